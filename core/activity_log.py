@@ -0,0 +1,432 @@
+"""
+Registro de actividad en lote del Telecom Technology
+Acumula los LogActividad en memoria y los inserta con bulk_create por tamaño o
+por tiempo, en lugar de un INSERT dentro de cada petición. Cada entrada se
+escribe antes en un archivo de respaldo (JSON por línea) para recuperarla si el
+proceso muere antes de vaciar el buffer.
+
+Los respaldos de cada proceso van en su propio directorio
+``proceso-<host>_<pid>_<sufijo>`` y el proceso mantiene un bloqueo (flock) sobre
+su archivo ``.bloqueo`` mientras vive. Otro proceso solo recupera un directorio
+cuando logra tomar ese bloqueo, lo que funciona aunque varios contenedores
+compartan ./logs y repitan los mismos PIDs. Los registros que la base de datos
+rechaza se apartan a ``cuarentena/`` para que no bloqueen el resto.
+"""
+
+import atexit
+import json
+import logging
+import os
+import re
+import secrets
+import shutil
+import socket
+import threading
+import time
+
+from django.conf import settings
+from django.db import DataError, IntegrityError, close_old_connections, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+logger = logging.getLogger(__name__)
+
+
+def _configuracion(nombre, por_defecto):
+    return getattr(settings, nombre, por_defecto)
+
+
+try:
+    import fcntl
+except ImportError:  # Windows (desarrollo): sin bloqueos entre procesos
+    fcntl = None
+
+PREFIJO_PROCESO = 'proceso-'
+ARCHIVO_BLOQUEO = '.bloqueo'
+DIRECTORIO_CUARENTENA = 'cuarentena'
+
+# Sin flock (o para respaldos con el formato anterior, actividad-<pid>.jsonl)
+# un respaldo se da por abandonado si no cambió en este tiempo; un proceso vivo
+# renombra su archivo en cada vaciado, cada pocos segundos
+ANTIGUEDAD_ABANDONO = 3600
+
+
+def _identificador_proceso():
+    """Host (contenedor), PID y un sufijo aleatorio: único aunque el PID se repita"""
+    host = re.sub(r'[^A-Za-z0-9.]', '_', socket.gethostname()) or 'host'
+    return f"{host}_{os.getpid()}_{secrets.token_hex(4)}"
+
+
+def _bloquear(ruta):
+    """
+    Abre ``ruta`` y toma un bloqueo exclusivo sin esperar. Retorna el archivo
+    abierto (el bloqueo dura mientras siga abierto) o None si otro proceso lo
+    tiene. El kernel libera el bloqueo cuando el proceso muere.
+    """
+    archivo = open(ruta, 'a')
+    if fcntl is None:
+        return archivo
+    try:
+        fcntl.flock(archivo.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        archivo.close()
+        return None
+    return archivo
+
+
+def _abandonado(ruta):
+    try:
+        return time.time() - os.path.getmtime(ruta) > ANTIGUEDAD_ABANDONO
+    except OSError:
+        return False
+
+
+def _leer_respaldo(ruta):
+    """Registros de un archivo de respaldo (JSON por línea)"""
+    registros = []
+    with open(ruta, encoding='utf-8') as archivo:
+        for linea in archivo:
+            linea = linea.strip()
+            if not linea:
+                continue
+            try:
+                registros.append(json.loads(linea))
+            except ValueError:
+                logger.warning(f"Línea inválida en {os.path.basename(ruta)}, se omite")
+    return registros
+
+
+class ActivityLogBuffer:
+    """
+    Cola en proceso de registros de actividad.
+
+    ``registrar()`` solo agrega la entrada a memoria y al archivo de respaldo;
+    un hilo en segundo plano la inserta cuando se juntan ``batch_size`` entradas
+    o pasan ``flush_interval`` segundos. Tras un ``bulk_create`` exitoso el
+    archivo del lote se elimina; si falla, queda para ``recuperar_respaldos()``.
+    """
+
+    def __init__(self, batch_size=None, flush_interval=None, spool_dir=None):
+        self.batch_size = batch_size or _configuracion('ACTIVITY_LOG_BATCH_SIZE', 50)
+        self.flush_interval = flush_interval or _configuracion('ACTIVITY_LOG_FLUSH_INTERVAL', 5)
+        self.spool_dir = str(spool_dir or _configuracion(
+            'ACTIVITY_LOG_SPOOL_DIR', os.path.join(settings.BASE_DIR, 'logs', 'actividad')
+        ))
+        self._pendientes = []
+        self._lock = threading.Lock()
+        self._vaciar_ahora = threading.Event()
+        self._hilo = None
+        self._pid = None
+        self._id = None
+        self._bloqueo = None
+        self._secuencia = 0
+
+    # Archivos de respaldo en proceso-<id>/: actividad.jsonl recibe las entradas
+    # nuevas y al vaciar se renombra a <n>.lote mientras se inserta el lote
+    def _directorio_propio(self):
+        return os.path.join(self.spool_dir, f'{PREFIJO_PROCESO}{self._id}')
+
+    def _archivo_actual(self):
+        return os.path.join(self._directorio_propio(), 'actividad.jsonl')
+
+    def _preparar_proceso(self):
+        """Crea el directorio del proceso y toma su bloqueo (también tras un fork)"""
+        if self._pid == os.getpid():
+            return
+        if self._bloqueo is not None:
+            # Copia heredada del padre: el bloqueo sigue siendo del padre
+            self._bloqueo.close()
+        self._pendientes = []
+        self._hilo = None
+        self._id = _identificador_proceso()
+        os.makedirs(self._directorio_propio(), exist_ok=True)
+        self._bloqueo = _bloquear(os.path.join(self._directorio_propio(), ARCHIVO_BLOQUEO))
+        self._pid = os.getpid()
+
+    def _asegurar_hilo(self):
+        # Tras un fork (workers de gunicorn con preload) el hilo no existe en el hijo
+        if self._hilo is not None and self._pid == os.getpid() and self._hilo.is_alive():
+            return
+        with self._lock:
+            if self._hilo is not None and self._pid == os.getpid() and self._hilo.is_alive():
+                return
+            self._preparar_proceso()
+            self._hilo = threading.Thread(
+                target=self._ciclo, name='activity-log-writer', daemon=True
+            )
+            self._hilo.start()
+
+    def registrar(self, campos):
+        """Encola un registro (diccionario de campos de LogActividad ya serializable)"""
+        self._asegurar_hilo()
+        linea = json.dumps(campos, default=str)
+        with self._lock:
+            self._pendientes.append(campos)
+            try:
+                with open(self._archivo_actual(), 'a', encoding='utf-8') as archivo:
+                    archivo.write(linea + '\n')
+            except OSError as e:
+                logger.warning(f"No se pudo escribir el respaldo del log de actividad: {e}")
+            lleno = len(self._pendientes) >= self.batch_size
+        if lleno:
+            self._vaciar_ahora.set()
+
+    def _ciclo(self):
+        try:
+            self.recuperar_respaldos()
+        except Exception as e:
+            logger.error(f"Error recuperando respaldos del log de actividad: {e}")
+        while True:
+            self._vaciar_ahora.wait(self.flush_interval)
+            self._vaciar_ahora.clear()
+            try:
+                close_old_connections()
+                self.vaciar()
+            except Exception as e:
+                logger.error(f"Error vaciando el log de actividad: {e}")
+
+    def vaciar(self):
+        """Inserta las entradas pendientes con bulk_create; retorna cuántas se insertaron"""
+        with self._lock:
+            if not self._pendientes:
+                return 0
+            lote = self._pendientes
+            self._pendientes = []
+            self._secuencia += 1
+            archivo_lote = os.path.join(self._directorio_propio(), f'{self._secuencia}.lote')
+            try:
+                os.replace(self._archivo_actual(), archivo_lote)
+            except OSError:
+                archivo_lote = None
+
+        insertados = insertar_registros(lote)
+        if archivo_lote:
+            try:
+                os.remove(archivo_lote)
+            except OSError:
+                pass
+        return insertados
+
+    def recuperar_respaldos(self):
+        """
+        Inserta las entradas de archivos de respaldo de procesos que ya no existen.
+
+        Un directorio ``proceso-*`` se recupera solo si se logra tomar su
+        bloqueo, es decir, si su proceso murió (en este u otro contenedor); el
+        bloqueo se mantiene mientras tanto para que dos workers no lo recuperen
+        a la vez. Si la base de datos no está disponible el directorio queda
+        como estaba y se reintenta más tarde. Retorna la cantidad de registros
+        recuperados.
+        """
+        with self._lock:
+            self._preparar_proceso()
+        propio = os.path.basename(self._directorio_propio())
+        recuperados = 0
+        for nombre in sorted(os.listdir(self.spool_dir)):
+            ruta = os.path.join(self.spool_dir, nombre)
+            if nombre.startswith(PREFIJO_PROCESO):
+                if nombre != propio and os.path.isdir(ruta):
+                    recuperados += self._recuperar_directorio(ruta)
+            elif nombre.endswith(('.jsonl', '.lote')) and _abandonado(ruta):
+                # Formato anterior (actividad-<pid>.jsonl, recuperando-*): se
+                # mueve al directorio propio, así solo un proceso lo toma
+                tomado = os.path.join(self._directorio_propio(), f'anterior-{nombre}')
+                try:
+                    os.rename(ruta, tomado)
+                except OSError:
+                    continue
+                recuperados += insertar_registros(_leer_respaldo(tomado))
+                os.remove(tomado)
+        if recuperados:
+            logger.info(f"Log de actividad: {recuperados} registros recuperados de respaldos")
+        return recuperados
+
+    def _recuperar_directorio(self, directorio):
+        if fcntl is None and not _abandonado(directorio):
+            return 0
+        try:
+            bloqueo = _bloquear(os.path.join(directorio, ARCHIVO_BLOQUEO))
+        except OSError:
+            # Otro proceso terminó de recuperarlo y lo eliminó
+            return 0
+        if bloqueo is None:
+            return 0
+        try:
+            recuperados = 0
+            for nombre in sorted(os.listdir(directorio)):
+                if nombre == ARCHIVO_BLOQUEO:
+                    continue
+                ruta = os.path.join(directorio, nombre)
+                recuperados += insertar_registros(_leer_respaldo(ruta))
+                os.remove(ruta)
+            shutil.rmtree(directorio, ignore_errors=True)
+        finally:
+            bloqueo.close()
+        return recuperados
+
+
+def _normalizar(campos):
+    """Convierte los argumentos de LogActividad.objects.create en un diccionario serializable"""
+    from .models import LogActividad
+
+    nombres = {campo.attname for campo in LogActividad._meta.concrete_fields} | {
+        campo.name for campo in LogActividad._meta.concrete_fields
+    }
+    registro = {}
+    for nombre, valor in campos.items():
+        if nombre not in nombres:
+            logger.warning(f"Campo desconocido en LogActividad ignorado: {nombre}")
+            continue
+        if nombre == 'usuario':
+            nombre, valor = 'usuario_id', valor.pk if valor is not None else None
+        registro[nombre] = valor
+    registro.setdefault('fecha_actividad', timezone.now().isoformat())
+    if not isinstance(registro['fecha_actividad'], str):
+        registro['fecha_actividad'] = registro['fecha_actividad'].isoformat()
+    return registro
+
+
+def insertar_registros(registros):
+    """
+    Inserta una lista de registros normalizados con bulk_create.
+
+    Si el lote falla por un registro inválido (usuario ya eliminado, texto
+    demasiado largo) se reintenta fila por fila y las filas rechazadas se
+    apartan a la cuarentena, así un registro malo no impide insertar los demás
+    ni deja el respaldo sin procesar. Retorna la cantidad insertada.
+    """
+    from .models import LogActividad
+
+    objetos, rechazados = [], []
+    for registro in registros:
+        try:
+            datos = dict(registro)
+            datos['fecha_actividad'] = parse_datetime(datos['fecha_actividad'])
+            objetos.append((registro, LogActividad(**datos)))
+        except (KeyError, TypeError, ValueError) as e:
+            rechazados.append((registro, e))
+    if not objetos:
+        _poner_en_cuarentena(rechazados)
+        return 0
+
+    try:
+        with transaction.atomic():
+            LogActividad.objects.bulk_create([objeto for _, objeto in objetos], batch_size=500)
+        insertados = len(objetos)
+    except (IntegrityError, DataError):
+        insertados = 0
+        for registro, objeto in objetos:
+            try:
+                with transaction.atomic():
+                    LogActividad.objects.bulk_create([objeto])
+                insertados += 1
+            except (IntegrityError, DataError) as e:
+                rechazados.append((registro, e))
+    _poner_en_cuarentena(rechazados)
+    return insertados
+
+
+def _poner_en_cuarentena(rechazados):
+    """Guarda los registros rechazados en cuarentena/actividad-AAAA-MM-DD.jsonl"""
+    if not rechazados:
+        return
+    directorio = os.path.join(
+        str(_configuracion('ACTIVITY_LOG_SPOOL_DIR', os.path.join(settings.BASE_DIR, 'logs', 'actividad'))),
+        DIRECTORIO_CUARENTENA,
+    )
+    logger.warning(f"Log de actividad: {len(rechazados)} registros rechazados pasan a {directorio}")
+    try:
+        os.makedirs(directorio, exist_ok=True)
+        ruta = os.path.join(directorio, f'actividad-{timezone.now():%Y-%m-%d}.jsonl')
+        with open(ruta, 'a', encoding='utf-8') as archivo:
+            for registro, error in rechazados:
+                archivo.write(json.dumps({'registro': registro, 'error': str(error)}, default=str) + '\n')
+    except OSError as e:
+        logger.error(f"No se pudo escribir la cuarentena del log de actividad: {e}")
+
+
+_buffer = None
+_buffer_lock = threading.Lock()
+
+
+def obtener_buffer():
+    """Buffer del proceso (se crea al primer uso, cuando settings ya está cargado)"""
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                _buffer = ActivityLogBuffer()
+                atexit.register(_vaciar_al_salir)
+    return _buffer
+
+
+def _vaciar_al_salir():
+    try:
+        if _buffer is not None:
+            _buffer.vaciar()
+    except Exception as e:
+        logger.error(f"No se pudo vaciar el log de actividad al salir: {e}")
+
+
+def registrar_actividad(**campos):
+    """
+    Registra una actividad con los mismos argumentos que LogActividad.objects.create.
+
+    Con ``ACTIVITY_LOG_BUFFERED = False`` (pruebas, comandos de gestión) se inserta
+    de inmediato; de lo contrario se encola y se inserta en lote.
+    """
+    try:
+        registro = _normalizar(campos)
+        if not _configuracion('ACTIVITY_LOG_BUFFERED', True):
+            insertar_registros([registro])
+            return
+        obtener_buffer().registrar(registro)
+    except Exception as e:
+        logger.error(f"Error registrando actividad: {e}")
+
+
+def depurar_logs_actividad(dias=None, archivar=True, lote=1000):
+    """
+    Elimina los registros más antiguos que la retención configurada.
+
+    La tabla se maneja por particiones lógicas de un mes: antes de borrar, cada
+    registro se agrega (si ``archivar``) al archivo ``actividad-AAAA-MM.jsonl.gz``
+    de su mes en ``ACTIVITY_LOG_ARCHIVE_DIR``. El borrado se hace por lotes de
+    ids para no bloquear la base de datos con una sola transacción grande.
+    Retorna la cantidad de registros eliminados.
+    """
+    import gzip
+    from datetime import timedelta
+
+    from .models import LogActividad
+
+    dias = dias if dias is not None else _configuracion('ACTIVITY_LOG_RETENTION_DAYS', 365)
+    fecha_limite = timezone.now() - timedelta(days=dias)
+    directorio = str(_configuracion(
+        'ACTIVITY_LOG_ARCHIVE_DIR', os.path.join(settings.BASE_DIR, 'logs', 'actividad_archivo')
+    ))
+    if archivar:
+        os.makedirs(directorio, exist_ok=True)
+
+    campos = [campo.attname for campo in LogActividad._meta.concrete_fields]
+    eliminados = 0
+    while True:
+        filas = list(
+            LogActividad.objects.filter(fecha_actividad__lt=fecha_limite)
+            .order_by('id').values(*campos)[:lote]
+        )
+        if not filas:
+            break
+        if archivar:
+            por_mes = {}
+            for fila in filas:
+                por_mes.setdefault(fila['fecha_actividad'].strftime('%Y-%m'), []).append(fila)
+            for mes, filas_mes in por_mes.items():
+                ruta = os.path.join(directorio, f'actividad-{mes}.jsonl.gz')
+                with gzip.open(ruta, 'at', encoding='utf-8') as archivo:
+                    for fila in filas_mes:
+                        archivo.write(json.dumps(fila, default=str) + '\n')
+        eliminados += LogActividad.objects.filter(id__in=[fila['id'] for fila in filas]).delete()[0]
+
+    logger.info(f"Log de actividad depurado: {eliminados} registros anteriores a {fecha_limite:%Y-%m-%d}")
+    return eliminados
@@ -4,3 +4,17 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        from .finanzas import conectar_finanzas
+        conectar_finanzas()
+        from .cache_invalidation import conectar_invalidacion_cache
+        conectar_invalidacion_cache()
+        from .pdf_cache import conectar_invalidacion_pdf
+        conectar_invalidacion_pdf()
+        from .search import conectar_indexacion
+        conectar_indexacion()
+        from .archivos_meta import conectar_metadatos_archivos
+        conectar_metadatos_archivos()
+        from .miniaturas import conectar_miniaturas
+        conectar_miniaturas()
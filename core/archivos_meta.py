@@ -0,0 +1,199 @@
+"""
+Metadatos de archivos del Telecom Technology
+Calcula tamaño, SHA-256, tipo MIME y dimensiones de imagen al subir un archivo
+(ArchivoProyecto, ArchivoAdjunto) para que los listados no consulten el disco,
+y mantiene el tamaño acumulado por carpeta y por proyecto con señales.
+"""
+
+import hashlib
+import logging
+import mimetypes
+import os
+
+from django.apps import apps
+from django.core.files.images import get_image_dimensions
+from django.db import transaction
+from django.db.models import Sum
+from django.db.models.signals import post_delete, post_save, pre_save
+
+logger = logging.getLogger(__name__)
+
+EXTENSIONES_IMAGEN = {'.jpg', '.jpeg', '.png', '.gif', '.bmp', '.webp'}
+
+
+def formato_tamano(tamano):
+    """Tamaño en bytes en formato legible (None -> 'N/A')"""
+    if tamano is None:
+        return "N/A"
+    tamano = float(tamano)
+    for unidad in ['B', 'KB', 'MB', 'GB']:
+        if tamano < 1024.0:
+            return f"{tamano:.1f} {unidad}"
+        tamano /= 1024.0
+    return f"{tamano:.1f} TB"
+
+
+def calcular_metadatos(campo):
+    """
+    Metadatos de un FieldFile: tamano, sha256, tipo_mime, ancho y alto.
+
+    Si el archivo recién se subió se lee desde el archivo temporal (o la
+    memoria) antes de guardarlo; si no, se abre desde el almacenamiento. Un
+    archivo de una subida fragmentada (subidas.ArchivoSubido) ya trae el
+    tamaño y el SHA-256 verificados al completarla y no se vuelve a leer.
+    """
+    nombre = campo.name or ''
+    guardado = campo._committed
+    if guardado:
+        campo.open('rb')
+    try:
+        archivo = campo.file
+        sha256 = getattr(archivo, 'sha256', '')
+        if sha256:
+            tamano = archivo.size
+        else:
+            hash_archivo = hashlib.sha256()
+            tamano = 0
+            for bloque in campo.chunks():
+                hash_archivo.update(bloque)
+                tamano += len(bloque)
+            sha256 = hash_archivo.hexdigest()
+        ancho = alto = None
+        if os.path.splitext(nombre)[1].lower() in EXTENSIONES_IMAGEN:
+            try:
+                ancho, alto = get_image_dimensions(archivo)
+            except Exception as e:
+                logger.warning(f"No se pudieron leer las dimensiones de {nombre}: {e}")
+        tipo_mime = mimetypes.guess_type(nombre)[0] or getattr(archivo, 'content_type', None) or ''
+        archivo.seek(0)
+    finally:
+        if guardado:
+            campo.close()
+
+    return {
+        'tamano': tamano,
+        'sha256': sha256,
+        'tipo_mime': tipo_mime[:100],
+        'ancho': ancho,
+        'alto': alto,
+    }
+
+
+def asignar_metadatos(instancia):
+    """
+    Calcula los metadatos del archivo de la instancia (ver MetadatosArchivoMixin)
+    y los asigna a sus campos. Retorna los nombres de los campos asignados.
+    """
+    campo = getattr(instancia, instancia.CAMPO_ARCHIVO)
+    try:
+        metadatos = calcular_metadatos(campo)
+    except (OSError, ValueError) as e:
+        logger.warning(f"No se pudieron calcular los metadatos de {campo.name}: {e}")
+        return []
+    for clave, nombre_campo in instancia.CAMPOS_METADATOS.items():
+        setattr(instancia, nombre_campo, metadatos[clave])
+    return list(instancia.CAMPOS_METADATOS.values())
+
+
+def recalcular_tamanos_proyecto(proyecto_id):
+    """
+    Recalcula el tamaño acumulado de todas las carpetas de un proyecto y del proyecto.
+
+    Dos consultas (tamaño directo por carpeta y árbol de carpetas) y las
+    sumas de subcarpetas se resuelven en memoria; solo se escriben los valores
+    que cambiaron, con update() para no disparar otras señales.
+    """
+    ArchivoProyecto = apps.get_model('core', 'ArchivoProyecto')
+    CarpetaProyecto = apps.get_model('core', 'CarpetaProyecto')
+    Proyecto = apps.get_model('core', 'Proyecto')
+
+    activos = ArchivoProyecto.objects.filter(proyecto_id=proyecto_id, activo=True)
+    directo = dict(
+        activos.exclude(carpeta__isnull=True).values('carpeta_id').annotate(
+            total=Sum('tamano_bytes')
+        ).values_list('carpeta_id', 'total')
+    )
+    carpetas = list(CarpetaProyecto.objects.filter(proyecto_id=proyecto_id).values_list(
+        'id', 'carpeta_padre_id', 'activa', 'tamano_bytes'
+    ))
+    hijas = {}
+    for carpeta_id, padre_id, activa, _ in carpetas:
+        if activa:
+            hijas.setdefault(padre_id, []).append(carpeta_id)
+
+    totales = {}
+
+    def total(carpeta_id, visitadas=()):
+        if carpeta_id not in totales:
+            # ``visitadas`` evita ciclos si una carpeta quedó como su propio ancestro
+            suma = directo.get(carpeta_id) or 0
+            for hija in hijas.get(carpeta_id, ()):
+                if hija not in visitadas:
+                    suma += total(hija, visitadas + (carpeta_id,))
+            totales[carpeta_id] = suma
+        return totales[carpeta_id]
+
+    for carpeta_id, _, _, anterior in carpetas:
+        nuevo = total(carpeta_id)
+        if nuevo != anterior:
+            CarpetaProyecto.objects.filter(pk=carpeta_id).update(tamano_bytes=nuevo)
+
+    total_proyecto = activos.aggregate(total=Sum('tamano_bytes'))['total'] or 0
+    Proyecto.objects.filter(pk=proyecto_id).exclude(
+        tamano_archivos_bytes=total_proyecto
+    ).update(tamano_archivos_bytes=total_proyecto)
+    return total_proyecto
+
+
+def _programar_recalculo(*proyecto_ids):
+    for proyecto_id in {proyecto_id for proyecto_id in proyecto_ids if proyecto_id}:
+        transaction.on_commit(lambda proyecto_id=proyecto_id: recalcular_tamanos_proyecto(proyecto_id))
+
+
+# Campos que cambian los tamaños acumulados (si el guardado indica update_fields).
+# Proyecto y CarpetaProyecto se incluyen porque un save() completo con una
+# instancia cargada antes de la subida escribiría un total desactualizado.
+CAMPOS_TAMANO = {
+    'ArchivoProyecto': {'tamano_bytes', 'activo', 'carpeta', 'proyecto'},
+    'CarpetaProyecto': {'activa', 'carpeta_padre', 'proyecto', 'tamano_bytes'},
+    'Proyecto': {'tamano_archivos_bytes'},
+}
+
+
+def _proyecto_de(sender, instance):
+    return instance.pk if sender.__name__ == 'Proyecto' else instance.proyecto_id
+
+
+def _archivo_por_guardar(sender, instance, raw=False, update_fields=None, **kwargs):
+    """Guarda el proyecto que tenía el archivo o la carpeta si este cambio lo mueve a otro"""
+    instance._proyecto_id_anterior = None
+    if raw or instance.pk is None:
+        return
+    if update_fields is not None and not {'proyecto', 'proyecto_id'} & set(update_fields):
+        return
+    anterior = sender.objects.filter(pk=instance.pk).values_list('proyecto_id', flat=True).first()
+    if anterior is not None and anterior != instance.proyecto_id:
+        instance._proyecto_id_anterior = anterior
+
+
+def _archivo_cambio(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    if update_fields is not None and not CAMPOS_TAMANO[sender.__name__] & set(update_fields):
+        return
+    # Al mover a otro proyecto cambian los totales de los dos
+    _programar_recalculo(_proyecto_de(sender, instance), getattr(instance, '_proyecto_id_anterior', None))
+
+
+def _archivo_eliminado(sender, instance, **kwargs):
+    _programar_recalculo(instance.proyecto_id)
+
+
+def conectar_metadatos_archivos():
+    """Mantiene los tamaños acumulados al guardar o eliminar archivos y carpetas"""
+    for nombre in CAMPOS_TAMANO:
+        modelo = apps.get_model('core', nombre)
+        post_save.connect(_archivo_cambio, sender=modelo, dispatch_uid=f'archivos_meta_save_{nombre}')
+        if nombre != 'Proyecto':
+            pre_save.connect(_archivo_por_guardar, sender=modelo, dispatch_uid=f'archivos_meta_pre_save_{nombre}')
+            post_delete.connect(_archivo_eliminado, sender=modelo, dispatch_uid=f'archivos_meta_delete_{nombre}')
@@ -5,97 +5,113 @@ Configuración de caché para el Telecom Technology
 from django.core.cache import cache
 from django.conf import settings
 from .query_utils import CacheKeys
+from .cache_utils import (
+    TAG_DASHBOARD, TAG_FACTURAS, TAG_GASTOS, TAG_PROYECTOS,
+    invalidate_tags, tag_proyecto, tag_usuario, versioned_key,
+)
 import json
 
 
 class CacheManager:
-    """Gestor de caché para el sistema"""
+    """
+    Gestor de caché para el sistema
+    
+    Las claves se versionan con etiquetas (ver cache_utils.versioned_key), de modo
+    que una factura o un gasto guardado en un worker invalida las claves afectadas
+    en todos los workers que comparten la caché.
+    """
+    
+    # Etiquetas de las que depende cada dato cacheado
+    TAGS = {
+        CacheKeys.DASHBOARD_STATS: (TAG_DASHBOARD,),
+        CacheKeys.PROYECTOS_RECIENTES: (TAG_PROYECTOS,),
+        CacheKeys.GASTOS_RECIENTES: (TAG_GASTOS,),
+        CacheKeys.FACTURAS_VENCIDAS: (TAG_FACTURAS,),
+        CacheKeys.GASTOS_PENDIENTES: (TAG_GASTOS,),
+    }
+    
+    @staticmethod
+    def _key(base_key, user_id=None):
+        """Clave versionada de un dato, opcionalmente específica para un usuario"""
+        tags = CacheManager.TAGS.get(base_key, ())
+        if user_id:
+            base_key = CacheKeys.get_user_key(user_id, base_key)
+            tags = tags + (tag_usuario(user_id),)
+        return versioned_key(base_key, tags)
     
     @staticmethod
     def get_dashboard_stats(user_id=None):
         """Obtiene estadísticas del dashboard desde caché"""
-        key = CacheKeys.get_user_key(user_id, CacheKeys.DASHBOARD_STATS) if user_id else CacheKeys.DASHBOARD_STATS
-        return cache.get(key)
+        return cache.get(CacheManager._key(CacheKeys.DASHBOARD_STATS, user_id))
     
     @staticmethod
     def set_dashboard_stats(data, user_id=None, timeout=300):
         """Guarda estadísticas del dashboard en caché"""
-        key = CacheKeys.get_user_key(user_id, CacheKeys.DASHBOARD_STATS) if user_id else CacheKeys.DASHBOARD_STATS
-        cache.set(key, data, timeout)
+        cache.set(CacheManager._key(CacheKeys.DASHBOARD_STATS, user_id), data, timeout)
     
     @staticmethod
     def get_proyectos_recientes(user_id=None):
         """Obtiene proyectos recientes desde caché"""
-        key = CacheKeys.get_user_key(user_id, CacheKeys.PROYECTOS_RECIENTES) if user_id else CacheKeys.PROYECTOS_RECIENTES
-        return cache.get(key)
+        return cache.get(CacheManager._key(CacheKeys.PROYECTOS_RECIENTES, user_id))
     
     @staticmethod
     def set_proyectos_recientes(data, user_id=None, timeout=600):
         """Guarda proyectos recientes en caché"""
-        key = CacheKeys.get_user_key(user_id, CacheKeys.PROYECTOS_RECIENTES) if user_id else CacheKeys.PROYECTOS_RECIENTES
-        cache.set(key, data, timeout)
+        cache.set(CacheManager._key(CacheKeys.PROYECTOS_RECIENTES, user_id), data, timeout)
     
     @staticmethod
     def get_gastos_recientes(user_id=None):
         """Obtiene gastos recientes desde caché"""
-        key = CacheKeys.get_user_key(user_id, CacheKeys.GASTOS_RECIENTES) if user_id else CacheKeys.GASTOS_RECIENTES
-        return cache.get(key)
+        return cache.get(CacheManager._key(CacheKeys.GASTOS_RECIENTES, user_id))
     
     @staticmethod
     def set_gastos_recientes(data, user_id=None, timeout=600):
         """Guarda gastos recientes en caché"""
-        key = CacheKeys.get_user_key(user_id, CacheKeys.GASTOS_RECIENTES) if user_id else CacheKeys.GASTOS_RECIENTES
-        cache.set(key, data, timeout)
+        cache.set(CacheManager._key(CacheKeys.GASTOS_RECIENTES, user_id), data, timeout)
     
     @staticmethod
     def get_facturas_vencidas(user_id=None):
         """Obtiene facturas vencidas desde caché"""
-        key = CacheKeys.get_user_key(user_id, CacheKeys.FACTURAS_VENCIDAS) if user_id else CacheKeys.FACTURAS_VENCIDAS
-        return cache.get(key)
+        return cache.get(CacheManager._key(CacheKeys.FACTURAS_VENCIDAS, user_id))
     
     @staticmethod
     def set_facturas_vencidas(data, user_id=None, timeout=300):
         """Guarda facturas vencidas en caché"""
-        key = CacheKeys.get_user_key(user_id, CacheKeys.FACTURAS_VENCIDAS) if user_id else CacheKeys.FACTURAS_VENCIDAS
-        cache.set(key, data, timeout)
+        cache.set(CacheManager._key(CacheKeys.FACTURAS_VENCIDAS, user_id), data, timeout)
     
     @staticmethod
     def get_gastos_pendientes(user_id=None):
         """Obtiene gastos pendientes desde caché"""
-        key = CacheKeys.get_user_key(user_id, CacheKeys.GASTOS_PENDIENTES) if user_id else CacheKeys.GASTOS_PENDIENTES
-        return cache.get(key)
+        return cache.get(CacheManager._key(CacheKeys.GASTOS_PENDIENTES, user_id))
     
     @staticmethod
     def set_gastos_pendientes(data, user_id=None, timeout=300):
         """Guarda gastos pendientes en caché"""
-        key = CacheKeys.get_user_key(user_id, CacheKeys.GASTOS_PENDIENTES) if user_id else CacheKeys.GASTOS_PENDIENTES
-        cache.set(key, data, timeout)
+        cache.set(CacheManager._key(CacheKeys.GASTOS_PENDIENTES, user_id), data, timeout)
+    
+    @staticmethod
+    def get_project_data(project_id, key):
+        """Obtiene un dato de un proyecto desde caché"""
+        return cache.get(versioned_key(CacheKeys.get_project_key(project_id, key), (tag_proyecto(project_id),)))
+    
+    @staticmethod
+    def set_project_data(project_id, key, data, timeout=600):
+        """Guarda un dato de un proyecto en caché"""
+        cache.set(
+            versioned_key(CacheKeys.get_project_key(project_id, key), (tag_proyecto(project_id),)),
+            data,
+            timeout,
+        )
     
     @staticmethod
     def invalidate_user_cache(user_id):
         """Invalida todo el caché de un usuario"""
-        keys_to_invalidate = [
-            CacheKeys.get_user_key(user_id, CacheKeys.DASHBOARD_STATS),
-            CacheKeys.get_user_key(user_id, CacheKeys.PROYECTOS_RECIENTES),
-            CacheKeys.get_user_key(user_id, CacheKeys.GASTOS_RECIENTES),
-            CacheKeys.get_user_key(user_id, CacheKeys.FACTURAS_VENCIDAS),
-            CacheKeys.get_user_key(user_id, CacheKeys.GASTOS_PENDIENTES),
-        ]
-        
-        for key in keys_to_invalidate:
-            cache.delete(key)
+        invalidate_tags(tag_usuario(user_id))
     
     @staticmethod
     def invalidate_project_cache(project_id):
         """Invalida el caché relacionado con un proyecto"""
-        keys_to_invalidate = [
-            CacheKeys.get_project_key(project_id, 'stats'),
-            CacheKeys.get_project_key(project_id, 'gastos'),
-            CacheKeys.get_project_key(project_id, 'facturas'),
-        ]
-        
-        for key in keys_to_invalidate:
-            cache.delete(key)
+        invalidate_tags(tag_proyecto(project_id))
     
     @staticmethod
     def clear_all_cache():
@@ -106,18 +122,14 @@ class CacheManager:
     def get_cache_info():
         """Obtiene información del caché"""
         try:
-            # Esta implementación depende del backend de caché usado
-            if hasattr(cache, '_cache'):
-                return {
-                    'backend': str(type(cache._cache).__name__),
-                    'timeout': getattr(cache, 'default_timeout', 'No definido'),
-                }
-            else:
-                return {
-                    'backend': 'Desconocido',
-                    'timeout': 'No definido',
-                }
-        except:
+            backend = settings.CACHES.get('default', {}).get('BACKEND', '')
+            return {
+                'backend': type(cache).__name__,
+                'compartido': 'locmem' not in backend and 'dummy' not in backend,
+                'location': getattr(cache, '_dir', None) or settings.CACHES['default'].get('LOCATION'),
+                'timeout': getattr(cache, 'default_timeout', 'No definido'),
+            }
+        except Exception:
             return {
                 'backend': 'Error al obtener información',
                 'timeout': 'No definido',
@@ -150,13 +162,13 @@ class CacheDecorators:
         """Decorador para cachear datos de proyecto"""
         def decorator(func):
             def wrapper(request, project_id, *args, **kwargs):
-                cached_data = cache.get(f"project_{project_id}_data")
+                cached_data = CacheManager.get_project_data(project_id, 'data')
                 
                 if cached_data is not None:
                     return cached_data
                 
                 result = func(request, project_id, *args, **kwargs)
-                cache.set(f"project_{project_id}_data", result, timeout)
+                CacheManager.set_project_data(project_id, 'data', result, timeout)
                 return result
             
             return wrapper
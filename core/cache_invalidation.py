@@ -0,0 +1,181 @@
+"""
+Registro de invalidación de caché por modelo del Telecom Technology
+Declara qué etiquetas de caché (ver cache_utils) afecta cada modelo y las
+invalida con las señales post_save, post_delete y m2m_changed.
+"""
+
+import logging
+
+from django.apps import apps
+from django.core.exceptions import ObjectDoesNotExist
+from django.db.models.signals import post_save, post_delete, m2m_changed
+
+from .cache_utils import (
+    TAG_DASHBOARD, TAG_FACTURAS, TAG_GASTOS, TAG_PERMISOS, TAG_PROYECTOS,
+    invalidate_tags_on_commit, tag_proyecto, tag_rol,
+)
+
+logger = logging.getLogger(__name__)
+
+
+# Cada entrada indica:
+#   etiquetas: etiquetas fijas que se invalidan con cualquier escritura del modelo
+#   proyecto:  ruta (con puntos) al id del proyecto afectado, para invalidar solo
+#              las claves de ese proyecto (cache_proyecto_data, CacheManager.*_project_data)
+#   rol:       ruta al id del rol cuyos permisos cacheados cambian (RolPermiso.codigos_de_rol)
+#   m2m:       campos ManyToMany cuyos cambios también invalidan
+REGISTRO_INVALIDACION = {
+    'Rol': {
+        'etiquetas': (),
+        'rol': 'pk',
+    },
+    'RolPermiso': {
+        'etiquetas': (),
+        'rol': 'rol_id',
+    },
+    'Permiso': {
+        'etiquetas': (TAG_PERMISOS,),
+    },
+    'Modulo': {
+        'etiquetas': (TAG_PERMISOS,),
+    },
+    'Proyecto': {
+        'etiquetas': (TAG_DASHBOARD, TAG_PROYECTOS),
+        'proyecto': 'pk',
+        'm2m': ('colaboradores',),
+    },
+    'Subproyecto': {
+        'etiquetas': (TAG_PROYECTOS,),
+        'proyecto': 'proyecto_id',
+    },
+    'Cliente': {
+        'etiquetas': (TAG_PROYECTOS, TAG_FACTURAS),
+    },
+    'Factura': {
+        'etiquetas': (TAG_DASHBOARD, TAG_FACTURAS),
+        'proyecto': 'proyecto_id',
+        'm2m': ('archivos_adjuntos',),
+    },
+    'Pago': {
+        'etiquetas': (TAG_DASHBOARD, TAG_FACTURAS),
+        'proyecto': 'factura.proyecto_id',
+    },
+    'Gasto': {
+        'etiquetas': (TAG_DASHBOARD, TAG_GASTOS),
+        'proyecto': 'proyecto_id',
+    },
+    'CategoriaGasto': {
+        'etiquetas': (TAG_GASTOS,),
+    },
+    'Anticipo': {
+        'etiquetas': (TAG_DASHBOARD, TAG_FACTURAS),
+        'proyecto': 'proyecto_id',
+    },
+    'AplicacionAnticipo': {
+        'etiquetas': (TAG_DASHBOARD, TAG_FACTURAS),
+        'proyecto': 'factura.proyecto_id',
+    },
+    'AnticipoProyecto': {
+        'etiquetas': (TAG_DASHBOARD,),
+        'proyecto': 'proyecto_id',
+    },
+    'PlanillaLiquidada': {
+        'etiquetas': (TAG_DASHBOARD,),
+        'proyecto': 'proyecto_id',
+    },
+    'IngresoProyecto': {
+        'etiquetas': (TAG_DASHBOARD,),
+        'proyecto': 'proyecto_id',
+    },
+}
+
+
+def _resolver(instancia, ruta):
+    """Sigue una ruta con puntos (``factura.proyecto_id``); None si algún tramo no existe"""
+    valor = instancia
+    for atributo in ruta.split('.'):
+        try:
+            valor = getattr(valor, atributo)
+        except ObjectDoesNotExist:
+            # En borrados en cascada el objeto relacionado puede ya no existir
+            return None
+        if valor is None:
+            return None
+    return valor
+
+
+def etiquetas_de(instancia):
+    """Etiquetas de caché afectadas por una escritura de la instancia"""
+    regla = REGISTRO_INVALIDACION.get(type(instancia).__name__)
+    if regla is None:
+        return set()
+
+    etiquetas = set(regla['etiquetas'])
+    ruta_proyecto = regla.get('proyecto')
+    if ruta_proyecto:
+        proyecto_id = _resolver(instancia, ruta_proyecto)
+        if proyecto_id:
+            etiquetas.add(tag_proyecto(proyecto_id))
+        # Las señales de finanzas y archivos_meta dejan el proyecto anterior si el registro cambió de proyecto
+        proyecto_anterior_id = getattr(instancia, '_proyecto_id_anterior', None)
+        if proyecto_anterior_id:
+            etiquetas.add(tag_proyecto(proyecto_anterior_id))
+    ruta_rol = regla.get('rol')
+    if ruta_rol:
+        rol_id = _resolver(instancia, ruta_rol)
+        if rol_id:
+            etiquetas.add(tag_rol(rol_id))
+    return etiquetas
+
+
+def _invalidar_guardado(sender, instance, raw=False, **kwargs):
+    # Las cargas de fixtures (raw) no pasan por la caché
+    if raw:
+        return
+    invalidate_tags_on_commit(*etiquetas_de(instance))
+
+
+def _invalidar_eliminado(sender, instance, **kwargs):
+    invalidate_tags_on_commit(*etiquetas_de(instance))
+
+
+def _invalidar_m2m(sender, instance, action, reverse, model, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+
+    if not reverse:
+        invalidate_tags_on_commit(*etiquetas_de(instance))
+        return
+
+    # Cambio desde el lado inverso (p. ej. colaborador.proyectos.add): la instancia
+    # es del otro modelo y pk_set trae los registros del modelo registrado
+    regla = REGISTRO_INVALIDACION.get(model.__name__, {})
+    etiquetas = set(regla.get('etiquetas', ()))
+    if regla.get('proyecto') == 'pk' and pk_set:
+        etiquetas.update(tag_proyecto(pk) for pk in pk_set)
+    elif regla.get('proyecto'):
+        # post_clear no informa los ids afectados: se invalidan por modelo
+        for objeto in model.objects.filter(pk__in=pk_set or ()):
+            etiquetas |= etiquetas_de(objeto)
+    invalidate_tags_on_commit(*etiquetas)
+
+
+def conectar_invalidacion_cache():
+    """Conecta las señales del registro; se llama desde CoreConfig.ready()"""
+    for nombre, regla in REGISTRO_INVALIDACION.items():
+        modelo = apps.get_model('core', nombre)
+        post_save.connect(
+            _invalidar_guardado, sender=modelo,
+            dispatch_uid=f'cache_invalidation_save_{nombre}',
+        )
+        post_delete.connect(
+            _invalidar_eliminado, sender=modelo,
+            dispatch_uid=f'cache_invalidation_delete_{nombre}',
+        )
+        for campo in regla.get('m2m', ()):
+            through = modelo._meta.get_field(campo).remote_field.through
+            m2m_changed.connect(
+                _invalidar_m2m, sender=through,
+                dispatch_uid=f'cache_invalidation_m2m_{nombre}_{campo}',
+            )
+    logger.debug(f"Invalidación de caché conectada para {len(REGISTRO_INVALIDACION)} modelos")
@@ -2,16 +2,134 @@
 Utilidades de cache para optimizar consultas pesadas
 """
 
-from django.core.cache import cache
+from django.core.cache import cache, caches
 from django.conf import settings
+from django.db import transaction
 import hashlib
 import json
+import time
 from functools import wraps
-from typing import Any, Optional, Callable
+from typing import Any, Iterable, Optional, Callable
 import logging
 
 logger = logging.getLogger(__name__)
 
+# Etiquetas de invalidación. Cada clave cacheada se versiona con las etiquetas de
+# los datos de los que depende; al invalidar una etiqueta cambia su versión y todas
+# las claves que la usan dejan de encontrarse en cualquier worker que comparta la caché.
+TAG_DASHBOARD = "dashboard"
+TAG_FACTURAS = "facturas"
+TAG_GASTOS = "gastos"
+TAG_PROYECTOS = "proyectos"
+TAG_PERMISOS = "permisos"
+TAG_VERSION_PREFIX = "tag_version"
+
+
+def tag_proyecto(proyecto_id) -> str:
+    """Etiqueta de los datos cacheados de un proyecto"""
+    return f"proyecto_{proyecto_id}"
+
+
+def tag_usuario(user_id) -> str:
+    """Etiqueta de los datos cacheados de un usuario"""
+    return f"usuario_{user_id}"
+
+
+def tag_rol(rol_id) -> str:
+    """Etiqueta de los permisos cacheados de un rol"""
+    return f"rol_{rol_id}"
+
+
+def _tag_version_key(tag: str) -> str:
+    return f"{TAG_VERSION_PREFIX}:{tag}"
+
+
+def _nueva_version() -> int:
+    # Se parte del reloj para que una etiqueta expulsada de la caché no reutilice
+    # una versión anterior y reviva claves viejas
+    return int(time.time() * 1000)
+
+
+def get_tag_versions(tags: Iterable[str], cache_alias: str = "default") -> list:
+    """
+    Obtiene la versión actual de cada etiqueta (una sola lectura a la caché)
+    
+    Args:
+        tags: Etiquetas a consultar
+        cache_alias: Alias del cache a usar
+    
+    Returns:
+        Lista de versiones en el mismo orden que las etiquetas
+    """
+    backend = caches[cache_alias]
+    tags = list(tags)
+    version_keys = [_tag_version_key(tag) for tag in tags]
+    found = backend.get_many(version_keys)
+    versions = []
+    for version_key in version_keys:
+        version = found.get(version_key)
+        if version is None:
+            version = _nueva_version()
+            # add() no pisa la versión si otro worker la creó primero
+            if not backend.add(version_key, version, None):
+                version = backend.get(version_key, version)
+        versions.append(version)
+    return versions
+
+
+def versioned_key(key: str, tags: Iterable[str] = (), cache_alias: str = "default") -> str:
+    """
+    Agrega a una clave las versiones de sus etiquetas
+    
+    Args:
+        key: Clave base
+        tags: Etiquetas de las que depende el valor
+        cache_alias: Alias del cache a usar
+    
+    Returns:
+        Clave que cambia cuando se invalida cualquiera de las etiquetas
+    """
+    tags = sorted(set(tags))
+    if not tags:
+        return key
+    versions = get_tag_versions(tags, cache_alias)
+    fingerprint = ".".join(str(version) for version in versions)
+    return f"{key}:{hashlib.md5(fingerprint.encode('utf-8')).hexdigest()[:12]}"
+
+
+def invalidate_tags(*tags: str, cache_alias: str = "default"):
+    """
+    Invalida todas las claves asociadas a las etiquetas indicadas
+    
+    Las claves viejas no se borran: quedan huérfanas y expiran por su timeout.
+    
+    Args:
+        *tags: Etiquetas a invalidar
+        cache_alias: Alias del cache a usar
+    """
+    backend = caches[cache_alias]
+    for tag in set(tags):
+        version_key = _tag_version_key(tag)
+        try:
+            backend.incr(version_key)
+        except ValueError:
+            backend.set(version_key, _nueva_version(), None)
+        except Exception as e:
+            logger.warning(f"Error al invalidar etiqueta {tag}: {e}")
+        else:
+            logger.debug(f"Cache INVALIDATE: {tag}")
+
+
+def invalidate_tags_on_commit(*tags: str, cache_alias: str = "default"):
+    """
+    Invalida las etiquetas cuando se confirme la transacción actual
+    
+    Así otro worker no vuelve a cachear los datos viejos entre la invalidación y el commit.
+    """
+    if not tags:
+        return
+    transaction.on_commit(lambda: invalidate_tags(*tags, cache_alias=cache_alias))
+
 def generate_cache_key(prefix: str, *args, **kwargs) -> str:
     """
     Genera una clave de cache única basada en el prefijo y los argumentos
@@ -29,7 +147,8 @@ def generate_cache_key(prefix: str, *args, **kwargs) -> str:
     key_hash = hashlib.md5(key_data.encode('utf-8')).hexdigest()
     return f"{prefix}_{key_hash}"
 
-def cache_result(timeout: int = 3600, key_prefix: str = "query", cache_alias: str = "default"):
+def cache_result(timeout: int = 3600, key_prefix: str = "query", cache_alias: str = "default",
+                 tags: Optional[Iterable[str]] = None):
     """
     Decorador para cachear el resultado de una función
     
@@ -37,16 +156,23 @@ def cache_result(timeout: int = 3600, key_prefix: str = "query", cache_alias: st
         timeout: Tiempo de vida del cache en segundos
         key_prefix: Prefijo para la clave del cache
         cache_alias: Alias del cache a usar
+        tags: Etiquetas de invalidación (por defecto el prefijo, de modo que
+            ``invalidate_cache_pattern(f"{key_prefix}*")`` invalida todos sus resultados)
     """
+    cache_tags = tuple(tags) if tags is not None else (key_prefix,)
+    
     def decorator(func: Callable) -> Callable:
         @wraps(func)
         def wrapper(*args, **kwargs):
+            backend = caches[cache_alias]
+            
             # Generar clave única para el cache
             cache_key = generate_cache_key(key_prefix, *args, **kwargs)
             
             # Intentar obtener del cache
             try:
-                cached_result = cache.get(cache_key)
+                cache_key = versioned_key(cache_key, cache_tags, cache_alias)
+                cached_result = backend.get(cache_key)
                 if cached_result is not None:
                     logger.debug(f"Cache HIT: {cache_key}")
                     return cached_result
@@ -59,7 +185,7 @@ def cache_result(timeout: int = 3600, key_prefix: str = "query", cache_alias: st
             
             # Guardar en cache
             try:
-                cache.set(cache_key, result, timeout)
+                backend.set(cache_key, result, timeout)
                 logger.debug(f"Cache SET: {cache_key}")
             except Exception as e:
                 logger.warning(f"Error al guardar en cache: {e}")
@@ -68,7 +194,8 @@ def cache_result(timeout: int = 3600, key_prefix: str = "query", cache_alias: st
         return wrapper
     return decorator
 
-def cache_model_queryset(model_class, timeout: int = 3600, key_prefix: str = "queryset"):
+def cache_model_queryset(model_class, timeout: int = 3600, key_prefix: str = "queryset",
+                         tags: Optional[Iterable[str]] = None):
     """
     Decorador para cachear querysets de modelos
     
@@ -76,15 +203,20 @@ def cache_model_queryset(model_class, timeout: int = 3600, key_prefix: str = "qu
         model_class: Clase del modelo
         timeout: Tiempo de vida del cache en segundos
         key_prefix: Prefijo para la clave del cache
+        tags: Etiquetas de invalidación (por defecto ``f"{key_prefix}_{Modelo}"``)
     """
+    model_prefix = f"{key_prefix}_{model_class.__name__}"
+    cache_tags = tuple(tags) if tags is not None else (model_prefix,)
+    
     def decorator(func: Callable) -> Callable:
         @wraps(func)
         def wrapper(*args, **kwargs):
             # Generar clave única incluyendo la clase del modelo
-            cache_key = generate_cache_key(f"{key_prefix}_{model_class.__name__}", *args, **kwargs)
+            cache_key = generate_cache_key(model_prefix, *args, **kwargs)
             
             # Intentar obtener del cache
             try:
+                cache_key = versioned_key(cache_key, cache_tags)
                 cached_result = cache.get(cache_key)
                 if cached_result is not None:
                     logger.debug(f"Cache HIT para {model_class.__name__}: {cache_key}")
@@ -107,23 +239,40 @@ def cache_model_queryset(model_class, timeout: int = 3600, key_prefix: str = "qu
         return wrapper
     return decorator
 
+def pattern_to_tag(pattern: str) -> str:
+    """
+    Convierte un patrón de claves en su etiqueta de invalidación
+    
+    ``"dashboard:*"``, ``"dashboard_*"`` y ``"dashboard"`` corresponden a la etiqueta ``"dashboard"``.
+    """
+    return pattern.split("*", 1)[0].rstrip(":_")
+
 def invalidate_cache_pattern(pattern: str, cache_alias: str = "default"):
     """
     Invalida todas las claves de cache que coincidan con un patrón
     
+    El prefijo del patrón (lo anterior al ``*``) se trata como etiqueta y se cambia
+    su versión, lo que funciona con cualquier backend compartido. Si el backend
+    soporta borrado por patrón (django-redis) también se borran las claves sin
+    etiqueta que coincidan.
+    
     Args:
         pattern: Patrón para buscar claves a invalidar
         cache_alias: Alias del cache a usar
     """
     try:
-        # Nota: Esta funcionalidad requiere Redis
-        # En SQLite no se puede hacer esto fácilmente
+        tag = pattern_to_tag(pattern)
+        if tag:
+            invalidate_tags(tag, cache_alias=cache_alias)
+        backend = caches[cache_alias]
+        if hasattr(backend, "delete_pattern"):
+            backend.delete_pattern(pattern)
         logger.info(f"Invalidando cache con patrón: {pattern}")
-        # Aquí podrías implementar lógica específica para Redis
     except Exception as e:
         logger.warning(f"Error al invalidar cache: {e}")
 
-def get_or_set_cache(key: str, default_func: Callable, timeout: int = 3600, cache_alias: str = "default") -> Any:
+def get_or_set_cache(key: str, default_func: Callable, timeout: int = 3600, cache_alias: str = "default",
+                     tags: Iterable[str] = ()) -> Any:
     """
     Obtiene un valor del cache o lo establece si no existe
     
@@ -132,13 +281,17 @@ def get_or_set_cache(key: str, default_func: Callable, timeout: int = 3600, cach
         default_func: Función que se ejecuta si no hay cache
         timeout: Tiempo de vida del cache en segundos
         cache_alias: Alias del cache a usar
+        tags: Etiquetas de invalidación del valor
     
     Returns:
         Valor del cache o resultado de default_func
     """
     try:
+        backend = caches[cache_alias]
+        key = versioned_key(key, tags, cache_alias)
+        
         # Intentar obtener del cache
-        cached_value = cache.get(key)
+        cached_value = backend.get(key)
         if cached_value is not None:
             logger.debug(f"Cache HIT: {key}")
             return cached_value
@@ -148,7 +301,7 @@ def get_or_set_cache(key: str, default_func: Callable, timeout: int = 3600, cach
         value = default_func()
         
         # Guardar en cache
-        cache.set(key, value, timeout)
+        backend.set(key, value, timeout)
         logger.debug(f"Cache SET: {key}")
         
         return value
@@ -167,9 +320,9 @@ def cache_dashboard_data(user_id: int, timeout: int = 1800):
         timeout: Tiempo de vida del cache en segundos (30 min por defecto)
     
     Returns:
-        Clave del cache para el dashboard
+        Clave del cache para el dashboard (se invalida con cualquier factura o gasto)
     """
-    return f"dashboard_data_{user_id}"
+    return versioned_key(f"dashboard_data_{user_id}", (TAG_DASHBOARD, tag_usuario(user_id)))
 
 def cache_proyecto_data(proyecto_id: int, timeout: int = 3600):
     """
@@ -180,9 +333,9 @@ def cache_proyecto_data(proyecto_id: int, timeout: int = 3600):
         timeout: Tiempo de vida del cache en segundos
     
     Returns:
-        Clave del cache para el proyecto
+        Clave del cache para el proyecto (se invalida con las escrituras del proyecto)
     """
-    return f"proyecto_data_{proyecto_id}"
+    return versioned_key(f"proyecto_data_{proyecto_id}", (tag_proyecto(proyecto_id),))
 
 def cache_facturas_data(filters: dict, timeout: int = 1800):
     """
@@ -196,8 +349,11 @@ def cache_facturas_data(filters: dict, timeout: int = 1800):
         Clave del cache para las facturas
     """
     # Crear clave basada en los filtros
-    filters_str = json.dumps(filters, sort_keys=True)
-    return f"facturas_data_{hashlib.md5(filters_str.encode()).hexdigest()}"
+    filters_str = json.dumps(filters, sort_keys=True, default=str)
+    return versioned_key(
+        f"facturas_data_{hashlib.md5(filters_str.encode()).hexdigest()}",
+        (TAG_FACTURAS,),
+    )
 
 def clear_user_cache(user_id: int):
     """
@@ -207,13 +363,8 @@ def clear_user_cache(user_id: int):
         user_id: ID del usuario
     """
     try:
-        # Invalidar cache del dashboard
-        dashboard_key = cache_dashboard_data(user_id)
-        cache.delete(dashboard_key)
-        
-        # Invalidar cache de proyectos del usuario
-        proyecto_pattern = f"proyecto_data_{user_id}_*"
-        invalidate_cache_pattern(proyecto_pattern)
+        # Invalida el dashboard y cualquier otra clave etiquetada con el usuario
+        invalidate_tags(tag_usuario(user_id))
         
         logger.info(f"Cache del usuario {user_id} limpiado")
     except Exception as e:
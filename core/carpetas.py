@@ -0,0 +1,89 @@
+"""
+Árbol de carpetas de proyecto del Telecom Technology
+Carga todas las carpetas de un proyecto y la cantidad de archivos por carpeta
+en dos consultas; rutas, niveles, conteos recursivos y subcarpetas se
+resuelven en memoria sin importar la profundidad del árbol.
+"""
+
+from django.apps import apps
+from django.db.models import Count
+
+
+class ArbolCarpetas:
+    """
+    Carpetas de un proyecto indexadas por id.
+
+    Cada instancia de CarpetaProyecto cargada queda enlazada al árbol
+    (``carpeta._arbol``), de modo que sus métodos (get_ruta_completa,
+    get_nivel, get_total_archivos, ...) no vuelven a consultar la base.
+    """
+
+    def __init__(self, carpetas, archivos_por_carpeta):
+        self.carpetas = {carpeta.id: carpeta for carpeta in carpetas}
+        self.archivos_por_carpeta = archivos_por_carpeta
+        self._hijas = {}
+        self._totales = {}
+        for carpeta in sorted(self.carpetas.values(), key=lambda c: c.nombre.lower()):
+            carpeta._arbol = self
+            if carpeta.activa:
+                self._hijas.setdefault(carpeta.carpeta_padre_id, []).append(carpeta)
+
+    @classmethod
+    def de_proyecto(cls, proyecto_id, carpeta=None):
+        """
+        Árbol del proyecto. Si se pasa ``carpeta`` se usa esa misma instancia
+        en lugar de la cargada, para que quede enlazada al árbol.
+        """
+        CarpetaProyecto = apps.get_model('core', 'CarpetaProyecto')
+        ArchivoProyecto = apps.get_model('core', 'ArchivoProyecto')
+        carpetas = [
+            carpeta if carpeta is not None and cargada.id == carpeta.id else cargada
+            for cargada in CarpetaProyecto.objects.filter(proyecto_id=proyecto_id)
+        ]
+        archivos_por_carpeta = dict(
+            ArchivoProyecto.objects.filter(proyecto_id=proyecto_id, carpeta__isnull=False).values(
+                'carpeta_id'
+            ).annotate(total=Count('id')).values_list('carpeta_id', 'total')
+        )
+        return cls(carpetas, archivos_por_carpeta)
+
+    def raices(self):
+        """Carpetas raíz activas ordenadas por nombre"""
+        return list(self._hijas.get(None, []))
+
+    def activas(self):
+        """Todas las carpetas activas ordenadas por nombre"""
+        return sorted(
+            (carpeta for carpeta in self.carpetas.values() if carpeta.activa),
+            key=lambda c: c.nombre.lower(),
+        )
+
+    def subcarpetas(self, carpeta):
+        """Subcarpetas activas directas de la carpeta (raíces si es None)"""
+        return list(self._hijas.get(carpeta.id if carpeta else None, []))
+
+    def ancestros(self, carpeta):
+        """Carpetas desde la raíz hasta el padre de la carpeta"""
+        ancestros = []
+        visitadas = {carpeta.id}
+        padre = self.carpetas.get(carpeta.carpeta_padre_id)
+        while padre is not None and padre.id not in visitadas:
+            ancestros.insert(0, padre)
+            visitadas.add(padre.id)
+            padre = self.carpetas.get(padre.carpeta_padre_id)
+        return ancestros
+
+    def archivos_directos(self, carpeta):
+        """Cantidad de archivos guardados directamente en la carpeta"""
+        return self.archivos_por_carpeta.get(carpeta.id, 0)
+
+    def total_archivos(self, carpeta, _visitadas=None):
+        """Archivos de la carpeta y de sus subcarpetas activas"""
+        if carpeta.id not in self._totales:
+            visitadas = (_visitadas or set()) | {carpeta.id}
+            total = self.archivos_directos(carpeta)
+            for hija in self._hijas.get(carpeta.id, ()):
+                if hija.id not in visitadas:
+                    total += self.total_archivos(hija, visitadas)
+            self._totales[carpeta.id] = total
+        return self._totales[carpeta.id]
@@ -0,0 +1,223 @@
+"""
+Motor de métricas financieras del dashboard del Telecom Technology
+Calcula ingresos y gastos por proyecto y por mes con pocas consultas agrupadas
+"""
+
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import date
+from decimal import Decimal
+
+from django.db import connection
+from django.db.models import Sum, Count, Q
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+from .models import Proyecto, Factura, Anticipo, Gasto
+
+
+CERO = Decimal('0.00')
+
+
+def _a_decimal(valor):
+    """Convierte el resultado de un Sum (Decimal, float o None) a Decimal"""
+    if valor is None:
+        return CERO
+    if isinstance(valor, Decimal):
+        return valor
+    return Decimal(str(valor))
+
+
+def _totales_en_cero():
+    """Totales de un proyecto sin movimientos"""
+    return {
+        'facturas_cobradas': CERO,
+        'facturas_pagadas': CERO,
+        'facturas_emitidas': CERO,
+        'facturado': CERO,
+        'anticipos_aplicados': CERO,
+        'gastos': CERO,
+    }
+
+
+def _inicio_mes(fecha):
+    """Normaliza una fecha (date o datetime) al primer día de su mes"""
+    if hasattr(fecha, 'date'):
+        fecha = fecha.date()
+    return date(fecha.year, fecha.month, 1)
+
+
+def _sumar_meses(fecha, meses):
+    """Desplaza el primer día de un mes n meses (n puede ser negativo)"""
+    indice = fecha.year * 12 + fecha.month - 1 + meses
+    return date(indice // 12, indice % 12 + 1, 1)
+
+
+class DashboardMetricsEngine:
+    """
+    Calcula las métricas financieras del dashboard en pocas consultas agrupadas.
+
+    Cada método usa agregaciones condicionales (``Sum``/``Count`` con ``filter``)
+    y ``TruncMonth`` en lugar de una consulta por proyecto o por mes. El atributo
+    ``consultas`` acumula las consultas SQL ejecutadas dentro de ``medir()``.
+    """
+
+    def __init__(self):
+        self.consultas = 0
+
+    @contextmanager
+    def medir(self):
+        """Cuenta las consultas SQL ejecutadas dentro del bloque"""
+        def contador(execute, sql, params, many, context):
+            self.consultas += 1
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(contador):
+            yield self
+
+    def totales_generales(self):
+        """Totales históricos de facturación, cobro y anticipos aplicados (2 consultas)"""
+        facturas = Factura.objects.aggregate(
+            total_facturado=Sum('monto_total'),
+            total_facturas_pagadas=Sum('monto_total', filter=Q(estado='pagada')),
+        )
+        anticipos = Anticipo.objects.aggregate(
+            total=Sum('monto_aplicado_proyecto', filter=Q(aplicado_al_proyecto=True)),
+        )
+
+        total_facturas_pagadas = _a_decimal(facturas['total_facturas_pagadas'])
+        total_anticipos_aplicados = _a_decimal(anticipos['total'])
+        return {
+            'total_facturado': _a_decimal(facturas['total_facturado']),
+            'total_facturas_pagadas': total_facturas_pagadas,
+            'total_anticipos_aplicados': total_anticipos_aplicados,
+            'total_cobrado': total_facturas_pagadas + total_anticipos_aplicados,
+        }
+
+    def resumen_proyectos(self):
+        """Conteo de proyectos activos por estado (1 consulta)"""
+        return Proyecto.objects.filter(activo=True).aggregate(
+            total=Count('id'),
+            planificacion=Count('id', filter=Q(estado='planificacion')),
+            en_progreso=Count('id', filter=Q(estado='en_progreso')),
+            en_pausa=Count('id', filter=Q(estado='en_pausa')),
+            completado=Count('id', filter=Q(estado='completado')),
+        )
+
+    def totales_por_proyecto(self, proyectos=None):
+        """
+        Ingresos y gastos históricos por proyecto (3 consultas agrupadas).
+
+        ``proyectos`` es un queryset de Proyecto (por defecto los activos) y se
+        usa como subconsulta, por lo que no agrega viajes a la base de datos.
+        Retorna un diccionario ``{proyecto_id: {...}}`` con Decimals.
+        """
+        if proyectos is None:
+            proyectos = Proyecto.objects.filter(activo=True)
+
+        resultado = defaultdict(_totales_en_cero)
+
+        facturas = Factura.objects.filter(proyecto__in=proyectos).values('proyecto_id').annotate(
+            cobrado=Sum('monto_pagado', filter=Q(monto_pagado__gt=0)),
+            pagadas=Sum('monto_total', filter=Q(estado='pagada')),
+            emitidas=Sum('monto_total', filter=Q(estado__in=['pagada', 'enviada'])),
+            facturado=Sum('monto_total'),
+        ).order_by()
+        for fila in facturas:
+            datos = resultado[fila['proyecto_id']]
+            datos['facturas_cobradas'] = _a_decimal(fila['cobrado'])
+            datos['facturas_pagadas'] = _a_decimal(fila['pagadas'])
+            datos['facturas_emitidas'] = _a_decimal(fila['emitidas'])
+            datos['facturado'] = _a_decimal(fila['facturado'])
+
+        anticipos = Anticipo.objects.filter(
+            proyecto__in=proyectos,
+            aplicado_al_proyecto=True,
+        ).values('proyecto_id').annotate(
+            total=Sum('monto_aplicado_proyecto'),
+        ).order_by()
+        for fila in anticipos:
+            resultado[fila['proyecto_id']]['anticipos_aplicados'] = _a_decimal(fila['total'])
+
+        gastos = Gasto.objects.filter(
+            proyecto__in=proyectos,
+            aprobado=True,
+        ).values('proyecto_id').annotate(
+            total=Sum('monto'),
+        ).order_by()
+        for fila in gastos:
+            resultado[fila['proyecto_id']]['gastos'] = _a_decimal(fila['total'])
+
+        for datos in resultado.values():
+            datos['ingresos'] = datos['facturas_cobradas'] + datos['anticipos_aplicados']
+            datos['rentabilidad'] = datos['ingresos'] - datos['gastos']
+            datos['margen'] = (
+                datos['rentabilidad'] / datos['ingresos'] * 100
+                if datos['ingresos'] > 0 else CERO
+            )
+        return dict(resultado)
+
+    def serie_mensual(self, num_meses=6, hoy=None):
+        """
+        Ingresos y gastos de los últimos ``num_meses`` meses calendario (3 consultas).
+
+        Retorna una lista ordenada del mes más antiguo al actual. Cada elemento
+        incluye facturado, facturas pagadas, anticipos aplicados, ingresos
+        (pagadas + anticipos) y gastos aprobados.
+        """
+        hoy = hoy or timezone.now().date()
+        mes_actual = _inicio_mes(hoy)
+        meses = [_sumar_meses(mes_actual, -i) for i in range(num_meses - 1, -1, -1)]
+        desde = meses[0]
+        hasta = _sumar_meses(mes_actual, 1)
+
+        facturas = {
+            _inicio_mes(fila['mes']): fila
+            for fila in Factura.objects.filter(
+                fecha_emision__gte=desde,
+                fecha_emision__lt=hasta,
+            ).annotate(mes=TruncMonth('fecha_emision')).values('mes').annotate(
+                facturado=Sum('monto_total'),
+                pagadas=Sum('monto_total', filter=Q(estado='pagada')),
+                emitidas=Sum('monto_total', filter=Q(estado__in=['pagada', 'enviada'])),
+            ).order_by()
+        }
+        anticipos = {
+            _inicio_mes(fila['mes']): _a_decimal(fila['total'])
+            for fila in Anticipo.objects.filter(
+                aplicado_al_proyecto=True,
+                fecha_aplicacion__gte=desde,
+                fecha_aplicacion__lt=hasta,
+            ).annotate(mes=TruncMonth('fecha_aplicacion')).values('mes').annotate(
+                total=Sum('monto_aplicado_proyecto'),
+            ).order_by()
+        }
+        gastos = {
+            _inicio_mes(fila['mes']): _a_decimal(fila['total'])
+            for fila in Gasto.objects.filter(
+                aprobado=True,
+                fecha_gasto__gte=desde,
+                fecha_gasto__lt=hasta,
+            ).annotate(mes=TruncMonth('fecha_gasto')).values('mes').annotate(
+                total=Sum('monto'),
+            ).order_by()
+        }
+
+        serie = []
+        for mes in meses:
+            fila_facturas = facturas.get(mes, {})
+            facturas_pagadas = _a_decimal(fila_facturas.get('pagadas'))
+            anticipos_mes = anticipos.get(mes, CERO)
+            serie.append({
+                'mes': mes,
+                'etiqueta': mes.strftime('%b'),
+                'clave': mes.strftime('%Y-%m'),
+                'facturado': _a_decimal(fila_facturas.get('facturado')),
+                'facturas_pagadas': facturas_pagadas,
+                'facturas_emitidas': _a_decimal(fila_facturas.get('emitidas')),
+                'anticipos_aplicados': anticipos_mes,
+                'ingresos': facturas_pagadas + anticipos_mes,
+                'gastos': gastos.get(mes, CERO),
+            })
+        return serie
+
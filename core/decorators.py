@@ -95,8 +95,8 @@ def log_activity(activity_name):
             # Registrar actividad si el usuario está autenticado
             if request.user.is_authenticated:
                 try:
-                    from .models import LogActividad
-                    LogActividad.objects.create(
+                    from .activity_log import registrar_actividad
+                    registrar_actividad(
                         usuario=request.user,
                         accion=activity_name,
                         modulo=view_func.__module__.split('.')[-1],
@@ -300,3 +300,40 @@ def secure_view(permission_code=None, log_activity_name=None):
         
         return view_func
     return decorator
+
+
+def en_segundo_plano(tipo, condicion=None):
+    """
+    Decorador para vistas pesadas (PDF, ZIP, exportaciones).
+
+    En una petición web encola la vista como TrabajoSegundoPlano y redirige a
+    la página del trabajo (o responde JSON si es AJAX); el worker
+    ``procesar_trabajos`` la ejecuta después con la misma petición y guarda el
+    archivo. ``condicion(request, *args, **kwargs)`` permite encolar solo
+    algunos formatos. Debe ir debajo de ``login_required``.
+    """
+    def decorator(view_func):
+        vista = f"{view_func.__module__}.{view_func.__name__}"
+
+        @wraps(view_func)
+        def wrapper(request, *args, **kwargs):
+            from .trabajos import en_worker, encolar, segundo_plano_activo, trabajo_a_dict
+
+            if (
+                en_worker(request)
+                or not segundo_plano_activo()
+                or request.method not in ('GET', 'POST')
+                or request.FILES
+                or (condicion is not None and not condicion(request, *args, **kwargs))
+            ):
+                return view_func(request, *args, **kwargs)
+
+            trabajo, creado = encolar(tipo, vista, request, args, kwargs)
+            if request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+                return JsonResponse(dict(trabajo_a_dict(trabajo), creado=creado), status=202)
+            if not creado:
+                messages.info(request, 'Ya existe una solicitud igual; se muestra su estado.')
+            return redirect('trabajo_detalle', trabajo_id=trabajo.pk)
+
+        return wrapper
+    return decorator
@@ -0,0 +1,155 @@
+"""
+Descargas protegidas del Telecom Technology
+Django verifica permisos y registra la descarga, pero la transferencia de los
+bytes la puede hacer nginx: con ``DESCARGAS_BACKEND = 'nginx'`` la vista solo
+responde la cabecera X-Accel-Redirect hacia una ubicación ``internal`` y el
+worker de gunicorn queda libre de inmediato. En desarrollo (backend
+``django``) el archivo se envía desde Django con soporte de Range, ETag y
+Last-Modified para que las descargas interrumpidas se puedan retomar.
+"""
+
+import logging
+import mimetypes
+import os
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import content_disposition_header, http_date, parse_http_date_safe
+
+logger = logging.getLogger(__name__)
+
+TAMANO_BLOQUE = 64 * 1024
+
+_RANGO = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def _configuracion(nombre, por_defecto):
+    return getattr(settings, nombre, por_defecto)
+
+
+def backend():
+    """'nginx' para X-Accel-Redirect o 'django' para enviar el archivo desde Django"""
+    return _configuracion('DESCARGAS_BACKEND', 'django')
+
+
+def etag_archivo(estado):
+    """ETag con el mismo formato que nginx (mtime-tamaño en hexadecimal)"""
+    return f'"{int(estado.st_mtime):x}-{estado.st_size:x}"'
+
+
+def rango_pedido(request, tamano):
+    """
+    Rango ``(inicio, fin)`` inclusivo pedido en la cabecera Range, None si se
+    pide el archivo completo o 'invalido' si el rango no se puede satisfacer.
+    Solo se atiende un rango; varios rangos se responden con el archivo completo.
+    """
+    cabecera = request.META.get('HTTP_RANGE', '').strip()
+    coincidencia = _RANGO.match(cabecera)
+    if not coincidencia:
+        return None
+    inicio, fin = coincidencia.groups()
+    if not inicio and not fin:
+        return None
+    if not inicio:
+        # bytes=-N: los últimos N bytes
+        sufijo = int(fin)
+        if sufijo == 0 or tamano == 0:
+            return 'invalido'
+        return max(tamano - sufijo, 0), tamano - 1
+    inicio = int(inicio)
+    fin = min(int(fin), tamano - 1) if fin else tamano - 1
+    if inicio >= tamano or fin < inicio:
+        return 'invalido'
+    return inicio, fin
+
+
+def es_descarga_inicial(request):
+    """False si la petición continúa una descarga interrumpida (Range desde un byte > 0)"""
+    coincidencia = _RANGO.match(request.META.get('HTTP_RANGE', '').strip())
+    return not coincidencia or coincidencia.group(1) in ('', '0')
+
+
+def _rango_vigente(request, etag, modificado):
+    """If-Range: el rango solo vale si el archivo no cambió desde la primera parte"""
+    condicion = request.META.get('HTTP_IF_RANGE', '').strip()
+    if not condicion:
+        return True
+    if condicion.startswith('"') or condicion.startswith('W/'):
+        return condicion == etag
+    fecha = parse_http_date_safe(condicion)
+    return fecha is not None and fecha >= int(modificado)
+
+
+def _leer_rango(archivo, inicio, longitud):
+    try:
+        archivo.seek(inicio)
+        restante = longitud
+        while restante > 0:
+            bloque = archivo.read(min(TAMANO_BLOQUE, restante))
+            if not bloque:
+                break
+            restante -= len(bloque)
+            yield bloque
+    finally:
+        archivo.close()
+
+
+def _ruta_interna(ruta):
+    """URL de la ubicación internal de nginx para una ruta bajo MEDIA_ROOT"""
+    relativa = os.path.relpath(ruta, settings.MEDIA_ROOT)
+    if relativa.startswith('..'):
+        raise ValueError(f"{ruta} no está dentro de MEDIA_ROOT")
+    prefijo = _configuracion('DESCARGAS_NGINX_PREFIJO', '/protegido/').rstrip('/')
+    return f"{prefijo}/{quote(relativa.replace(os.sep, '/'))}"
+
+
+def servir_archivo(request, ruta, nombre=None, content_type=None, adjunto=True):
+    """
+    Respuesta para descargar ``ruta`` (ruta absoluta dentro de MEDIA_ROOT).
+
+    Responde 304 si el navegador ya tiene la misma versión. Con el backend
+    nginx la transferencia (incluidos los rangos) la hace nginx; con el
+    backend django se atiende aquí una cabecera Range con un 206.
+    """
+    estado = os.stat(ruta)
+    etag = etag_archivo(estado)
+    no_modificado = get_conditional_response(request, etag=etag, last_modified=int(estado.st_mtime))
+    if no_modificado is not None:
+        return no_modificado
+
+    nombre = nombre or os.path.basename(ruta)
+    content_type = content_type or mimetypes.guess_type(nombre)[0] or 'application/octet-stream'
+
+    if backend() == 'nginx':
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = _ruta_interna(ruta)
+        # nginx calcula ETag, Last-Modified, Content-Length y los rangos desde el archivo
+        response['X-Accel-Buffering'] = 'no'
+    else:
+        rango = rango_pedido(request, estado.st_size) if _rango_vigente(request, etag, estado.st_mtime) else None
+        if rango == 'invalido':
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f'bytes */{estado.st_size}'
+            return response
+        if rango is None:
+            response = FileResponse(open(ruta, 'rb'), content_type=content_type)
+        else:
+            inicio, fin = rango
+            longitud = fin - inicio + 1
+            response = StreamingHttpResponse(
+                _leer_rango(open(ruta, 'rb'), inicio, longitud), status=206, content_type=content_type
+            )
+            response['Content-Length'] = str(longitud)
+            response['Content-Range'] = f'bytes {inicio}-{fin}/{estado.st_size}'
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(estado.st_mtime)
+        response['Accept-Ranges'] = 'bytes'
+
+    disposicion = content_disposition_header(adjunto, nombre)
+    if disposicion:
+        response['Content-Disposition'] = disposicion
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
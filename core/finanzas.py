@@ -0,0 +1,356 @@
+"""
+Libro financiero materializado por proyecto y mes del Telecom Technology
+Calcula los agregados de ProyectoFinanzas a partir de las tablas transaccionales
+(Factura, Anticipo, Gasto, IngresoProyecto y PlanillaLiquidada) y los mantiene
+al día con las señales pre_save, post_save y post_delete de esos modelos, que
+también se emiten en borrados en cascada, ``queryset.delete()`` y el borrado
+masivo del admin. Lo que no emite señales (``queryset.update()``, SQL directo)
+se corrige con ``conciliar_finanzas``.
+"""
+
+import logging
+from collections import defaultdict
+from datetime import date
+from decimal import Decimal
+
+from django.apps import apps
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.db.models import Sum, Count, Q
+from django.db.models.functions import TruncMonth, Coalesce
+
+logger = logging.getLogger(__name__)
+
+CERO = Decimal('0.00')
+CENTAVO = Decimal('0.01')
+
+CAMPOS_CANTIDAD = (
+    'facturas_cantidad',
+    'facturas_pagadas_cantidad',
+    'anticipos_cantidad',
+    'gastos_cantidad',
+    'gastos_aprobados_cantidad',
+)
+
+CAMPOS_MONTO = (
+    'facturado',
+    'facturas_pagadas',
+    'facturas_monto_pagado',
+    'anticipos_monto',
+    'anticipos_aplicados',
+    'anticipos_disponibles',
+    'anticipos_aplicados_proyecto',
+    'gastos_aprobados',
+    'gastos_pendientes',
+    'ingresos_registrados',
+    'planillas_personal',
+    'planillas_trabajadores_diarios',
+)
+
+CAMPOS_FINANZAS = CAMPOS_CANTIDAD + CAMPOS_MONTO
+
+# Las planillas de trabajadores diarios se distinguen por sus observaciones
+FILTRO_PLANILLA_DIARIOS = Q(observaciones__icontains='trabajadores diarios')
+
+
+def periodo_de(fecha):
+    """Primer día del mes de una fecha (o None si no hay fecha)"""
+    if not fecha:
+        return None
+    if hasattr(fecha, 'date'):
+        fecha = fecha.date()
+    return date(fecha.year, fecha.month, 1)
+
+
+def _mes_siguiente(periodo):
+    if periodo.month == 12:
+        return date(periodo.year + 1, 1, 1)
+    return date(periodo.year, periodo.month + 1, 1)
+
+
+def _monto(valor):
+    """Normaliza un Sum (Decimal, float o None) a Decimal con dos decimales"""
+    if valor is None:
+        return CERO
+    if not isinstance(valor, Decimal):
+        valor = Decimal(str(valor))
+    return valor.quantize(CENTAVO)
+
+
+def _modelo(nombre, modelos):
+    if modelos is not None:
+        return modelos[nombre]
+    return apps.get_model('core', nombre)
+
+
+def _valores_en_cero():
+    valores = {campo: 0 for campo in CAMPOS_CANTIDAD}
+    valores.update({campo: CERO for campo in CAMPOS_MONTO})
+    return valores
+
+
+def calcular_finanzas(proyecto_ids=None, periodo=None, modelos=None):
+    """
+    Calcula los agregados por proyecto y mes con una consulta agrupada por tabla.
+
+    ``proyecto_ids`` limita el cálculo a ciertos proyectos y ``periodo`` (primer
+    día de mes) a un solo mes. ``modelos`` permite pasar los modelos históricos
+    desde una migración. Retorna ``{(proyecto_id, periodo): {campo: valor}}``.
+    """
+    Factura = _modelo('Factura', modelos)
+    Anticipo = _modelo('Anticipo', modelos)
+    Gasto = _modelo('Gasto', modelos)
+    IngresoProyecto = _modelo('IngresoProyecto', modelos)
+    PlanillaLiquidada = _modelo('PlanillaLiquidada', modelos)
+
+    def filtrar(queryset, campo_fecha):
+        if proyecto_ids is not None:
+            queryset = queryset.filter(proyecto_id__in=proyecto_ids)
+        else:
+            queryset = queryset.filter(proyecto_id__isnull=False)
+        if periodo is not None:
+            queryset = queryset.filter(**{
+                f'{campo_fecha}__gte': periodo,
+                f'{campo_fecha}__lt': _mes_siguiente(periodo),
+            })
+        return queryset
+
+    def agrupar(queryset, campo_fecha, **agregados):
+        return filtrar(queryset, campo_fecha).annotate(
+            periodo_mes=TruncMonth(campo_fecha)
+        ).values('proyecto_id', 'periodo_mes').annotate(**agregados).order_by()
+
+    resultado = defaultdict(_valores_en_cero)
+
+    for fila in agrupar(
+        Factura.objects.all(), 'fecha_emision',
+        facturas_cantidad=Count('id'),
+        facturas_pagadas_cantidad=Count('id', filter=Q(estado='pagada')),
+        facturado=Sum('monto_total'),
+        facturas_pagadas=Sum('monto_total', filter=Q(estado='pagada')),
+        facturas_monto_pagado=Sum('monto_pagado'),
+    ):
+        valores = resultado[(fila['proyecto_id'], periodo_de(fila['periodo_mes']))]
+        valores['facturas_cantidad'] = fila['facturas_cantidad']
+        valores['facturas_pagadas_cantidad'] = fila['facturas_pagadas_cantidad']
+        valores['facturado'] = _monto(fila['facturado'])
+        valores['facturas_pagadas'] = _monto(fila['facturas_pagadas'])
+        valores['facturas_monto_pagado'] = _monto(fila['facturas_monto_pagado'])
+
+    # Los anticipos se ubican en el mes de aplicación o, si aún no se aplican, en el de recepción
+    anticipos = Anticipo.objects.annotate(
+        fecha_referencia=Coalesce('fecha_aplicacion', 'fecha_recepcion')
+    )
+    for fila in agrupar(
+        anticipos, 'fecha_referencia',
+        anticipos_cantidad=Count('id'),
+        anticipos_monto=Sum('monto'),
+        anticipos_aplicados=Sum('monto_aplicado', filter=Q(monto_aplicado__gt=0)),
+        anticipos_disponibles=Sum('monto_disponible'),
+        anticipos_aplicados_proyecto=Sum(
+            'monto_aplicado_proyecto', filter=Q(aplicado_al_proyecto=True)
+        ),
+    ):
+        valores = resultado[(fila['proyecto_id'], periodo_de(fila['periodo_mes']))]
+        valores['anticipos_cantidad'] = fila['anticipos_cantidad']
+        valores['anticipos_monto'] = _monto(fila['anticipos_monto'])
+        valores['anticipos_aplicados'] = _monto(fila['anticipos_aplicados'])
+        valores['anticipos_disponibles'] = _monto(fila['anticipos_disponibles'])
+        valores['anticipos_aplicados_proyecto'] = _monto(fila['anticipos_aplicados_proyecto'])
+
+    for fila in agrupar(
+        Gasto.objects.all(), 'fecha_gasto',
+        gastos_cantidad=Count('id'),
+        gastos_aprobados_cantidad=Count('id', filter=Q(aprobado=True)),
+        gastos_aprobados=Sum('monto', filter=Q(aprobado=True)),
+        gastos_pendientes=Sum('monto', filter=Q(aprobado=False)),
+    ):
+        valores = resultado[(fila['proyecto_id'], periodo_de(fila['periodo_mes']))]
+        valores['gastos_cantidad'] = fila['gastos_cantidad']
+        valores['gastos_aprobados_cantidad'] = fila['gastos_aprobados_cantidad']
+        valores['gastos_aprobados'] = _monto(fila['gastos_aprobados'])
+        valores['gastos_pendientes'] = _monto(fila['gastos_pendientes'])
+
+    for fila in agrupar(
+        IngresoProyecto.objects.all(), 'fecha_emision',
+        ingresos_registrados=Sum('monto_total'),
+    ):
+        valores = resultado[(fila['proyecto_id'], periodo_de(fila['periodo_mes']))]
+        valores['ingresos_registrados'] = _monto(fila['ingresos_registrados'])
+
+    planillas = PlanillaLiquidada.objects.all()
+    if proyecto_ids is not None:
+        planillas = planillas.filter(proyecto_id__in=proyecto_ids)
+    if periodo is not None:
+        planillas = planillas.filter(año=periodo.year, mes=periodo.month)
+    for fila in planillas.values('proyecto_id', 'año', 'mes').annotate(
+        planillas_personal=Sum('total_planilla', filter=~FILTRO_PLANILLA_DIARIOS),
+        planillas_trabajadores_diarios=Sum('total_planilla', filter=FILTRO_PLANILLA_DIARIOS),
+    ).order_by():
+        valores = resultado[(fila['proyecto_id'], date(fila['año'], fila['mes'], 1))]
+        valores['planillas_personal'] = _monto(fila['planillas_personal'])
+        valores['planillas_trabajadores_diarios'] = _monto(fila['planillas_trabajadores_diarios'])
+
+    return dict(resultado)
+
+
+def recalcular_periodos(periodos):
+    """
+    Recalcula las filas (proyecto_id, periodo) afectadas por un cambio.
+
+    Cada fila se recalcula desde las tablas transaccionales acotadas a un
+    proyecto y un mes, por lo que el costo no depende del histórico total.
+    """
+    ProyectoFinanzas = apps.get_model('core', 'ProyectoFinanzas')
+    for proyecto_id, periodo in set(periodos):
+        if not proyecto_id or not periodo:
+            continue
+        valores = calcular_finanzas([proyecto_id], periodo).get((proyecto_id, periodo))
+        if valores:
+            ProyectoFinanzas.objects.update_or_create(
+                proyecto_id=proyecto_id,
+                periodo=periodo,
+                defaults=valores,
+            )
+        else:
+            ProyectoFinanzas.objects.filter(proyecto_id=proyecto_id, periodo=periodo).delete()
+
+
+def programar_recalculo(periodos):
+    """
+    Recalcula las filas al confirmar la transacción actual (de inmediato fuera
+    de una transacción). En un borrado en cascada el proyecto o sus filas del
+    libro pueden estar eliminándose en la misma transacción.
+    """
+    periodos = {(proyecto_id, periodo) for proyecto_id, periodo in periodos if proyecto_id and periodo}
+    if periodos:
+        transaction.on_commit(lambda: recalcular_periodos(periodos))
+
+
+def reconstruir_finanzas(proyecto_ids=None, modelos=None):
+    """Reconstruye por completo el libro (o el de ciertos proyectos); retorna las filas creadas"""
+    ProyectoFinanzas = _modelo('ProyectoFinanzas', modelos)
+    calculado = calcular_finanzas(proyecto_ids, modelos=modelos)
+
+    with transaction.atomic():
+        existentes = ProyectoFinanzas.objects.all()
+        if proyecto_ids is not None:
+            existentes = existentes.filter(proyecto_id__in=proyecto_ids)
+        existentes.delete()
+        ProyectoFinanzas.objects.bulk_create(
+            [
+                ProyectoFinanzas(proyecto_id=proyecto_id, periodo=periodo, **valores)
+                for (proyecto_id, periodo), valores in calculado.items()
+            ],
+            batch_size=500,
+        )
+    return len(calculado)
+
+
+def verificar_finanzas(proyecto_ids=None):
+    """
+    Compara el libro almacenado con el recalculado.
+
+    Retorna una lista de diferencias ``(proyecto_id, periodo, campo, guardado, esperado)``.
+    """
+    ProyectoFinanzas = apps.get_model('core', 'ProyectoFinanzas')
+    esperado = calcular_finanzas(proyecto_ids)
+
+    guardado = ProyectoFinanzas.objects.all()
+    if proyecto_ids is not None:
+        guardado = guardado.filter(proyecto_id__in=proyecto_ids)
+    guardado = {
+        (fila['proyecto_id'], fila['periodo']): fila
+        for fila in guardado.values('proyecto_id', 'periodo', *CAMPOS_FINANZAS)
+    }
+
+    diferencias = []
+    for clave in sorted(set(esperado) | set(guardado), key=lambda c: (c[0], c[1])):
+        valores_esperados = esperado.get(clave, _valores_en_cero())
+        valores_guardados = guardado.get(clave, _valores_en_cero())
+        for campo in CAMPOS_FINANZAS:
+            valor_guardado = valores_guardados[campo]
+            valor_esperado = valores_esperados[campo]
+            if campo in CAMPOS_MONTO:
+                valor_guardado = _monto(valor_guardado)
+            if valor_guardado != valor_esperado:
+                diferencias.append((clave[0], clave[1], campo, valor_guardado, valor_esperado))
+    return diferencias
+
+
+def conciliar_finanzas(proyecto_ids=None):
+    """
+    Recalcula solo las filas (proyecto, mes) que no coinciden con las tablas
+    transaccionales. Retorna cuántas filas se corrigieron.
+    """
+    periodos = {
+        (proyecto_id, periodo)
+        for proyecto_id, periodo, _campo, _guardado, _esperado in verificar_finanzas(proyecto_ids)
+    }
+    recalcular_periodos(periodos)
+    if periodos:
+        logger.warning(f"Libro financiero conciliado: {len(periodos)} filas (proyecto, mes) corregidas")
+    return len(periodos)
+
+
+def totales_proyecto(proyecto, fecha_inicio=None, fecha_fin=None):
+    """
+    Totales del libro para un proyecto, opcionalmente acotados a periodos.
+
+    Lee una fila por mes del proyecto en lugar de recorrer las tablas
+    transaccionales. Retorna un diccionario con todos los campos en cero
+    si el proyecto no tiene movimientos.
+    """
+    ProyectoFinanzas = apps.get_model('core', 'ProyectoFinanzas')
+    filas = ProyectoFinanzas.objects.filter(proyecto=proyecto)
+    if fecha_inicio:
+        filas = filas.filter(periodo__gte=periodo_de(fecha_inicio))
+    if fecha_fin:
+        filas = filas.filter(periodo__lte=periodo_de(fecha_fin))
+
+    totales = filas.aggregate(**{campo: Sum(campo) for campo in CAMPOS_FINANZAS})
+    valores = _valores_en_cero()
+    for campo, valor in totales.items():
+        if valor is not None:
+            valores[campo] = valor
+    return valores
+
+
+# Modelos que aportan al libro (todos heredan de FinanzasProyectoMixin)
+MODELOS_FINANZAS = ('Factura', 'Anticipo', 'Gasto', 'IngresoProyecto', 'PlanillaLiquidada')
+
+
+def _registro_por_guardar(sender, instance, raw=False, **kwargs):
+    """Guarda el mes y el proyecto que tenía el registro antes de este cambio"""
+    instance._claves_finanzas_anteriores = set()
+    instance._proyecto_id_anterior = None
+    if raw or instance.pk is None:
+        return
+    anterior = sender.objects.filter(pk=instance.pk).only(
+        'proyecto', *sender.CAMPOS_PERIODO_FINANZAS
+    ).first()
+    if anterior is not None:
+        instance._claves_finanzas_anteriores = anterior._claves_finanzas()
+        if anterior.proyecto_id != instance.proyecto_id:
+            instance._proyecto_id_anterior = anterior.proyecto_id
+
+
+def _registro_guardado(sender, instance, raw=False, **kwargs):
+    # Las cargas de fixtures (raw) se concilian después con el comando
+    if raw:
+        return
+    anteriores = getattr(instance, '_claves_finanzas_anteriores', set())
+    programar_recalculo(anteriores | instance._claves_finanzas())
+
+
+def _registro_eliminado(sender, instance, **kwargs):
+    programar_recalculo(instance._claves_finanzas())
+
+
+def conectar_finanzas():
+    """Mantiene ProyectoFinanzas con señales; se llama desde CoreConfig.ready()"""
+    for nombre in MODELOS_FINANZAS:
+        modelo = apps.get_model('core', nombre)
+        pre_save.connect(_registro_por_guardar, sender=modelo, dispatch_uid=f'finanzas_pre_save_{nombre}')
+        post_save.connect(_registro_guardado, sender=modelo, dispatch_uid=f'finanzas_save_{nombre}')
+        post_delete.connect(_registro_eliminado, sender=modelo, dispatch_uid=f'finanzas_delete_{nombre}')
@@ -1,9 +1,13 @@
+import base64
+import json
 import logging
 import os
 import uuid
 import urllib.parse
 from dataclasses import dataclass
-from datetime import datetime, time
+from datetime import datetime, time, timezone as dt_timezone
+from decimal import Decimal, InvalidOperation
+from time import monotonic, sleep
 
 from django.conf import settings
 from django.utils import timezone
@@ -212,6 +216,7 @@ def sync_caja_menuda_to_firebase(
         payload["id"] = transaction_id
 
         client.collection("transactions").document(transaction_id).set(payload, merge=True)
+        _guardar_transaccion_local(transaction_id, payload)
 
         user_id = payload.get("userId", "")
         if previous_monto is None or previous_tipo is None:
@@ -228,46 +233,233 @@ def sync_caja_menuda_to_firebase(
         return FirebaseSyncResult(ok=False, message=str(exc))
 
 
-def fetch_expenses_for_caja_menuda(sort_key="timestamp", sort_order="desc"):
+TRANSACTIONS_COLLECTION = "transactions"
+CAJA_MENUDA_TIPOS = ("EXPENSE", "DEPOSIT")
+CAMPOS_TRANSACCION_ESPEJO = (
+    "tipo", "origen", "usuario_firebase_id", "usuario_nombre", "monto", "timestamp_ms",
+    "actualizado_ms", "fecha", "descripcion", "numero_factura", "tipo_gasto", "periodo", "datos",
+)
+
+
+def _json_seguro(value):
+    """Convierte valores de Firestore (timestamps, referencias) a tipos serializables en JSON"""
+    if isinstance(value, dict):
+        return {str(key): _json_seguro(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [_json_seguro(item) for item in value]
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    if isinstance(value, datetime):
+        return _datetime_to_ms(value)
+    return str(value)
+
+
+def _ms_a_entero(value):
+    if value is None:
+        return 0
+    if isinstance(value, (int, float)):
+        return int(value)
+    parsed = _parse_firestore_timestamp(value)
+    return _datetime_to_ms(parsed) if parsed else 0
+
+
+def _transaccion_a_campos(doc_id, data):
+    """Campos de TransaccionFirebase a partir de un documento de ``transactions``"""
+    timestamp_ms = _ms_a_entero(data.get("timestamp"))
+    try:
+        monto = Decimal(str(data.get("amount") or 0)).quantize(Decimal("0.01"))
+    except (InvalidOperation, ValueError):
+        monto = Decimal("0.00")
+    return {
+        "tipo": str(data.get("type") or "")[:20],
+        "origen": str(data.get("source") or "")[:40],
+        "usuario_firebase_id": str(data.get("userId") or "")[:120],
+        "usuario_nombre": str(data.get("userName") or "").strip()[:200],
+        "monto": monto,
+        "timestamp_ms": timestamp_ms,
+        "actualizado_ms": _ms_a_entero(data.get("updatedAt")) or timestamp_ms,
+        "fecha": _parse_firestore_timestamp(timestamp_ms) if timestamp_ms else None,
+        "descripcion": str(data.get("description") or ""),
+        "numero_factura": str(data.get("invoiceNumber") or "")[:100],
+        "tipo_gasto": str(data.get("expenseType") or "")[:50],
+        "periodo": str(data.get("period") or "")[:7],
+        "datos": _json_seguro(data),
+    }
+
+
+def guardar_transacciones_espejo(documentos):
+    """
+    Inserta o actualiza en TransaccionFirebase una lista de ``(doc_id, data)``.
+
+    Usa una consulta para los existentes, bulk_update y bulk_create, de modo que
+    una resincronización completa no hace una consulta por documento.
+    Retorna la cantidad de documentos guardados.
+    """
+    from .models import TransaccionFirebase
+
+    campos_por_id = {}
+    for doc_id, data in documentos:
+        firebase_id = str((data or {}).get("id") or doc_id)
+        campos_por_id[firebase_id] = _transaccion_a_campos(doc_id, data or {})
+    if not campos_por_id:
+        return 0
+
+    existentes = {}
+    ids = list(campos_por_id)
+    for inicio in range(0, len(ids), 500):
+        for transaccion in TransaccionFirebase.objects.filter(firebase_id__in=ids[inicio:inicio + 500]):
+            existentes[transaccion.firebase_id] = transaccion
+
+    nuevas = []
+    actualizadas = []
+    ahora = timezone.now()
+    for firebase_id, campos in campos_por_id.items():
+        transaccion = existentes.get(firebase_id)
+        if transaccion is None:
+            nuevas.append(TransaccionFirebase(firebase_id=firebase_id, **campos))
+            continue
+        for campo, valor in campos.items():
+            setattr(transaccion, campo, valor)
+        transaccion.sincronizado_en = ahora
+        actualizadas.append(transaccion)
+
+    if nuevas:
+        TransaccionFirebase.objects.bulk_create(nuevas, batch_size=500, ignore_conflicts=True)
+    if actualizadas:
+        TransaccionFirebase.objects.bulk_update(
+            actualizadas, list(CAMPOS_TRANSACCION_ESPEJO) + ["sincronizado_en"], batch_size=500
+        )
+    return len(campos_por_id)
+
+
+def _documentos_posteriores(collection, campo, desde_ms):
+    """
+    Documentos con ``campo`` posterior a ``desde_ms``.
+
+    Firestore solo compara valores del mismo tipo (los números se ordenan antes
+    que los Timestamp), así que se consulta con los milisegundos y con la fecha
+    equivalente para incluir los documentos que guardan el campo como Timestamp.
+    """
+    desde = datetime.fromtimestamp(desde_ms / 1000.0, tz=dt_timezone.utc)
+    for valor in (desde_ms, desde):
+        yield from collection.where(campo, ">", valor).stream()
+
+
+def sync_transacciones_espejo(completa=False):
+    """
+    Trae de Firestore las transacciones nuevas o modificadas y las guarda en el espejo local.
+
+    La sincronización incremental pide solo los documentos con ``timestamp``
+    posterior al último visto (menos ``FIREBASE_MIRROR_OVERLAP_MS`` para cubrir
+    registros que la app móvil sube tarde) y los que tengan ``updatedAt``
+    posterior al último visto, sea número o Timestamp. La completa lee toda la colección y elimina del
+    espejo los documentos borrados en Firestore.
+    """
+    from .models import SincronizacionFirebase, TransaccionFirebase
+
+    estado, _ = SincronizacionFirebase.objects.get_or_create(coleccion=TRANSACTIONS_COLLECTION)
     client, error = _get_firestore_client()
     if client is None:
-        return [], error
+        estado.error = error
+        estado.save(update_fields=["error"])
+        return FirebaseSyncResult(ok=False, message=error)
 
     try:
-        query = (
-            client.collection("transactions")
-        )
-        docs = query.stream()
-        expenses = []
-        tz = timezone.get_current_timezone()
-        for doc in docs:
-            data = doc.to_dict() or {}
-            transaction_type = data.get("type")
-            if transaction_type not in ("EXPENSE", "DEPOSIT"):
-                continue
-            if data.get("source") == "web":
-                continue
-            data["id"] = data.get("id") or doc.id
-            timestamp_ms = data.get("timestamp")
-            if timestamp_ms:
-                try:
-                    data["timestamp_dt"] = datetime.fromtimestamp(
-                        float(timestamp_ms) / 1000.0, tz=tz
-                    )
-                except Exception:
-                    data["timestamp_dt"] = None
-            expenses.append(data)
-        reverse = str(sort_order).lower() != "asc"
-        if sort_key == "userName":
-            expenses.sort(key=lambda item: (item.get("userName") or "").lower(), reverse=reverse)
-        elif sort_key == "amount":
-            expenses.sort(key=lambda item: float(item.get("amount") or 0), reverse=reverse)
+        collection = client.collection(TRANSACTIONS_COLLECTION)
+        completa = completa or not estado.ultima_sincronizacion_completa
+        documentos = {}
+        if completa:
+            for doc in collection.stream():
+                documentos[doc.id] = doc.to_dict() or {}
         else:
-            expenses.sort(key=lambda item: item.get("timestamp", 0), reverse=reverse)
-        return expenses, ""
+            solape = getattr(settings, "FIREBASE_MIRROR_OVERLAP_MS", 7 * 24 * 3600 * 1000)
+            desde_ms = max(estado.ultimo_timestamp_ms - solape, 0)
+            for doc in _documentos_posteriores(collection, "timestamp", desde_ms):
+                documentos[doc.id] = doc.to_dict() or {}
+            if estado.ultimo_actualizado_ms:
+                for doc in _documentos_posteriores(collection, "updatedAt", estado.ultimo_actualizado_ms):
+                    documentos[doc.id] = doc.to_dict() or {}
+
+        guardados = guardar_transacciones_espejo(documentos.items())
+
+        if completa:
+            vigentes = {str(data.get("id") or doc_id) for doc_id, data in documentos.items()}
+            sobrantes = set(TransaccionFirebase.objects.values_list("firebase_id", flat=True)) - vigentes
+            if sobrantes:
+                TransaccionFirebase.objects.filter(firebase_id__in=sobrantes).delete()
+            estado.ultima_sincronizacion_completa = timezone.now()
+
+        for data in documentos.values():
+            timestamp_ms = _ms_a_entero(data.get("timestamp"))
+            actualizado_ms = _ms_a_entero(data.get("updatedAt"))
+            estado.ultimo_timestamp_ms = max(estado.ultimo_timestamp_ms, timestamp_ms)
+            estado.ultimo_actualizado_ms = max(estado.ultimo_actualizado_ms, actualizado_ms)
+        estado.ultima_sincronizacion = timezone.now()
+        estado.documentos_sincronizados = guardados
+        estado.error = ""
+        estado.save()
+        return FirebaseSyncResult(ok=True, message=f"{guardados} transacciones sincronizadas")
     except Exception as exc:
-        logger.error("Error obteniendo gastos desde Firebase: %s", exc)
-        return [], str(exc)
+        logger.error("Error sincronizando transacciones de Firebase: %s", exc)
+        estado.error = str(exc)
+        estado.save(update_fields=["error"])
+        return FirebaseSyncResult(ok=False, message=str(exc))
+
+
+def asegurar_espejo_transacciones(max_age=None, esperar=None):
+    """
+    Sincroniza el espejo si su última actualización es más antigua que ``max_age`` segundos.
+
+    Un candado en la caché compartida evita que varios workers sincronicen a la
+    vez; si otro ya lo está haciendo se usan los datos actuales del espejo. Con
+    ``esperar`` (por defecto cuando ``max_age=0``, es decir, cuando se necesitan
+    los datos al día) se espera hasta ``FIREBASE_MIRROR_LOCK_WAIT`` segundos a
+    que el otro worker termine para sincronizar después de él; si no termina a
+    tiempo se retorna un error indicando que la sincronización sigue en curso.
+    Retorna ``(estado, error)``.
+    """
+    from django.core.cache import cache
+
+    from .models import SincronizacionFirebase
+
+    if max_age is None:
+        max_age = getattr(settings, "FIREBASE_MIRROR_MAX_AGE", 60)
+    estado = SincronizacionFirebase.objects.filter(coleccion=TRANSACTIONS_COLLECTION).first()
+    vencido = (
+        estado is None
+        or estado.ultima_sincronizacion is None
+        or (timezone.now() - estado.ultima_sincronizacion).total_seconds() >= max_age
+    )
+    if not vencido:
+        return estado, estado.error
+
+    candado = f"firebase_mirror_lock:{TRANSACTIONS_COLLECTION}"
+    if esperar is None:
+        esperar = max_age == 0
+    limite = monotonic() + getattr(settings, "FIREBASE_MIRROR_LOCK_WAIT", 30)
+    while not cache.add(candado, 1, 300):
+        if not esperar:
+            return estado, estado.error if estado else ""
+        if monotonic() >= limite:
+            return estado, (
+                "La sincronización de transacciones con Firebase sigue en curso; "
+                "intenta de nuevo en unos segundos."
+            )
+        sleep(0.5)
+    try:
+        result = sync_transacciones_espejo()
+    finally:
+        cache.delete(candado)
+    estado = SincronizacionFirebase.objects.filter(coleccion=TRANSACTIONS_COLLECTION).first()
+    return estado, "" if result.ok else result.message
+
+
+def _guardar_transaccion_local(transaction_id, payload):
+    """Refleja en el espejo una transacción escrita desde la web, sin esperar la sincronización"""
+    try:
+        guardar_transacciones_espejo([(transaction_id, payload)])
+    except Exception as exc:
+        logger.warning("No se pudo actualizar el espejo de transacciones: %s", exc)
 
 
 def fetch_expense_detail(transaction_id):
@@ -349,6 +541,7 @@ def create_firebase_deposit(
             "source": "web_deposit",
         }
         client.collection("transactions").document(transaction_id).set(payload, merge=True)
+        _guardar_transaccion_local(transaction_id, payload)
         _update_user_balance(client, user_id, float(amount))
         return FirebaseSyncResult(ok=True, transaction_id=transaction_id)
     except Exception as exc:
@@ -970,6 +1163,154 @@ def fetch_firestore_collection_docs(collection_name, limit=None, include_drafts=
         return [], str(exc)
 
 
+def _valor_cursor(valor):
+    """
+    Valor de orden serializable que conserva su tipo de Firestore.
+
+    ``start_after`` compara con el tipo almacenado: un Timestamp convertido a
+    milisegundos (como hace ``_json_seguro``) nunca coincide con un campo de
+    tipo Timestamp, así que las fechas viajan como ISO con su marca de tipo.
+    """
+    if isinstance(valor, datetime):
+        if timezone.is_naive(valor):
+            valor = timezone.make_aware(valor, timezone.get_current_timezone())
+        return {"$timestamp": valor.isoformat()}
+    return _json_seguro(valor)
+
+
+def _restaurar_valor_cursor(valor):
+    if isinstance(valor, dict) and "$timestamp" in valor:
+        return datetime.fromisoformat(valor["$timestamp"])
+    return valor
+
+
+def _codificar_cursor(doc_id, valor_orden=None):
+    """Cursor opaco (base64 de JSON) con el id y el valor de orden del último documento"""
+    contenido = json.dumps({"id": doc_id, "orden": _valor_cursor(valor_orden)})
+    return base64.urlsafe_b64encode(contenido.encode("utf-8")).decode("ascii")
+
+
+def _decodificar_cursor(cursor):
+    try:
+        datos = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")).decode("utf-8"))
+        if not isinstance(datos, dict) or not datos.get("id"):
+            return None
+        datos["orden"] = _restaurar_valor_cursor(datos.get("orden"))
+    except (ValueError, UnicodeError):
+        return None
+    return datos
+
+
+def _construir_consulta(client, collection_name, filters=None, order_field=None, descending=False):
+    """
+    Consulta con filtros ``where`` y orden estable para paginar con ``start_after``.
+
+    ``filters`` es una lista de tuplas ``(campo, operador, valor)``. El orden
+    siempre termina por id de documento para que el cursor sea único; los
+    filtros de rango deben ir sobre ``order_field`` (restricción de Firestore).
+    """
+    direction = firestore.Query.DESCENDING if descending else firestore.Query.ASCENDING
+    query = client.collection(collection_name)
+    for campo, operador, valor in filters or ():
+        query = query.where(campo, operador, valor)
+    if order_field:
+        query = query.order_by(order_field, direction=direction)
+    return query.order_by("__name__", direction=direction)
+
+
+def fetch_firestore_collection_page(
+    collection_name,
+    page_size=50,
+    cursor=None,
+    filters=None,
+    order_field=None,
+    descending=False,
+    fields=None,
+    include_drafts=True,
+):
+    """
+    Una página de documentos de una colección, filtrada y paginada en Firestore.
+
+    ``cursor`` es el valor ``next_cursor`` de la página anterior; ``fields``
+    limita los campos devueltos (proyección ``select``) para no descargar los
+    reportes completos en los listados. Cada página lee ``page_size + 1``
+    documentos sin importar el tamaño de la colección.
+
+    Con ``include_drafts=False`` se omiten los documentos con ``isDraft`` en
+    True al leerlos y no con un ``where``: Firestore excluye de ``isDraft ==
+    False`` los reportes antiguos que no tienen el campo. Por eso una página
+    puede traer menos de ``page_size`` elementos aunque haya más.
+    Retorna ``(items, next_cursor, error)``; ``next_cursor`` es "" en la última página.
+    """
+    client, error = _get_firestore_client()
+    if client is None:
+        return [], "", error
+
+    try:
+        query = _construir_consulta(client, collection_name, filters, order_field, descending)
+        if fields:
+            campos = list(fields)
+            for campo in (order_field, None if include_drafts else "isDraft"):
+                if campo and campo not in campos:
+                    campos.append(campo)
+            query = query.select(campos)
+        if cursor:
+            datos_cursor = _decodificar_cursor(cursor)
+            if datos_cursor is None:
+                return [], "", "Cursor de paginación inválido"
+            valores = {"__name__": client.collection(collection_name).document(datos_cursor["id"])}
+            if order_field:
+                valores = {order_field: datos_cursor.get("orden"), **valores}
+            query = query.start_after(valores)
+
+        docs = list(query.limit(page_size + 1).stream())
+        leidos = [{"id": doc.id, "data": doc.to_dict() or {}} for doc in docs[:page_size]]
+        next_cursor = ""
+        if len(docs) > page_size:
+            # El cursor parte del último documento leído, aunque sea un borrador omitido
+            ultimo = leidos[-1]
+            next_cursor = _codificar_cursor(
+                ultimo["id"],
+                ultimo["data"].get(order_field) if order_field else None,
+            )
+        items = [
+            item for item in leidos
+            if include_drafts or item["data"].get("isDraft") is not True
+        ]
+        return items, next_cursor, ""
+    except Exception as exc:
+        logger.error("Error obteniendo página de documentos de Firebase: %s", exc)
+        return [], "", str(exc)
+
+
+def iter_firestore_collection_docs(
+    collection_name, filters=None, order_field=None, descending=False, batch_size=500,
+    include_drafts=True,
+):
+    """
+    Recorre una colección completa por lotes de ``batch_size`` con ``start_after``.
+
+    Evita mantener un único stream abierto sobre miles de documentos (que
+    Firestore corta por tiempo). Lanza la excepción si falla la consulta.
+    """
+    cursor = None
+    while True:
+        items, cursor, error = fetch_firestore_collection_page(
+            collection_name,
+            page_size=batch_size,
+            cursor=cursor,
+            filters=filters,
+            order_field=order_field,
+            descending=descending,
+            include_drafts=include_drafts,
+        )
+        if error:
+            raise RuntimeError(error)
+        yield from items
+        if not cursor:
+            return
+
+
 def fetch_firestore_document(collection_name, document_id):
     client, error = _get_firestore_client()
     if client is None:
@@ -986,6 +1327,35 @@ def fetch_firestore_document(collection_name, document_id):
         return None, str(exc)
 
 
+def fetch_firestore_documents(collection_name, document_ids):
+    """
+    Varios documentos por id en lecturas agrupadas (``get_all``), en el orden pedido.
+
+    Retorna ``(items, error)``; los ids que no existen se omiten.
+    """
+    client, error = _get_firestore_client()
+    if client is None:
+        return [], error
+
+    try:
+        collection = client.collection(collection_name)
+        refs = [collection.document(doc_id) for doc_id in dict.fromkeys(document_ids)]
+        encontrados = {
+            doc.id: doc.to_dict() or {}
+            for doc in client.get_all(refs)
+            if doc.exists
+        }
+        items = [
+            {"id": doc_id, "data": encontrados[doc_id]}
+            for doc_id in dict.fromkeys(document_ids)
+            if doc_id in encontrados
+        ]
+        return items, ""
+    except Exception as exc:
+        logger.error("Error obteniendo documentos de Firebase: %s", exc)
+        return [], str(exc)
+
+
 def fetch_firebase_team_leaders():
     docs, error = fetch_firestore_collection_docs("users")
     if error:
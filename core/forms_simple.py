@@ -489,7 +489,7 @@ class ArchivoProyectoForm(forms.ModelForm):
             self.fields['carpeta'].queryset = CarpetaProyecto.objects.filter(
                 proyecto=self.proyecto, 
                 activa=True
-            )
+            ).select_related('carpeta_padre', 'proyecto')  # __str__ usa el padre o el proyecto
             self.fields['carpeta'].required = False
     
     def clean_archivo(self):
@@ -583,7 +583,7 @@ class CarpetaProyectoForm(forms.ModelForm):
             self.fields['carpeta_padre'].queryset = CarpetaProyecto.objects.filter(
                 proyecto=self.proyecto, 
                 activa=True
-            )
+            ).select_related('carpeta_padre', 'proyecto')  # __str__ usa el padre o el proyecto
             self.fields['carpeta_padre'].required = False
             logger.info(f"✅ Carpeta padre configurada para proyecto {self.proyecto.id}")
     
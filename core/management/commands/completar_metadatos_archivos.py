@@ -0,0 +1,53 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from core.archivos_meta import calcular_metadatos, recalcular_tamanos_proyecto
+from core.models import ArchivoAdjunto, ArchivoProyecto, Proyecto
+
+
+class Command(BaseCommand):
+    help = 'Calcula tamaño, SHA-256, tipo MIME y dimensiones de los archivos subidos antes de guardarlos al subir'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--todos',
+            action='store_true',
+            help='Recalcular también los archivos que ya tienen metadatos',
+        )
+
+    def handle(self, *args, **options):
+        pendientes = Q(sha256='') | Q(tamano_bytes__isnull=True)
+        archivos = ArchivoProyecto.objects.exclude(archivo='')
+        if not options['todos']:
+            archivos = archivos.filter(pendientes)
+        self.stdout.write(f'📁 Archivos de proyecto a revisar: {archivos.count()}')
+        completados, faltantes = self._completar(archivos)
+        self.stdout.write(f'   {completados} completados, {faltantes} no encontrados en disco')
+
+        adjuntos = ArchivoAdjunto.objects.exclude(archivo='')
+        if not options['todos']:
+            adjuntos = adjuntos.filter(sha256='')
+        self.stdout.write(f'📎 Archivos adjuntos a revisar: {adjuntos.count()}')
+        completados, faltantes = self._completar(adjuntos)
+        self.stdout.write(f'   {completados} completados, {faltantes} no encontrados en disco')
+
+        # Tamaños acumulados por carpeta y proyecto
+        proyectos = Proyecto.objects.values_list('id', flat=True)
+        for proyecto_id in proyectos.iterator():
+            recalcular_tamanos_proyecto(proyecto_id)
+        self.stdout.write(self.style.SUCCESS(f'✅ Tamaños acumulados recalculados en {proyectos.count()} proyectos'))
+
+    def _completar(self, queryset):
+        """Guarda los metadatos con update() para no disparar señales por cada archivo"""
+        completados = faltantes = 0
+        for registro in queryset.iterator(chunk_size=200):
+            try:
+                metadatos = calcular_metadatos(registro.archivo)
+            except (OSError, ValueError) as e:
+                faltantes += 1
+                self.stdout.write(self.style.WARNING(f'⚠️ {registro.archivo.name}: {e}'))
+                continue
+            type(registro).objects.filter(pk=registro.pk).update(**{
+                campo: metadatos[clave] for clave, campo in registro.CAMPOS_METADATOS.items()
+            })
+            completados += 1
+        return completados, faltantes
@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand
+from core.activity_log import depurar_logs_actividad, obtener_buffer
+
+
+class Command(BaseCommand):
+    help = 'Recupera los respaldos pendientes del log de actividad y elimina (archivando por mes) los registros antiguos'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dias',
+            type=int,
+            help='Días de retención (por defecto ACTIVITY_LOG_RETENTION_DAYS)',
+        )
+        parser.add_argument(
+            '--sin-archivo',
+            action='store_true',
+            help='Eliminar sin guardar los registros en los archivos mensuales',
+        )
+        parser.add_argument(
+            '--solo-recuperar',
+            action='store_true',
+            help='Solo insertar los respaldos de procesos terminados, sin depurar',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write('🔄 Recuperando respaldos del log de actividad...')
+        recuperados = obtener_buffer().recuperar_respaldos()
+        self.stdout.write(self.style.SUCCESS(f'✅ {recuperados} registros recuperados'))
+
+        if options['solo_recuperar']:
+            return
+
+        self.stdout.write('🧹 Depurando registros antiguos...')
+        eliminados = depurar_logs_actividad(
+            dias=options.get('dias'),
+            archivar=not options['sin_archivo'],
+        )
+        self.stdout.write(self.style.SUCCESS(f'✅ {eliminados} registros eliminados'))
@@ -0,0 +1,46 @@
+from django.core.management.base import BaseCommand
+from core.subidas import depurar_abandonadas
+from core.trabajos import depurar_expirados, nombre_worker, procesar, recuperar_colgados
+
+
+class Command(BaseCommand):
+    help = 'Ejecuta los trabajos en segundo plano (PDF, ZIP y exportaciones) encolados por las vistas'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--una-vez',
+            action='store_true',
+            help='Procesar los trabajos pendientes y terminar (para cron)',
+        )
+        parser.add_argument(
+            '--intervalo',
+            type=float,
+            default=2,
+            help='Segundos de espera cuando la cola está vacía (por defecto 2)',
+        )
+        parser.add_argument(
+            '--solo-depurar',
+            action='store_true',
+            help='Solo reencolar trabajos colgados y eliminar archivos expirados y subidas abandonadas',
+        )
+
+    def handle(self, *args, **options):
+        if options['solo_depurar']:
+            self.stdout.write('🧹 Depurando trabajos...')
+            recuperados = recuperar_colgados()
+            borrados = depurar_expirados()
+            subidas = depurar_abandonadas()
+            self.stdout.write(self.style.SUCCESS(
+                f'✅ {recuperados} trabajos colgados atendidos, {borrados} archivos expirados eliminados, '
+                f'{subidas} subidas abandonadas eliminadas'
+            ))
+            return
+
+        worker = nombre_worker()
+        self.stdout.write(f'🔄 Worker {worker} procesando trabajos...')
+        try:
+            ejecutados = procesar(una_vez=options['una_vez'], intervalo=options['intervalo'], worker=worker)
+        except KeyboardInterrupt:
+            self.stdout.write('⏹️ Worker detenido')
+            return
+        self.stdout.write(self.style.SUCCESS(f'✅ {ejecutados} trabajos ejecutados'))
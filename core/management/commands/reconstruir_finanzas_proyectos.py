@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand
+from core.finanzas import conciliar_finanzas, reconstruir_finanzas, verificar_finanzas
+
+
+class Command(BaseCommand):
+    help = 'Reconstruye y verifica el libro financiero por proyecto y mes (ProyectoFinanzas)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--proyecto_id',
+            type=int,
+            action='append',
+            help='ID del proyecto a procesar (se puede repetir)',
+        )
+        parser.add_argument(
+            '--solo-verificar',
+            action='store_true',
+            help='Solo comparar el libro con las tablas transaccionales, sin reconstruir',
+        )
+        parser.add_argument(
+            '--conciliar',
+            action='store_true',
+            help='Recalcular solo los meses que no coinciden en lugar de reconstruir todo el libro',
+        )
+
+    def handle(self, *args, **options):
+        proyecto_ids = options.get('proyecto_id')
+        solo_verificar = options['solo_verificar']
+
+        alcance = f'proyectos {proyecto_ids}' if proyecto_ids else 'todos los proyectos'
+
+        if options['conciliar'] and not solo_verificar:
+            self.stdout.write(f'🔄 Conciliando libro financiero de {alcance}...')
+            filas = conciliar_finanzas(proyecto_ids)
+            self.stdout.write(self.style.SUCCESS(f'✅ {filas} filas (proyecto, mes) corregidas'))
+        elif not solo_verificar:
+            self.stdout.write(f'🔄 Reconstruyendo libro financiero de {alcance}...')
+            filas = reconstruir_finanzas(proyecto_ids)
+            self.stdout.write(self.style.SUCCESS(f'✅ {filas} filas (proyecto, mes) generadas'))
+
+        self.stdout.write(f'🔍 Verificando libro financiero de {alcance}...')
+        diferencias = verificar_finanzas(proyecto_ids)
+
+        if not diferencias:
+            self.stdout.write(self.style.SUCCESS('✅ El libro coincide con las tablas transaccionales'))
+            return
+
+        self.stdout.write(self.style.WARNING(f'⚠️  Se encontraron {len(diferencias)} diferencias:'))
+        for proyecto_id, periodo, campo, guardado, esperado in diferencias[:50]:
+            self.stdout.write(
+                f'  Proyecto {proyecto_id} {periodo:%Y-%m} {campo}: guardado={guardado} esperado={esperado}'
+            )
+        if len(diferencias) > 50:
+            self.stdout.write(f'  ... y {len(diferencias) - 50} más')
+        self.stdout.write('Ejecute el comando sin --solo-verificar para corregirlas.')
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+from core import search
+
+
+class Command(BaseCommand):
+    help = 'Vacía y vuelve a llenar el índice de búsqueda de texto completo (facturas, gastos, proyectos, ...)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--modulo',
+            action='append',
+            dest='modulos',
+            choices=sorted(search.DOCUMENTOS),
+            help='Reconstruir solo este módulo (se puede repetir)',
+        )
+
+    def handle(self, *args, **options):
+        motor = search.motor() or 'icontains (sin índice de texto completo)'
+        self.stdout.write(f'🔎 Reconstruyendo índice de búsqueda con {motor}...')
+        try:
+            totales = search.reconstruir(options['modulos'])
+        except Exception as e:
+            raise CommandError(f'No se pudo reconstruir el índice: {e}')
+        for modulo, total in totales.items():
+            self.stdout.write(f'   {modulo}: {total} documentos')
+        self.stdout.write(self.style.SUCCESS(f'✅ {sum(totales.values())} documentos indexados'))
@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+from core.firebase_sync import sync_transacciones_espejo
+
+
+class Command(BaseCommand):
+    help = 'Sincroniza el espejo local de la colección transactions de Firebase (caja menuda)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--completa',
+            action='store_true',
+            help='Releer toda la colección y eliminar del espejo los documentos borrados en Firebase',
+        )
+
+    def handle(self, *args, **options):
+        self.stdout.write('🔄 Sincronizando transacciones de Firebase...')
+        result = sync_transacciones_espejo(completa=options['completa'])
+        if result.ok:
+            self.stdout.write(self.style.SUCCESS(f'✅ {result.message}'))
+        else:
+            self.stdout.write(self.style.ERROR(f'❌ {result.message}'))
@@ -2,6 +2,7 @@ from django.shortcuts import redirect
 from django.contrib import messages
 from django.urls import reverse
 from django.conf import settings
+from django.utils.functional import SimpleLazyObject
 import logging
 
 logger = logging.getLogger(__name__)
@@ -80,6 +81,11 @@ class PermisosMiddleware:
         }
 
     def __call__(self, request):
+        # Permisos del rol resueltos una vez y compartidos por el resto de la petición
+        if request.user.is_authenticated and not request.user.is_superuser:
+            usuario = request.user
+            request.user.permisos_codigos = SimpleLazyObject(lambda: self.codigos_permiso(usuario))
+        
         # Obtener el nombre de la vista actual
         view_name = request.resolver_match.url_name if request.resolver_match else None
         
@@ -119,16 +125,26 @@ class PermisosMiddleware:
         
         return self.get_response(request)
     
+    def codigos_permiso(self, user):
+        """
+        Conjunto de códigos de permiso del rol del usuario (caché compartida por rol)
+        """
+        try:
+            if hasattr(user, 'perfilusuario'):
+                return user.perfilusuario.permisos_rol()['codigos']
+        except Exception as e:
+            logger.error(f"Error cargando permisos para usuario {user.username}: {e}")
+        return frozenset()
+    
     def tiene_permiso(self, user, codigo_permiso):
         """
         Verifica si el usuario tiene un permiso específico
         """
         try:
-            # Obtener el perfil del usuario
-            if hasattr(user, 'perfilusuario'):
-                perfil = user.perfilusuario
-                return perfil.tiene_permiso(codigo_permiso)
-            return False
+            codigos = getattr(user, 'permisos_codigos', None)
+            if codigos is None:
+                codigos = self.codigos_permiso(user)
+            return codigo_permiso in codigos
         except Exception as e:
             logger.error(f"Error verificando permiso {codigo_permiso} para usuario {user.username}: {e}")
             return False
@@ -151,7 +167,7 @@ class LogActividadMiddleware:
             request.method in ['POST', 'PUT', 'DELETE']):
             
             try:
-                from .models import LogActividad
+                from .activity_log import registrar_actividad
                 
                 # Obtener información de la vista
                 view_name = request.resolver_match.url_name if request.resolver_match else 'unknown'
@@ -167,8 +183,8 @@ class LogActividadMiddleware:
                 # Determinar el módulo basado en la URL
                 modulo = self.determinar_modulo(request.path)
                 
-                # Crear log de actividad
-                LogActividad.objects.create(
+                # Encolar log de actividad (se inserta en lote fuera de la petición)
+                registrar_actividad(
                     usuario=request.user,
                     accion=accion,
                     modulo=modulo,
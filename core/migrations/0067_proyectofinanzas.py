@@ -0,0 +1,55 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def poblar_finanzas(apps, schema_editor):
+    from core.finanzas import reconstruir_finanzas
+
+    modelos = {
+        nombre: apps.get_model('core', nombre)
+        for nombre in ('Factura', 'Anticipo', 'Gasto', 'IngresoProyecto', 'PlanillaLiquidada', 'ProyectoFinanzas')
+    }
+    reconstruir_finanzas(modelos=modelos)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0066_bitacora_asignaciones_avances'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ProyectoFinanzas',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('periodo', models.DateField(help_text='Primer día del mes')),
+                ('facturas_cantidad', models.PositiveIntegerField(default=0)),
+                ('facturas_pagadas_cantidad', models.PositiveIntegerField(default=0)),
+                ('facturado', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('facturas_pagadas', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('facturas_monto_pagado', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('anticipos_cantidad', models.PositiveIntegerField(default=0)),
+                ('anticipos_monto', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('anticipos_aplicados', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('anticipos_disponibles', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('anticipos_aplicados_proyecto', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('gastos_cantidad', models.PositiveIntegerField(default=0)),
+                ('gastos_aprobados_cantidad', models.PositiveIntegerField(default=0)),
+                ('gastos_aprobados', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('gastos_pendientes', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('ingresos_registrados', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('planillas_personal', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('planillas_trabajadores_diarios', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('actualizado_en', models.DateTimeField(auto_now=True)),
+                ('proyecto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='finanzas', to='core.proyecto')),
+            ],
+            options={
+                'verbose_name': 'Finanzas de Proyecto',
+                'verbose_name_plural': 'Finanzas de Proyectos',
+                'ordering': ['proyecto', 'periodo'],
+                'unique_together': {('proyecto', 'periodo')},
+            },
+        ),
+        migrations.RunPython(poblar_finanzas, migrations.RunPython.noop),
+    ]
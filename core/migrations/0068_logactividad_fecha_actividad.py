@@ -0,0 +1,17 @@
+from django.db import migrations, models
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0067_proyectofinanzas'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='logactividad',
+            name='fecha_actividad',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,59 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0068_logactividad_fecha_actividad'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TransaccionFirebase',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('firebase_id', models.CharField(max_length=120, unique=True)),
+                ('tipo', models.CharField(db_index=True, help_text='EXPENSE, DEPOSIT, ...', max_length=20)),
+                ('origen', models.CharField(blank=True, help_text='Campo source de Firestore', max_length=40)),
+                ('usuario_firebase_id', models.CharField(blank=True, db_index=True, max_length=120)),
+                ('usuario_nombre', models.CharField(blank=True, max_length=200)),
+                ('monto', models.DecimalField(decimal_places=2, default=0, max_digits=14)),
+                ('timestamp_ms', models.BigIntegerField(default=0)),
+                ('actualizado_ms', models.BigIntegerField(default=0, help_text='updatedAt de Firestore (o timestamp si no existe)')),
+                ('fecha', models.DateTimeField(blank=True, null=True)),
+                ('descripcion', models.TextField(blank=True)),
+                ('numero_factura', models.CharField(blank=True, max_length=100)),
+                ('tipo_gasto', models.CharField(blank=True, max_length=50)),
+                ('periodo', models.CharField(blank=True, max_length=7)),
+                ('datos', models.JSONField(blank=True, default=dict, help_text='Documento original de Firestore')),
+                ('sincronizado_en', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Transacción Firebase',
+                'verbose_name_plural': 'Transacciones Firebase',
+                'ordering': ['-timestamp_ms'],
+                'indexes': [
+                    models.Index(fields=['tipo', 'timestamp_ms'], name='core_transa_tipo_3f1c2a_idx'),
+                    models.Index(fields=['usuario_nombre', 'timestamp_ms'], name='core_transa_usuario_8b4d1e_idx'),
+                    models.Index(fields=['usuario_firebase_id', 'timestamp_ms'], name='core_transa_usuario_c52e7f_idx'),
+                ],
+            },
+        ),
+        migrations.CreateModel(
+            name='SincronizacionFirebase',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('coleccion', models.CharField(max_length=100, unique=True)),
+                ('ultimo_timestamp_ms', models.BigIntegerField(default=0)),
+                ('ultimo_actualizado_ms', models.BigIntegerField(default=0)),
+                ('ultima_sincronizacion', models.DateTimeField(blank=True, null=True)),
+                ('ultima_sincronizacion_completa', models.DateTimeField(blank=True, null=True)),
+                ('documentos_sincronizados', models.PositiveIntegerField(default=0)),
+                ('error', models.TextField(blank=True)),
+            ],
+            options={
+                'verbose_name': 'Sincronización Firebase',
+                'verbose_name_plural': 'Sincronizaciones Firebase',
+            },
+        ),
+    ]
@@ -0,0 +1,121 @@
+from django.db import migrations, models
+
+
+# SQLite: tabla FTS5 de contenido externo sincronizada con triggers
+SQLITE_CREAR = [
+    """
+    CREATE VIRTUAL TABLE core_indicebusqueda_fts USING fts5(
+        claves, contenido,
+        content='core_indicebusqueda', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    """,
+    """
+    CREATE TRIGGER core_indicebusqueda_ai AFTER INSERT ON core_indicebusqueda BEGIN
+        INSERT INTO core_indicebusqueda_fts(rowid, claves, contenido)
+        VALUES (new.id, new.claves, new.contenido);
+    END
+    """,
+    """
+    CREATE TRIGGER core_indicebusqueda_ad AFTER DELETE ON core_indicebusqueda BEGIN
+        INSERT INTO core_indicebusqueda_fts(core_indicebusqueda_fts, rowid, claves, contenido)
+        VALUES ('delete', old.id, old.claves, old.contenido);
+    END
+    """,
+    """
+    CREATE TRIGGER core_indicebusqueda_au AFTER UPDATE ON core_indicebusqueda BEGIN
+        INSERT INTO core_indicebusqueda_fts(core_indicebusqueda_fts, rowid, claves, contenido)
+        VALUES ('delete', old.id, old.claves, old.contenido);
+        INSERT INTO core_indicebusqueda_fts(rowid, claves, contenido)
+        VALUES (new.id, new.claves, new.contenido);
+    END
+    """,
+]
+
+SQLITE_ELIMINAR = [
+    "DROP TRIGGER IF EXISTS core_indicebusqueda_au",
+    "DROP TRIGGER IF EXISTS core_indicebusqueda_ad",
+    "DROP TRIGGER IF EXISTS core_indicebusqueda_ai",
+    "DROP TABLE IF EXISTS core_indicebusqueda_fts",
+]
+
+# PostgreSQL: tsvector generado (claves con más peso) e índice GIN
+POSTGRESQL_CREAR = [
+    """
+    ALTER TABLE core_indicebusqueda ADD COLUMN documento tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('simple', coalesce(claves, '')), 'A') ||
+        setweight(to_tsvector('simple', coalesce(contenido, '')), 'C')
+    ) STORED
+    """,
+    "CREATE INDEX core_indicebusqueda_documento_gin ON core_indicebusqueda USING GIN (documento)",
+]
+
+POSTGRESQL_ELIMINAR = [
+    "DROP INDEX IF EXISTS core_indicebusqueda_documento_gin",
+    "ALTER TABLE core_indicebusqueda DROP COLUMN IF EXISTS documento",
+]
+
+
+def _sqlite_con_fts5(cursor):
+    cursor.execute("PRAGMA compile_options")
+    return any('FTS5' in opcion for (opcion,) in cursor.fetchall())
+
+
+def crear_indice_texto(apps, schema_editor):
+    conexion = schema_editor.connection
+    with conexion.cursor() as cursor:
+        if conexion.vendor == 'sqlite':
+            # Sin FTS5 compilado, core.search busca con icontains sobre la tabla
+            if not _sqlite_con_fts5(cursor):
+                return
+            sentencias = SQLITE_CREAR
+        elif conexion.vendor == 'postgresql':
+            sentencias = POSTGRESQL_CREAR
+        else:
+            return
+        for sentencia in sentencias:
+            cursor.execute(sentencia)
+
+
+def eliminar_indice_texto(apps, schema_editor):
+    conexion = schema_editor.connection
+    sentencias = {
+        'sqlite': SQLITE_ELIMINAR,
+        'postgresql': POSTGRESQL_ELIMINAR,
+    }.get(conexion.vendor, [])
+    with conexion.cursor() as cursor:
+        for sentencia in sentencias:
+            cursor.execute(sentencia)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0071_factura_emision_id_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IndiceBusqueda',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('modulo', models.CharField(max_length=30)),
+                ('objeto_id', models.BigIntegerField()),
+                ('titulo', models.CharField(max_length=255)),
+                ('subtitulo', models.CharField(blank=True, max_length=255)),
+                ('claves', models.TextField(blank=True, help_text='Números, códigos y nombres (mayor peso)')),
+                ('contenido', models.TextField(blank=True, help_text='Descripciones y observaciones')),
+                ('fecha', models.DateField(blank=True, null=True)),
+                ('actualizado_en', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Índice de búsqueda',
+                'verbose_name_plural': 'Índice de búsqueda',
+            },
+        ),
+        migrations.AddConstraint(
+            model_name='indicebusqueda',
+            constraint=models.UniqueConstraint(fields=('modulo', 'objeto_id'), name='core_indice_modulo_objeto_uniq'),
+        ),
+        migrations.RunPython(crear_indice_texto, eliminar_indice_texto),
+    ]
@@ -0,0 +1,61 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0072_indicebusqueda'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivoproyecto',
+            name='tamano_bytes',
+            field=models.BigIntegerField(blank=True, help_text='Tamaño del archivo en bytes', null=True),
+        ),
+        migrations.AddField(
+            model_name='archivoproyecto',
+            name='sha256',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='archivoproyecto',
+            name='tipo_mime',
+            field=models.CharField(blank=True, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='archivoproyecto',
+            name='ancho',
+            field=models.PositiveIntegerField(blank=True, help_text='Ancho en píxeles (solo imágenes)', null=True),
+        ),
+        migrations.AddField(
+            model_name='archivoproyecto',
+            name='alto',
+            field=models.PositiveIntegerField(blank=True, help_text='Alto en píxeles (solo imágenes)', null=True),
+        ),
+        migrations.AddField(
+            model_name='archivoadjunto',
+            name='sha256',
+            field=models.CharField(blank=True, max_length=64),
+        ),
+        migrations.AddField(
+            model_name='archivoadjunto',
+            name='ancho',
+            field=models.PositiveIntegerField(blank=True, help_text='Ancho en píxeles (solo imágenes)', null=True),
+        ),
+        migrations.AddField(
+            model_name='archivoadjunto',
+            name='alto',
+            field=models.PositiveIntegerField(blank=True, help_text='Alto en píxeles (solo imágenes)', null=True),
+        ),
+        migrations.AddField(
+            model_name='carpetaproyecto',
+            name='tamano_bytes',
+            field=models.BigIntegerField(default=0, help_text='Tamaño de los archivos activos de la carpeta y sus subcarpetas'),
+        ),
+        migrations.AddField(
+            model_name='proyecto',
+            name='tamano_archivos_bytes',
+            field=models.BigIntegerField(default=0, help_text='Tamaño de los archivos activos del proyecto'),
+        ),
+    ]
@@ -0,0 +1,37 @@
+from django.conf import settings
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('core', '0073_metadatos_archivos'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SubidaFragmentada',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('token', models.CharField(max_length=64, unique=True)),
+                ('nombre_archivo', models.CharField(max_length=255)),
+                ('tamano_total', models.BigIntegerField(help_text='Tamaño del archivo en bytes')),
+                ('tamano_fragmento', models.PositiveIntegerField()),
+                ('total_fragmentos', models.PositiveIntegerField()),
+                ('sha256_esperado', models.CharField(blank=True, help_text='SHA-256 enviado por el cliente (opcional)', max_length=64)),
+                ('sha256', models.CharField(blank=True, help_text='SHA-256 del archivo unido', max_length=64)),
+                ('estado', models.CharField(choices=[('recibiendo', 'Recibiendo fragmentos'), ('ensamblando', 'Uniendo fragmentos'), ('completada', 'Completada')], default='recibiendo', max_length=20)),
+                ('creado_en', models.DateTimeField(auto_now_add=True)),
+                ('actualizado_en', models.DateTimeField(auto_now=True, db_index=True)),
+                ('completada_en', models.DateTimeField(blank=True, null=True)),
+                ('usuario', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='subidas_fragmentadas', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Subida fragmentada',
+                'verbose_name_plural': 'Subidas fragmentadas',
+                'ordering': ['-creado_en'],
+            },
+        ),
+    ]
@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0074_subidafragmentada'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trabajosegundoplano',
+            name='latido_en',
+            field=models.DateTimeField(blank=True, help_text='Última señal de vida del worker que lo ejecuta', null=True),
+        ),
+    ]
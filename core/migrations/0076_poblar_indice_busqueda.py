@@ -0,0 +1,12 @@
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    # Sin operaciones: el índice se llena en post_migrate (search.poblar_indice_vacio)
+    # con los modelos actuales, para no importar core.search desde una migración
+
+    dependencies = [
+        ('core', '0075_trabajo_latido'),
+    ]
+
+    operations = []
@@ -0,0 +1,281 @@
+"""
+Miniaturas y vistas previas de archivos de proyecto del Telecom Technology
+Las imágenes y la primera página de los PDFs se reducen a varios tamaños
+(lista, cuadrícula y vista previa) fuera de la petición de subida: al guardar
+un archivo nuevo se encola una tarea para el worker de ``procesar_trabajos``
+y, si el worker no está activo o el archivo es anterior, la miniatura se
+genera la primera vez que se pide y queda guardada en
+MEDIA/miniaturas/<id>/<tamaño>-<versión>.jpg.
+"""
+
+import logging
+import os
+import shutil
+import subprocess
+import tempfile
+from functools import lru_cache
+
+from django.apps import apps
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+from .pdf_cache import huella
+
+logger = logging.getLogger(__name__)
+
+DIRECTORIO = 'miniaturas'
+
+# Lado mayor en píxeles de cada tamaño, de mayor a menor para reducir en cadena
+TAMANOS = {
+    'vista_previa': 1280,
+    'cuadricula': 320,
+    'lista': 64,
+}
+
+# Tamaño que se guarda en ArchivoProyecto.thumbnail
+TAMANO_THUMBNAIL = 'cuadricula'
+
+CALIDAD_JPEG = 82
+
+EXTENSIONES_IMAGEN = {'jpg', 'jpeg', 'png', 'gif', 'bmp', 'webp'}
+EXTENSIONES_PDF = {'pdf'}
+
+# Imágenes más grandes se rechazan (protección contra "bombas" de descompresión)
+MAX_PIXELES = 120_000_000
+
+
+@lru_cache(maxsize=1)
+def _renderizador_pdf():
+    """'pymupdf', 'pdftoppm' o None si no hay con qué rasterizar PDFs"""
+    try:
+        import fitz  # noqa: F401  (PyMuPDF, opcional)
+        return 'pymupdf'
+    except ImportError:
+        pass
+    if shutil.which('pdftoppm'):
+        return 'pdftoppm'
+    return None
+
+
+def soporta(archivo):
+    """True si se puede generar una miniatura del archivo"""
+    if not archivo.archivo:
+        return False
+    extension = archivo.get_extension()
+    if extension in EXTENSIONES_IMAGEN:
+        return True
+    return extension in EXTENSIONES_PDF and _renderizador_pdf() is not None
+
+
+def version(archivo):
+    """Versión de las miniaturas: cambia si se reemplaza el archivo"""
+    if archivo.sha256:
+        return archivo.sha256[:16]
+    return huella(archivo.archivo.name, archivo.tamano_bytes)[:16]
+
+
+def _directorio(archivo_id):
+    return os.path.join(settings.MEDIA_ROOT, DIRECTORIO, str(archivo_id))
+
+
+def nombre_relativo(archivo, tamano):
+    """Ruta de la miniatura relativa a MEDIA_ROOT"""
+    return os.path.join(DIRECTORIO, str(archivo.pk), f"{tamano}-{version(archivo)}.jpg")
+
+
+def ruta(archivo, tamano):
+    return os.path.join(settings.MEDIA_ROOT, nombre_relativo(archivo, tamano))
+
+
+def existe(archivo, tamano):
+    return os.path.exists(ruta(archivo, tamano))
+
+
+def _abrir_imagen(ruta_archivo, lado):
+    """
+    Imagen orientada según EXIF y en RGB.
+
+    En JPEG ``draft`` decodifica directamente a una escala reducida, lo que
+    evita descomprimir las fotos de 20 MB del celular a resolución completa.
+    """
+    from PIL import Image, ImageOps
+
+    imagen = Image.open(ruta_archivo)
+    if imagen.width * imagen.height > MAX_PIXELES:
+        raise ValueError(f"Imagen demasiado grande ({imagen.width}x{imagen.height})")
+    if imagen.format == 'JPEG':
+        imagen.draft('RGB', (lado, lado))
+    imagen = ImageOps.exif_transpose(imagen)
+
+    if imagen.mode in ('RGBA', 'LA', 'P'):
+        # Fondo blanco para las transparencias en lugar de negro
+        imagen = imagen.convert('RGBA')
+        fondo = Image.new('RGB', imagen.size, (255, 255, 255))
+        fondo.paste(imagen, mask=imagen.getchannel('A'))
+        return fondo
+    return imagen.convert('RGB')
+
+
+def _primera_pagina_pdf(ruta_archivo, lado):
+    """Primera página del PDF rasterizada con el lado mayor cercano a ``lado``"""
+    from PIL import Image
+
+    renderizador = _renderizador_pdf()
+    if renderizador == 'pymupdf':
+        import fitz
+
+        with fitz.open(ruta_archivo) as documento:
+            pagina = documento[0]
+            escala = lado / max(pagina.rect.width, pagina.rect.height)
+            pixmap = pagina.get_pixmap(matrix=fitz.Matrix(escala, escala), alpha=False)
+            return Image.frombytes('RGB', (pixmap.width, pixmap.height), pixmap.samples)
+
+    if renderizador == 'pdftoppm':
+        with tempfile.TemporaryDirectory() as temporal:
+            prefijo = os.path.join(temporal, 'pagina')
+            subprocess.run(
+                ['pdftoppm', '-jpeg', '-f', '1', '-l', '1', '-singlefile',
+                 '-scale-to', str(lado), ruta_archivo, prefijo],
+                check=True, capture_output=True, timeout=60,
+            )
+            with Image.open(f"{prefijo}.jpg") as imagen:
+                return imagen.convert('RGB')
+
+    raise ValueError('No hay un renderizador de PDF disponible')
+
+
+def _guardar_jpeg(imagen, destino):
+    """Escritura atómica: nunca se sirve una miniatura a medio escribir"""
+    descriptor, temporal = tempfile.mkstemp(dir=os.path.dirname(destino), suffix='.tmp')
+    try:
+        with os.fdopen(descriptor, 'wb') as salida:
+            imagen.save(salida, 'JPEG', quality=CALIDAD_JPEG, optimize=True, progressive=True)
+        os.replace(temporal, destino)
+    except Exception:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        raise
+
+
+def generar(archivo):
+    """
+    Genera todos los tamaños de la miniatura del archivo y elimina las de
+    versiones anteriores. Retorna True si se generaron.
+    """
+    from PIL import Image
+
+    if not soporta(archivo):
+        return False
+
+    lado = max(TAMANOS.values())
+    ruta_archivo = archivo.archivo.path
+    if archivo.get_extension() in EXTENSIONES_PDF:
+        imagen = _primera_pagina_pdf(ruta_archivo, lado)
+    else:
+        imagen = _abrir_imagen(ruta_archivo, lado)
+
+    directorio = _directorio(archivo.pk)
+    os.makedirs(directorio, exist_ok=True)
+    vigentes = set()
+    for tamano, maximo in TAMANOS.items():
+        # Cada tamaño parte del anterior, que ya es más pequeño que el original
+        imagen.thumbnail((maximo, maximo), Image.Resampling.LANCZOS)
+        destino = ruta(archivo, tamano)
+        _guardar_jpeg(imagen, destino)
+        vigentes.add(os.path.basename(destino))
+
+    for nombre in os.listdir(directorio):
+        if nombre not in vigentes:
+            try:
+                os.remove(os.path.join(directorio, nombre))
+            except OSError:
+                pass
+
+    anterior = archivo.thumbnail.name if archivo.thumbnail else ''
+    nuevo = nombre_relativo(archivo, TAMANO_THUMBNAIL)
+    if anterior != nuevo:
+        # update() para no volver a disparar las señales de guardado
+        type(archivo).objects.filter(pk=archivo.pk).update(thumbnail=nuevo)
+        archivo.thumbnail.name = nuevo
+        if anterior and not anterior.startswith(DIRECTORIO + os.sep):
+            # Miniatura de 200px generada en la subida antes de este módulo
+            try:
+                os.remove(os.path.join(settings.MEDIA_ROOT, anterior))
+            except OSError:
+                pass
+    return True
+
+
+def generar_por_id(archivo_id):
+    """Punto de entrada de la tarea en segundo plano"""
+    ArchivoProyecto = apps.get_model('core', 'ArchivoProyecto')
+    archivo = ArchivoProyecto.objects.filter(pk=archivo_id).first()
+    if archivo is None:
+        return False
+    if existe(archivo, TAMANO_THUMBNAIL):
+        return True
+    return generar(archivo)
+
+
+def obtener(archivo, tamano):
+    """
+    Ruta de la miniatura del tamaño pedido, generándola si falta (archivos
+    subidos antes del pipeline o sin worker). None si no se puede generar.
+    """
+    if tamano not in TAMANOS or not soporta(archivo):
+        return None
+    destino = ruta(archivo, tamano)
+    if not os.path.exists(destino):
+        try:
+            generar(archivo)
+        except Exception as e:
+            logger.warning(f"No se pudo generar la miniatura del archivo {archivo.pk}: {e}")
+            return None
+    return destino if os.path.exists(destino) else None
+
+
+def eliminar(archivo_id):
+    """Elimina todas las miniaturas de un archivo"""
+    shutil.rmtree(_directorio(archivo_id), ignore_errors=True)
+
+
+def programar(archivo):
+    """Encola la generación de miniaturas al confirmar la transacción"""
+    from .trabajos import encolar_tarea, segundo_plano_activo
+
+    if not segundo_plano_activo() or not soporta(archivo):
+        # Sin worker la miniatura se genera la primera vez que se pide
+        return
+
+    def _encolar():
+        encolar_tarea(
+            'miniaturas',
+            'core.miniaturas.generar_por_id',
+            archivo.subido_por,
+            args=[archivo.pk],
+            descripcion=f'Miniaturas de {archivo.nombre}',
+            clave=huella('miniaturas', archivo.pk, version(archivo)),
+        )
+
+    transaction.on_commit(_encolar)
+
+
+def _archivo_guardado(sender, instance, raw=False, update_fields=None, **kwargs):
+    if raw:
+        return
+    if update_fields is not None and not {'archivo', 'sha256'} & set(update_fields):
+        return
+    if instance.activo and not existe(instance, TAMANO_THUMBNAIL):
+        programar(instance)
+
+
+def _archivo_eliminado(sender, instance, **kwargs):
+    eliminar(instance.pk)
+
+
+def conectar_miniaturas():
+    """Genera miniaturas en segundo plano al subir archivos y las borra con el archivo"""
+    ArchivoProyecto = apps.get_model('core', 'ArchivoProyecto')
+    post_save.connect(_archivo_guardado, sender=ArchivoProyecto, dispatch_uid='miniaturas_save')
+    post_delete.connect(_archivo_eliminado, sender=ArchivoProyecto, dispatch_uid='miniaturas_delete')
@@ -3,6 +3,7 @@ from django.db.models import Sum, Case, When, DecimalField
 from django.contrib.auth.models import User
 from django.utils import timezone
 from decimal import Decimal
+from datetime import date
 from django.core.exceptions import ValidationError
 
 
@@ -79,6 +80,33 @@ class RolPermiso(models.Model):
     
     def __str__(self):
         return f"{self.rol.nombre} - {self.permiso.nombre}"
+    
+    @staticmethod
+    def codigos_de_rol(rol_id):
+        """
+        Permisos activos de un rol desde la caché compartida.
+        
+        Retorna ``{'codigos': frozenset, 'modulos': frozenset((modulo, tipo))}`` con
+        una sola consulta por rol; la clave cambia de versión cuando se edita el rol,
+        sus RolPermiso o cualquier Permiso/Módulo (ver cache_invalidation).
+        """
+        from .cache_utils import TAG_PERMISOS, get_or_set_cache, tag_rol
+        
+        def cargar():
+            filas = RolPermiso.objects.filter(rol_id=rol_id, activo=True).values_list(
+                'permiso__codigo', 'permiso__modulo__nombre', 'permiso__tipo'
+            )
+            codigos = set()
+            modulos = set()
+            for codigo, modulo, tipo in filas:
+                codigos.add(codigo)
+                modulos.add((modulo, tipo))
+            return {'codigos': frozenset(codigos), 'modulos': frozenset(modulos)}
+        
+        return get_or_set_cache(
+            f"permisos_rol_{rol_id}", cargar, timeout=3600,
+            tags=(TAG_PERMISOS, tag_rol(rol_id)),
+        )
 
 
 class PerfilUsuario(models.Model):
@@ -100,30 +128,26 @@ class PerfilUsuario(models.Model):
         else:
             return f"{self.usuario.get_full_name()} - Sin rol"
     
+    def permisos_rol(self):
+        """Permisos del rol, resueltos una sola vez por instancia (es decir, por petición)"""
+        if not hasattr(self, '_permisos_rol'):
+            if self.rol_id:
+                self._permisos_rol = RolPermiso.codigos_de_rol(self.rol_id)
+            else:
+                self._permisos_rol = {'codigos': frozenset(), 'modulos': frozenset()}
+        return self._permisos_rol
+    
     def tiene_permiso(self, codigo_permiso):
         """Verifica si el usuario tiene un permiso específico"""
         try:
-            if not self.rol:
-                return False
-            return RolPermiso.objects.filter(
-                rol=self.rol,
-                permiso__codigo=codigo_permiso,
-                activo=True
-            ).exists()
+            return codigo_permiso in self.permisos_rol()['codigos']
         except:
             return False
     
     def tiene_permiso_modulo(self, codigo_modulo, tipo_permiso='ver'):
         """Verifica si el usuario tiene un permiso específico en un módulo"""
         try:
-            if not self.rol:
-                return False
-            return RolPermiso.objects.filter(
-                rol=self.rol,
-                permiso__modulo__nombre=codigo_modulo,
-                permiso__tipo=tipo_permiso,
-                activo=True
-            ).exists()
+            return (codigo_modulo, tipo_permiso) in self.permisos_rol()['modulos']
         except:
             return False
 
@@ -201,6 +225,7 @@ class Proyecto(models.Model):
     estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default='pendiente')
     activo = models.BooleanField(default=True)
     creado_en = models.DateTimeField(auto_now_add=True)
+    tamano_archivos_bytes = models.BigIntegerField(default=0, help_text="Tamaño de los archivos activos del proyecto")
     
     class Meta:
         verbose_name = 'Proyecto'
@@ -218,21 +243,18 @@ class Proyecto(models.Model):
         """Obtener gastos aprobados del proyecto"""
         return self.gasto_set.filter(aprobado=True)
     
+    def get_finanzas(self):
+        """Totales del libro financiero materializado (ProyectoFinanzas)"""
+        from .finanzas import totales_proyecto
+        return totales_proyecto(self)
+    
     def get_total_gastos_aprobados(self):
         """Calcular total de gastos aprobados"""
-        from django.db.models import Sum
-        total = self.gasto_set.filter(aprobado=True).aggregate(
-            total=Sum('monto')
-        )['total']
-        return Decimal(str(total)) if total else Decimal('0.00')
+        return self.get_finanzas()['gastos_aprobados']
     
     def get_total_gastos_pendientes(self):
         """Calcular total de gastos pendientes"""
-        from django.db.models import Sum
-        total = self.gasto_set.filter(aprobado=False).aggregate(
-            total=Sum('monto')
-        )['total']
-        return Decimal(str(total)) if total else Decimal('0.00')
+        return self.get_finanzas()['gastos_pendientes']
     
     def get_presupuesto_disponible(self):
         """Calcular presupuesto disponible (presupuesto - gastos aprobados)"""
@@ -343,7 +365,35 @@ class Subproyecto(models.Model):
         return self.estado == 'completado' and self.fecha_fin_real is not None
 
 
-class ArchivoAdjunto(models.Model):
+class MetadatosArchivoMixin:
+    """
+    Guarda tamaño, SHA-256, tipo MIME y dimensiones del archivo al subirlo.
+    
+    ``CAMPOS_METADATOS`` relaciona cada dato de archivos_meta.calcular_metadatos
+    con el campo del modelo donde se guarda. Se calculan solo cuando el archivo
+    es nuevo, mientras todavía está en memoria o en el archivo temporal de la
+    subida; los registros anteriores sin hash se completan con el comando
+    ``completar_metadatos_archivos`` y no al guardarlos, para no leer archivos
+    grandes del disco dentro de una petición.
+    """
+    
+    CAMPO_ARCHIVO = 'archivo'
+    CAMPOS_METADATOS = {}
+    
+    def metadatos_pendientes(self):
+        archivo = getattr(self, self.CAMPO_ARCHIVO)
+        return bool(archivo) and not archivo._committed
+    
+    def save(self, *args, **kwargs):
+        if self.metadatos_pendientes():
+            from .archivos_meta import asignar_metadatos
+            campos = asignar_metadatos(self)
+            if campos and kwargs.get('update_fields') is not None:
+                kwargs['update_fields'] = set(kwargs['update_fields']) | set(campos)
+        super().save(*args, **kwargs)
+
+
+class ArchivoAdjunto(MetadatosArchivoMixin, models.Model):
     """Modelo para archivos adjuntos"""
     TIPO_CHOICES = [
         ('cliente', 'Cliente'),
@@ -359,9 +409,20 @@ class ArchivoAdjunto(models.Model):
     archivo = models.FileField(upload_to='archivos_adjuntos/')
     tipo_mime = models.CharField(max_length=100, blank=True)
     tamano = models.IntegerField(blank=True)
+    sha256 = models.CharField(max_length=64, blank=True)
+    ancho = models.PositiveIntegerField(null=True, blank=True, help_text="Ancho en píxeles (solo imágenes)")
+    alto = models.PositiveIntegerField(null=True, blank=True, help_text="Alto en píxeles (solo imágenes)")
     uploaded_by = models.ForeignKey(User, on_delete=models.CASCADE)
     creado_en = models.DateTimeField(auto_now_add=True)
     
+    CAMPOS_METADATOS = {
+        'tamano': 'tamano',
+        'sha256': 'sha256',
+        'tipo_mime': 'tipo_mime',
+        'ancho': 'ancho',
+        'alto': 'alto',
+    }
+    
     class Meta:
         verbose_name = 'Archivo Adjunto'
         verbose_name_plural = 'Archivos Adjuntos'
@@ -370,7 +431,31 @@ class ArchivoAdjunto(models.Model):
         return f"{self.nombre_archivo} - {self.tipo}"
 
 
-class Factura(models.Model):
+class FinanzasProyectoMixin:
+    """
+    Registro que aporta al libro ProyectoFinanzas.
+
+    Cada modelo indica en ``periodo_finanzas()`` el mes del libro al que aporta y
+    en ``CAMPOS_PERIODO_FINANZAS`` los campos necesarios para calcularlo. Las
+    señales de core/finanzas.py recalculan el mes anterior y el nuevo al guardar
+    y el mes del registro al eliminar, también en borrados en cascada y
+    ``queryset.delete()``.
+    
+    Si el registro cambió de proyecto, ``_proyecto_id_anterior`` conserva el
+    proyecto previo para que cache_invalidation invalide también sus claves.
+    """
+    
+    CAMPOS_PERIODO_FINANZAS = ()
+    
+    def periodo_finanzas(self):
+        """Primer día del mes del libro financiero al que aporta el registro"""
+        raise NotImplementedError
+    
+    def _claves_finanzas(self):
+        return {(self.proyecto_id, self.periodo_finanzas())}
+
+
+class Factura(FinanzasProyectoMixin, models.Model):
     """Modelo para manejar facturas de proyectos"""
     
     ESTADO_CHOICES = [
@@ -450,6 +535,8 @@ class Factura(models.Model):
             models.Index(fields=['proyecto', 'cliente']),
             models.Index(fields=['estado', 'fecha_vencimiento']),
             models.Index(fields=['numero_factura']),
+            # Paginación por cursor del listado (facturas_list)
+            models.Index(fields=['-fecha_emision', '-id'], name='core_factur_emision_id_idx'),
         ]
     
     def clean(self):
@@ -466,9 +553,15 @@ class Factura(models.Model):
         if self.monto_pagado and self.monto_total and self.monto_pagado > self.monto_total:
             raise ValidationError("El monto pagado no puede ser mayor al monto total.")
     
+    CAMPOS_PERIODO_FINANZAS = ('fecha_emision',)
+    
     def __str__(self):
         return f"Factura {self.numero_factura} - {self.cliente.razon_social} - ${self.monto_total}"
     
+    def periodo_finanzas(self):
+        from .finanzas import periodo_de
+        return periodo_de(self.fecha_emision)
+    
     def save(self, *args, **kwargs):
         # Calcular montos si no están definidos
         if not self.monto_total:
@@ -761,7 +854,7 @@ class CategoriaGasto(models.Model):
         return self.gastos.aggregate(total=Sum('monto'))['total'] or 0
 
 
-class Gasto(models.Model):
+class Gasto(FinanzasProyectoMixin, models.Model):
     """Modelo para gastos"""
     proyecto = models.ForeignKey(Proyecto, on_delete=models.CASCADE, null=True, blank=True)
     subproyecto = models.ForeignKey('Subproyecto', on_delete=models.SET_NULL,
@@ -802,8 +895,14 @@ class Gasto(models.Model):
         verbose_name = 'Gasto'
         verbose_name_plural = 'Gastos'
     
+    CAMPOS_PERIODO_FINANZAS = ('fecha_gasto',)
+    
     def __str__(self):
         return f"{self.descripcion} - ${self.monto}"
+    
+    def periodo_finanzas(self):
+        from .finanzas import periodo_de
+        return periodo_de(self.fecha_gasto)
 
     def clean(self):
         """Validaciones del gasto según su tipo."""
@@ -891,7 +990,8 @@ class LogActividad(models.Model):
     descripcion = models.TextField(blank=True)
     ip_address = models.GenericIPAddressField(null=True, blank=True)
     user_agent = models.TextField(blank=True)
-    fecha_actividad = models.DateTimeField(auto_now_add=True)
+    # Se asigna al registrar (no al insertar) porque los logs se insertan en lote
+    fecha_actividad = models.DateTimeField(default=timezone.now, db_index=True)
     
     class Meta:
         verbose_name = 'Log de Actividad'
@@ -902,7 +1002,7 @@ class LogActividad(models.Model):
         return f"{self.usuario.username} - {self.accion} - {self.fecha_actividad}"
 
 
-class Anticipo(models.Model):
+class Anticipo(FinanzasProyectoMixin, models.Model):
     """Modelo para manejar anticipos de clientes a proyectos"""
     
     ESTADO_CHOICES = [
@@ -972,9 +1072,16 @@ class Anticipo(models.Model):
             models.Index(fields=['numero_anticipo']),
         ]
     
+    CAMPOS_PERIODO_FINANZAS = ('fecha_aplicacion', 'fecha_recepcion')
+    
     def __str__(self):
         return f"Anticipo {self.numero_anticipo} - {self.cliente.razon_social} - ${self.monto}"
     
+    def periodo_finanzas(self):
+        """Mes de aplicación o, si aún no se aplica, mes de recepción"""
+        from .finanzas import periodo_de
+        return periodo_de(self.fecha_aplicacion or self.fecha_recepcion)
+    
     def save(self, *args, **kwargs):
         # Calcular monto disponible considerando aplicaciones a facturas y al proyecto
         if not self.pk:  # Nuevo anticipo
@@ -1079,7 +1186,7 @@ class AplicacionAnticipo(models.Model):
         return f"Aplicación ${self.monto_aplicado} - {self.anticipo} → {self.factura}"
 
 
-class ArchivoProyecto(models.Model):
+class ArchivoProyecto(MetadatosArchivoMixin, models.Model):
     """Archivos adjuntos a proyectos (planos, documentos, imágenes)"""
     
     TIPO_CHOICES = [
@@ -1103,6 +1210,21 @@ class ArchivoProyecto(models.Model):
     subido_por = models.ForeignKey(User, on_delete=models.CASCADE, related_name='archivos_subidos')
     activo = models.BooleanField(default=True)
     
+    # Metadatos calculados al subir el archivo (ver MetadatosArchivoMixin)
+    tamano_bytes = models.BigIntegerField(null=True, blank=True, help_text="Tamaño del archivo en bytes")
+    sha256 = models.CharField(max_length=64, blank=True)
+    tipo_mime = models.CharField(max_length=100, blank=True)
+    ancho = models.PositiveIntegerField(null=True, blank=True, help_text="Ancho en píxeles (solo imágenes)")
+    alto = models.PositiveIntegerField(null=True, blank=True, help_text="Alto en píxeles (solo imágenes)")
+    
+    CAMPOS_METADATOS = {
+        'tamano': 'tamano_bytes',
+        'sha256': 'sha256',
+        'tipo_mime': 'tipo_mime',
+        'ancho': 'ancho',
+        'alto': 'alto',
+    }
+    
     class Meta:
         ordering = ['-fecha_subida']
         verbose_name = 'Archivo de Proyecto'
@@ -1116,16 +1238,9 @@ class ArchivoProyecto(models.Model):
         return self.archivo.name.split('.')[-1].lower()
     
     def get_tamaño_archivo(self):
-        """Obtener el tamaño del archivo en formato legible"""
-        try:
-            size = self.archivo.size
-            for unit in ['B', 'KB', 'MB', 'GB']:
-                if size < 1024.0:
-                    return f"{size:.1f} {unit}"
-                size /= 1024.0
-            return f"{size:.1f} TB"
-        except:
-            return "N/A"
+        """Obtener el tamaño del archivo en formato legible (guardado al subirlo)"""
+        from .archivos_meta import formato_tamano
+        return formato_tamano(self.tamano_bytes)
     
     def es_imagen(self):
         """Verificar si el archivo es una imagen"""
@@ -1148,48 +1263,35 @@ class ArchivoProyecto(models.Model):
         return self.get_extension() in extensiones_excel
     
     def generar_thumbnail(self):
-        """Generar miniatura del archivo si es posible"""
+        """
+        Generar las miniaturas del archivo (imágenes y primera página de PDFs).
+        
+        Se ejecuta en segundo plano al subir el archivo (ver core/miniaturas.py);
+        llamarlo directamente genera todos los tamaños en el momento.
+        """
+        from .miniaturas import generar
         try:
-            from PIL import Image
-            import os
-            from django.conf import settings
-            
-            # Solo generar thumbnail para imágenes
-            if not self.es_imagen():
-                return
-            
-            # Abrir la imagen
-            img = Image.open(self.archivo.path)
-            
-            # Convertir a RGB si es necesario
-            if img.mode in ('RGBA', 'LA', 'P'):
-                img = img.convert('RGB')
-            
-            # Redimensionar manteniendo proporción
-            img.thumbnail((200, 200), Image.Resampling.LANCZOS)
-            
-            # Crear nombre para el thumbnail
-            nombre_base = os.path.splitext(os.path.basename(self.archivo.name))[0]
-            extension = 'jpg'
-            nombre_thumbnail = f"{nombre_base}_thumb.{extension}"
-            
-            # Ruta completa para el thumbnail
-            ruta_thumbnail = os.path.join('proyectos/thumbnails/', nombre_thumbnail)
-            ruta_completa = os.path.join(settings.MEDIA_ROOT, ruta_thumbnail)
-            
-            # Crear directorio si no existe
-            os.makedirs(os.path.dirname(ruta_completa), exist_ok=True)
-            
-            # Guardar thumbnail
-            img.save(ruta_completa, 'JPEG', quality=85, optimize=True)
-            
-            # Actualizar campo thumbnail
-            self.thumbnail = ruta_thumbnail
-            self.save(update_fields=['thumbnail'])
-            
+            return generar(self)
         except Exception as e:
             print(f"Error generando thumbnail para {self.nombre}: {e}")
-            pass
+            return False
+    
+    def tiene_vista_previa(self):
+        """True si se puede mostrar una miniatura del archivo"""
+        from .miniaturas import soporta
+        return soporta(self)
+    
+    def get_url_miniatura(self, tamano='cuadricula'):
+        """URL de la miniatura; la versión en la URL evita servir una imagen vieja del caché"""
+        from django.urls import reverse
+        from .miniaturas import version
+        return f"{reverse('archivo_miniatura', args=[self.pk, tamano])}?v={version(self)}"
+    
+    def get_url_miniatura_lista(self):
+        return self.get_url_miniatura('lista')
+    
+    def get_url_vista_previa(self):
+        return self.get_url_miniatura('vista_previa')
 
 
 class CarpetaProyecto(models.Model):
@@ -1204,6 +1306,7 @@ class CarpetaProyecto(models.Model):
     fecha_creacion = models.DateTimeField(auto_now_add=True)
     creada_por = models.ForeignKey(User, on_delete=models.CASCADE, related_name='carpetas_creadas')
     activa = models.BooleanField(default=True)
+    tamano_bytes = models.BigIntegerField(default=0, help_text="Tamaño de los archivos activos de la carpeta y sus subcarpetas")
     
     class Meta:
         ordering = ['nombre']
@@ -1216,36 +1319,37 @@ class CarpetaProyecto(models.Model):
             return f"{self.carpeta_padre.nombre} / {self.nombre}"
         return f"{self.proyecto.nombre} / {self.nombre}"
     
+    def arbol(self):
+        """Árbol de carpetas del proyecto en memoria (ver core/carpetas.py), cargado una vez"""
+        if getattr(self, '_arbol', None) is None:
+            from .carpetas import ArbolCarpetas
+            ArbolCarpetas.de_proyecto(self.proyecto_id, carpeta=self)
+        return self._arbol
+    
+    def get_ancestros(self):
+        """Carpetas desde la raíz hasta el padre (para el breadcrumb)"""
+        return self.arbol().ancestros(self)
+    
     def get_ruta_completa(self):
         """Obtener la ruta completa de la carpeta"""
-        ruta = [self.nombre]
-        carpeta_actual = self.carpeta_padre
-        
-        while carpeta_actual:
-            ruta.insert(0, carpeta_actual.nombre)
-            carpeta_actual = carpeta_actual.carpeta_padre
-        
-        return " / ".join(ruta)
+        return " / ".join([carpeta.nombre for carpeta in self.get_ancestros()] + [self.nombre])
     
     def get_nivel(self):
         """Obtener el nivel de profundidad de la carpeta"""
-        nivel = 0
-        carpeta_actual = self.carpeta_padre
-        
-        while carpeta_actual:
-            nivel += 1
-            carpeta_actual = carpeta_actual.carpeta_padre
-        
-        return nivel
+        return len(self.get_ancestros())
     
     def get_total_archivos(self):
         """Obtener el total de archivos en esta carpeta y subcarpetas"""
-        total = self.archivos.count()
-        
-        for subcarpeta in self.subcarpetas.filter(activa=True):
-            total += subcarpeta.get_total_archivos()
-        
-        return total
+        return self.arbol().total_archivos(self)
+    
+    def get_total_subcarpetas(self):
+        """Cantidad de subcarpetas activas directas"""
+        return len(self.arbol().subcarpetas(self))
+    
+    def get_tamaño(self):
+        """Tamaño acumulado de la carpeta en formato legible"""
+        from .archivos_meta import formato_tamano
+        return formato_tamano(self.tamano_bytes)
     
     def get_subcarpetas_activas(self):
         """Obtener subcarpetas activas"""
@@ -1257,7 +1361,8 @@ class CarpetaProyecto(models.Model):
     
     def puede_eliminarse(self):
         """Verificar si la carpeta puede ser eliminada"""
-        return self.archivos.count() == 0 and self.subcarpetas.filter(activa=True).count() == 0
+        arbol = self.arbol()
+        return arbol.archivos_directos(self) == 0 and not arbol.subcarpetas(self)
 
 
 # MODELOS DE PRESUPUESTO ELIMINADOS - YA NO SE USAN
@@ -2004,7 +2109,7 @@ class PlanillaTrabajadoresDiarios(models.Model):
         return self.total_a_pagar - self.total_anticipos
 
 
-class PlanillaLiquidada(models.Model):
+class PlanillaLiquidada(FinanzasProyectoMixin, models.Model):
     """Modelo para registrar planillas de personal liquidadas por mes"""
     
     MESES_CHOICES = [
@@ -2036,6 +2141,11 @@ class PlanillaLiquidada(models.Model):
         ordering = ['-año', '-mes', '-quincena', '-fecha_liquidacion']
         unique_together = ['proyecto', 'mes', 'año', 'quincena']
     
+    CAMPOS_PERIODO_FINANZAS = ('mes', 'año')
+    
+    def periodo_finanzas(self):
+        return date(self.año, self.mes, 1) if self.año and self.mes else None
+    
     def __str__(self):
         mes_nombre = dict(self.MESES_CHOICES).get(self.mes, '')
         quincena_nombre = dict(self.QUINCENA_CHOICES).get(self.quincena, '')
@@ -2117,7 +2227,7 @@ class BonoColaboradorProyecto(models.Model):
         return f"{self.colaborador.nombre} - {self.proyecto.nombre}: ${self.bono_individual}"
 
 
-class IngresoProyecto(models.Model):
+class IngresoProyecto(FinanzasProyectoMixin, models.Model):
     """Modelo para registrar ingresos por proyecto basados en facturas"""
     
     TIPO_INGRESO_CHOICES = [
@@ -2198,10 +2308,66 @@ class IngresoProyecto(models.Model):
         
         super().save(*args, **kwargs)
     
+    CAMPOS_PERIODO_FINANZAS = ('fecha_emision',)
+    
+    def periodo_finanzas(self):
+        from .finanzas import periodo_de
+        return periodo_de(self.fecha_emision)
+    
     def __str__(self):
         return f"Ingreso {self.numero_documento} - {self.proyecto.nombre} - ${self.monto_total}"
 
 
+class ProyectoFinanzas(models.Model):
+    """
+    Resumen financiero materializado por proyecto y mes.
+
+    Se mantiene al guardar o eliminar facturas, anticipos, gastos, ingresos y
+    planillas liquidadas (ver FinanzasProyectoMixin). Los cambios hechos con
+    ``queryset.update()`` no emiten señales: el worker concilia el libro a diario
+    y puede reconstruirse con ``python manage.py reconstruir_finanzas_proyectos``.
+    """
+    
+    proyecto = models.ForeignKey(Proyecto, on_delete=models.CASCADE, related_name='finanzas')
+    periodo = models.DateField(help_text="Primer día del mes")
+    
+    # Facturas (por fecha de emisión)
+    facturas_cantidad = models.PositiveIntegerField(default=0)
+    facturas_pagadas_cantidad = models.PositiveIntegerField(default=0)
+    facturado = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    facturas_pagadas = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    facturas_monto_pagado = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    
+    # Anticipos (por fecha de aplicación o de recepción)
+    anticipos_cantidad = models.PositiveIntegerField(default=0)
+    anticipos_monto = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    anticipos_aplicados = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    anticipos_disponibles = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    anticipos_aplicados_proyecto = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    
+    # Gastos (por fecha del gasto)
+    gastos_cantidad = models.PositiveIntegerField(default=0)
+    gastos_aprobados_cantidad = models.PositiveIntegerField(default=0)
+    gastos_aprobados = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    gastos_pendientes = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    
+    # Ingresos registrados y nómina liquidada
+    ingresos_registrados = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    planillas_personal = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    planillas_trabajadores_diarios = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    
+    actualizado_en = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = 'Finanzas de Proyecto'
+        verbose_name_plural = 'Finanzas de Proyectos'
+        ordering = ['proyecto', 'periodo']
+        unique_together = ['proyecto', 'periodo']
+    
+    def __str__(self):
+        return f"Finanzas {self.proyecto_id} - {self.periodo:%Y-%m}"
+
+
 class Cotizacion(models.Model):
     """Modelo para cotizaciones de proyectos"""
     
@@ -2461,6 +2627,165 @@ class CajaMenuda(models.Model):
         return f"{self.folio} - ${self.monto} ({self.fecha})"
 
 
+class TransaccionFirebase(models.Model):
+    """
+    Copia local de la colección ``transactions`` de Firestore (caja menuda de técnicos).
+    
+    Se mantiene con una sincronización incremental (ver firebase_sync.sync_transacciones_espejo)
+    para que las vistas filtren, ordenen y paginen en SQL en lugar de leer la colección completa.
+    """
+    firebase_id = models.CharField(max_length=120, unique=True)
+    tipo = models.CharField(max_length=20, db_index=True, help_text="EXPENSE, DEPOSIT, ...")
+    origen = models.CharField(max_length=40, blank=True, help_text="Campo source de Firestore")
+    usuario_firebase_id = models.CharField(max_length=120, blank=True, db_index=True)
+    usuario_nombre = models.CharField(max_length=200, blank=True)
+    monto = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    timestamp_ms = models.BigIntegerField(default=0)
+    actualizado_ms = models.BigIntegerField(default=0, help_text="updatedAt de Firestore (o timestamp si no existe)")
+    fecha = models.DateTimeField(null=True, blank=True)
+    descripcion = models.TextField(blank=True)
+    numero_factura = models.CharField(max_length=100, blank=True)
+    tipo_gasto = models.CharField(max_length=50, blank=True)
+    periodo = models.CharField(max_length=7, blank=True)
+    datos = models.JSONField(default=dict, blank=True, help_text="Documento original de Firestore")
+    sincronizado_en = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = 'Transacción Firebase'
+        verbose_name_plural = 'Transacciones Firebase'
+        ordering = ['-timestamp_ms']
+        indexes = [
+            models.Index(fields=['tipo', 'timestamp_ms'], name='core_transa_tipo_3f1c2a_idx'),
+            models.Index(fields=['usuario_nombre', 'timestamp_ms'], name='core_transa_usuario_8b4d1e_idx'),
+            models.Index(fields=['usuario_firebase_id', 'timestamp_ms'], name='core_transa_usuario_c52e7f_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.tipo} {self.usuario_nombre} - ${self.monto}"
+    
+    def como_gasto(self):
+        """Diccionario con la forma del documento de Firestore que usan las plantillas"""
+        data = dict(self.datos or {})
+        data["id"] = self.firebase_id
+        data["timestamp_dt"] = timezone.localtime(self.fecha) if self.fecha else None
+        return data
+
+
+class SincronizacionFirebase(models.Model):
+    """Estado de la sincronización incremental de una colección de Firestore"""
+    coleccion = models.CharField(max_length=100, unique=True)
+    ultimo_timestamp_ms = models.BigIntegerField(default=0)
+    ultimo_actualizado_ms = models.BigIntegerField(default=0)
+    ultima_sincronizacion = models.DateTimeField(null=True, blank=True)
+    ultima_sincronizacion_completa = models.DateTimeField(null=True, blank=True)
+    documentos_sincronizados = models.PositiveIntegerField(default=0)
+    error = models.TextField(blank=True)
+    
+    class Meta:
+        verbose_name = 'Sincronización Firebase'
+        verbose_name_plural = 'Sincronizaciones Firebase'
+    
+    def __str__(self):
+        return f"{self.coleccion} - {self.ultima_sincronizacion}"
+
+
+class TrabajoSegundoPlano(models.Model):
+    """
+    Trabajo pesado (PDF, ZIP, exportación) que se procesa fuera de la petición web.
+    
+    La vista lo encola (ver core/trabajos.py), un worker lanzado con
+    ``manage.py procesar_trabajos`` lo ejecuta y deja el archivo resultante en
+    MEDIA hasta ``expira_en``. ``clave`` identifica peticiones idénticas para no
+    generar dos veces el mismo archivo.
+    """
+    ESTADO_CHOICES = [
+        ('pendiente', 'Pendiente'),
+        ('en_proceso', 'En proceso'),
+        ('completado', 'Completado'),
+        ('error', 'Error'),
+        ('expirado', 'Expirado'),
+    ]
+    
+    tipo = models.CharField(max_length=60, db_index=True)
+    descripcion = models.CharField(max_length=255, blank=True)
+    parametros = models.JSONField(default=dict, blank=True, help_text="Vista, ruta y parámetros de la petición original")
+    clave = models.CharField(max_length=64, db_index=True, help_text="Hash de la petición para deduplicar")
+    estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default='pendiente')
+    progreso = models.PositiveSmallIntegerField(default=0)
+    mensaje = models.CharField(max_length=255, blank=True)
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, related_name='trabajos_segundo_plano')
+    archivo = models.FileField(upload_to='trabajos/%Y/%m/', blank=True)
+    nombre_archivo = models.CharField(max_length=255, blank=True)
+    content_type = models.CharField(max_length=100, blank=True)
+    intentos = models.PositiveSmallIntegerField(default=0)
+    worker = models.CharField(max_length=100, blank=True)
+    error = models.TextField(blank=True)
+    creado_en = models.DateTimeField(auto_now_add=True)
+    iniciado_en = models.DateTimeField(null=True, blank=True)
+    latido_en = models.DateTimeField(null=True, blank=True, help_text="Última señal de vida del worker que lo ejecuta")
+    finalizado_en = models.DateTimeField(null=True, blank=True)
+    expira_en = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        verbose_name = 'Trabajo en segundo plano'
+        verbose_name_plural = 'Trabajos en segundo plano'
+        ordering = ['-creado_en']
+        indexes = [
+            models.Index(fields=['estado', 'creado_en'], name='core_trabaj_estado_5d2e81_idx'),
+        ]
+    
+    def __str__(self):
+        return f"{self.tipo} #{self.pk} ({self.estado})"
+    
+    @property
+    def activo(self):
+        return self.estado in ('pendiente', 'en_proceso')
+    
+    @property
+    def disponible(self):
+        """True si el archivo resultante todavía se puede descargar"""
+        return (
+            self.estado == 'completado' and bool(self.archivo)
+            and (self.expira_en is None or self.expira_en > timezone.now())
+        )
+
+
+class SubidaFragmentada(models.Model):
+    """
+    Subida de un archivo en fragmentos que se puede reanudar (ver core/subidas.py).
+    
+    Los fragmentos se guardan en disco; el registro solo describe el archivo
+    esperado. ``token`` identifica la subida en la API y en el campo oculto
+    del formulario que finalmente recibe el archivo.
+    """
+    ESTADO_CHOICES = [
+        ('recibiendo', 'Recibiendo fragmentos'),
+        ('ensamblando', 'Uniendo fragmentos'),
+        ('completada', 'Completada'),
+    ]
+    
+    token = models.CharField(max_length=64, unique=True)
+    usuario = models.ForeignKey(User, on_delete=models.CASCADE, related_name='subidas_fragmentadas')
+    nombre_archivo = models.CharField(max_length=255)
+    tamano_total = models.BigIntegerField(help_text="Tamaño del archivo en bytes")
+    tamano_fragmento = models.PositiveIntegerField()
+    total_fragmentos = models.PositiveIntegerField()
+    sha256_esperado = models.CharField(max_length=64, blank=True, help_text="SHA-256 enviado por el cliente (opcional)")
+    sha256 = models.CharField(max_length=64, blank=True, help_text="SHA-256 del archivo unido")
+    estado = models.CharField(max_length=20, choices=ESTADO_CHOICES, default='recibiendo')
+    creado_en = models.DateTimeField(auto_now_add=True)
+    actualizado_en = models.DateTimeField(auto_now=True, db_index=True)
+    completada_en = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        verbose_name = 'Subida fragmentada'
+        verbose_name_plural = 'Subidas fragmentadas'
+        ordering = ['-creado_en']
+    
+    def __str__(self):
+        return f"{self.nombre_archivo} ({self.estado})"
+
+
 # ===== MODELO PARA PLANIFICACIONES DE BITÁCORA =====
 
 class PlanificacionBitacora(models.Model):
@@ -3135,3 +3460,32 @@ class PagoServicioTorrero(models.Model):
         self.servicio.save()
 
 
+
+
+class IndiceBusqueda(models.Model):
+    """
+    Documento del buscador de texto completo (ver core/search.py).
+    
+    Una fila por factura, gasto, proyecto, planilla liquidada, colaborador o
+    trabajador diario. ``claves`` y ``contenido`` guardan el texto normalizado
+    (minúsculas, sin acentos) que indexa FTS5 en SQLite o el tsvector con
+    índice GIN en PostgreSQL; ``titulo`` y ``subtitulo`` solo se muestran.
+    """
+    modulo = models.CharField(max_length=30)
+    objeto_id = models.BigIntegerField()
+    titulo = models.CharField(max_length=255)
+    subtitulo = models.CharField(max_length=255, blank=True)
+    claves = models.TextField(blank=True, help_text="Números, códigos y nombres (mayor peso)")
+    contenido = models.TextField(blank=True, help_text="Descripciones y observaciones")
+    fecha = models.DateField(null=True, blank=True)
+    actualizado_en = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        verbose_name = 'Índice de búsqueda'
+        verbose_name_plural = 'Índice de búsqueda'
+        constraints = [
+            models.UniqueConstraint(fields=['modulo', 'objeto_id'], name='core_indice_modulo_objeto_uniq'),
+        ]
+    
+    def __str__(self):
+        return f"{self.modulo} {self.objeto_id}: {self.titulo}"
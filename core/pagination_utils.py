@@ -3,10 +3,14 @@
 Utilidades de paginación para listas largas
 """
 
+from django.core.exceptions import FieldDoesNotExist, ValidationError
 from django.core.paginator import Paginator, EmptyPage, PageNotAnInteger
+from django.db.models import Q
 from django.http import JsonResponse
 from django.template.loader import render_to_string
 from typing import Any, Dict, List, Optional
+import base64
+import json
 import math
 
 class CustomPaginator:
@@ -283,3 +287,64 @@ class PaginationMixin:
     def get_pagination_context(self, page_obj, paginator):
         """Obtiene el contexto de paginación"""
         return get_pagination_context(page_obj, paginator, self.request)
+
+
+def codificar_cursor(valores):
+    """Codifica los valores de la última fila de una página como cursor opaco para la URL"""
+    texto = json.dumps([str(valor) for valor in valores])
+    return base64.urlsafe_b64encode(texto.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decodificar_cursor(cursor, queryset, campos):
+    """
+    Valores del cursor convertidos al tipo de cada campo, o None si no es válido
+
+    Los campos pueden llevar '-' (orden descendente) como en order_by().
+    """
+    if not cursor:
+        return None
+    try:
+        relleno = '=' * (-len(cursor) % 4)
+        valores = json.loads(base64.urlsafe_b64decode(cursor + relleno).decode('utf-8'))
+        if not isinstance(valores, list) or len(valores) != len(campos):
+            return None
+        opciones = queryset.model._meta
+        return [
+            opciones.get_field(campo.lstrip('-')).to_python(valor)
+            for campo, valor in zip(campos, valores)
+        ]
+    except (ValueError, TypeError, UnicodeDecodeError, ValidationError, FieldDoesNotExist):
+        return None
+
+
+def paginar_por_cursor(queryset, cursor=None, por_pagina=50, campos=('-fecha_emision', '-id')):
+    """
+    Paginación por cursor (keyset / seek) sobre un orden total
+
+    En lugar de OFFSET filtra las filas posteriores a la última fila de la
+    página anterior, por lo que cada página cuesta lo mismo sin importar qué
+    tan lejos esté. ``campos`` debe terminar en una columna única (id).
+
+    Returns:
+        Tupla (objetos, siguiente_cursor) con siguiente_cursor None en la última página
+    """
+    queryset = queryset.order_by(*campos)
+    valores = decodificar_cursor(cursor, queryset, campos)
+    if valores is not None:
+        # (a, b) "después de" (va, vb)  ==  a > va  OR  (a = va AND b > vb), por cada nivel
+        condicion = Q()
+        iguales = {}
+        for campo, valor in zip(campos, valores):
+            nombre = campo.lstrip('-')
+            operador = 'lt' if campo.startswith('-') else 'gt'
+            condicion |= Q(**iguales, **{f"{nombre}__{operador}": valor})
+            iguales[nombre] = valor
+        queryset = queryset.filter(condicion)
+
+    objetos = list(queryset[:por_pagina + 1])
+    siguiente = None
+    if len(objetos) > por_pagina:
+        objetos = objetos[:por_pagina]
+        ultimo = objetos[-1]
+        siguiente = codificar_cursor([getattr(ultimo, campo.lstrip('-')) for campo in campos])
+    return objetos, siguiente
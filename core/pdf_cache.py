@@ -0,0 +1,133 @@
+"""
+Caché de PDFs renderizados del Telecom Technology
+Los documentos cerrados (planillas liquidadas, cotizaciones) se renderizan una
+vez y se guardan en MEDIA/pdf_cache/<modelo>/<pk>/<versión>.pdf. La versión es
+una huella de los datos que entran en el PDF, de modo que cualquier cambio
+produce otro archivo; las descargas repetidas solo leen el archivo y el ETag
+permite al navegador reutilizar su copia (304).
+"""
+
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.db.models.signals import post_delete, post_save
+from django.http import FileResponse, HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+
+logger = logging.getLogger(__name__)
+
+DIRECTORIO = 'pdf_cache'
+
+# Subir al cambiar el diseño de los PDFs cacheados para que se vuelvan a renderizar
+VERSION_PLANTILLAS = 1
+
+
+def huella(*partes):
+    """Versión de un documento a partir de los valores que usa su PDF"""
+    texto = '\x1f'.join(str(parte) for parte in (VERSION_PLANTILLAS,) + partes)
+    return hashlib.sha256(texto.encode('utf-8')).hexdigest()[:32]
+
+
+def _directorio(modelo, pk):
+    return os.path.join(settings.MEDIA_ROOT, DIRECTORIO, modelo, str(pk))
+
+
+def _ruta(modelo, pk, version):
+    return os.path.join(_directorio(modelo, pk), f"{version}.pdf")
+
+
+def en_cache(modelo, pk, version):
+    """True si ya existe el PDF de esa versión"""
+    return os.path.exists(_ruta(modelo, pk, version))
+
+
+def guardar(modelo, pk, version, pdf_bytes):
+    """Guarda el PDF de forma atómica y elimina las versiones anteriores del documento"""
+    directorio = _directorio(modelo, pk)
+    os.makedirs(directorio, exist_ok=True)
+    ruta = _ruta(modelo, pk, version)
+    descriptor, temporal = tempfile.mkstemp(dir=directorio, suffix='.tmp')
+    try:
+        with os.fdopen(descriptor, 'wb') as archivo:
+            archivo.write(pdf_bytes)
+        os.replace(temporal, ruta)
+    except OSError:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        raise
+    for nombre in os.listdir(directorio):
+        if nombre != os.path.basename(ruta) and nombre.endswith('.pdf'):
+            try:
+                os.remove(os.path.join(directorio, nombre))
+            except OSError:
+                pass
+    return ruta
+
+
+def invalidar(modelo, pk):
+    """Elimina todos los PDFs guardados de un documento"""
+    shutil.rmtree(_directorio(modelo, pk), ignore_errors=True)
+
+
+def respuesta_pdf(request, modelo, pk, version, generar, filename, inline=False):
+    """
+    Respuesta con el PDF de la versión indicada, renderizándolo solo si falta.
+
+    ``generar()`` retorna los bytes del PDF. Si el navegador envía el ETag de
+    la misma versión se responde 304 sin leer el archivo.
+    """
+    etag = f'"{version}"'
+    no_modificado = get_conditional_response(request, etag=etag)
+    if no_modificado is not None:
+        return no_modificado
+
+    ruta = _ruta(modelo, pk, version)
+    if not os.path.exists(ruta):
+        pdf_bytes = generar()
+        try:
+            ruta = guardar(modelo, pk, version, pdf_bytes)
+        except OSError as e:
+            # Sin caché (disco de solo lectura, permisos): se entrega lo renderizado
+            logger.warning(f"No se pudo guardar el PDF de {modelo} {pk} en caché: {e}")
+            response = HttpResponse(pdf_bytes, content_type='application/pdf')
+            response['Content-Disposition'] = f'{"inline" if inline else "attachment"}; filename="{filename}"'
+            return response
+
+    response = FileResponse(
+        open(ruta, 'rb'), content_type='application/pdf', as_attachment=not inline, filename=filename
+    )
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+# Modelos cuyos PDFs se guardan y nombre de su directorio
+MODELOS_CACHEADOS = {
+    'PlanillaLiquidada': 'planilla_liquidada',
+    'Cotizacion': 'cotizacion',
+}
+
+
+def _invalidar_instancia(sender, instance, **kwargs):
+    invalidar(MODELOS_CACHEADOS[sender.__name__], instance.pk)
+
+
+def _invalidar_por_item(sender, instance, **kwargs):
+    invalidar('cotizacion', instance.cotizacion_id)
+
+
+def conectar_invalidacion_pdf():
+    """Borra los PDFs guardados cuando el documento (o un ítem de cotización) cambia"""
+    from django.apps import apps
+
+    for nombre in MODELOS_CACHEADOS:
+        modelo = apps.get_model('core', nombre)
+        post_save.connect(_invalidar_instancia, sender=modelo, dispatch_uid=f'pdf_cache_save_{nombre}')
+        post_delete.connect(_invalidar_instancia, sender=modelo, dispatch_uid=f'pdf_cache_delete_{nombre}')
+    item = apps.get_model('core', 'ItemCotizacion')
+    post_save.connect(_invalidar_por_item, sender=item, dispatch_uid='pdf_cache_save_ItemCotizacion')
+    post_delete.connect(_invalidar_por_item, sender=item, dispatch_uid='pdf_cache_delete_ItemCotizacion')
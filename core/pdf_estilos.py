@@ -0,0 +1,443 @@
+"""
+Estilos y plantillas compartidas de los PDF de la aplicación del Telecom Technology
+Los ParagraphStyle y TableStyle de los reportes se construyen una sola vez por
+proceso y se reutilizan en cada petición; las vistas solo arman el contenido.
+También incluye el encabezado con logo, el pie de documento y la numeración de
+páginas que comparten los reportes.
+"""
+
+import os
+from functools import lru_cache
+from io import BytesIO
+
+from django.conf import settings
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER, TA_RIGHT
+from reportlab.lib.pagesizes import A4
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.lib.units import inch
+from reportlab.platypus import Image, Paragraph, SimpleDocTemplate, Spacer, Table, TableStyle
+
+# Paleta de la empresa
+AZUL = colors.HexColor('#1e3a8a')
+AZUL_MEDIO = colors.HexColor('#3b82f6')
+AZUL_CLARO = colors.HexColor('#dbeafe')
+INDIGO = colors.HexColor('#6366f1')
+GRIS_BORDE = colors.HexColor('#d1d5db')
+GRIS_TENUE = colors.HexColor('#e5e7eb')
+GRIS_TEXTO = colors.HexColor('#6b7280')
+FILA_ALTERNA = colors.HexColor('#f8f9fa')
+VERDE = colors.HexColor('#10b981')
+AMBAR = colors.HexColor('#f59e0b')
+ROJO = colors.HexColor('#dc2626')
+
+RUC_EMPRESA = '155668382-2-2018'
+NOMBRE_LEGAL = 'Technology Panama INC.'
+
+
+def _estilos_parrafo(base):
+    """Estilos propios de los reportes, derivados de getSampleStyleSheet()"""
+    return [
+        # Títulos
+        ParagraphStyle('TituloReporte', parent=base['Heading1'], fontSize=18, spaceAfter=20,
+                       alignment=TA_CENTER, textColor=AZUL),
+        ParagraphStyle('TituloClasico', parent=base['Heading1'], fontSize=18, spaceAfter=30,
+                       alignment=TA_CENTER, textColor=colors.darkblue),
+        ParagraphStyle('SubtituloClasico', parent=base['Heading2'], fontSize=14, spaceAfter=20,
+                       alignment=TA_CENTER, textColor=colors.darkblue),
+        ParagraphStyle('TituloProyecto', parent=base['Heading1'], fontSize=24, spaceAfter=10,
+                       alignment=TA_CENTER, textColor=AZUL, fontName='Helvetica-Bold', leading=28),
+        ParagraphStyle('TituloProyectoChico', parent=base['Heading1'], fontSize=20, spaceAfter=10,
+                       alignment=TA_CENTER, textColor=AZUL, fontName='Helvetica-Bold', leading=24),
+        ParagraphStyle('TituloDocumento', parent=base['Heading1'], fontSize=32, spaceAfter=15,
+                       alignment=TA_CENTER, textColor=colors.black, fontName='Helvetica-Bold', leading=36),
+        ParagraphStyle('SubtituloDestacado', parent=base['Normal'], fontSize=14, spaceAfter=20,
+                       alignment=TA_CENTER, textColor=AZUL_MEDIO, fontName='Helvetica-Bold'),
+        ParagraphStyle('SubtituloGris', parent=base['Normal'], fontSize=12, spaceAfter=15,
+                       textColor=colors.HexColor('#374151'), fontName='Helvetica'),
+        # Secciones
+        ParagraphStyle('Seccion', parent=base['Normal'], fontSize=12, spaceAfter=10,
+                       textColor=AZUL, fontName='Helvetica-Bold'),
+        ParagraphStyle('SeccionChica', parent=base['Normal'], fontSize=11, spaceAfter=8,
+                       textColor=AZUL, fontName='Helvetica-Bold'),
+        ParagraphStyle('SeccionResaltada', parent=base['Heading2'], fontSize=16,
+                       textColor=colors.HexColor('#0f172a'), spaceAfter=12, spaceBefore=20,
+                       fontName='Helvetica-Bold', borderWidth=0, borderPadding=0,
+                       backColor=colors.HexColor('#f1f5f9'), leftIndent=10, rightIndent=10),
+        ParagraphStyle('SeccionNegrita', parent=base['Normal'], fontSize=11,
+                       fontName='Helvetica-Bold', spaceAfter=5),
+        # Texto
+        ParagraphStyle('NormalEspaciado', parent=base['Normal'], fontSize=10, spaceAfter=12),
+        ParagraphStyle('Resumen', parent=base['Normal'], fontSize=11, spaceAfter=15),
+        ParagraphStyle('TotalDerecha', parent=base['Normal'], fontSize=11, alignment=TA_RIGHT,
+                       textColor=AZUL, fontName='Helvetica-Bold'),
+        ParagraphStyle('FechaCentrada', parent=base['Normal'], fontSize=10, alignment=TA_CENTER,
+                       textColor=colors.black, spaceAfter=20),
+        ParagraphStyle('TextoNegrita', parent=base['Normal'], fontSize=12,
+                       fontName='Helvetica-Bold', spaceAfter=15),
+        ParagraphStyle('TextoChico', parent=base['Normal'], fontSize=9, spaceAfter=15),
+        ParagraphStyle('BarraTitulo', fontSize=12, textColor=colors.white, alignment=TA_CENTER,
+                       fontName='Helvetica-Bold'),
+        # Encabezado (columna derecha junto al logo)
+        ParagraphStyle('EncabezadoDerecha', parent=base['Normal'], fontSize=12, alignment=TA_RIGHT),
+        ParagraphStyle('EncabezadoDerechaChico', parent=base['Normal'], fontSize=10, alignment=TA_RIGHT),
+        # Valores destacados dentro de tablas
+        ParagraphStyle('ValorVerde', parent=base['Normal'], textColor=VERDE, fontName='Helvetica-Bold'),
+        ParagraphStyle('ValorAmbar', parent=base['Normal'], textColor=AMBAR, fontName='Helvetica-Bold'),
+        ParagraphStyle('ValorAzul', parent=base['Normal'], textColor=colors.HexColor('#1e40af'),
+                       fontName='Helvetica-Bold'),
+        ParagraphStyle('ValorRojo', parent=base['Normal'], textColor=ROJO, fontName='Helvetica-Bold'),
+        # Pies
+        ParagraphStyle('PieCentrado', parent=base['Normal'], fontSize=8, alignment=TA_CENTER,
+                       textColor=GRIS_TEXTO),
+        ParagraphStyle('PieDiminuto', parent=base['Normal'], fontSize=7, alignment=TA_CENTER,
+                       textColor=colors.HexColor('#9ca3af')),
+        ParagraphStyle('PieEmpresa', parent=base['Normal'], fontSize=8, alignment=TA_CENTER,
+                       textColor=colors.HexColor('#6c757d')),
+        ParagraphStyle('PieGris', parent=base['Normal'], fontSize=9, textColor=colors.HexColor('#64748b'),
+                       alignment=TA_CENTER, leading=12),
+    ]
+
+
+@lru_cache(maxsize=1)
+def hoja_estilos():
+    """
+    getSampleStyleSheet() más los estilos de los reportes, construida una vez por proceso.
+
+    Es compartida: las vistas no deben modificar los estilos que obtienen de aquí.
+    """
+    hoja = getSampleStyleSheet()
+    for estilo in _estilos_parrafo(hoja):
+        hoja.add(estilo)
+    return hoja
+
+
+def estilo(nombre):
+    """ParagraphStyle registrado por nombre ('Normal', 'TituloReporte', ...)"""
+    return hoja_estilos()[nombre]
+
+
+# ===== PLANTILLAS DE TABLA =====
+
+@lru_cache(maxsize=None)
+def tabla_listado(columnas_monto=()):
+    """Listado con encabezado azul, filas alternas y borde (gastos, reporte contable)"""
+    comandos = [
+        ('BACKGROUND', (0, 0), (-1, 0), AZUL),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+        ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), 9),
+        ('BOTTOMPADDING', (0, 0), (-1, 0), 10),
+        ('TOPPADDING', (0, 0), (-1, 0), 10),
+        ('BACKGROUND', (0, 1), (-1, -1), colors.white),
+        ('FONTSIZE', (0, 1), (-1, -1), 8),
+        ('ALIGN', (0, 1), (-1, -1), 'LEFT'),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+        ('LEFTPADDING', (0, 1), (-1, -1), 6),
+        ('RIGHTPADDING', (0, 1), (-1, -1), 6),
+        ('TOPPADDING', (0, 1), (-1, -1), 6),
+        ('BOTTOMPADDING', (0, 1), (-1, -1), 6),
+        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, FILA_ALTERNA]),
+        ('GRID', (0, 0), (-1, -1), 0.5, GRIS_BORDE),
+        ('BOX', (0, 0), (-1, -1), 1.5, AZUL),
+    ]
+    comandos += [('ALIGN', (columna, 1), (columna, -1), 'RIGHT') for columna in columnas_monto]
+    return TableStyle(comandos)
+
+
+@lru_cache(maxsize=None)
+def tabla_clasica(tamano_encabezado=10, tamano_cuerpo=None, columnas_monto=(), fila_total=False,
+                  relleno_encabezado=None):
+    """Tabla con encabezado azul oscuro y cuadrícula negra (facturas, planillas de diarios)"""
+    comandos = [
+        ('BACKGROUND', (0, 0), (-1, 0), colors.darkblue),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), tamano_encabezado),
+        ('GRID', (0, 0), (-1, -1), 1, colors.black),
+        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ]
+    if relleno_encabezado:
+        comandos.append(('BOTTOMPADDING', (0, 0), (-1, 0), relleno_encabezado))
+    if tamano_cuerpo:
+        comandos.append(('FONTSIZE', (0, 1), (-1, -1), tamano_cuerpo))
+    comandos += [('ALIGN', (columna, 1), (columna, -1), 'RIGHT') for columna in columnas_monto]
+    if fila_total:
+        comandos += [
+            ('BACKGROUND', (0, -1), (-1, -1), colors.lightgrey),
+            ('TEXTCOLOR', (0, -1), (-1, -1), colors.black),
+            ('ALIGN', (0, -1), (-1, -1), 'CENTER'),
+            ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, -1), (-1, -1), tamano_encabezado),
+        ]
+    return TableStyle(comandos)
+
+
+@lru_cache(maxsize=None)
+def tabla_resumen(tamano_encabezado=11, fila_destacada=None, tamano_destacado=12, relleno=5):
+    """Concepto / monto con encabezado azul y, opcionalmente, una fila de total resaltada"""
+    comandos = [
+        ('BACKGROUND', (0, 0), (-1, 0), AZUL),
+        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+        ('FONTSIZE', (0, 0), (-1, 0), tamano_encabezado),
+        ('FONTSIZE', (0, 1), (-1, -1), 10),
+        ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+        ('GRID', (0, 0), (-1, -1), 1, AZUL),
+        ('TOPPADDING', (0, 0), (-1, -1), relleno),
+        ('BOTTOMPADDING', (0, 0), (-1, -1), relleno),
+    ]
+    if fila_destacada is not None:
+        comandos += [
+            ('FONTNAME', (0, fila_destacada), (-1, fila_destacada), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, fila_destacada), (-1, fila_destacada), tamano_destacado),
+            ('BACKGROUND', (0, fila_destacada), (-1, fila_destacada), AZUL_CLARO),
+        ]
+    return TableStyle(comandos)
+
+
+# Etiqueta / valor con cuadrícula tenue
+TABLA_FICHA = TableStyle([
+    ('FONTSIZE', (0, 0), (-1, -1), 10),
+    ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+    ('LEFTPADDING', (0, 0), (-1, -1), 5),
+    ('TOPPADDING', (0, 0), (-1, -1), 3),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 3),
+    ('GRID', (0, 0), (-1, -1), 1, GRIS_TENUE),
+])
+
+TABLA_FICHA_MONTOS = TableStyle([
+    ('FONTSIZE', (0, 0), (-1, -1), 10),
+    ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+    ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+    ('GRID', (0, 0), (-1, -1), 1, GRIS_TENUE),
+])
+
+# Bloque con una fila de título (período de una planilla)
+TABLA_PERIODO = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#e0e7ff')),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, -1), 10),
+    ('LEFTPADDING', (0, 0), (-1, -1), 10),
+    ('TOPPADDING', (0, 0), (-1, -1), 5),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 5),
+    ('GRID', (0, 0), (-1, -1), 1, GRIS_BORDE),
+])
+
+# Resumen con la columna de conceptos resaltada (reporte de facturas)
+TABLA_CONCEPTOS = TableStyle([
+    ('BACKGROUND', (0, 0), (0, -1), colors.lightblue),
+    ('TEXTCOLOR', (0, 0), (0, -1), colors.black),
+    ('ALIGN', (0, 0), (0, -1), 'LEFT'),
+    ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (0, -1), 10),
+    ('BOTTOMPADDING', (0, 0), (0, -1), 12),
+    ('BACKGROUND', (1, 0), (1, -1), colors.white),
+    ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
+    ('GRID', (0, 0), (-1, -1), 1, colors.black),
+])
+
+# Detalle secundario con encabezado gris (anticipos de un colaborador)
+TABLA_DETALLE_GRIS = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#f3f4f6')),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 9),
+    ('FONTSIZE', (0, 1), (-1, -1), 8),
+    ('ALIGN', (2, 0), (2, -1), 'RIGHT'),
+    ('GRID', (0, 0), (-1, -1), 1, GRIS_TENUE),
+    ('TOPPADDING', (0, 0), (-1, -1), 3),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 3),
+])
+
+# Fichas y detalles con acento índigo (servicios de torreros)
+TABLA_FICHA_INDIGO = TableStyle([
+    ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#f8fafc')),
+    ('TEXTCOLOR', (0, 0), (-1, -1), colors.HexColor('#1e293b')),
+    ('ALIGN', (0, 0), (0, -1), 'RIGHT'),
+    ('ALIGN', (1, 0), (1, -1), 'LEFT'),
+    ('FONTNAME', (0, 0), (-1, -1), 'Helvetica'),
+    ('FONTSIZE', (0, 0), (-1, -1), 10),
+    ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#e2e8f0')),
+    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ('TOPPADDING', (0, 0), (-1, -1), 10),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 10),
+    ('LEFTPADDING', (0, 0), (-1, -1), 12),
+    ('RIGHTPADDING', (0, 0), (-1, -1), 12),
+    ('BOX', (0, 0), (-1, -1), 1.5, INDIGO),
+])
+
+TABLA_RESUMEN_INDIGO = TableStyle([
+    ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#f3f4f6')),
+    ('TEXTCOLOR', (0, 0), (-1, -1), colors.HexColor('#1f2937')),
+    ('ALIGN', (0, 0), (0, -1), 'RIGHT'),
+    ('ALIGN', (1, 0), (1, -1), 'LEFT'),
+    ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, -1), 10),
+    ('GRID', (0, 0), (-1, -1), 0.5, GRIS_TENUE),
+    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ('TOPPADDING', (0, 0), (-1, -1), 10),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 10),
+    ('BOX', (0, 0), (-1, -1), 1.5, INDIGO),
+])
+
+TABLA_DETALLE_INDIGO = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), INDIGO),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 11),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('ALIGN', (1, 1), (1, -1), 'LEFT'),
+    ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+    ('FONTSIZE', (0, 1), (-1, -1), 10),
+    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ('TOPPADDING', (0, 0), (-1, 0), 10),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 10),
+    ('TOPPADDING', (0, 1), (-1, -1), 8),
+    ('BOTTOMPADDING', (0, 1), (-1, -1), 8),
+    ('LEFTPADDING', (0, 1), (-1, -1), 8),
+    ('RIGHTPADDING', (0, 1), (-1, -1), 8),
+    ('GRID', (0, 0), (-1, -1), 0.5, GRIS_TENUE),
+    ('BOX', (0, 0), (-1, -1), 1.5, INDIGO),
+    ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f8fafc')]),
+])
+
+TABLA_PAGOS = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), AMBAR),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 10),
+    ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
+    ('FONTSIZE', (0, 1), (-1, -1), 9),
+    ('GRID', (0, 0), (-1, -1), 0.5, GRIS_TENUE),
+    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ('TOPPADDING', (0, 0), (-1, -1), 6),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
+    ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f9fafb')]),
+])
+
+# Cotizaciones
+BARRA_AZUL = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#007bff')),
+    ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+    ('TOPPADDING', (0, 0), (-1, -1), 8),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+])
+
+TABLA_DATOS_CLIENTE = TableStyle([
+    ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+    ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, -1), 10),
+    ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
+    ('TOPPADDING', (0, 0), (-1, -1), 8),
+    ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
+])
+
+# Ítems con tres filas finales de subtotal, impuesto y total
+TABLA_ITEMS_COTIZACION = TableStyle([
+    ('BACKGROUND', (0, 0), (-1, 0), colors.black),
+    ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
+    ('ALIGN', (0, 0), (1, 0), 'CENTER'),
+    ('ALIGN', (2, 0), (-1, 0), 'RIGHT'),
+    ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+    ('FONTSIZE', (0, 0), (-1, 0), 11),
+    ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+    ('TOPPADDING', (0, 0), (-1, 0), 12),
+    ('BACKGROUND', (0, 1), (-1, -4), colors.white),
+    ('TEXTCOLOR', (0, 1), (-1, -4), colors.black),
+    ('FONTSIZE', (0, 1), (-1, -4), 10),
+    ('ALIGN', (0, 1), (0, -4), 'LEFT'),
+    ('ALIGN', (1, 1), (1, -4), 'CENTER'),
+    ('ALIGN', (2, 1), (-1, -4), 'RIGHT'),
+    ('GRID', (0, 0), (-1, -4), 0.5, colors.black),
+    ('ROWBACKGROUNDS', (0, 1), (-1, -4), [colors.white, FILA_ALTERNA]),
+    ('BACKGROUND', (2, -3), (-1, -2), colors.white),
+    ('FONTNAME', (2, -3), (-1, -2), 'Helvetica-Bold'),
+    ('FONTSIZE', (2, -3), (-1, -2), 10),
+    ('ALIGN', (2, -3), (-1, -2), 'RIGHT'),
+    ('GRID', (2, -3), (-1, -2), 0.5, colors.black),
+    ('BACKGROUND', (2, -1), (-1, -1), colors.black),
+    ('TEXTCOLOR', (2, -1), (-1, -1), colors.white),
+    ('FONTNAME', (2, -1), (-1, -1), 'Helvetica-Bold'),
+    ('FONTSIZE', (2, -1), (-1, -1), 14),
+    ('ALIGN', (2, -1), (-1, -1), 'RIGHT'),
+    ('BOTTOMPADDING', (2, -1), (-1, -1), 10),
+    ('TOPPADDING', (2, -1), (-1, -1), 10),
+])
+
+_ENCABEZADO = TableStyle([
+    ('ALIGN', (0, 0), (0, 0), 'LEFT'),
+    ('ALIGN', (1, 0), (1, 0), 'RIGHT'),
+    ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+])
+
+
+@lru_cache(maxsize=None)
+def linea(posicion='LINEBELOW', grosor=2, color='#6366f1'):
+    """Estilo de una tabla vacía usada como línea divisoria"""
+    return TableStyle([(posicion, (0, 0), (0, 0), grosor, colors.HexColor(color))])
+
+
+# ===== ENCABEZADO Y PIE =====
+
+@lru_cache(maxsize=1)
+def _ruta_logo():
+    ruta = os.path.join(settings.BASE_DIR, 'static', 'images', 'LOGO-TELECOM-small.png')
+    return ruta if os.path.exists(ruta) else None
+
+
+def logo_empresa(ancho=100, alto=50, estilo_alternativo='Normal'):
+    """Logo de la empresa, o su nombre en texto si el archivo no está disponible"""
+    ruta = _ruta_logo()
+    if ruta:
+        return Image(ruta, width=ancho, height=alto)
+    return Paragraph(f"<b>TELECOM</b><br/>{NOMBRE_LEGAL}", estilo(estilo_alternativo))
+
+
+def encabezado_con_logo(texto_derecha, anchos, estilo_texto='EncabezadoDerecha', logo=(100, 50)):
+    """Fila con el logo a la izquierda y el texto (HTML de reportlab) a la derecha"""
+    tabla = Table(
+        [[logo_empresa(*logo), Paragraph(texto_derecha, estilo(estilo_texto))]],
+        colWidths=anchos,
+    )
+    tabla.setStyle(_ENCABEZADO)
+    return tabla
+
+
+def pie_documento(texto, estilo_texto='PieCentrado', espacio=20):
+    """Elementos del pie al final del contenido"""
+    return [Spacer(1, espacio), Paragraph(texto, estilo(estilo_texto))]
+
+
+def numerar_paginas(canvas, doc):
+    """Dibuja 'Página N' en el margen inferior derecho de cada página"""
+    canvas.saveState()
+    canvas.setFont('Helvetica', 7)
+    canvas.setFillColor(GRIS_TEXTO)
+    canvas.drawRightString(doc.pagesize[0] - doc.rightMargin, 10, f"Página {doc.page}")
+    canvas.restoreState()
+
+
+def construir_pdf(elementos, pagesize=A4, numerar=False, **margenes):
+    """
+    Arma el documento con SimpleDocTemplate y retorna los bytes del PDF.
+    Con ``numerar`` se agrega 'Página N' al pie de cada página (ver numerar_paginas).
+    """
+    buffer = BytesIO()
+    doc = SimpleDocTemplate(buffer, pagesize=pagesize, **margenes)
+    if numerar:
+        doc.build(elementos, onFirstPage=numerar_paginas, onLaterPages=numerar_paginas)
+    else:
+        doc.build(elementos)
+    return buffer.getvalue()
+
+
+MARGEN_ESTRECHO = {
+    'leftMargin': 0.5 * inch,
+    'rightMargin': 0.5 * inch,
+    'topMargin': 0.5 * inch,
+    'bottomMargin': 0.5 * inch,
+}
@@ -0,0 +1,149 @@
+"""
+ZIP del reporte contable de egresos del Telecom Technology
+Reúne los comprobantes de gastos y los adjuntos de facturas de un período y
+los entrega como un ZIP en flujo, con un manifiesto (00_manifest.csv) que
+registra cada archivo incluido o faltante con su tamaño y su SHA-256.
+"""
+
+import csv
+import hashlib
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+
+from .models import ArchivoAdjunto, Factura, Gasto
+from .zip_stream import ZipEnFlujo, compresion_para
+
+logger = logging.getLogger(__name__)
+
+CAMPOS_MANIFIESTO = [
+    'archivo_zip', 'origen', 'registro_id', 'referencia', 'archivo_original',
+    'estado', 'tamano_bytes', 'sha256',
+]
+
+
+class _LectorConHash:
+    """Envuelve un archivo abierto y calcula su SHA-256 mientras se lee"""
+
+    def __init__(self, archivo):
+        self._archivo = archivo
+        self.hash = hashlib.sha256()
+
+    def read(self, tamano=-1):
+        datos = self._archivo.read(tamano)
+        self.hash.update(datos)
+        return datos
+
+
+def _revisar(entrada):
+    """Completa ruta, existencia y tamaño de una entrada (se ejecuta en paralelo)"""
+    try:
+        entrada['ruta'] = entrada.pop('storage').path(entrada['archivo_original'])
+        entrada['tamano_bytes'] = os.stat(entrada['ruta']).st_size
+        entrada['estado'] = 'pendiente'
+    except FileNotFoundError:
+        entrada['estado'] = 'faltante'
+    except (NotImplementedError, ValueError, OSError) as e:
+        entrada['estado'] = f'error: {e}'
+    return entrada
+
+
+def recolectar_adjuntos(gastos, fecha_inicio, fecha_fin, incluir_facturas):
+    """
+    Lista los archivos del reporte con dos consultas y los revisa en paralelo.
+
+    Retorna una lista de diccionarios (una fila del manifiesto por archivo) en
+    el orden en que van al ZIP: facturas y luego comprobantes de gastos.
+    """
+    storage_gasto = Gasto._meta.get_field('comprobante').storage
+    storage_adjunto = ArchivoAdjunto._meta.get_field('archivo').storage
+    entradas = []
+
+    if incluir_facturas:
+        # Adjuntos de las facturas de los proyectos de los gastos en el mismo período
+        Adjuntos = Factura.archivos_adjuntos.through
+        adjuntos = Adjuntos.objects.filter(
+            factura__proyecto_id__in=gastos.values('proyecto_id'),
+            factura__fecha_emision__gte=fecha_inicio,
+            factura__fecha_emision__lte=fecha_fin,
+        ).exclude(archivoadjunto__archivo='').order_by(
+            'factura__fecha_emision', 'factura_id', 'archivoadjunto_id'
+        ).values_list('factura_id', 'factura__numero_factura', 'archivoadjunto__archivo')
+        for factura_id, numero_factura, nombre in adjuntos:
+            numero = (numero_factura or str(factura_id)).replace('/', '_')
+            entradas.append({
+                'archivo_zip': f"02_facturas/factura_{numero}_{os.path.basename(nombre)}",
+                'origen': 'factura',
+                'registro_id': factura_id,
+                'referencia': numero_factura,
+                'archivo_original': nombre,
+                'storage': storage_adjunto,
+            })
+
+    comprobantes = gastos.exclude(comprobante='').exclude(comprobante__isnull=True).values_list(
+        'id', 'comprobante'
+    )
+    for gasto_id, nombre in comprobantes:
+        entradas.append({
+            'archivo_zip': f"03_comprobantes_gastos/comprobante_gasto_{gasto_id}_{os.path.basename(nombre)}",
+            'origen': 'gasto',
+            'registro_id': gasto_id,
+            'referencia': '',
+            'archivo_original': nombre,
+            'storage': storage_gasto,
+        })
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        entradas = list(pool.map(_revisar, entradas))
+
+    faltantes = sum(1 for entrada in entradas if entrada['estado'] != 'pendiente')
+    if faltantes:
+        logger.warning(f"Reporte contable {fecha_inicio} a {fecha_fin}: {faltantes} archivos no disponibles")
+    return entradas
+
+
+def _manifiesto_csv(entradas):
+    salida = StringIO()
+    escritor = csv.DictWriter(salida, fieldnames=CAMPOS_MANIFIESTO, extrasaction='ignore')
+    escritor.writeheader()
+    for entrada in entradas:
+        escritor.writerow({campo: entrada.get(campo, '') for campo in CAMPOS_MANIFIESTO})
+    # BOM para que Excel reconozca los acentos
+    return '\ufeff' + salida.getvalue()
+
+
+def generar_zip_contable(pdf_bytes, entradas):
+    """
+    Genera los bytes del ZIP contable por partes.
+
+    Cada archivo se copia desde el disco por bloques, de modo que la memoria no
+    depende del tamaño del período; los ya comprimidos (JPEG, PDF, ...) se
+    guardan sin volver a comprimir. El SHA-256 se calcula en la misma lectura y
+    el manifiesto se escribe al final, cuando ya se conocen todos.
+    """
+    zip_stream = ZipEnFlujo()
+    yield from zip_stream.agregar(
+        '01_reporte_gastos.pdf', pdf_bytes, compresion_para('01_reporte_gastos.pdf')
+    )
+
+    for entrada in entradas:
+        if entrada['estado'] != 'pendiente':
+            continue
+        entrada['archivo_zip'] = zip_stream.nombre_unico(entrada['archivo_zip'])
+        try:
+            with open(entrada['ruta'], 'rb') as archivo:
+                lector = _LectorConHash(archivo)
+                yield from zip_stream.agregar_archivo(
+                    entrada['archivo_zip'], lector, compresion_para(entrada['archivo_zip'])
+                )
+        except OSError as e:
+            # El archivo desapareció entre la revisión y la copia
+            logger.warning(f"No se pudo agregar {entrada['archivo_original']} al reporte contable: {e}")
+            entrada['estado'] = f'error: {e}'
+            continue
+        entrada['sha256'] = lector.hash.hexdigest()
+        entrada['estado'] = 'incluido'
+
+    yield from zip_stream.agregar('00_manifest.csv', _manifiesto_csv(entradas))
+    yield from zip_stream.cerrar()
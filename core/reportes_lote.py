@@ -0,0 +1,141 @@
+"""
+Exportación en lote de reportes PDF de Firebase del Telecom Technology
+Renderiza varios reportes con generar_pdf_reporte en un pool de procesos y los
+entrega como un ZIP en flujo a medida que terminan. El avance se guarda en la
+caché compartida para que el navegador lo consulte mientras descarga.
+"""
+
+import logging
+import multiprocessing
+import re
+import zipfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from django.conf import settings
+from django.core.cache import cache
+
+from .trabajos import reportar_progreso
+from .zip_stream import ZipEnFlujo
+
+logger = logging.getLogger(__name__)
+
+TOKEN_VALIDO = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+TIMEOUT_PROGRESO = 3600
+
+
+def _clave_progreso(token):
+    return f"reportes_lote:{token}"
+
+
+def actualizar_progreso(token, **campos):
+    """Guarda el avance de una exportación (no hace nada si no hay token válido)"""
+    if not token or not TOKEN_VALIDO.match(token):
+        return
+    progreso = cache.get(_clave_progreso(token)) or {}
+    progreso.update(campos)
+    cache.set(_clave_progreso(token), progreso, TIMEOUT_PROGRESO)
+
+
+def obtener_progreso(token):
+    """Avance de una exportación o None si el token no existe"""
+    if not token or not TOKEN_VALIDO.match(token):
+        return None
+    return cache.get(_clave_progreso(token))
+
+
+def _inicializar_proceso():
+    # Los procesos se crean con "spawn": no heredan conexiones ni hilos del worker web
+    import django
+
+    django.setup()
+
+
+def _renderizar(tipo, doc_id, data):
+    from .reportes_pdf import generar_pdf_reporte
+
+    pdf_bytes, error = generar_pdf_reporte(tipo, doc_id, data)
+    return doc_id, pdf_bytes, error
+
+
+def exportar_lote_zip(tipo, documentos, nombrar, total=None, token=None, procesos=None):
+    """
+    Generador de bytes de un ZIP con un PDF por documento.
+
+    ``documentos`` es un iterable de ``{"id", "data"}`` que se consume a medida
+    que hay cupo en el pool, ``nombrar(doc)`` retorna el nombre del PDF dentro
+    del ZIP y ``total`` (opcional) se informa en el progreso. Como máximo hay
+    ``2 * procesos`` reportes en curso, de modo que la memoria no depende del
+    tamaño del lote. Los reportes que fallan se listan en ``errores.txt``.
+    """
+    procesos = procesos or getattr(settings, 'REPORTES_LOTE_PROCESOS', 2)
+    zip_stream = ZipEnFlujo(compresion=zipfile.ZIP_STORED)
+    completados = 0
+    errores = []
+    nombres = {}
+    actualizar_progreso(token, estado='procesando', total=total, completados=0, errores=0)
+
+    def registrar(doc_id, pdf_bytes, error):
+        nonlocal completados
+        completados += 1
+        if error or not pdf_bytes:
+            errores.append(f"{doc_id}: {error or 'PDF vacío'}")
+            resultado = []
+        else:
+            nombre = zip_stream.nombre_unico(nombres.pop(doc_id, f'{doc_id}.pdf'))
+            resultado = zip_stream.agregar(nombre, pdf_bytes)
+        actualizar_progreso(token, completados=completados, errores=len(errores))
+        reportar_progreso(
+            completados * 100 // total if total else None,
+            f"PDFs generados: {completados}" + (f" de {total}" if total else ''),
+        )
+        return resultado
+
+    try:
+        if procesos <= 1:
+            for doc in documentos:
+                nombres[doc['id']] = nombrar(doc)
+                yield from registrar(*_renderizar(tipo, doc['id'], doc.get('data', {})))
+        else:
+            pool = ProcessPoolExecutor(
+                max_workers=procesos,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_inicializar_proceso,
+            )
+            try:
+                pendientes = set()
+                iterador = iter(documentos)
+                agotado = False
+                while pendientes or not agotado:
+                    while not agotado and len(pendientes) < procesos * 2:
+                        doc = next(iterador, None)
+                        if doc is None:
+                            agotado = True
+                            break
+                        nombres[doc['id']] = nombrar(doc)
+                        pendientes.add(pool.submit(_renderizar, tipo, doc['id'], doc.get('data', {})))
+                    if not pendientes:
+                        break
+                    listos, pendientes = wait(pendientes, return_when=FIRST_COMPLETED)
+                    for futuro in listos:
+                        try:
+                            resultado = futuro.result()
+                        except Exception as exc:
+                            logger.exception("Error renderizando PDF en lote")
+                            errores.append(f"(proceso): {exc}")
+                            completados += 1
+                            continue
+                        yield from registrar(*resultado)
+            finally:
+                pool.shutdown(wait=False, cancel_futures=True)
+
+        if errores:
+            yield from zip_stream.agregar('errores.txt', '\n'.join(errores) + '\n')
+        yield from zip_stream.cerrar()
+        actualizar_progreso(token, estado='completado', completados=completados, errores=len(errores))
+    except GeneratorExit:
+        actualizar_progreso(token, estado='cancelado')
+        raise
+    except Exception as exc:
+        logger.exception("Error en la exportación en lote de %s", tipo)
+        actualizar_progreso(token, estado='error', mensaje=str(exc))
+        raise
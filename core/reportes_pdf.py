@@ -48,6 +48,28 @@ REPORT_PDF_CONFIG = {
 }
 
 _MODULE_CACHE = {}
+_REPORTES_DIR = os.path.join(settings.BASE_DIR, "reportes")
+_IMAGE_CACHE_CONFIGURED = False
+
+
+def _configure_image_cache():
+    """Ubica las cachés de imágenes y plantillas de los generadores según settings (una vez por proceso)"""
+    global _IMAGE_CACHE_CONFIGURED
+    if _IMAGE_CACHE_CONFIGURED:
+        return
+    if _REPORTES_DIR not in sys.path:
+        sys.path.insert(0, _REPORTES_DIR)
+    import imagenes_reporte
+
+    imagenes_reporte.configurar_cache(
+        getattr(settings, "REPORTES_CACHE_IMAGENES_DIR", None),
+        getattr(settings, "REPORTES_CACHE_IMAGENES_MB", None),
+        getattr(settings, "REPORTES_CACHE_IMAGENES_REVALIDAR_HORAS", None),
+    )
+    imagenes_reporte.configurar_plantillas(
+        getattr(settings, "REPORTES_CACHE_PLANTILLAS_DIR", None),
+    )
+    _IMAGE_CACHE_CONFIGURED = True
 
 
 def _load_report_module(tipo, module_path):
@@ -77,6 +99,7 @@ def generar_pdf_reporte(tipo, doc_id, data):
         return None, "Tipo de reporte no soportado para PDF"
 
     try:
+        _configure_image_cache()
         module = _load_report_module(tipo, config["module_path"])
     except Exception as exc:
         logger.exception("Error cargando modulo PDF para %s", tipo)
@@ -92,7 +115,13 @@ def generar_pdf_reporte(tipo, doc_id, data):
 
     try:
         if tipo == "routers_nokia":
-            generator(doc_id, temp_path, data=data, debug_save_images=False)
+            generator(
+                doc_id,
+                temp_path,
+                data=data,
+                debug_save_images=False,
+                reducir_imagenes=getattr(settings, "REPORTES_ROUTERS_REDUCIR_IMAGENES", False),
+            )
         else:
             generator(doc_id, temp_path, data=data)
         with open(temp_path, "rb") as handle:
@@ -0,0 +1,628 @@
+"""
+Búsqueda de texto completo del Telecom Technology
+Mantiene la tabla IndiceBusqueda (un documento por factura, gasto, proyecto,
+planilla liquidada, colaborador o trabajador diario) y la consulta con el
+motor de la base de datos: FTS5 en SQLite y tsvector con índice GIN en
+PostgreSQL (ver migración 0072). Si ninguno está disponible se busca con
+icontains sobre la misma tabla, sin joins.
+
+Uso::
+
+    facturas = search.filtrar(Factura.objects.all(), 'factura', 'f-0012 acme')
+    resultados = search.buscar('acme', modulos=['factura', 'gasto'], limite=20)
+
+Las palabras se buscan por prefijo ('acm' encuentra 'acme'). Las que
+contienen dígitos (números de factura, códigos) también se buscan como
+subcadena de las claves, así '012' sigue encontrando 'F-0012'.
+
+Las señales conectadas por ``conectar_indexacion`` (desde CoreConfig.ready)
+actualizan el índice al confirmar la transacción. ``poblar_indice_vacio``
+(post_migrate) lo llena la primera vez y ``manage.py
+reconstruir_indice_busqueda`` lo reconstruye desde cero.
+"""
+
+import logging
+import re
+import unicodedata
+from functools import partial
+
+from django.apps import apps
+from django.db import connection, transaction
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.db.models.signals import m2m_changed, post_delete, post_migrate, post_save
+from django.urls import reverse
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+TABLA = 'core_indicebusqueda'
+TABLA_FTS = 'core_indicebusqueda_fts'
+
+# Términos de búsqueda que se consideran como máximo
+MAX_TERMINOS = 8
+
+# Documentos indexados por lote al reconstruir o reindexar dependientes
+TAMANO_LOTE = 500
+
+
+def normalizar(texto):
+    """Minúsculas, sin acentos y con espacios simples (así se guarda y se consulta)"""
+    texto = unicodedata.normalize('NFKD', str(texto or ''))
+    texto = ''.join(c for c in texto if not unicodedata.combining(c))
+    return ' '.join(texto.lower().split())
+
+
+def _unir(*partes):
+    return normalizar(' '.join(str(parte) for parte in partes if parte))
+
+
+def _variantes_numero(numero):
+    """Número tal cual y sin separadores, para que 'F-001' y 'F001' coincidan"""
+    if not numero:
+        return ''
+    return f"{numero} {re.sub(r'[^0-9A-Za-z]', '', numero)}"
+
+
+def _fecha(momento):
+    """Fecha local de un DateTimeField (None si no tiene)"""
+    if momento is None:
+        return None
+    if timezone.is_aware(momento):
+        momento = timezone.localtime(momento)
+    return momento.date()
+
+
+# ---------------------------------------------------------------------------
+# Documentos por módulo
+# ---------------------------------------------------------------------------
+
+def _documento_factura(factura):
+    proyecto = factura.proyecto
+    subproyecto = factura.subproyecto
+    return {
+        'titulo': f"Factura {factura.numero_factura}",
+        'subtitulo': f"{factura.cliente.razon_social} · {proyecto.nombre}",
+        'claves': _unir(
+            _variantes_numero(factura.numero_factura),
+            factura.cliente.razon_social, factura.cliente.codigo_fiscal,
+            proyecto.nombre, subproyecto and subproyecto.codigo,
+        ),
+        'contenido': _unir(
+            factura.descripcion_servicios, factura.observaciones,
+            subproyecto and subproyecto.nombre, factura.referencia_pago,
+        ),
+        'fecha': factura.fecha_emision,
+    }
+
+
+def _documento_gasto(gasto):
+    proyecto = gasto.proyecto
+    subproyecto = gasto.subproyecto
+    return {
+        'titulo': (gasto.descripcion or f"Gasto {gasto.pk}")[:255],
+        'subtitulo': ' · '.join(filter(None, [gasto.categoria.nombre, proyecto and proyecto.nombre])),
+        'claves': _unir(
+            proyecto and proyecto.nombre, subproyecto and subproyecto.codigo,
+            gasto.categoria.nombre,
+        ),
+        'contenido': _unir(
+            gasto.descripcion, gasto.observaciones,
+            proyecto and proyecto.cliente.razon_social, subproyecto and subproyecto.nombre,
+        ),
+        'fecha': gasto.fecha_gasto,
+    }
+
+
+def _documento_proyecto(proyecto):
+    subproyectos = list(proyecto.subproyectos.all())
+    return {
+        'titulo': proyecto.nombre,
+        'subtitulo': proyecto.cliente.razon_social,
+        'claves': _unir(
+            proyecto.nombre, proyecto.cliente.razon_social,
+            *[subproyecto.codigo for subproyecto in subproyectos],
+        ),
+        'contenido': _unir(
+            proyecto.descripcion, *[subproyecto.nombre for subproyecto in subproyectos],
+        ),
+        'fecha': proyecto.fecha_inicio,
+    }
+
+
+def _documento_planilla_liquidada(planilla):
+    periodo = f"{planilla.get_mes_display()} {planilla.año} Q{planilla.quincena}"
+    return {
+        'titulo': f"Planilla {periodo}",
+        'subtitulo': planilla.proyecto.nombre,
+        'claves': _unir(planilla.proyecto.nombre, periodo),
+        'contenido': _unir(planilla.observaciones, planilla.proyecto.cliente.razon_social),
+        'fecha': _fecha(planilla.fecha_liquidacion),
+    }
+
+
+def _documento_colaborador(colaborador):
+    return {
+        'titulo': colaborador.nombre,
+        'subtitulo': colaborador.email,
+        'claves': _unir(colaborador.nombre, colaborador.dpi),
+        'contenido': _unir(
+            colaborador.email, *[proyecto.nombre for proyecto in colaborador.proyectos.all()],
+        ),
+        'fecha': colaborador.fecha_contratacion,
+    }
+
+
+def _documento_trabajador_diario(trabajador):
+    return {
+        'titulo': trabajador.nombre,
+        'subtitulo': trabajador.proyecto.nombre,
+        'claves': _unir(trabajador.nombre),
+        'contenido': _unir(trabajador.proyecto.nombre),
+        'fecha': _fecha(trabajador.fecha_registro),
+    }
+
+
+# Cada entrada indica:
+#   modelo:     modelo de core que se indexa
+#   etiqueta:   nombre que ve el usuario en la búsqueda global
+#   permiso:    código de permiso necesario para verlo en la búsqueda global
+#   relaciones: select_related / prefetch_related al armar los documentos
+#   documento:  función que arma titulo, subtitulo, claves, contenido y fecha
+#   url:        función (objeto_id) -> URL del detalle
+DOCUMENTOS = {
+    'factura': {
+        'modelo': 'Factura',
+        'etiqueta': 'Factura',
+        'permiso': 'facturas.ver',
+        'relaciones': (('cliente', 'proyecto', 'subproyecto'), ()),
+        'documento': _documento_factura,
+        'url': lambda pk: reverse('factura_detail', args=[pk]),
+    },
+    'gasto': {
+        'modelo': 'Gasto',
+        'etiqueta': 'Gasto',
+        'permiso': 'gastos.ver',
+        'relaciones': (('proyecto__cliente', 'subproyecto', 'categoria'), ()),
+        'documento': _documento_gasto,
+        'url': lambda pk: reverse('egreso_detail', args=[pk]),
+    },
+    'proyecto': {
+        'modelo': 'Proyecto',
+        'etiqueta': 'Proyecto',
+        'permiso': 'proyectos.ver',
+        'relaciones': (('cliente',), ('subproyectos',)),
+        'documento': _documento_proyecto,
+        'url': lambda pk: reverse('proyecto_dashboard', args=[pk]),
+    },
+    'planilla_liquidada': {
+        'modelo': 'PlanillaLiquidada',
+        'etiqueta': 'Planilla liquidada',
+        'permiso': 'proyectos.ver',
+        'relaciones': (('proyecto__cliente',), ()),
+        'documento': _documento_planilla_liquidada,
+        'url': lambda pk: reverse('planilla_liquidada_pdf', args=[pk]),
+    },
+    'colaborador': {
+        'modelo': 'Colaborador',
+        'etiqueta': 'Colaborador',
+        'permiso': 'colaboradores.ver',
+        'relaciones': ((), ('proyectos',)),
+        'documento': _documento_colaborador,
+        'url': lambda pk: reverse('colaborador_detail', args=[pk]),
+    },
+    'trabajador_diario': {
+        'modelo': 'TrabajadorDiario',
+        'etiqueta': 'Trabajador diario',
+        'permiso': 'proyectos.ver',
+        'relaciones': (('proyecto',), ()),
+        'documento': _documento_trabajador_diario,
+        'url': lambda pk: reverse('trabajadores_diarios_dashboard'),
+    },
+}
+
+# Documentos que repiten datos de otro modelo y se reindexan cuando este cambia:
+#   modelo -> [(módulo, campo de filtro, atributo de la instancia que da el valor)]
+DEPENDENCIAS = {
+    'Cliente': [
+        ('factura', 'cliente_id', 'pk'),
+        ('proyecto', 'cliente_id', 'pk'),
+        ('gasto', 'proyecto__cliente_id', 'pk'),
+        ('planilla_liquidada', 'proyecto__cliente_id', 'pk'),
+    ],
+    'Proyecto': [
+        ('factura', 'proyecto_id', 'pk'),
+        ('gasto', 'proyecto_id', 'pk'),
+        ('planilla_liquidada', 'proyecto_id', 'pk'),
+        ('trabajador_diario', 'proyecto_id', 'pk'),
+        ('colaborador', 'proyectos__id', 'pk'),
+    ],
+    # Por proyecto y no por subproyecto: al eliminarlo las FK ya quedaron en NULL
+    'Subproyecto': [
+        ('proyecto', 'pk', 'proyecto_id'),
+        ('factura', 'proyecto_id', 'proyecto_id'),
+        ('gasto', 'proyecto_id', 'proyecto_id'),
+    ],
+    'CategoriaGasto': [
+        ('gasto', 'categoria_id', 'pk'),
+    ],
+}
+
+MODULO_POR_MODELO = {config['modelo']: modulo for modulo, config in DOCUMENTOS.items()}
+
+CAMPOS_DOCUMENTO = ('titulo', 'subtitulo', 'claves', 'contenido', 'fecha')
+
+
+def _modelo(modulo, modelos=None):
+    nombre = DOCUMENTOS[modulo]['modelo']
+    if modelos is not None:
+        return modelos[nombre]
+    return apps.get_model('core', nombre)
+
+
+def _indice(modelos=None):
+    if modelos is not None:
+        return modelos['IndiceBusqueda']
+    return apps.get_model('core', 'IndiceBusqueda')
+
+
+# ---------------------------------------------------------------------------
+# Escritura del índice
+# ---------------------------------------------------------------------------
+
+def indexar_ids(modulo, ids, modelos=None):
+    """
+    Indexa (o reindexa) los objetos indicados de un módulo.
+
+    Solo escribe los documentos cuyo texto cambió y elimina los de objetos que
+    ya no existen. ``modelos`` permite pasar los modelos históricos desde una
+    migración. Retorna la cantidad de documentos creados o modificados.
+    """
+    ids = list(ids)
+    if not ids:
+        return 0
+    config = DOCUMENTOS[modulo]
+    relacionados, prefetch = config['relaciones']
+    IndiceBusqueda = _indice(modelos)
+
+    objetos = _modelo(modulo, modelos).objects.filter(pk__in=ids).select_related(*relacionados)
+    if prefetch:
+        objetos = objetos.prefetch_related(*prefetch)
+    existentes = {fila.objeto_id: fila for fila in IndiceBusqueda.objects.filter(modulo=modulo, objeto_id__in=ids)}
+
+    ahora = timezone.now()
+    nuevos, modificados, encontrados = [], [], set()
+    for objeto in objetos:
+        encontrados.add(objeto.pk)
+        documento = config['documento'](objeto)
+        documento['titulo'] = documento['titulo'][:255]
+        documento['subtitulo'] = (documento['subtitulo'] or '')[:255]
+        fila = existentes.get(objeto.pk)
+        if fila is None:
+            nuevos.append(IndiceBusqueda(modulo=modulo, objeto_id=objeto.pk, actualizado_en=ahora, **documento))
+        elif any(getattr(fila, campo) != documento[campo] for campo in CAMPOS_DOCUMENTO):
+            for campo, valor in documento.items():
+                setattr(fila, campo, valor)
+            fila.actualizado_en = ahora
+            modificados.append(fila)
+
+    if nuevos:
+        IndiceBusqueda.objects.bulk_create(nuevos, batch_size=TAMANO_LOTE, ignore_conflicts=True)
+    if modificados:
+        IndiceBusqueda.objects.bulk_update(
+            modificados, CAMPOS_DOCUMENTO + ('actualizado_en',), batch_size=TAMANO_LOTE
+        )
+    eliminados = set(existentes) - encontrados
+    if eliminados:
+        eliminar(modulo, eliminados, modelos)
+    return len(nuevos) + len(modificados)
+
+
+def indexar_queryset(modulo, queryset, modelos=None):
+    """Indexa por lotes los objetos de un queryset del módulo"""
+    ids = list(queryset.order_by().values_list('pk', flat=True).distinct())
+    total = 0
+    for inicio in range(0, len(ids), TAMANO_LOTE):
+        total += indexar_ids(modulo, ids[inicio:inicio + TAMANO_LOTE], modelos)
+    return total
+
+
+def eliminar(modulo, ids, modelos=None):
+    """Quita del índice los documentos de esos objetos"""
+    _indice(modelos).objects.filter(modulo=modulo, objeto_id__in=list(ids)).delete()
+
+
+def reconstruir(modulos=None, modelos=None):
+    """
+    Vacía y vuelve a llenar el índice; retorna {módulo: documentos indexados}.
+
+    ``modelos`` permite pasar los modelos históricos desde una migración.
+    """
+    totales = {}
+    for modulo in modulos or DOCUMENTOS:
+        _indice(modelos).objects.filter(modulo=modulo).delete()
+        totales[modulo] = indexar_queryset(modulo, _modelo(modulo, modelos).objects.all(), modelos)
+    if motor() == 'fts5':
+        with connection.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {TABLA_FTS}({TABLA_FTS}) VALUES ('optimize')")
+    return totales
+
+
+# ---------------------------------------------------------------------------
+# Consultas
+# ---------------------------------------------------------------------------
+
+_motores = {}
+
+
+def motor():
+    """'fts5', 'postgresql' o None según lo que creó la migración en esta base"""
+    alias = connection.alias
+    if alias not in _motores:
+        if connection.vendor == 'sqlite':
+            _motores[alias] = 'fts5' if TABLA_FTS in connection.introspection.table_names() else None
+        elif connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                columnas = {
+                    columna.name for columna in connection.introspection.get_table_description(cursor, TABLA)
+                }
+            _motores[alias] = 'postgresql' if 'documento' in columnas else None
+        else:
+            _motores[alias] = None
+    return _motores[alias]
+
+
+def terminos(texto):
+    """Palabras normalizadas de la búsqueda (sin signos, como máximo MAX_TERMINOS)"""
+    return re.findall(r'[^\W_]+', normalizar(texto))[:MAX_TERMINOS]
+
+
+def es_numerica(palabra):
+    """Palabras con dígitos (números de documento, códigos): también se buscan como subcadena"""
+    return any(caracter.isdigit() for caracter in palabra)
+
+
+def _consulta(palabras, solo_claves=False):
+    """
+    Consulta por prefijo para el motor: todas las palabras deben aparecer.
+
+    Con ``solo_claves`` solo cuenta la columna claves (peso A en PostgreSQL).
+    """
+    if motor() == 'fts5':
+        consulta = ' '.join(f'"{palabra}"*' for palabra in palabras)
+        return f"claves : ({consulta})" if solo_claves else consulta
+    peso = 'A' if solo_claves else ''
+    return ' & '.join(f"{palabra}:*{peso}" for palabra in palabras)
+
+
+def _coincide_motor(palabras, solo_claves=False):
+    """Condición sobre IndiceBusqueda con el motor de texto; None si no hay motor"""
+    tipo = motor()
+    if tipo == 'fts5':
+        return Q(pk__in=RawSQL(
+            f"SELECT rowid FROM {TABLA_FTS} WHERE {TABLA_FTS} MATCH %s", [_consulta(palabras, solo_claves)]
+        ))
+    if tipo == 'postgresql':
+        return Q(pk__in=RawSQL(
+            f"SELECT id FROM {TABLA} WHERE documento @@ to_tsquery('simple', %s)",
+            [_consulta(palabras, solo_claves)]
+        ))
+    return None
+
+
+def _coincidencias(palabras, modulos, solo_claves=False):
+    """
+    Filas de IndiceBusqueda que contienen todas las palabras.
+
+    Las palabras sin dígitos van en una sola consulta al motor; cada palabra
+    con dígitos coincide por prefijo o como subcadena de las claves.
+    """
+    indice = _indice().objects.filter(modulo__in=modulos)
+    if motor() is None:
+        for palabra in palabras:
+            coincide = Q(claves__icontains=palabra)
+            if not solo_claves:
+                coincide |= Q(contenido__icontains=palabra)
+            indice = indice.filter(coincide)
+        return indice
+
+    texto = [palabra for palabra in palabras if not es_numerica(palabra)]
+    if texto:
+        indice = indice.filter(_coincide_motor(texto, solo_claves))
+    for palabra in palabras:
+        if es_numerica(palabra):
+            indice = indice.filter(Q(claves__icontains=palabra) | _coincide_motor([palabra], solo_claves))
+    return indice
+
+
+def filtrar(queryset, modulo, texto, solo_claves=False):
+    """
+    Restringe un queryset del módulo a los objetos que coinciden con el texto.
+
+    Usa una subconsulta sobre el índice, así que conserva el orden y los demás
+    filtros del queryset. Sin palabras válidas lo retorna sin cambios.
+    ``solo_claves`` ignora descripciones y observaciones (p. ej. buscar por nombre).
+    """
+    palabras = terminos(texto)
+    if not palabras:
+        return queryset
+    return queryset.filter(pk__in=_coincidencias(palabras, [modulo], solo_claves).values('objeto_id'))
+
+
+def buscar(texto, modulos=None, limite=20):
+    """
+    Búsqueda global ordenada por relevancia entre módulos.
+
+    Retorna una lista de diccionarios con modulo, etiqueta, objeto_id, titulo,
+    subtitulo, fecha, url y puntaje (mayor es más relevante). Las coincidencias
+    en claves (números, códigos, nombres) pesan más que en descripciones. Si
+    alguna palabra tiene dígitos se busca también como subcadena y los
+    resultados se ordenan por fecha, sin puntaje.
+    """
+    palabras = terminos(texto)
+    modulos = [modulo for modulo in (modulos or DOCUMENTOS) if modulo in DOCUMENTOS]
+    if not palabras or not modulos:
+        return []
+
+    tipo = None if any(es_numerica(palabra) for palabra in palabras) else motor()
+    marcadores = ', '.join(['%s'] * len(modulos))
+    if tipo == 'fts5':
+        sql = (
+            f"SELECT i.modulo, i.objeto_id, i.titulo, i.subtitulo, i.fecha, "
+            f"-bm25({TABLA_FTS}, 10.0, 1.0) AS puntaje "
+            f"FROM {TABLA_FTS} JOIN {TABLA} i ON i.id = {TABLA_FTS}.rowid "
+            f"WHERE {TABLA_FTS} MATCH %s AND i.modulo IN ({marcadores}) "
+            f"ORDER BY bm25({TABLA_FTS}, 10.0, 1.0), i.fecha DESC LIMIT %s"
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [_consulta(palabras), *modulos, limite])
+            filas = cursor.fetchall()
+    elif tipo == 'postgresql':
+        sql = (
+            f"SELECT modulo, objeto_id, titulo, subtitulo, fecha, ts_rank(documento, consulta) AS puntaje "
+            f"FROM {TABLA}, to_tsquery('simple', %s) consulta "
+            f"WHERE documento @@ consulta AND modulo IN ({marcadores}) "
+            f"ORDER BY puntaje DESC, fecha DESC NULLS LAST LIMIT %s"
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(sql, [_consulta(palabras), *modulos, limite])
+            filas = cursor.fetchall()
+    else:
+        filas = _coincidencias(palabras, modulos).order_by('-fecha', '-id').values_list(
+            'modulo', 'objeto_id', 'titulo', 'subtitulo', 'fecha'
+        )[:limite]
+        filas = [fila + (0.0,) for fila in filas]
+
+    resultados = []
+    for modulo, objeto_id, titulo, subtitulo, fecha, puntaje in filas:
+        config = DOCUMENTOS[modulo]
+        resultados.append({
+            'modulo': modulo,
+            'etiqueta': config['etiqueta'],
+            'objeto_id': objeto_id,
+            'titulo': titulo,
+            'subtitulo': subtitulo,
+            'fecha': fecha,
+            'url': config['url'](objeto_id),
+            'puntaje': float(puntaje or 0),
+        })
+    return resultados
+
+
+def modulos_permitidos(user):
+    """Módulos que el usuario puede ver en la búsqueda global según su rol"""
+    if user.is_superuser:
+        return list(DOCUMENTOS)
+    codigos = getattr(user, 'permisos_codigos', None)
+    if codigos is None:
+        try:
+            codigos = user.perfilusuario.permisos_rol()['codigos']
+        except Exception:
+            codigos = frozenset()
+    return [modulo for modulo, config in DOCUMENTOS.items() if config['permiso'] in codigos]
+
+
+# ---------------------------------------------------------------------------
+# Señales
+# ---------------------------------------------------------------------------
+
+def _indexar_seguro(modulo, ids):
+    """Indexa sin propagar errores: un fallo del índice no debe romper el guardado"""
+    try:
+        return indexar_ids(modulo, ids)
+    except Exception as e:
+        logger.exception(f"No se pudo indexar {modulo} {list(ids)}: {e}")
+        return 0
+
+
+def _reindexar_dependientes(nombre_modelo, instancia_id, valores):
+    for modulo, campo, atributo in DEPENDENCIAS.get(nombre_modelo, ()):
+        valor = valores.get(atributo)
+        if valor is None:
+            continue
+        try:
+            indexar_queryset(modulo, _modelo(modulo).objects.filter(**{campo: valor}))
+        except Exception as e:
+            logger.exception(f"No se pudo reindexar {modulo} por {nombre_modelo} {instancia_id}: {e}")
+
+
+def _valores_dependencias(sender, instance):
+    return {atributo: getattr(instance, atributo) for _, _, atributo in DEPENDENCIAS.get(sender.__name__, ())}
+
+
+def _al_guardar(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    nombre = sender.__name__
+    modulo = MODULO_POR_MODELO.get(nombre)
+    valores = _valores_dependencias(sender, instance)
+
+    def actualizar():
+        # Los dependientes solo se reindexan si el documento propio cambió
+        # (o si el modelo no tiene documento propio, como Cliente)
+        if modulo is None or _indexar_seguro(modulo, [instance.pk]):
+            _reindexar_dependientes(nombre, instance.pk, valores)
+
+    transaction.on_commit(actualizar)
+
+
+def _al_eliminar(sender, instance, **kwargs):
+    nombre = sender.__name__
+    modulo = MODULO_POR_MODELO.get(nombre)
+    if modulo:
+        eliminar(modulo, [instance.pk])
+    if nombre == 'Subproyecto':
+        valores = _valores_dependencias(sender, instance)
+        transaction.on_commit(partial(_reindexar_dependientes, nombre, instance.pk, valores))
+
+
+def _al_cambiar_colaboradores(sender, instance, action, reverse, pk_set, **kwargs):
+    """Proyecto.colaboradores: el documento del colaborador lista sus proyectos"""
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if reverse:
+        ids = [instance.pk]
+    elif action == 'pre_clear':
+        ids = list(instance.colaboradores.values_list('pk', flat=True))
+    else:
+        ids = list(pk_set or ())
+    if ids:
+        transaction.on_commit(partial(_indexar_seguro, 'colaborador', ids))
+
+
+def poblar_indice_vacio(sender, using=None, **kwargs):
+    """
+    post_migrate: reconstruye el índice si está vacío y hay datos que indexar
+    (la primera migración tras crear la tabla, o una base restaurada sin índice).
+
+    Un fallo solo se registra: ``manage.py reconstruir_indice_busqueda`` lo repite.
+    """
+    if using not in (None, connection.alias):
+        return
+    try:
+        if _indice().objects.exists():
+            return
+        if not any(_modelo(modulo).objects.exists() for modulo in DOCUMENTOS):
+            return
+        totales = reconstruir()
+    except Exception as e:
+        logger.exception(f"No se pudo poblar el índice de búsqueda tras migrar: {e}")
+        return
+    logger.info(f"Índice de búsqueda poblado con {sum(totales.values())} documentos")
+
+
+def conectar_indexacion():
+    """Mantiene el índice al día con las escrituras de los modelos indexados y sus dependencias"""
+    post_migrate.connect(
+        poblar_indice_vacio, sender=apps.get_app_config('core'), dispatch_uid='search_post_migrate'
+    )
+    nombres = set(MODULO_POR_MODELO) | set(DEPENDENCIAS)
+    for nombre in nombres:
+        modelo = apps.get_model('core', nombre)
+        post_save.connect(_al_guardar, sender=modelo, dispatch_uid=f'search_save_{nombre}')
+        post_delete.connect(_al_eliminar, sender=modelo, dispatch_uid=f'search_delete_{nombre}')
+    m2m_changed.connect(
+        _al_cambiar_colaboradores,
+        sender=apps.get_model('core', 'Proyecto').colaboradores.through,
+        dispatch_uid='search_m2m_Proyecto_colaboradores',
+    )
@@ -61,35 +61,19 @@ class ProyectoService:
     def obtener_estadisticas_proyecto(proyecto):
         """Obtiene estadísticas detalladas de un proyecto"""
         try:
-            # Estadísticas básicas
-            total_gastos = Gasto.objects.filter(proyecto=proyecto).aggregate(
-                total=Sum('monto')
-            )['total'] or 0
+            # Totales desde el libro financiero materializado del proyecto
+            finanzas = proyecto.get_finanzas()
             
-            gastos_aprobados = Gasto.objects.filter(
-                proyecto=proyecto,
-                aprobado=True
-            ).aggregate(total=Sum('monto'))['total'] or 0
-            
-            gastos_pendientes = Gasto.objects.filter(
-                proyecto=proyecto,
-                aprobado=False
-            ).aggregate(total=Sum('monto'))['total'] or 0
+            # Estadísticas básicas
+            gastos_aprobados = finanzas['gastos_aprobados']
+            gastos_pendientes = finanzas['gastos_pendientes']
+            total_gastos = gastos_aprobados + gastos_pendientes
             
             # Estadísticas de facturas
-            total_facturas = Factura.objects.filter(proyecto=proyecto).count()
-            facturas_pagadas = Factura.objects.filter(
-                proyecto=proyecto,
-                estado='pagada'
-            ).count()
-            
-            monto_facturado = Factura.objects.filter(proyecto=proyecto).aggregate(
-                total=Sum('monto_total')
-            )['total'] or 0
-            
-            monto_pagado = Factura.objects.filter(proyecto=proyecto).aggregate(
-                total=Sum('monto_pagado')
-            )['total'] or 0
+            total_facturas = finanzas['facturas_cantidad']
+            facturas_pagadas = finanzas['facturas_pagadas_cantidad']
+            monto_facturado = finanzas['facturado']
+            monto_pagado = finanzas['facturas_monto_pagado']
             
             # Estadísticas de colaboradores
             total_colaboradores = proyecto.colaboradores.count()
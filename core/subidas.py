@@ -0,0 +1,338 @@
+"""
+Subidas fragmentadas y reanudables del Telecom Technology
+El navegador divide el archivo en fragmentos y los envía en peticiones cortas
+(init / fragmento / completar). Cada fragmento se guarda en disco bajo
+SUBIDAS_DIR/<token>/, de modo que una conexión que se cae al 90% retoma desde
+los fragmentos que faltan y ningún worker queda ocupado durante toda la
+transferencia. Al completar, los fragmentos se unen en un archivo, se
+verifica el SHA-256 y los formularios existentes lo reciben como si hubiera
+llegado en el POST (ver ``adjuntar``).
+"""
+
+import hashlib
+import logging
+import os
+import re
+import secrets
+import shutil
+import tempfile
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+NOMBRE_ENSAMBLADO = 'archivo'
+
+TAMANO_BLOQUE = 64 * 1024
+
+
+class ErrorSubida(Exception):
+    """Petición de subida inválida; el mensaje se muestra al usuario"""
+
+    def __init__(self, mensaje, estado=400):
+        super().__init__(mensaje)
+        self.estado = estado
+
+
+def _configuracion(nombre, por_defecto):
+    return getattr(settings, nombre, por_defecto)
+
+
+def tamano_fragmento():
+    return _configuracion('SUBIDAS_TAMANO_FRAGMENTO', 2 * 1024 * 1024)
+
+
+def tamano_maximo():
+    return _configuracion('SUBIDAS_TAMANO_MAXIMO', 200 * 1024 * 1024)
+
+
+def _directorio_base():
+    return str(_configuracion('SUBIDAS_DIR', os.path.join(settings.BASE_DIR, 'subidas_temporales')))
+
+
+def directorio(subida):
+    return os.path.join(_directorio_base(), subida.token)
+
+
+def _ruta_fragmento(subida, indice):
+    return os.path.join(directorio(subida), f"{indice:06d}.part")
+
+
+def ruta_ensamblado(subida):
+    return os.path.join(directorio(subida), NOMBRE_ENSAMBLADO)
+
+
+def _sha256_valido(valor):
+    return bool(re.fullmatch(r'[0-9a-f]{64}', valor or ''))
+
+
+def iniciar(usuario, nombre, tamano, sha256=''):
+    """Crea una subida para un archivo de ``tamano`` bytes y retorna el registro"""
+    from .models import SubidaFragmentada
+
+    nombre = os.path.basename(str(nombre or '').replace('\\', '/')).strip()
+    if not nombre:
+        raise ErrorSubida('Falta el nombre del archivo')
+    try:
+        tamano = int(tamano)
+    except (TypeError, ValueError):
+        raise ErrorSubida('Tamaño de archivo inválido')
+    if tamano <= 0:
+        raise ErrorSubida('El archivo está vacío')
+    if tamano > tamano_maximo():
+        raise ErrorSubida(f'El archivo supera el máximo de {tamano_maximo() // (1024 * 1024)} MB', 413)
+    sha256 = (sha256 or '').lower()
+    if sha256 and not _sha256_valido(sha256):
+        raise ErrorSubida('SHA-256 inválido')
+
+    fragmento = tamano_fragmento()
+    subida = SubidaFragmentada.objects.create(
+        token=secrets.token_hex(16),
+        usuario=usuario,
+        nombre_archivo=nombre[:255],
+        tamano_total=tamano,
+        tamano_fragmento=fragmento,
+        total_fragmentos=(tamano + fragmento - 1) // fragmento,
+        sha256_esperado=sha256,
+    )
+    os.makedirs(directorio(subida), exist_ok=True)
+    return subida
+
+
+def obtener(usuario, token):
+    """Subida del usuario o ErrorSubida 404"""
+    from .models import SubidaFragmentada
+
+    subida = SubidaFragmentada.objects.filter(token=token, usuario=usuario).first()
+    if subida is None:
+        raise ErrorSubida('La subida no existe o expiró', 404)
+    return subida
+
+
+def recibidos(subida):
+    """Índices de los fragmentos ya guardados"""
+    try:
+        nombres = os.listdir(directorio(subida))
+    except FileNotFoundError:
+        return []
+    return sorted(int(nombre[:-5]) for nombre in nombres if nombre.endswith('.part'))
+
+
+def _tamano_esperado(subida, indice):
+    if indice == subida.total_fragmentos - 1:
+        return subida.tamano_total - subida.tamano_fragmento * indice
+    return subida.tamano_fragmento
+
+
+def guardar_fragmento(subida, indice, flujo, sha256=''):
+    """
+    Guarda el fragmento ``indice`` leyendo ``flujo`` por bloques.
+
+    La escritura es atómica: un fragmento cortado a la mitad nunca queda como
+    recibido y el cliente lo vuelve a enviar. Enviar dos veces el mismo
+    fragmento es inofensivo.
+    """
+    if subida.estado != 'recibiendo':
+        raise ErrorSubida('La subida ya fue completada', 409)
+    if not 0 <= indice < subida.total_fragmentos:
+        raise ErrorSubida('Fragmento fuera de rango')
+    esperado = _tamano_esperado(subida, indice)
+    sha256 = (sha256 or '').lower()
+
+    carpeta = directorio(subida)
+    os.makedirs(carpeta, exist_ok=True)
+    descriptor, temporal = tempfile.mkstemp(dir=carpeta, suffix='.tmp')
+    hash_fragmento = hashlib.sha256()
+    recibido = 0
+    try:
+        with os.fdopen(descriptor, 'wb') as destino:
+            while recibido <= esperado:
+                bloque = flujo.read(min(TAMANO_BLOQUE, esperado + 1 - recibido))
+                if not bloque:
+                    break
+                destino.write(bloque)
+                hash_fragmento.update(bloque)
+                recibido += len(bloque)
+        if recibido != esperado:
+            raise ErrorSubida(f'El fragmento {indice} debe tener {esperado} bytes y llegaron {recibido}')
+        if sha256 and hash_fragmento.hexdigest() != sha256:
+            raise ErrorSubida(f'El fragmento {indice} llegó dañado (SHA-256 distinto)', 422)
+        os.replace(temporal, _ruta_fragmento(subida, indice))
+    except BaseException:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        raise
+
+    type(subida).objects.filter(pk=subida.pk).update(actualizado_en=timezone.now())
+    return recibidos(subida)
+
+
+def completar(subida):
+    """
+    Une los fragmentos en un solo archivo y verifica tamaño y SHA-256.
+
+    El estado pasa a ``ensamblando`` con un UPDATE condicionado, así dos
+    peticiones simultáneas no unen el mismo archivo.
+    """
+    modelo = type(subida)
+    if subida.estado == 'completada':
+        return subida
+    tomada = modelo.objects.filter(pk=subida.pk, estado='recibiendo').update(estado='ensamblando')
+    if not tomada:
+        raise ErrorSubida('La subida ya se está completando', 409)
+
+    try:
+        faltantes = sorted(set(range(subida.total_fragmentos)) - set(recibidos(subida)))
+        if faltantes:
+            raise ErrorSubida(f'Faltan {len(faltantes)} fragmentos', 409)
+
+        hash_archivo = hashlib.sha256()
+        destino = ruta_ensamblado(subida)
+        with open(destino, 'wb') as salida:
+            for indice in range(subida.total_fragmentos):
+                with open(_ruta_fragmento(subida, indice), 'rb') as fragmento:
+                    for bloque in iter(lambda: fragmento.read(TAMANO_BLOQUE), b''):
+                        salida.write(bloque)
+                        hash_archivo.update(bloque)
+        sha256 = hash_archivo.hexdigest()
+
+        if os.path.getsize(destino) != subida.tamano_total:
+            raise ErrorSubida('El archivo unido no tiene el tamaño esperado', 422)
+        if subida.sha256_esperado and sha256 != subida.sha256_esperado:
+            os.remove(destino)
+            # Los fragmentos no coinciden con el archivo original: se reinicia la subida
+            for indice in range(subida.total_fragmentos):
+                try:
+                    os.remove(_ruta_fragmento(subida, indice))
+                except OSError:
+                    pass
+            raise ErrorSubida('El archivo llegó dañado (SHA-256 distinto); vuelva a subirlo', 422)
+    except BaseException:
+        modelo.objects.filter(pk=subida.pk).update(estado='recibiendo')
+        subida.estado = 'recibiendo'
+        raise
+
+    for indice in range(subida.total_fragmentos):
+        try:
+            os.remove(_ruta_fragmento(subida, indice))
+        except OSError:
+            pass
+    subida.estado = 'completada'
+    subida.sha256 = sha256
+    subida.completada_en = timezone.now()
+    subida.save(update_fields=['estado', 'sha256', 'completada_en', 'actualizado_en'])
+    logger.info(f"Subida {subida.token} completada: {subida.nombre_archivo} ({subida.tamano_total} bytes)")
+    return subida
+
+
+def eliminar(subida):
+    """Borra los fragmentos y el registro de la subida"""
+    shutil.rmtree(directorio(subida), ignore_errors=True)
+    subida.delete()
+
+
+def subida_a_dict(subida, con_recibidos=True):
+    """Estado de la subida para las respuestas JSON"""
+    datos = {
+        'token': subida.token,
+        'nombre': subida.nombre_archivo,
+        'tamano': subida.tamano_total,
+        'tamano_fragmento': subida.tamano_fragmento,
+        'total_fragmentos': subida.total_fragmentos,
+        'estado': subida.estado,
+        'sha256': subida.sha256,
+    }
+    if con_recibidos:
+        datos['recibidos'] = recibidos(subida) if subida.estado == 'recibiendo' else []
+    return datos
+
+
+class ArchivoSubido(UploadedFile):
+    """
+    Archivo unido de una subida fragmentada.
+
+    Expone ``temporary_file_path`` como TemporaryUploadedFile, así el
+    almacenamiento en disco lo mueve a MEDIA en lugar de copiarlo, y
+    ``sha256`` con el hash calculado en ``completar`` para que los metadatos
+    del modelo no vuelvan a leer el archivo (ver archivos_meta.calcular_metadatos).
+    """
+
+    def __init__(self, subida):
+        ruta = ruta_ensamblado(subida)
+        super().__init__(
+            file=open(ruta, 'rb'),
+            name=subida.nombre_archivo,
+            content_type=None,
+            size=subida.tamano_total,
+        )
+        self._ruta = ruta
+        self.sha256 = subida.sha256
+
+    def temporary_file_path(self):
+        return self._ruta
+
+
+def campo_token(campo):
+    """Nombre del campo oculto del formulario con el token de la subida"""
+    return f'subida_{campo}'
+
+
+def adjuntar(request, campo):
+    """
+    Si el formulario trae el token de una subida completada para ``campo`` (y
+    no el archivo en sí), agrega el archivo unido a ``request.FILES``.
+    Retorna la subida usada o None. Tras guardar el formulario se llama a
+    ``finalizar`` para borrar lo que quede de ella.
+    """
+    token = request.POST.get(campo_token(campo), '').strip()
+    if not token or campo in request.FILES:
+        return None
+    try:
+        subida = obtener(request.user, token)
+    except ErrorSubida:
+        logger.warning(f"Subida {token} no encontrada para {request.user}")
+        return None
+    if subida.estado != 'completada' or not os.path.exists(ruta_ensamblado(subida)):
+        return None
+    request.FILES[campo] = ArchivoSubido(subida)
+    return subida
+
+
+def finalizar(request, campo, subida):
+    """Cierra el archivo adjuntado y elimina la subida ya guardada en el modelo"""
+    if subida is None:
+        return
+    archivo = request.FILES.get(campo)
+    if isinstance(archivo, ArchivoSubido):
+        archivo.close()
+    eliminar(subida)
+
+
+def depurar_abandonadas():
+    """
+    Elimina las subidas sin actividad en ``SUBIDAS_EXPIRACION_HORAS`` horas y
+    los directorios huérfanos. Retorna cuántas se eliminaron.
+    """
+    from .models import SubidaFragmentada
+
+    limite = timezone.now() - timedelta(hours=_configuracion('SUBIDAS_EXPIRACION_HORAS', 24))
+    eliminadas = 0
+    for subida in SubidaFragmentada.objects.filter(actualizado_en__lt=limite).iterator():
+        eliminar(subida)
+        eliminadas += 1
+
+    base = _directorio_base()
+    if os.path.isdir(base):
+        vigentes = set(SubidaFragmentada.objects.values_list('token', flat=True))
+        for nombre in os.listdir(base):
+            ruta = os.path.join(base, nombre)
+            if nombre not in vigentes and os.path.isdir(ruta) and \
+                    os.path.getmtime(ruta) < limite.timestamp():
+                shutil.rmtree(ruta, ignore_errors=True)
+                eliminadas += 1
+    if eliminadas:
+        logger.info(f"Subidas abandonadas eliminadas: {eliminadas}")
+    return eliminadas
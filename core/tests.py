@@ -1,3 +1,1044 @@
-from django.test import TestCase
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.http import QueryDict
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from . import activity_log, descargas, firebase_sync, pdf_cache, search, subidas, trabajos, views
+from .cache_utils import get_tag_versions, tag_rol
+from .finanzas import conciliar_finanzas
+from .pagination_utils import codificar_cursor, paginar_por_cursor
+from .models import (
+    ArchivoProyecto, Cliente, Cotizacion, Factura, IngresoProyecto, ItemCotizacion, LogActividad, Modulo,
+    PerfilUsuario, Permiso, PlanillaLiquidada, Proyecto, ProyectoFinanzas, Rol, RolPermiso,
+    SincronizacionFirebase, SubidaFragmentada, TrabajoSegundoPlano, TransaccionFirebase,
+)
+
+
+@override_settings(ACTIVITY_LOG_BUFFERED=False)
+class UsuariosMejoradosTests(TestCase):
+    """Vistas de usuarios: cada cambio se guarda y queda en el log de actividad"""
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'clave-admin')
+        self.client.force_login(self.admin)
+        self.rol = Rol.objects.create(nombre='Supervisor')
+
+    def test_crear_usuario(self):
+        respuesta = self.client.post(reverse('usuario_crear_mejorado'), {
+            'username': 'tecnico', 'password': 'clave-tecnico', 'email': 'tecnico@example.com',
+            'first_name': 'Ana', 'last_name': 'Pérez', 'rol': self.rol.id,
+        })
+        self.assertRedirects(respuesta, reverse('usuarios_lista_mejorada'), fetch_redirect_response=False)
+        usuario = User.objects.get(username='tecnico')
+        self.assertEqual(PerfilUsuario.objects.get(usuario=usuario).rol, self.rol)
+        self.assertTrue(LogActividad.objects.filter(accion='Crear Usuario', usuario=self.admin).exists())
+
+    def test_editar_usuario(self):
+        usuario = User.objects.create_user('tecnico', password='clave-tecnico')
+        respuesta = self.client.post(reverse('usuario_editar_mejorado', args=[usuario.id]), {
+            'first_name': 'Ana', 'email': 'ana@example.com', 'is_active': 'on',
+            'activo': 'on', 'rol': self.rol.id,
+        })
+        self.assertRedirects(respuesta, reverse('usuarios_lista_mejorada'), fetch_redirect_response=False)
+        usuario.refresh_from_db()
+        self.assertEqual(usuario.first_name, 'Ana')
+        self.assertEqual(usuario.perfilusuario.rol, self.rol)
+        self.assertTrue(LogActividad.objects.filter(accion='Editar Usuario').exists())
+
+    def test_actualizar_modulos_de_rol(self):
+        modulo = Modulo.objects.create(nombre='Proyectos')
+        permiso = Permiso.objects.create(nombre='Ver proyectos', codigo='proyectos_ver', tipo='ver', modulo=modulo)
+        respuesta = self.client.post(
+            reverse('permisos_actualizar_modulos'),
+            json.dumps({'rol_id': self.rol.id, 'modulos_ids': [modulo.id]}),
+            content_type='application/json',
+        )
+        self.assertTrue(respuesta.json()['success'])
+        self.assertTrue(RolPermiso.objects.filter(rol=self.rol, permiso=permiso, activo=True).exists())
+        self.assertTrue(LogActividad.objects.filter(accion='Actualizar Módulos').exists())
+
+
+@override_settings(ACTIVITY_LOG_BUFFERED=False)
+class RolesMejoradosTests(TestCase):
+    """Vistas de roles: los cambios se confirman e invalidan la caché de permisos del rol"""
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'clave-admin')
+        self.client.force_login(self.admin)
+        modulo = Modulo.objects.create(nombre='Proyectos')
+        self.ver = Permiso.objects.create(nombre='Ver', codigo='proyectos_ver', tipo='ver', modulo=modulo)
+        self.editar = Permiso.objects.create(nombre='Editar', codigo='proyectos_editar', tipo='editar', modulo=modulo)
+
+    def test_crear_rol(self):
+        respuesta = self.client.post(reverse('rol_crear_mejorado'), {
+            'nombre': 'Supervisor', 'descripcion': 'Supervisa obras', 'permisos': [self.ver.id],
+        })
+        self.assertRedirects(respuesta, reverse('roles_lista_mejorada'), fetch_redirect_response=False)
+        rol = Rol.objects.get(nombre='Supervisor')
+        self.assertEqual(list(RolPermiso.objects.filter(rol=rol).values_list('permiso_id', flat=True)), [self.ver.id])
+        self.assertTrue(LogActividad.objects.filter(accion='Crear Rol').exists())
+
+    def test_editar_rol_invalida_permisos(self):
+        rol = Rol.objects.create(nombre='Supervisor')
+        RolPermiso.objects.create(rol=rol, permiso=self.ver)
+        version = get_tag_versions([tag_rol(rol.id)])[0]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            respuesta = self.client.post(reverse('rol_editar_mejorado', args=[rol.id]), {
+                'nombre': 'Supervisor de obra', 'permisos': [self.editar.id],
+            })
+        self.assertRedirects(respuesta, reverse('roles_lista_mejorada'), fetch_redirect_response=False)
+        rol.refresh_from_db()
+        self.assertEqual(rol.nombre, 'Supervisor de obra')
+        activos = RolPermiso.objects.filter(rol=rol, activo=True).values_list('permiso_id', flat=True)
+        self.assertEqual(list(activos), [self.editar.id])
+        self.assertNotEqual(get_tag_versions([tag_rol(rol.id)])[0], version)
+
+    def test_eliminar_rol(self):
+        rol = Rol.objects.create(nombre='Temporal')
+        usuario = User.objects.create_user('tecnico', password='clave-tecnico')
+        PerfilUsuario.objects.create(usuario=usuario, rol=rol)
+
+        respuesta = self.client.post(reverse('rol_eliminar_mejorado', args=[rol.id]))
+        self.assertRedirects(respuesta, reverse('roles_lista_mejorada'), fetch_redirect_response=False)
+        self.assertFalse(Rol.objects.filter(id=rol.id).exists())
+        self.assertIsNone(PerfilUsuario.objects.get(usuario=usuario).rol)
+
+    def test_actualizar_permisos_masivo(self):
+        rol = Rol.objects.create(nombre='Supervisor')
+        RolPermiso.objects.create(rol=rol, permiso=self.ver)
+        version = get_tag_versions([tag_rol(rol.id)])[0]
+
+        with self.captureOnCommitCallbacks(execute=True):
+            respuesta = self.client.post(
+                reverse('permisos_actualizar_masivo'),
+                json.dumps({'rol_id': rol.id, 'permisos_ids': [self.editar.id]}),
+                content_type='application/json',
+            )
+        self.assertTrue(respuesta.json()['success'])
+        activos = RolPermiso.objects.filter(rol=rol, activo=True).values_list('permiso_id', flat=True)
+        self.assertEqual(list(activos), [self.editar.id])
+        self.assertNotEqual(get_tag_versions([tag_rol(rol.id)])[0], version)
+
+
+class RespaldosActividadTests(TestCase):
+    """Log de actividad: cuarentena de registros rechazados y recuperación de respaldos"""
+
+    def setUp(self):
+        self.usuario = User.objects.create_user('auditor', password='clave-auditor')
+        self.spool = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.spool, ignore_errors=True)
+        configuracion = override_settings(ACTIVITY_LOG_SPOOL_DIR=self.spool)
+        configuracion.enable()
+        self.addCleanup(configuracion.disable)
+
+    def _registro(self, accion='login'):
+        return {
+            'usuario_id': self.usuario.pk, 'accion': accion, 'modulo': 'usuarios',
+            'fecha_actividad': timezone.now().isoformat(),
+        }
+
+    def _respaldo_de_otro_proceso(self, *registros):
+        directorio = os.path.join(self.spool, 'proceso-otro_1_abcd')
+        os.makedirs(directorio)
+        with open(os.path.join(directorio, 'actividad.jsonl'), 'w', encoding='utf-8') as archivo:
+            for registro in registros:
+                archivo.write(json.dumps(registro) + '\n')
+        open(os.path.join(directorio, activity_log.ARCHIVO_BLOQUEO), 'w').close()
+        return directorio
+
+    def test_registro_invalido_va_a_cuarentena(self):
+        insertados = activity_log.insertar_registros([
+            self._registro('login'), self._registro(None), self._registro('logout'),
+        ])
+        self.assertEqual(insertados, 2)
+        self.assertEqual(
+            sorted(LogActividad.objects.values_list('accion', flat=True)), ['login', 'logout']
+        )
+        cuarentena = os.path.join(self.spool, activity_log.DIRECTORIO_CUARENTENA)
+        (nombre,) = os.listdir(cuarentena)
+        with open(os.path.join(cuarentena, nombre), encoding='utf-8') as archivo:
+            rechazados = [json.loads(linea) for linea in archivo]
+        self.assertEqual(len(rechazados), 1)
+        self.assertIsNone(rechazados[0]['registro']['accion'])
+
+    def test_recupera_directorio_sin_bloqueo(self):
+        directorio = self._respaldo_de_otro_proceso(self._registro(), self._registro(None))
+        buffer = activity_log.ActivityLogBuffer(spool_dir=self.spool)
+
+        self.assertEqual(buffer.recuperar_respaldos(), 1)
+        self.assertFalse(os.path.exists(directorio))
+        self.assertEqual(LogActividad.objects.count(), 1)
+        # El registro rechazado no vuelve a procesarse en la siguiente pasada
+        self.assertEqual(buffer.recuperar_respaldos(), 0)
+
+    def test_respeta_directorio_de_proceso_vivo(self):
+        if activity_log.fcntl is None:
+            self.skipTest('flock no disponible')
+        directorio = self._respaldo_de_otro_proceso(self._registro())
+        bloqueo = activity_log._bloquear(os.path.join(directorio, activity_log.ARCHIVO_BLOQUEO))
+        self.addCleanup(bloqueo.close)
+        buffer = activity_log.ActivityLogBuffer(spool_dir=self.spool)
+
+        self.assertEqual(buffer.recuperar_respaldos(), 0)
+        self.assertTrue(os.path.exists(os.path.join(directorio, 'actividad.jsonl')))
+
+        bloqueo.close()
+        self.assertEqual(buffer.recuperar_respaldos(), 1)
+
+
+TAREAS_EJECUTADAS = []
+
+
+def tarea_de_prueba(valor):
+    TAREAS_EJECUTADAS.append(valor)
+
+
+class TrabajosSegundoPlanoTests(TestCase):
+    """Cola de trabajos: deduplicación, expiración y recuperación de trabajos colgados"""
+
+    VISTA = 'core.views.exportar_de_prueba'
+
+    def setUp(self):
+        self.usuario = User.objects.create_user('tecnico', password='clave-tecnico')
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        configuracion = override_settings(MEDIA_ROOT=self.media)
+        configuracion.enable()
+        self.addCleanup(configuracion.disable)
+
+    def _peticion(self, consulta=''):
+        request = RequestFactory().get(f'/exportar/?{consulta}')
+        request.user = self.usuario
+        return request
+
+    def test_reutiliza_trabajo_activo(self):
+        trabajo, creado = trabajos.encolar('pdf', self.VISTA, self._peticion('formato=pdf'))
+        self.assertTrue(creado)
+        igual, creado = trabajos.encolar('pdf', self.VISTA, self._peticion('formato=pdf&_=123'))
+        self.assertFalse(creado)
+        self.assertEqual(igual.pk, trabajo.pk)
+
+        otro, creado = trabajos.encolar('pdf', self.VISTA, self._peticion('formato=xlsx'))
+        self.assertTrue(creado)
+        nuevo, creado = trabajos.encolar('pdf', self.VISTA, self._peticion('formato=pdf&nuevo=1'))
+        self.assertTrue(creado)
+
+    def test_no_reutiliza_trabajo_completado(self):
+        trabajo, _ = trabajos.encolar('pdf', self.VISTA, self._peticion('formato=pdf'))
+        TrabajoSegundoPlano.objects.filter(pk=trabajo.pk).update(
+            estado='completado', expira_en=timezone.now() + timedelta(hours=1)
+        )
+        # Los datos pudieron cambiar desde entonces: se genera de nuevo
+        nuevo, creado = trabajos.encolar('pdf', self.VISTA, self._peticion('formato=pdf'))
+        self.assertTrue(creado)
+        self.assertNotEqual(nuevo.pk, trabajo.pk)
+
+    def test_depurar_expirados(self):
+        trabajo = TrabajoSegundoPlano.objects.create(
+            tipo='pdf', clave='x', usuario=self.usuario, estado='completado',
+            expira_en=timezone.now() - timedelta(minutes=1),
+        )
+        trabajo.archivo.save('reporte.pdf', ContentFile(b'%PDF-1.4'))
+        ruta = trabajo.archivo.path
+        viejo = TrabajoSegundoPlano.objects.create(
+            tipo='pdf', clave='y', usuario=self.usuario, estado='error',
+            finalizado_en=timezone.now() - timedelta(days=60),
+        )
+
+        self.assertEqual(trabajos.depurar_expirados(), 1)
+        trabajo.refresh_from_db()
+        self.assertEqual(trabajo.estado, 'expirado')
+        self.assertFalse(trabajo.disponible)
+        self.assertFalse(os.path.exists(ruta))
+        self.assertFalse(TrabajoSegundoPlano.objects.filter(pk=viejo.pk).exists())
+
+    def _en_proceso(self, latido, iniciado=None, intentos=1):
+        ahora = timezone.now()
+        return TrabajoSegundoPlano.objects.create(
+            tipo='pdf', clave='x', usuario=self.usuario, estado='en_proceso', worker='otro:1',
+            iniciado_en=iniciado or ahora, latido_en=latido, intentos=intentos,
+        )
+
+    @override_settings(TRABAJOS_LATIDO_LIMITE=120, TRABAJOS_TIMEOUT=1800, TRABAJOS_MAX_INTENTOS=2)
+    def test_recuperar_colgados_respeta_latido(self):
+        ahora = timezone.now()
+        # Lleva horas ejecutándose pero su worker sigue vivo
+        largo = self._en_proceso(latido=ahora - timedelta(seconds=10), iniciado=ahora - timedelta(hours=3))
+        muerto = self._en_proceso(latido=ahora - timedelta(minutes=5))
+        agotado = self._en_proceso(latido=ahora - timedelta(minutes=5), intentos=2)
+        antiguo = self._en_proceso(latido=None, iniciado=ahora - timedelta(hours=1))
+
+        self.assertEqual(trabajos.recuperar_colgados(), 3)
+        estados = dict(TrabajoSegundoPlano.objects.values_list('pk', 'estado'))
+        self.assertEqual(estados[largo.pk], 'en_proceso')
+        self.assertEqual(estados[muerto.pk], 'pendiente')
+        self.assertEqual(estados[agotado.pk], 'error')
+        self.assertEqual(estados[antiguo.pk], 'pendiente')
+
+    def test_tomar_y_ejecutar_tarea(self):
+        del TAREAS_EJECUTADAS[:]
+        trabajo, creado = trabajos.encolar_tarea('prueba', 'core.tests.tarea_de_prueba', self.usuario, args=[7])
+        self.assertTrue(creado)
+        repetido, creado = trabajos.encolar_tarea('prueba', 'core.tests.tarea_de_prueba', self.usuario, args=[7])
+        self.assertFalse(creado)
+        self.assertEqual(repetido.pk, trabajo.pk)
+
+        tomado = trabajos.tomar_siguiente('prueba:1')
+        self.assertEqual(tomado.pk, trabajo.pk)
+        self.assertIsNotNone(tomado.latido_en)
+        self.assertIsNone(trabajos.tomar_siguiente('prueba:2'))
+
+        trabajos.ejecutar(tomado)
+        self.assertEqual(TAREAS_EJECUTADAS, [7])
+        self.assertEqual(TrabajoSegundoPlano.objects.get(pk=trabajo.pk).estado, 'completado')
+
+
+class LibroFinancieroTests(TestCase):
+    """ProyectoFinanzas se mantiene con señales, también en cascadas y borrados masivos"""
+
+    MARZO = date(2026, 3, 1)
+
+    def setUp(self):
+        self.cliente = Cliente.objects.create(razon_social='Cliente de prueba')
+        self.proyecto = Proyecto.objects.create(nombre='Radiobase', cliente=self.cliente)
+
+    def _factura(self, numero, monto, fecha=date(2026, 3, 10), proyecto=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Factura.objects.create(
+                numero_factura=numero, proyecto=proyecto or self.proyecto, cliente=self.cliente,
+                monto_subtotal=Decimal(monto), monto_total=Decimal(monto),
+                fecha_emision=fecha, fecha_vencimiento=date(2099, 1, 1),
+            )
+
+    def _libro(self, proyecto=None, periodo=MARZO):
+        return ProyectoFinanzas.objects.filter(proyecto=proyecto or self.proyecto, periodo=periodo).first()
+
+    def test_guardar_y_mover_factura(self):
+        factura = self._factura('F-0001', '100.00')
+        self.assertEqual(self._libro().facturado, Decimal('100.00'))
+
+        otro = Proyecto.objects.create(nombre='Metro celda', cliente=self.cliente)
+        factura.proyecto = otro
+        factura.fecha_emision = date(2026, 4, 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            factura.save()
+        self.assertIsNone(self._libro())
+        self.assertEqual(self._libro(otro, date(2026, 4, 1)).facturas_cantidad, 1)
+
+    def test_borrado_en_cascada(self):
+        factura = self._factura('F-0001', '100.00')
+        with self.captureOnCommitCallbacks(execute=True):
+            IngresoProyecto.objects.create(
+                proyecto=self.proyecto, factura=factura, numero_documento='F-0001',
+                descripcion='Pago', monto_total=Decimal('40.00'), fecha_emision=date(2026, 3, 12),
+            )
+        self.assertEqual(self._libro().ingresos_registrados, Decimal('40.00'))
+
+        # El ingreso se elimina en cascada con la factura
+        with self.captureOnCommitCallbacks(execute=True):
+            factura.delete()
+        self.assertIsNone(self._libro())
+
+    def test_borrado_masivo_y_de_cliente(self):
+        self._factura('F-0001', '100.00')
+        self._factura('F-0002', '50.00')
+        with self.captureOnCommitCallbacks(execute=True):
+            Factura.objects.filter(numero_factura='F-0001').delete()
+        self.assertEqual(self._libro().facturado, Decimal('50.00'))
+
+        # Cliente -> Proyecto y Factura en cascada, sin romper las claves foráneas del libro
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cliente.delete()
+        self.assertFalse(ProyectoFinanzas.objects.exists())
+
+    def test_conciliar_cambios_sin_senales(self):
+        self._factura('F-0001', '100.00')
+        Factura.objects.update(monto_total=Decimal('80.00'))
+        self.assertEqual(self._libro().facturado, Decimal('100.00'))
+
+        self.assertEqual(conciliar_finanzas(), 1)
+        self.assertEqual(self._libro().facturado, Decimal('80.00'))
+        self.assertEqual(conciliar_finanzas(), 0)
+
+
+class DashboardInteligenteTests(TestCase):
+    """El número de consultas del análisis inteligente no crece con los proyectos"""
+
+    def setUp(self):
+        self.cliente = Cliente.objects.create(razon_social='Cliente dashboard')
+        self.client.force_login(User.objects.create_user('analista', password='clave-analista'))
+
+    def _consultar(self):
+        respuesta = self.client.get(reverse('dashboard_intelligent_data'), HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        datos = respuesta.json()
+        self.assertTrue(datos['success'])
+        return datos
+
+    def test_consultas_constantes(self):
+        Proyecto.objects.create(nombre='Proyecto 1', cliente=self.cliente)
+        pocos = self._consultar()
+
+        for numero in range(2, 5):
+            Proyecto.objects.create(nombre=f'Proyecto {numero}', cliente=self.cliente)
+        muchos = self._consultar()
+
+        self.assertEqual(len(muchos['data']['proyectos_rentabilidad']), 4)
+        self.assertGreater(pocos['consultas'], 0)
+        self.assertEqual(muchos['consultas'], pocos['consultas'])
+        self.assertTrue(all(p['rentabilidad'] == 0 for p in muchos['data']['proyectos_rentabilidad']))
+
+
+class PaginacionCursorTests(TestCase):
+    """Paginación por cursor de facturas: empates de fecha, cursores inválidos y filtros"""
+
+    def setUp(self):
+        self.cliente = Cliente.objects.create(razon_social='Cliente cursor')
+        self.otro_cliente = Cliente.objects.create(razon_social='Otro cliente')
+        self.proyecto = Proyecto.objects.create(nombre='Cursor', cliente=self.cliente)
+        fechas = [date(2026, 3, 10)] * 5 + [date(2026, 3, 9), date(2026, 3, 11)]
+        self.facturas = [self._factura(f'F-{numero:04d}', fecha) for numero, fecha in enumerate(fechas, 1)]
+
+    def _factura(self, numero, fecha, cliente=None, estado='emitida'):
+        return Factura.objects.create(
+            numero_factura=numero, proyecto=self.proyecto, cliente=cliente or self.cliente, estado=estado,
+            monto_subtotal=Decimal('10.00'), monto_total=Decimal('10.00'),
+            fecha_emision=fecha, fecha_vencimiento=date(2099, 1, 1),
+        )
+
+    def _recorrer(self, por_pagina):
+        ids, cursor = [], None
+        while True:
+            pagina, cursor = paginar_por_cursor(Factura.objects.all(), cursor, por_pagina)
+            ids.extend(factura.pk for factura in pagina)
+            if cursor is None:
+                return ids
+
+    def test_misma_fecha_entre_paginas(self):
+        esperado = list(Factura.objects.order_by('-fecha_emision', '-id').values_list('pk', flat=True))
+        # Las 5 facturas del 10 de marzo quedan repartidas entre varias páginas
+        for por_pagina in (1, 2, 3, 7):
+            self.assertEqual(self._recorrer(por_pagina), esperado)
+
+    def test_cursor_invalido_vuelve_a_la_primera_pagina(self):
+        primera, _ = paginar_por_cursor(Factura.objects.all(), None, 3)
+        for cursor in ('no-es-un-cursor!', 'bm8gZXMganNvbg', codificar_cursor(['2026-03-10']),
+                       codificar_cursor(['ayer', '1']), codificar_cursor(['2026-03-10', 'uno'])):
+            pagina, _ = paginar_por_cursor(Factura.objects.all(), cursor, 3)
+            self.assertEqual(pagina, primera, cursor)
+
+    def test_siguiente_url_conserva_los_filtros(self):
+        self.client.force_login(User.objects.create_user('facturador', password='clave-facturador'))
+        self._factura('F-0100', date(2026, 3, 10), cliente=self.otro_cliente)
+        self._factura('F-0101', date(2026, 3, 10), estado='pagada')
+        filtros = {'estado': 'emitida', 'cliente': str(self.cliente.pk)}
+        url = f"{reverse('facturas_list_pagina')}?estado=emitida&cliente={self.cliente.pk}"
+
+        cantidad = 0
+        with mock.patch.object(views, 'FACTURAS_POR_PAGINA', 3):
+            while url:
+                datos = self.client.get(url).json()
+                cantidad += datos['cantidad']
+                url = datos['siguiente_url']
+                if url:
+                    parametros = QueryDict(url.split('?', 1)[1])
+                    self.assertEqual({clave: parametros[clave] for clave in filtros}, filtros)
+                    self.assertIn('cursor', parametros)
+        self.assertEqual(cantidad, len(self.facturas))
+
+
+class IndiceBusquedaTests(TestCase):
+    """Índice de búsqueda: se llena al migrar y sigue los cambios de los datos relacionados"""
+
+    def setUp(self):
+        self.cliente = Cliente.objects.create(razon_social='Acme Telecom')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.proyecto = Proyecto.objects.create(nombre='Radiobase Norte', cliente=self.cliente)
+            self.factura = Factura.objects.create(
+                numero_factura='F-0012', proyecto=self.proyecto, cliente=self.cliente,
+                monto_subtotal=Decimal('10.00'), monto_total=Decimal('10.00'),
+                fecha_emision=date(2026, 3, 10), fecha_vencimiento=date(2099, 1, 1),
+            )
+
+    def _facturas(self, texto):
+        return list(search.filtrar(Factura.objects.all(), 'factura', texto))
+
+    def test_reindexa_al_renombrar_cliente(self):
+        self.assertEqual(self._facturas('acme'), [self.factura])
+
+        self.cliente.razon_social = 'Globex Redes'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.cliente.save()
+        self.assertEqual(self._facturas('globex'), [self.factura])
+        self.assertEqual(self._facturas('acme'), [])
+        self.assertIn('globex', search.buscar('globex redes', modulos=['proyecto'])[0]['subtitulo'].lower())
+
+    def test_reindexa_al_renombrar_proyecto(self):
+        self.proyecto.nombre = 'Metro Celda Sur'
+        with self.captureOnCommitCallbacks(execute=True):
+            self.proyecto.save()
+        self.assertEqual(self._facturas('metro celda'), [self.factura])
+
+    def test_numeros_por_subcadena(self):
+        self.assertEqual(self._facturas('012'), [self.factura])
+        self.assertEqual(self._facturas('f0012'), [self.factura])
+        self.assertEqual(self._facturas('acme 012'), [self.factura])
+        self.assertEqual(self._facturas('013'), [])
+        resultados = search.buscar('012')
+        self.assertEqual([(r['modulo'], r['objeto_id']) for r in resultados], [('factura', self.factura.pk)])
+
+    def test_reconstruir(self):
+        search._indice().objects.all().delete()
+        self.assertEqual(self._facturas('acme'), [])
+        totales = search.reconstruir()
+        self.assertEqual(totales['factura'], 1)
+        self.assertEqual(self._facturas('acme'), [self.factura])
+
+    def test_poblar_tras_migrar_solo_si_esta_vacio(self):
+        with mock.patch.object(search, 'reconstruir', wraps=search.reconstruir) as reconstruir:
+            search.poblar_indice_vacio(sender=None, using='default')
+            self.assertFalse(reconstruir.called)
+
+            search._indice().objects.all().delete()
+            search.poblar_indice_vacio(sender=None, using='default')
+            self.assertEqual(reconstruir.call_count, 1)
+        self.assertEqual(self._facturas('acme'), [self.factura])
+
+
+class _DocumentoFalso:
+    def __init__(self, doc_id, data):
+        self.id = doc_id
+        self._data = data
+
+    def to_dict(self):
+        return dict(self._data)
+
+
+class _ConsultaFalsa:
+    """Consulta de Firestore mínima: registra start_after y devuelve los documentos en orden"""
+
+    def __init__(self, documentos):
+        self.documentos = documentos
+        self.inicio = None
+        self.limite = None
+
+    def where(self, *args):
+        return self
+
+    def order_by(self, *args, **kwargs):
+        return self
+
+    def select(self, campos):
+        return self
+
+    def start_after(self, valores):
+        self.inicio = valores
+        return self
+
+    def limit(self, limite):
+        self.limite = limite
+        return self
+
+    def stream(self):
+        documentos = self.documentos
+        if self.inicio is not None:
+            ids = [documento.id for documento in documentos]
+            documentos = documentos[ids.index(self.inicio['__name__']) + 1:]
+        return iter(documentos[:self.limite])
+
+
+class _ClienteFalso:
+    def __init__(self, consulta):
+        self.consulta = consulta
+
+    def collection(self, nombre):
+        cliente = self
+
+        class _Coleccion:
+            def document(self, doc_id):
+                return doc_id
+
+            def __getattr__(self, atributo):
+                return getattr(cliente.consulta, atributo)
+
+        return _Coleccion()
+
+
+class PaginacionFirestoreTests(TestCase):
+    """Listado de reportes: borradores omitidos al leer y cursor con el tipo de Firestore"""
+
+    def test_cursor_conserva_timestamp(self):
+        fecha = datetime(2026, 3, 10, 14, 30, 15, 123456, tzinfo=dt_timezone.utc)
+        datos = firebase_sync._decodificar_cursor(firebase_sync._codificar_cursor('abc', fecha))
+        self.assertEqual(datos['id'], 'abc')
+        self.assertIsInstance(datos['orden'], datetime)
+        self.assertEqual(datos['orden'], fecha)
+
+        datos = firebase_sync._decodificar_cursor(firebase_sync._codificar_cursor('abc', '2026-03-10'))
+        self.assertEqual(datos['orden'], '2026-03-10')
+        self.assertIsNone(firebase_sync._decodificar_cursor('no-es-un-cursor'))
+
+    def test_omite_borradores_sin_ocultar_reportes_antiguos(self):
+        fecha = datetime(2026, 3, 10, tzinfo=dt_timezone.utc)
+        consulta = _ConsultaFalsa([
+            _DocumentoFalso('antiguo', {'nombre': 'Sin campo isDraft', 'fecha': fecha}),
+            _DocumentoFalso('borrador', {'nombre': 'Borrador', 'isDraft': True, 'fecha': fecha}),
+            _DocumentoFalso('final', {'nombre': 'Final', 'isDraft': False, 'fecha': fecha}),
+        ])
+        with mock.patch.object(firebase_sync, '_get_firestore_client', return_value=(_ClienteFalso(consulta), '')):
+            items, cursor, error = firebase_sync.fetch_firestore_collection_page(
+                'reportes', page_size=2, order_field='fecha', include_drafts=False,
+            )
+            self.assertEqual(error, '')
+            self.assertEqual([item['id'] for item in items], ['antiguo'])
+            # El cursor sigue al borrador omitido y conserva el Timestamp
+            self.assertTrue(cursor)
+
+            items, cursor, error = firebase_sync.fetch_firestore_collection_page(
+                'reportes', page_size=2, cursor=cursor, order_field='fecha', include_drafts=False,
+            )
+        self.assertEqual(consulta.inicio, {'fecha': fecha, '__name__': 'borrador'})
+        self.assertEqual([item['id'] for item in items], ['final'])
+        self.assertEqual(cursor, '')
+
+
+class SubidasFragmentadasTests(TestCase):
+    """Subidas fragmentadas: fragmentos dañados, reanudación y verificación al completar"""
+
+    CONTENIDO = b'0123456789abcdefghij'
+
+    def setUp(self):
+        self.usuario = User.objects.create_user('cargador', password='clave-cargador')
+        self.client.force_login(self.usuario)
+        self.directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directorio, ignore_errors=True)
+        configuracion = override_settings(SUBIDAS_DIR=self.directorio, SUBIDAS_TAMANO_FRAGMENTO=8)
+        configuracion.enable()
+        self.addCleanup(configuracion.disable)
+
+    def _iniciar(self, **datos):
+        datos = {'nombre': 'plano.dwg', 'tamano': len(self.CONTENIDO), **datos}
+        respuesta = self.client.post(reverse('api_subida_iniciar'), json.dumps(datos), content_type='application/json')
+        self.assertEqual(respuesta.status_code, 201)
+        return respuesta.json()
+
+    def _enviar(self, token, indice, datos=None, sha256=None):
+        datos = self.CONTENIDO[indice * 8:(indice + 1) * 8] if datos is None else datos
+        return self.client.put(
+            reverse('api_subida_fragmento', args=[token, indice]), datos,
+            content_type='application/octet-stream',
+            HTTP_X_FRAGMENTO_SHA256=sha256 if sha256 is not None else hashlib.sha256(datos).hexdigest(),
+        )
+
+    def _completar(self, token):
+        return self.client.post(reverse('api_subida_completar', args=[token]))
+
+    def test_fragmento_danado_se_rechaza(self):
+        subida = self._iniciar()
+        self.assertEqual(subida['total_fragmentos'], 3)
+
+        respuesta = self._enviar(subida['token'], 0, sha256=hashlib.sha256(b'otro').hexdigest())
+        self.assertEqual(respuesta.status_code, 422)
+        estado = self.client.get(reverse('api_subida_estado', args=[subida['token']])).json()
+        self.assertEqual(estado['recibidos'], [])
+
+        self.assertEqual(self._enviar(subida['token'], 0).status_code, 200)
+        estado = self.client.get(reverse('api_subida_estado', args=[subida['token']])).json()
+        self.assertEqual(estado['recibidos'], [0])
+
+    def test_completar_une_y_verifica(self):
+        subida = self._iniciar(sha256=hashlib.sha256(self.CONTENIDO).hexdigest())
+        token = subida['token']
+        for indice in (2, 0):
+            self.assertEqual(self._enviar(token, indice).status_code, 200)
+        # Falta el fragmento 1: la subida sigue abierta para reanudarla
+        self.assertEqual(self._completar(token).status_code, 409)
+        self.assertEqual(self._enviar(token, 1).status_code, 200)
+
+        respuesta = self._completar(token)
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(respuesta.json()['estado'], 'completada')
+        self.assertEqual(respuesta.json()['sha256'], hashlib.sha256(self.CONTENIDO).hexdigest())
+        subida_db = SubidaFragmentada.objects.get(token=token)
+        with open(subidas.ruta_ensamblado(subida_db), 'rb') as archivo:
+            self.assertEqual(archivo.read(), self.CONTENIDO)
+        # Ya completada no acepta más fragmentos
+        self.assertEqual(self._enviar(token, 0).status_code, 409)
+
+    def test_archivo_completado_no_se_vuelve_a_leer_al_guardar(self):
+        token = self._iniciar()['token']
+        for indice in range(3):
+            self._enviar(token, indice)
+        self._completar(token)
+        subida = SubidaFragmentada.objects.get(token=token)
+        cliente = Cliente.objects.create(razon_social='Cliente Subidas')
+        proyecto = Proyecto.objects.create(nombre='Subidas', cliente=cliente)
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+
+        with override_settings(MEDIA_ROOT=media), \
+                mock.patch.object(subidas.ArchivoSubido, 'chunks', side_effect=AssertionError('releído')):
+            archivo = ArchivoProyecto.objects.create(
+                proyecto=proyecto, nombre='Plano', subido_por=self.usuario, archivo=subidas.ArchivoSubido(subida),
+            )
+            archivo.archivo.file.close()
+
+        self.assertEqual(archivo.sha256, hashlib.sha256(self.CONTENIDO).hexdigest())
+        self.assertEqual(archivo.tamano_bytes, len(self.CONTENIDO))
+
+    def test_archivo_distinto_al_declarado_se_reinicia(self):
+        subida = self._iniciar(sha256=hashlib.sha256(b'otro contenido ......').hexdigest())
+        token = subida['token']
+        for indice in range(3):
+            self.assertEqual(self._enviar(token, indice).status_code, 200)
+
+        self.assertEqual(self._completar(token).status_code, 422)
+        estado = self.client.get(reverse('api_subida_estado', args=[token])).json()
+        self.assertEqual(estado['estado'], 'recibiendo')
+        self.assertEqual(estado['recibidos'], [])
+
+
+@override_settings(DESCARGAS_BACKEND='django')
+class DescargasProtegidasTests(TestCase):
+    """Descargas desde Django: Range, If-Range, 416 y 304"""
+
+    CONTENIDO = b'0123456789'
+
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        configuracion = override_settings(MEDIA_ROOT=self.media)
+        configuracion.enable()
+        self.addCleanup(configuracion.disable)
+        self.ruta = self._archivo('reporte.pdf', self.CONTENIDO)
+
+    def _archivo(self, nombre, contenido):
+        ruta = os.path.join(self.media, nombre)
+        with open(ruta, 'wb') as archivo:
+            archivo.write(contenido)
+        return ruta
+
+    def _descargar(self, ruta=None, **cabeceras):
+        request = RequestFactory().get('/descargar/', **cabeceras)
+        return descargas.servir_archivo(request, ruta or self.ruta)
+
+    def _cuerpo(self, respuesta):
+        cuerpo = b''.join(respuesta.streaming_content)
+        respuesta.close()
+        return cuerpo
+
+    def test_rango_parcial(self):
+        respuesta = self._descargar(HTTP_RANGE='bytes=2-5')
+        self.assertEqual(respuesta.status_code, 206)
+        self.assertEqual(respuesta['Content-Range'], 'bytes 2-5/10')
+        self.assertEqual(self._cuerpo(respuesta), b'2345')
+
+        respuesta = self._descargar(HTTP_RANGE='bytes=-3')
+        self.assertEqual(respuesta['Content-Range'], 'bytes 7-9/10')
+        self.assertEqual(self._cuerpo(respuesta), b'789')
+
+    def test_if_range(self):
+        completa = self._descargar()
+        etag = completa['ETag']
+        self.assertEqual(self._cuerpo(completa), self.CONTENIDO)
+
+        respuesta = self._descargar(HTTP_RANGE='bytes=4-', HTTP_IF_RANGE=etag)
+        self.assertEqual(respuesta.status_code, 206)
+        self.assertEqual(self._cuerpo(respuesta), b'456789')
+
+        # El archivo cambió desde la primera parte: se envía completo
+        respuesta = self._descargar(HTTP_RANGE='bytes=4-', HTTP_IF_RANGE='"otro-etag"')
+        self.assertEqual(respuesta.status_code, 200)
+        self.assertEqual(self._cuerpo(respuesta), self.CONTENIDO)
+
+    def test_rango_no_satisfacible(self):
+        respuesta = self._descargar(HTTP_RANGE='bytes=10-')
+        self.assertEqual(respuesta.status_code, 416)
+        self.assertEqual(respuesta['Content-Range'], 'bytes */10')
+
+        vacio = self._archivo('vacio.txt', b'')
+        respuesta = self._descargar(vacio, HTTP_RANGE='bytes=-5')
+        self.assertEqual(respuesta.status_code, 416)
+        self.assertEqual(respuesta['Content-Range'], 'bytes */0')
+
+    def test_no_modificado(self):
+        completa = self._descargar()
+        completa.close()
+        respuesta = self._descargar(HTTP_IF_NONE_MATCH=completa['ETag'])
+        self.assertEqual(respuesta.status_code, 304)
+
+
+class CachePdfTests(TestCase):
+    """PDFs cacheados: 304 con el ETag, sin volver a renderizar e invalidación al guardar"""
+
+    PDF = b'%PDF-1.4 planilla'
+
+    def setUp(self):
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        configuracion = override_settings(MEDIA_ROOT=self.media)
+        configuracion.enable()
+        self.addCleanup(configuracion.disable)
+        self.usuario = User.objects.create_user('contador', password='clave-contador')
+        self.client.force_login(self.usuario)
+        cliente = Cliente.objects.create(razon_social='Cliente PDF')
+        self.proyecto = Proyecto.objects.create(nombre='PDF', cliente=cliente)
+        self.planilla = PlanillaLiquidada.objects.create(
+            proyecto=self.proyecto, mes=3, año=2025, quincena=1, total_salarios=Decimal('800.00'),
+            total_planilla=Decimal('800.00'), cantidad_personal=2, liquidada_por=self.usuario,
+        )
+        self.url = reverse('planilla_liquidada_pdf', args=[self.planilla.pk])
+
+    def _descargar(self, **cabeceras):
+        respuesta = self.client.get(self.url, **cabeceras)
+        if respuesta.streaming:
+            b''.join(respuesta.streaming_content)
+        respuesta.close()
+        return respuesta
+
+    def test_segunda_descarga_no_vuelve_a_renderizar(self):
+        renderizar = views._render_planilla_liquidada_pdf
+        with mock.patch.object(views, '_render_planilla_liquidada_pdf', wraps=renderizar) as render:
+            primera = self._descargar()
+            segunda = self._descargar()
+
+        self.assertEqual(render.call_count, 1)
+        self.assertEqual(primera.status_code, 200)
+        self.assertEqual(segunda.status_code, 200)
+        self.assertEqual(primera['ETag'], segunda['ETag'])
+
+    def test_etag_coincidente_responde_304(self):
+        with mock.patch.object(views, '_render_planilla_liquidada_pdf', return_value=self.PDF) as render:
+            etag = self._descargar()['ETag']
+            respuesta = self._descargar(HTTP_IF_NONE_MATCH=etag)
+
+        self.assertEqual(respuesta.status_code, 304)
+        self.assertEqual(render.call_count, 1)
+
+    def test_guardar_planilla_elimina_el_pdf(self):
+        pdf_cache.guardar('planilla_liquidada', self.planilla.pk, 'v1', self.PDF)
+
+        self.planilla.observaciones = 'Corregida'
+        self.planilla.save()
+
+        self.assertFalse(pdf_cache.en_cache('planilla_liquidada', self.planilla.pk, 'v1'))
+
+    def test_guardar_item_de_cotizacion_elimina_el_pdf(self):
+        cotizacion = Cotizacion.objects.create(
+            proyecto=self.proyecto, cliente=self.proyecto.cliente, numero_cotizacion='COT-PDF-1',
+            titulo='Cableado', descripcion='Cableado estructurado', monto_total=Decimal('100.00'),
+            fecha_emision=date(2025, 3, 1),
+        )
+        pdf_cache.guardar('cotizacion', cotizacion.pk, 'v1', self.PDF)
+
+        ItemCotizacion.objects.create(
+            cotizacion=cotizacion, descripcion='Punto de red', precio_unitario=Decimal('100.00'),
+            total=Decimal('100.00'),
+        )
+
+        self.assertFalse(pdf_cache.en_cache('cotizacion', cotizacion.pk, 'v1'))
+
+
+class _ColeccionTipada:
+    """Colección donde ``where(campo, '>', valor)``, como en Firestore, solo compara valores del mismo tipo"""
+
+    def __init__(self, documentos):
+        self.documentos = documentos
+
+    def where(self, campo, operador, valor):
+        def coincide(documento):
+            actual = documento.to_dict().get(campo)
+            return actual is not None and \
+                isinstance(actual, datetime) == isinstance(valor, datetime) and actual > valor
+
+        return _ConsultaFalsa([documento for documento in self.documentos if coincide(documento)])
+
+
+class EspejoTransaccionesTests(TestCase):
+    """Espejo de transactions: updatedAt numérico o Timestamp y espera del candado de sincronización"""
+
+    CANDADO = f"firebase_mirror_lock:{firebase_sync.TRANSACTIONS_COLLECTION}"
+
+    def setUp(self):
+        self.addCleanup(cache.delete, self.CANDADO)
+
+    def test_incremental_incluye_updated_at_timestamp(self):
+        corte = datetime(2026, 3, 1, tzinfo=dt_timezone.utc)
+        corte_ms = int(corte.timestamp() * 1000)
+        SincronizacionFirebase.objects.create(
+            coleccion=firebase_sync.TRANSACTIONS_COLLECTION,
+            ultimo_timestamp_ms=corte_ms + 30 * 24 * 3600 * 1000,
+            ultimo_actualizado_ms=corte_ms,
+            ultima_sincronizacion_completa=timezone.now(),
+        )
+        viejo_ms = corte_ms - 60 * 24 * 3600 * 1000
+        coleccion = _ColeccionTipada([
+            _DocumentoFalso('numero', {'type': 'EXPENSE', 'amount': 5, 'timestamp': viejo_ms, 'updatedAt': corte_ms + 1}),
+            _DocumentoFalso('fecha', {
+                'type': 'EXPENSE', 'amount': 7, 'timestamp': viejo_ms, 'updatedAt': corte + timedelta(hours=1),
+            }),
+            _DocumentoFalso('sin_cambios', {'type': 'EXPENSE', 'amount': 9, 'timestamp': viejo_ms, 'updatedAt': corte_ms - 1}),
+        ])
+        cliente = mock.Mock()
+        cliente.collection.return_value = coleccion
+
+        with mock.patch.object(firebase_sync, '_get_firestore_client', return_value=(cliente, '')):
+            resultado = firebase_sync.sync_transacciones_espejo()
+
+        self.assertTrue(resultado.ok)
+        self.assertEqual(
+            sorted(TransaccionFirebase.objects.values_list('firebase_id', flat=True)), ['fecha', 'numero']
+        )
+        estado = SincronizacionFirebase.objects.get(coleccion=firebase_sync.TRANSACTIONS_COLLECTION)
+        self.assertEqual(estado.ultimo_actualizado_ms, corte_ms + 3600 * 1000)
+
+    @override_settings(FIREBASE_MIRROR_LOCK_WAIT=0)
+    def test_sincronizacion_obligatoria_informa_si_sigue_en_curso(self):
+        cache.add(self.CANDADO, 1, 60)
+        with mock.patch.object(firebase_sync, 'sync_transacciones_espejo') as sincronizar:
+            _, error = firebase_sync.asegurar_espejo_transacciones(max_age=0)
+            self.assertIn('en curso', error)
+            # Una consulta normal usa el espejo tal como está
+            _, error = firebase_sync.asegurar_espejo_transacciones()
+            self.assertEqual(error, '')
+            sincronizar.assert_not_called()
+
+    def test_sincronizacion_obligatoria_espera_al_otro_worker(self):
+        cache.add(self.CANDADO, 1, 60)
+        esperas = []
+
+        def liberar(segundos):
+            esperas.append(segundos)
+            cache.delete(self.CANDADO)
+
+        resultado = firebase_sync.FirebaseSyncResult(ok=True, message='')
+        with mock.patch.object(firebase_sync, 'sleep', side_effect=liberar), \
+                mock.patch.object(firebase_sync, 'sync_transacciones_espejo', return_value=resultado) as sincronizar:
+            _, error = firebase_sync.asegurar_espejo_transacciones(max_age=0)
+
+        self.assertEqual(error, '')
+        self.assertEqual(len(esperas), 1)
+        sincronizar.assert_called_once_with()
+        self.assertTrue(cache.add(self.CANDADO, 1, 60))
+
+
+class MetadatosArchivosTests(TestCase):
+    """Metadatos al subir archivos y tamaños acumulados por proyecto"""
+
+    def setUp(self):
+        self.usuario = User.objects.create_user('documentador', password='clave-documentador')
+        cliente = Cliente.objects.create(razon_social='Cliente Archivos')
+        self.origen = Proyecto.objects.create(nombre='Origen', cliente=cliente)
+        self.destino = Proyecto.objects.create(nombre='Destino', cliente=cliente)
+        self.media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.media, ignore_errors=True)
+        configuracion = override_settings(MEDIA_ROOT=self.media)
+        configuracion.enable()
+        self.addCleanup(configuracion.disable)
+
+    def _subir(self, contenido=b'plano de red'):
+        with self.captureOnCommitCallbacks(execute=True):
+            return ArchivoProyecto.objects.create(
+                proyecto=self.origen, nombre='Plano', subido_por=self.usuario,
+                archivo=ContentFile(contenido, name='plano.txt'),
+            )
+
+    def test_subida_calcula_metadatos(self):
+        archivo = self._subir()
+        self.assertEqual(archivo.tamano_bytes, 12)
+        self.assertEqual(archivo.sha256, hashlib.sha256(b'plano de red').hexdigest())
+        self.origen.refresh_from_db()
+        self.assertEqual(self.origen.tamano_archivos_bytes, 12)
+
+    def test_registro_anterior_no_se_hashea_al_guardar(self):
+        archivo = self._subir()
+        ArchivoProyecto.objects.filter(pk=archivo.pk).update(sha256='', tamano_bytes=None)
+        archivo = ArchivoProyecto.objects.get(pk=archivo.pk)
+
+        with mock.patch('core.archivos_meta.calcular_metadatos') as calcular:
+            archivo.descripcion = 'Revisión 2'
+            archivo.save()
+        calcular.assert_not_called()
+        self.assertEqual(ArchivoProyecto.objects.get(pk=archivo.pk).sha256, '')
+
+    def test_mover_de_proyecto_recalcula_ambos(self):
+        archivo = self._subir()
+        with self.captureOnCommitCallbacks(execute=True):
+            archivo.proyecto = self.destino
+            archivo.save()
+
+        self.origen.refresh_from_db()
+        self.destino.refresh_from_db()
+        self.assertEqual(self.origen.tamano_archivos_bytes, 0)
+        self.assertEqual(self.destino.tamano_archivos_bytes, 12)
+
+
+def _imagenes_reporte():
+    """Módulo compartido de los generadores de reportes (fuera del paquete core)"""
+    directorio = os.path.join(settings.BASE_DIR, 'reportes')
+    if directorio not in sys.path:
+        sys.path.insert(0, directorio)
+    import imagenes_reporte
+    return imagenes_reporte
+
+
+class _RespuestaImagen:
+    def __init__(self, contenido, longitud=None, estado=200):
+        self.status_code = estado
+        self.ok = estado < 400
+        self.content = contenido
+        self.headers = {
+            'content-type': 'image/png',
+            'ETag': '"v1"',
+            'Content-Length': str(len(contenido) if longitud is None else longitud),
+        }
+
+
+class CacheImagenesReporteTests(TestCase):
+    """Caché de fotos de los reportes: las descargas cortadas no se guardan"""
+
+    URL = 'https://storage.example.com/foto.png'
+
+    def setUp(self):
+        self.modulo = _imagenes_reporte()
+        directorio = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directorio, ignore_errors=True)
+        self.cache = self.modulo.CacheImagenes(directorio, 10)
+        self.sesion = mock.Mock()
+        for atributo, valor in (('_cache', self.cache), ('_sesion', self.sesion)):
+            parche = mock.patch.object(self.modulo, atributo, valor)
+            parche.start()
+            self.addCleanup(parche.stop)
+        self.clave = self.modulo.CacheImagenes.clave(self.URL, 'original', 'original')
+
+    def test_descarga_incompleta_no_se_guarda(self):
+        self.sesion.get.return_value = _RespuestaImagen(b'\x89PNG-cortada', longitud=5000)
+        contenido = self.modulo.descargar_imagen(self.URL, comprimir=False)
+        self.assertEqual(contenido, b'\x89PNG-cortada')
+        self.assertIsNone(self.cache.entrada(self.clave))
+
+        self.sesion.get.return_value = _RespuestaImagen(b'\x89PNG-completa')
+        self.assertEqual(self.modulo.descargar_imagen(self.URL, comprimir=False), b'\x89PNG-completa')
+        self.assertEqual(self.cache.obtener(self.clave), b'\x89PNG-completa')
+
+    def test_descarga_incompleta_conserva_la_copia_en_cache(self):
+        self.cache.guardar(self.clave, b'\x89PNG-completa', '"v0"')
+        self.cache.revalidar_segundos = 0
+        self.sesion.get.return_value = _RespuestaImagen(b'\x89PNG-cortada', longitud=5000)
+
+        self.assertEqual(self.modulo.descargar_imagen(self.URL, comprimir=False), b'\x89PNG-completa')
+        self.assertEqual(self.cache.entrada(self.clave)['etag'], '"v0"')
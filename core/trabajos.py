@@ -0,0 +1,494 @@
+"""
+Cola de trabajos en segundo plano del Telecom Technology
+Las vistas pesadas (PDF, ZIP, exportaciones) se encolan en la tabla
+TrabajoSegundoPlano en lugar de ejecutarse dentro del worker web. Un proceso
+lanzado con ``manage.py procesar_trabajos`` toma los trabajos pendientes,
+ejecuta la misma vista con una petición reconstruida y guarda la respuesta
+como archivo en MEDIA hasta que expira. Las tareas internas (por ejemplo las
+miniaturas de archivos) ejecutan una función en lugar de una vista y no dejan
+archivo. No requiere un broker externo.
+"""
+
+import hashlib
+import json
+import logging
+import os
+import re
+import socket
+import tempfile
+import threading
+import time
+from contextvars import ContextVar
+from datetime import timedelta
+from importlib import import_module
+
+from django.conf import settings
+from django.contrib import messages
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.core.files import File
+from django.db import close_old_connections, connection
+from django.db.models import F, Q
+from django.http import HttpRequest, QueryDict
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+ESTADOS_ACTIVOS = ('pendiente', 'en_proceso')
+
+# Parámetros que no cambian el resultado y no cuentan para la deduplicación
+PARAMETROS_IGNORADOS = {'token', 'csrfmiddlewaretoken', 'nuevo', '_'}
+
+_trabajo_actual = ContextVar('trabajo_actual', default=None)
+_ultimo_progreso = ContextVar('ultimo_progreso', default=0.0)
+
+
+class ErrorTrabajo(Exception):
+    """La vista no produjo un archivo (redirección, error HTTP, etc.)"""
+
+
+def _configuracion(nombre, por_defecto):
+    return getattr(settings, nombre, por_defecto)
+
+
+def segundo_plano_activo():
+    """Con ``TRABAJOS_SEGUNDO_PLANO = False`` las vistas se ejecutan en la petición"""
+    return _configuracion('TRABAJOS_SEGUNDO_PLANO', True)
+
+
+def en_worker(request):
+    """True si la petición fue reconstruida por el worker para ejecutar un trabajo"""
+    return getattr(request, 'trabajo', None) is not None
+
+
+def nombre_worker():
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def clave_peticion(vista, request, args=(), kwargs=None):
+    """Hash que identifica una petición idéntica del mismo usuario"""
+    def _normalizar(datos):
+        return sorted(
+            (nombre, sorted(valores))
+            for nombre, valores in datos.lists()
+            if nombre not in PARAMETROS_IGNORADOS
+        )
+
+    datos = request.POST if request.method == 'POST' else QueryDict()
+    contenido = json.dumps(
+        [vista, request.user.pk, list(args), kwargs or {},
+         _normalizar(request.GET), request.method, _normalizar(datos)],
+        sort_keys=True, default=str,
+    )
+    return hashlib.sha256(contenido.encode('utf-8')).hexdigest()
+
+
+def encolar(tipo, vista, request, args=(), kwargs=None, descripcion=''):
+    """
+    Encola la ejecución de ``vista`` (ruta con puntos) para la petición actual.
+
+    Si el mismo usuario ya pidió lo mismo y el trabajo sigue pendiente o en
+    proceso, retorna ese trabajo en lugar de crear otro (salvo ``?nuevo=1``).
+    Un trabajo ya completado no se reutiliza: la clave solo describe la
+    petición, no los datos, y tras editar una cotización o un proyecto el
+    archivo anterior quedaría desactualizado. Retorna ``(trabajo, creado)``.
+    """
+    from .models import TrabajoSegundoPlano
+
+    kwargs = kwargs or {}
+    clave = clave_peticion(vista, request, args, kwargs)
+    if request.GET.get('nuevo') != '1':
+        existente = TrabajoSegundoPlano.objects.filter(
+            estado__in=ESTADOS_ACTIVOS,
+            clave=clave,
+            usuario=request.user,
+        ).order_by('-creado_en').first()
+        if existente is not None:
+            return existente, False
+
+    trabajo = TrabajoSegundoPlano.objects.create(
+        tipo=tipo,
+        descripcion=descripcion[:255],
+        clave=clave,
+        usuario=request.user,
+        mensaje='En cola',
+        parametros={
+            'vista': vista,
+            'metodo': request.method,
+            'ruta': request.path,
+            'consulta': request.GET.urlencode(),
+            'datos': request.POST.urlencode() if request.method == 'POST' else '',
+            'args': list(args),
+            'kwargs': kwargs,
+            'host': request.get_host(),
+            'remote_addr': request.META.get('REMOTE_ADDR', ''),
+        },
+    )
+    logger.info(f"Trabajo {trabajo.pk} ({tipo}) encolado por {request.user}")
+    return trabajo, True
+
+
+def encolar_tarea(tipo, funcion, usuario, args=(), descripcion='', clave=None):
+    """
+    Encola una función interna (ruta con puntos) que no produce un archivo,
+    por ejemplo las miniaturas de un archivo recién subido.
+
+    ``usuario`` es obligatorio: el trabajo queda a su nombre y solo él lo ve
+    en el panel de trabajos. Con ``clave`` no se encola otra tarea igual mientras haya una pendiente o
+    en proceso. Retorna ``(trabajo, creado)``.
+    """
+    from .models import TrabajoSegundoPlano
+
+    clave = clave or hashlib.sha256(
+        json.dumps([funcion, list(args)], default=str).encode('utf-8')
+    ).hexdigest()
+    existente = TrabajoSegundoPlano.objects.filter(
+        estado__in=ESTADOS_ACTIVOS, clave=clave
+    ).order_by('-creado_en').first()
+    if existente is not None:
+        return existente, False
+
+    trabajo = TrabajoSegundoPlano.objects.create(
+        tipo=tipo,
+        descripcion=descripcion[:255],
+        clave=clave,
+        usuario=usuario,
+        mensaje='En cola',
+        parametros={'funcion': funcion, 'args': list(args)},
+    )
+    return trabajo, True
+
+
+def es_tarea_interna(trabajo):
+    """True si el trabajo ejecuta una función interna en lugar de una vista"""
+    return 'funcion' in (trabajo.parametros or {})
+
+
+def reportar_progreso(progreso=None, mensaje=None, forzar=False):
+    """
+    Actualiza el avance del trabajo en ejecución (no hace nada fuera del worker).
+
+    Las escrituras se limitan a una por segundo para no cargar la base de datos
+    desde bucles largos.
+    """
+    trabajo = _trabajo_actual.get()
+    if trabajo is None:
+        return
+    ahora = time.monotonic()
+    if not forzar and ahora - _ultimo_progreso.get() < 1:
+        return
+    _ultimo_progreso.set(ahora)
+
+    campos = {}
+    if progreso is not None:
+        campos['progreso'] = max(0, min(int(progreso), 100))
+    if mensaje is not None:
+        campos['mensaje'] = str(mensaje)[:255]
+    if campos:
+        type(trabajo).objects.filter(pk=trabajo.pk).update(latido_en=timezone.now(), **campos)
+
+
+def tomar_siguiente(worker=None):
+    """
+    Marca como ``en_proceso`` el trabajo pendiente más antiguo y lo retorna.
+
+    La toma es un UPDATE condicionado al estado, de modo que varios workers
+    (incluso sobre SQLite, sin SELECT ... FOR UPDATE SKIP LOCKED) nunca
+    ejecutan el mismo trabajo.
+    """
+    from .models import TrabajoSegundoPlano
+
+    worker = worker or nombre_worker()
+    candidatos = TrabajoSegundoPlano.objects.filter(
+        estado='pendiente'
+    ).order_by('creado_en').values_list('pk', flat=True)[:10]
+    for pk in list(candidatos):
+        tomado = TrabajoSegundoPlano.objects.filter(pk=pk, estado='pendiente').update(
+            estado='en_proceso',
+            iniciado_en=timezone.now(),
+            latido_en=timezone.now(),
+            worker=worker[:100],
+            intentos=F('intentos') + 1,
+            progreso=0,
+            mensaje='Procesando',
+        )
+        if tomado:
+            return TrabajoSegundoPlano.objects.select_related('usuario').get(pk=pk)
+    return None
+
+
+def _construir_peticion(trabajo):
+    """Petición equivalente a la original, autenticada como el usuario que la hizo"""
+    parametros = trabajo.parametros
+    host = parametros.get('host') or 'localhost'
+    request = HttpRequest()
+    request.method = parametros.get('metodo', 'GET')
+    request.path = request.path_info = parametros.get('ruta', '/')
+    request.GET = QueryDict(parametros.get('consulta', ''))
+    request.POST = QueryDict(parametros.get('datos', ''))
+    request.META.update({
+        'QUERY_STRING': parametros.get('consulta', ''),
+        'HTTP_HOST': host,
+        'SERVER_NAME': host.split(':')[0],
+        'SERVER_PORT': host.split(':')[1] if ':' in host else '80',
+        'REMOTE_ADDR': parametros.get('remote_addr') or '127.0.0.1',
+        'HTTP_USER_AGENT': 'procesar_trabajos',
+    })
+    request.user = trabajo.usuario
+    request.session = import_module(settings.SESSION_ENGINE).SessionStore()
+    request._messages = CookieStorage(request)
+    request.trabajo = trabajo
+    return request
+
+
+def _nombre_de_respuesta(response, por_defecto):
+    disposicion = response.get('Content-Disposition', '')
+    coincidencia = re.search(r'filename="?([^";]+)"?', disposicion)
+    return os.path.basename(coincidencia.group(1)) if coincidencia else por_defecto
+
+
+def _guardar_respuesta(trabajo, request, response):
+    """Guarda el cuerpo de la respuesta de la vista como archivo del trabajo"""
+    if response.status_code != 200:
+        detalle = '; '.join(str(mensaje) for mensaje in messages.get_messages(request))
+        if not detalle and not response.streaming and response.status_code not in (301, 302):
+            detalle = response.content[:500].decode('utf-8', errors='ignore')
+        raise ErrorTrabajo(detalle or f"La vista respondió con estado {response.status_code}")
+    if 'attachment' not in response.get('Content-Disposition', '') and \
+            response.get('Content-Type', '').startswith('text/html'):
+        # Las vistas muestran sus errores como página HTML en lugar de un archivo
+        raise ErrorTrabajo('La vista no generó un archivo')
+
+    nombre = _nombre_de_respuesta(response, f"{trabajo.tipo}_{trabajo.pk}")
+    with tempfile.TemporaryFile() as temporal:
+        if response.streaming:
+            for bloque in response.streaming_content:
+                temporal.write(bloque)
+        else:
+            temporal.write(response.content)
+        temporal.seek(0)
+        trabajo.archivo.save(nombre, File(temporal, name=nombre), save=False)
+    trabajo.nombre_archivo = nombre[:255]
+    trabajo.content_type = response.get('Content-Type', 'application/octet-stream')[:100]
+
+
+def _iniciar_latido(trabajo):
+    """
+    Renueva ``latido_en`` cada ``TRABAJOS_LATIDO`` segundos mientras el trabajo
+    se ejecuta, así ``recuperar_colgados`` distingue un trabajo largo de uno
+    cuyo worker murió. Retorna el evento que detiene el hilo.
+    """
+    detener = threading.Event()
+    intervalo = _configuracion('TRABAJOS_LATIDO', 30)
+    modelo = type(trabajo)
+
+    def _latir():
+        try:
+            while not detener.wait(intervalo):
+                try:
+                    modelo.objects.filter(pk=trabajo.pk, estado='en_proceso').update(
+                        latido_en=timezone.now()
+                    )
+                except Exception as e:
+                    logger.warning(f"No se pudo renovar el latido del trabajo {trabajo.pk}: {e}")
+        finally:
+            connection.close()
+
+    threading.Thread(target=_latir, name=f'latido-trabajo-{trabajo.pk}', daemon=True).start()
+    return detener
+
+
+def ejecutar(trabajo):
+    """Ejecuta un trabajo ya tomado y deja su estado final (completado o error)"""
+    token = _trabajo_actual.set(trabajo)
+    _ultimo_progreso.set(0.0)
+    inicio = time.monotonic()
+    latido = _iniciar_latido(trabajo)
+    try:
+        parametros = trabajo.parametros
+        if es_tarea_interna(trabajo):
+            return _ejecutar_tarea(trabajo, inicio)
+        modulo, _, nombre = parametros['vista'].rpartition('.')
+        vista = getattr(import_module(modulo), nombre)
+        request = _construir_peticion(trabajo)
+        response = vista(request, *parametros.get('args', []), **parametros.get('kwargs', {}))
+        try:
+            _guardar_respuesta(trabajo, request, response)
+        finally:
+            response.close()
+
+        ahora = timezone.now()
+        trabajo.estado = 'completado'
+        trabajo.progreso = 100
+        trabajo.mensaje = 'Archivo listo'
+        trabajo.error = ''
+        trabajo.finalizado_en = ahora
+        trabajo.expira_en = ahora + timedelta(hours=_configuracion('TRABAJOS_RETENCION_HORAS', 24))
+        trabajo.save()
+        logger.info(f"Trabajo {trabajo.pk} ({trabajo.tipo}) completado en {time.monotonic() - inicio:.1f}s")
+    except Exception as exc:
+        logger.exception(f"Error en el trabajo {trabajo.pk} ({trabajo.tipo})")
+        trabajo.estado = 'error'
+        trabajo.mensaje = 'No se pudo generar el archivo'
+        trabajo.error = str(exc)[:2000]
+        trabajo.finalizado_en = timezone.now()
+        trabajo.save()
+    finally:
+        latido.set()
+        _trabajo_actual.reset(token)
+    return trabajo
+
+
+def _ejecutar_tarea(trabajo, inicio):
+    """Ejecuta la función de una tarea interna; el registro expira al terminar"""
+    modulo, _, nombre = trabajo.parametros['funcion'].rpartition('.')
+    funcion = getattr(import_module(modulo), nombre)
+    funcion(*trabajo.parametros.get('args', []))
+
+    ahora = timezone.now()
+    trabajo.estado = 'completado'
+    trabajo.progreso = 100
+    trabajo.mensaje = 'Tarea completada'
+    trabajo.error = ''
+    trabajo.finalizado_en = ahora
+    trabajo.expira_en = ahora
+    trabajo.save()
+    logger.info(f"Tarea {trabajo.pk} ({trabajo.tipo}) completada en {time.monotonic() - inicio:.1f}s")
+    return trabajo
+
+
+def recuperar_colgados():
+    """
+    Devuelve a la cola los trabajos ``en_proceso`` cuyo worker murió.
+
+    Un trabajo en ejecución renueva ``latido_en`` cada ``TRABAJOS_LATIDO``
+    segundos; solo se considera colgado si su latido tiene más de
+    ``TRABAJOS_LATIDO_LIMITE`` segundos, sin importar cuánto lleve
+    ejecutándose. Los trabajos sin latido (tomados antes de existir el campo)
+    se recuperan tras ``TRABAJOS_TIMEOUT`` segundos. Tras
+    ``TRABAJOS_MAX_INTENTOS`` intentos quedan en error. Retorna cuántos se tocaron.
+    """
+    from .models import TrabajoSegundoPlano
+
+    ahora = timezone.now()
+    sin_latido = ahora - timedelta(seconds=_configuracion('TRABAJOS_LATIDO_LIMITE', 120))
+    limite = ahora - timedelta(seconds=_configuracion('TRABAJOS_TIMEOUT', 1800))
+    colgados = TrabajoSegundoPlano.objects.filter(
+        Q(latido_en__lt=sin_latido) | Q(latido_en__isnull=True, iniciado_en__lt=limite),
+        estado='en_proceso',
+    )
+    agotados = colgados.filter(intentos__gte=_configuracion('TRABAJOS_MAX_INTENTOS', 2)).update(
+        estado='error',
+        mensaje='Tiempo agotado',
+        error='El worker no terminó el trabajo a tiempo',
+        finalizado_en=timezone.now(),
+    )
+    # Los agotados ya no están en_proceso: el resto vuelve a la cola
+    reintentados = colgados.update(estado='pendiente', mensaje='Reintentando', worker='')
+    if agotados or reintentados:
+        logger.warning(f"Trabajos colgados: {reintentados} reencolados, {agotados} con error")
+    return agotados + reintentados
+
+
+def depurar_expirados():
+    """
+    Elimina los archivos de los trabajos expirados y el historial antiguo.
+
+    Los trabajos completados pasan a ``expirado`` al vencer (el registro se
+    conserva para el historial) y los finalizados hace más de
+    ``TRABAJOS_HISTORIAL_DIAS`` días se eliminan. Retorna cuántos archivos se borraron.
+    """
+    from .models import TrabajoSegundoPlano
+
+    ahora = timezone.now()
+    borrados = 0
+    for trabajo in TrabajoSegundoPlano.objects.filter(estado='completado', expira_en__lte=ahora).iterator():
+        if trabajo.archivo:
+            try:
+                trabajo.archivo.delete(save=False)
+                borrados += 1
+            except Exception as e:
+                logger.warning(f"No se pudo eliminar el archivo del trabajo {trabajo.pk}: {e}")
+        trabajo.estado = 'expirado'
+        trabajo.mensaje = 'Archivo expirado'
+        trabajo.save(update_fields=['archivo', 'estado', 'mensaje'])
+
+    limite = ahora - timedelta(days=_configuracion('TRABAJOS_HISTORIAL_DIAS', 30))
+    TrabajoSegundoPlano.objects.filter(
+        estado__in=('error', 'expirado'), finalizado_en__lt=limite
+    ).delete()
+    return borrados
+
+
+def _depurar_subidas():
+    """Fragmentos de subidas abandonadas (ver core/subidas.py)"""
+    from .subidas import depurar_abandonadas
+
+    try:
+        return depurar_abandonadas()
+    except Exception:
+        logger.exception("Error depurando subidas abandonadas")
+        return 0
+
+
+def _conciliar_finanzas():
+    """Corrige el libro ProyectoFinanzas (cambios sin señales, ver core/finanzas.py)"""
+    from .finanzas import conciliar_finanzas
+
+    try:
+        return conciliar_finanzas()
+    except Exception:
+        logger.exception("Error conciliando el libro financiero")
+        return 0
+
+
+def procesar(una_vez=False, intervalo=2, mantenimiento=300, worker=None):
+    """
+    Ciclo del worker: toma y ejecuta trabajos hasta que no quedan (``una_vez``)
+    o indefinidamente, esperando ``intervalo`` segundos cuando la cola está vacía.
+    Cada ``mantenimiento`` segundos recupera trabajos colgados, depura expirados
+    y elimina los fragmentos de subidas abandonadas; cada
+    ``FINANZAS_CONCILIACION_HORAS`` horas concilia el libro financiero.
+    Retorna la cantidad de trabajos ejecutados.
+    """
+    worker = worker or nombre_worker()
+    ejecutados = 0
+    ultimo_mantenimiento = 0.0
+    ultima_conciliacion = time.monotonic()
+    while True:
+        close_old_connections()
+        if time.monotonic() - ultimo_mantenimiento >= mantenimiento:
+            recuperar_colgados()
+            depurar_expirados()
+            _depurar_subidas()
+            ultimo_mantenimiento = time.monotonic()
+        if time.monotonic() - ultima_conciliacion >= _configuracion('FINANZAS_CONCILIACION_HORAS', 24) * 3600:
+            _conciliar_finanzas()
+            ultima_conciliacion = time.monotonic()
+
+        trabajo = tomar_siguiente(worker)
+        if trabajo is not None:
+            ejecutar(trabajo)
+            ejecutados += 1
+            continue
+        if una_vez:
+            return ejecutados
+        time.sleep(intervalo)
+
+
+def trabajo_a_dict(trabajo):
+    """Estado del trabajo para las respuestas JSON"""
+    from django.urls import reverse
+
+    return {
+        'id': trabajo.pk,
+        'tipo': trabajo.tipo,
+        'estado': trabajo.estado,
+        'progreso': trabajo.progreso,
+        'mensaje': trabajo.mensaje,
+        'error': trabajo.error if trabajo.estado == 'error' else '',
+        'nombre_archivo': trabajo.nombre_archivo,
+        'expira_en': trabajo.expira_en.isoformat() if trabajo.expira_en else None,
+        'url_estado': reverse('trabajo_estado', args=[trabajo.pk]),
+        'url_detalle': reverse('trabajo_detalle', args=[trabajo.pk]),
+        'url_descarga': reverse('trabajo_descargar', args=[trabajo.pk]) if trabajo.disponible else None,
+    }
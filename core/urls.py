@@ -72,6 +72,7 @@ urlpatterns = [
     path('caja-menuda/firebase/depositar/', views.caja_menuda_firebase_deposit, name='caja_menuda_firebase_deposit'),
     path('caja-menuda/firebase/exportar/', views.caja_menuda_firebase_export, name='caja_menuda_firebase_export'),
     path('caja-menuda/firebase/exportar-pdf/', views.caja_menuda_firebase_export_pdf, name='caja_menuda_firebase_export_pdf'),
+    path('caja-menuda/firebase/sincronizar/', views.caja_menuda_firebase_resync, name='caja_menuda_firebase_resync'),
     path('caja-menuda/firebase/<str:transaction_id>/', views.caja_menuda_firebase_detail, name='caja_menuda_firebase_detail'),
     
     # Torreros - Dashboard y Servicios
@@ -152,6 +153,7 @@ urlpatterns = [
     
     # Facturas
     path('facturas/', views.facturas_list, name='facturas_list'),
+    path('facturas/pagina/', views.facturas_list_pagina, name='facturas_list_pagina'),
     path('facturas/crear/', views.factura_create, name='factura_create'),
     path('facturas/<int:factura_id>/', views.factura_detail, name='factura_detail'),
     path('facturas/<int:factura_id>/editar/', views.factura_edit, name='factura_edit'),
@@ -171,6 +173,16 @@ urlpatterns = [
         views.reportes_exportacion_exportar,
         name='reportes_exportacion_exportar'
     ),
+    path(
+        'reportes/exportacion/progreso/<str:token>/',
+        views.reportes_exportacion_progreso,
+        name='reportes_exportacion_progreso'
+    ),
+
+    # Trabajos en segundo plano (PDF, ZIP y exportaciones pesadas)
+    path('trabajos/<int:trabajo_id>/', views.trabajo_detalle, name='trabajo_detalle'),
+    path('trabajos/<int:trabajo_id>/estado/', views.trabajo_estado, name='trabajo_estado'),
+    path('trabajos/<int:trabajo_id>/descargar/', views.trabajo_descargar, name='trabajo_descargar'),
     
     # Egresos
     path('egresos/dashboard/', views.gastos_dashboard, name='egresos_dashboard'),
@@ -271,6 +283,7 @@ urlpatterns = [
     path('archivos/<int:archivo_id>/descargar/', views.archivo_download, name='archivo_download'),
     path('archivos/<int:archivo_id>/eliminar/', views.archivo_delete, name='archivo_delete'),
     path('archivos/<int:archivo_id>/preview/', views.archivo_preview, name='archivo_preview'),
+    path('archivos/<int:archivo_id>/miniatura/<str:tamano>/', views.archivo_miniatura, name='archivo_miniatura'),
     
     # URLs de Carpetas de Proyectos
     path('archivos/proyecto/<int:proyecto_id>/carpeta/crear/', views.carpeta_create, name='carpeta_create'),
@@ -293,6 +306,13 @@ urlpatterns = [
     path('api/notificaciones/no-leidas/', views.api_notificaciones_no_leidas, name='api_notificaciones_no_leidas'),
     path('api/notificacion/<int:notificacion_id>/marcar-leida/', views.api_marcar_leida, name='api_marcar_leida'),
     
+    # Búsqueda global de texto completo
+    path('api/buscar/', views.api_buscar, name='api_buscar'),
+    path('api/subidas/', views.api_subida_iniciar, name='api_subida_iniciar'),
+    path('api/subidas/<str:token>/', views.api_subida_estado, name='api_subida_estado'),
+    path('api/subidas/<str:token>/fragmentos/<int:indice>/', views.api_subida_fragmento, name='api_subida_fragmento'),
+    path('api/subidas/<str:token>/completar/', views.api_subida_completar, name='api_subida_completar'),
+    
     # API para subproyectos
     path('api/proyectos/<int:proyecto_id>/subproyectos/', views.get_subproyectos_by_proyecto, name='get_subproyectos_by_proyecto'),
     
@@ -87,10 +87,10 @@ def get_cached_data(key, callback, timeout=300):
 def invalidate_cache_pattern(pattern):
     """
     Invalida todas las claves de caché que coincidan con un patrón
+    (ver core.cache_utils.invalidate_cache_pattern)
     """
-    # En desarrollo con cache local, no hay mucho que invalidar
-    # En producción con Redis, se implementaría la invalidación real
-    logger.info(f"Cache invalidation requested for pattern: {pattern}")
+    from .cache_utils import invalidate_cache_pattern as invalidar_patron
+    invalidar_patron(pattern)
 
 def safe_json_response(data, status=200):
     """
@@ -107,12 +107,15 @@ def log_activity(user, action, details=None, project=None):
     Registra una actividad del usuario
     """
     try:
-        from .models import LogActividad
-        LogActividad.objects.create(
+        from .activity_log import registrar_actividad
+        descripcion = details or ""
+        if project is not None:
+            descripcion = f"{descripcion} (Proyecto: {project})".strip()
+        registrar_actividad(
             usuario=user,
             accion=action,
-            detalles=details or "",
-            proyecto=project
+            modulo='Proyectos' if project is not None else 'Sistema',
+            descripcion=descripcion,
         )
     except Exception as e:
         logger.error(f"Error registrando actividad: {e}")
@@ -6,7 +6,7 @@ from django.contrib import messages
 from django.http import JsonResponse
 from django.db import models, IntegrityError
 from django.db.models import Sum, Count, Q, F, Avg
-from django.db.models.functions import Extract
+from django.db.models.functions import Extract, Lower
 from django.utils import timezone
 from django.views.decorators.http import require_http_methods
 from datetime import datetime, timedelta, time
@@ -17,6 +17,7 @@ import os
 from collections import defaultdict
 import json
 import csv
+import itertools
 import logging
 import re
 from .models import (
@@ -31,7 +32,7 @@ from .models import (
     ServicioTorrero, RegistroDiasTrabajados, PagoServicioTorrero, Torrero, AsignacionTorrero,
     Subproyecto, NotaPostit, CajaMenuda, PlanificacionBitacora, AvancePlanificacion, AvancePlanificacion,
     ArchivoAdjunto, BancoCuenta, MovimientoBanco, BitacoraTarea, BitacoraSubtarea,
-    BitacoraAsignacion, BitacoraAvanceDiario
+    BitacoraAsignacion, BitacoraAvanceDiario, ProyectoFinanzas, TransaccionFirebase, TrabajoSegundoPlano
 )
 from .forms_simple import (
     ClienteForm, ProyectoForm, ColaboradorForm, FacturaForm, 
@@ -47,18 +48,23 @@ from .forms_simple import (
 from django.contrib.auth.models import User
 from django.contrib.auth.forms import UserCreationForm, UserChangeForm
 from django.core.paginator import Paginator
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse, HttpResponse, StreamingHttpResponse
+from django.template.loader import render_to_string
 from .services import NotificacionService, DashboardService, ProyectoService
 from .firebase_sync import (
-    fetch_expenses_for_caja_menuda,
+    CAJA_MENUDA_TIPOS,
+    asegurar_espejo_transacciones,
+    sync_transacciones_espejo,
     fetch_expense_detail,
     fetch_firebase_team_leaders,
-    fetch_firebase_transactions_for_user,
     fetch_firebase_cuadres,
     create_firebase_cuadre,
     fetch_firebase_auth_emails,
     fetch_firestore_collection_docs,
     fetch_firestore_document,
+    fetch_firestore_collection_page,
+    fetch_firestore_documents,
+    iter_firestore_collection_docs,
     ensure_bitacora_proyecto,
     create_firebase_deposit,
     sync_bitacora_asignacion_to_firebase,
@@ -69,8 +75,26 @@ from .firebase_sync import (
     sync_caja_menuda_to_firebase,
 )
 from .reportes_pdf import generar_pdf_reporte
+from .reportes_lote import exportar_lote_zip, obtener_progreso
+from .reporte_contable import generar_zip_contable, recolectar_adjuntos
+from . import descargas
+from . import pdf_cache
+from . import search
+from . import subidas
+from .pdf_estilos import (
+    estilo, tabla_listado, tabla_clasica, tabla_resumen, linea, encabezado_con_logo,
+    pie_documento, construir_pdf, MARGEN_ESTRECHO, RUC_EMPRESA, TABLA_FICHA, TABLA_FICHA_MONTOS,
+    TABLA_PERIODO, TABLA_CONCEPTOS, TABLA_DETALLE_GRIS, TABLA_FICHA_INDIGO, TABLA_RESUMEN_INDIGO,
+    TABLA_DETALLE_INDIGO, TABLA_PAGOS, BARRA_AZUL, TABLA_DATOS_CLIENTE, TABLA_ITEMS_COTIZACION,
+)
+from .trabajos import segundo_plano_activo, trabajo_a_dict
 from .query_utils import QueryOptimizer, DashboardQueries
-from .decorators import api_view, secure_view, cache_view
+from .pagination_utils import paginar_por_cursor
+from .carpetas import ArbolCarpetas
+from .dashboard_metrics import DashboardMetricsEngine
+from .finanzas import reconstruir_finanzas
+from .activity_log import registrar_actividad, depurar_logs_actividad
+from .decorators import api_view, secure_view, cache_view, en_segundo_plano
 from reportlab.lib.pagesizes import letter, A4, landscape
 from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, PageBreak, Image
 from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
@@ -131,7 +155,7 @@ def login_view(request):
         if user is not None:
             login(request, user)
             # Registrar actividad
-            LogActividad.objects.create(
+            registrar_actividad(
                 usuario=user,
                 accion='Login',
                 modulo='Sistema',
@@ -150,7 +174,7 @@ def login_view(request):
 def logout_view(request):
     """Vista de logout"""
     # Registrar actividad
-    LogActividad.objects.create(
+    registrar_actividad(
         usuario=request.user,
         accion='Logout',
         modulo='Sistema',
@@ -167,194 +191,169 @@ def dashboard(request):
     """
     Vista del dashboard principal SUPER SIMPLE Y FUNCIONAL
     """
+    motor = DashboardMetricsEngine()
     try:
-        # Datos básicos del sistema
-        total_clientes = Cliente.objects.filter(activo=True).count()
-        total_proyectos = Proyecto.objects.filter(activo=True).count()
-        total_facturado = Factura.objects.aggregate(total=Sum('monto_total'))['total'] or Decimal('0.00')
-        
-        # Total cobrado = Facturas pagadas + Anticipos aplicados al proyecto
-        total_facturas_pagadas = Factura.objects.filter(estado='pagada').aggregate(total=Sum('monto_total'))['total'] or Decimal('0.00')
-        total_anticipos_aplicados = Anticipo.objects.filter(aplicado_al_proyecto=True).aggregate(total=Sum('monto_aplicado_proyecto'))['total'] or Decimal('0.00')
-        total_cobrado = total_facturas_pagadas + total_anticipos_aplicados
-        
-        # ============================================================================
-        # DATOS DE RENTABILIDAD REAL
-        # ============================================================================
-        
-        # Calcular rentabilidad del mes actual
-        hoy = timezone.now()
-        mes_actual = hoy.month
-        año_actual = hoy.year
-        
-        # Ingresos del mes = Facturas pagadas + Anticipos aplicados al proyecto
-        facturas_pagadas_mes = Factura.objects.filter(
-            fecha_emision__month=mes_actual,
-            fecha_emision__year=año_actual,
-            estado='pagada'  # Solo facturas pagadas
-        ).aggregate(total=Sum('monto_total'))['total'] or Decimal('0.00')
-        
-        anticipos_aplicados_mes = Anticipo.objects.filter(
-            fecha_aplicacion__month=mes_actual,
-            fecha_aplicacion__year=año_actual,
-            aplicado_al_proyecto=True
-        ).aggregate(total=Sum('monto_aplicado_proyecto'))['total'] or Decimal('0.00')
-        
-        ingresos_mes = facturas_pagadas_mes + anticipos_aplicados_mes
-        
-        # DEBUG: Mostrar diferencia en dashboard
-        total_facturado_mes = Factura.objects.filter(
-            fecha_emision__month=mes_actual,
-            fecha_emision__year=año_actual
-        ).aggregate(total=Sum('monto_total'))['total'] or Decimal('0.00')
-        
-        # Log información del dashboard para debugging
-        logger.debug(f"Dashboard - Mes: {mes_actual}/{año_actual}, Facturado: ${total_facturado_mes}, Cobrado: ${ingresos_mes}")
-        
-        # Gastos del mes (gastos aprobados)
-        gastos_mes_raw = Gasto.objects.filter(
-            fecha_gasto__month=mes_actual,
-            fecha_gasto__year=año_actual,
-            aprobado=True
-        ).aggregate(total=Sum('monto'))['total'] or 0
-        gastos_mes = Decimal(str(gastos_mes_raw))
-        
-        # Calcular rentabilidad
-        rentabilidad_mes = ingresos_mes - gastos_mes
-        margen_rentabilidad = (rentabilidad_mes / ingresos_mes * 100) if ingresos_mes > 0 else Decimal('0.00')
-        
-        # Gastos por categoría del mes
-        gastos_categoria_mes = Gasto.objects.filter(
-            fecha_gasto__month=mes_actual,
-            fecha_gasto__year=año_actual,
-            aprobado=True
-        ).values('categoria__nombre').annotate(
-            total=Sum('monto')
-        ).order_by('-total')[:5]
-        
-        # Proyectos más rentables del mes
-        proyectos_rentables = []
-        proyectos_activos = Proyecto.objects.filter(activo=True)
-        
-        for proyecto in proyectos_activos:
-            # Ingresos del proyecto = Facturas pagadas + Anticipos aplicados (TODOS LOS TIEMPOS)
-            facturas_pagadas_proyecto = Factura.objects.filter(
-                proyecto=proyecto,
-                monto_pagado__gt=0
-            ).aggregate(total=Sum('monto_pagado'))['total'] or Decimal('0.00')
+        with motor.medir():
+            # Datos básicos del sistema
+            total_clientes = Cliente.objects.filter(activo=True).count()
+            resumen_proyectos = motor.resumen_proyectos()
+            total_proyectos = resumen_proyectos['total']
+            
+            # Total cobrado = Facturas pagadas + Anticipos aplicados al proyecto
+            totales = motor.totales_generales()
+            total_facturado = totales['total_facturado']
+            total_facturas_pagadas = totales['total_facturas_pagadas']
+            total_anticipos_aplicados = totales['total_anticipos_aplicados']
+            total_cobrado = totales['total_cobrado']
             
-            anticipos_aplicados_proyecto = Anticipo.objects.filter(
-                proyecto=proyecto,
-                aplicado_al_proyecto=True
-            ).aggregate(total=Sum('monto_aplicado_proyecto'))['total'] or Decimal('0.00')
+            # ============================================================================
+            # DATOS REALES PARA GRÁFICOS - INGRESOS VS GASTOS
+            # ============================================================================
             
-            ingresos_proyecto = facturas_pagadas_proyecto + anticipos_aplicados_proyecto
+            # Obtener período seleccionado (por defecto 6 meses)
+            periodo = request.GET.get('periodo', '6')
+            num_meses = {'1': 1, '3': 3}.get(periodo, 6)
             
-            gastos_proyecto_raw = Gasto.objects.filter(
-                proyecto=proyecto,
+            # Una sola serie mensual alimenta el gráfico y los datos del mes actual
+            serie = motor.serie_mensual(num_meses)
+            meses_grafico = [mes['etiqueta'] for mes in serie]
+            ingresos_mensuales = [float(mes['ingresos']) for mes in serie]
+            gastos_mensuales = [float(mes['gastos']) for mes in serie]
+            
+            # ============================================================================
+            # DATOS DE RENTABILIDAD REAL
+            # ============================================================================
+            
+            # Ingresos del mes = Facturas pagadas + Anticipos aplicados al proyecto
+            mes_en_curso = serie[-1]
+            mes_actual = mes_en_curso['mes'].month
+            año_actual = mes_en_curso['mes'].year
+            ingresos_mes = mes_en_curso['ingresos']
+            total_facturado_mes = mes_en_curso['facturado']
+            
+            # Log información del dashboard para debugging
+            logger.debug(f"Dashboard - Mes: {mes_actual}/{año_actual}, Facturado: ${total_facturado_mes}, Cobrado: ${ingresos_mes}")
+            
+            # Gastos del mes (gastos aprobados)
+            gastos_mes = mes_en_curso['gastos']
+            
+            # Calcular rentabilidad
+            rentabilidad_mes = ingresos_mes - gastos_mes
+            margen_rentabilidad = (rentabilidad_mes / ingresos_mes * 100) if ingresos_mes > 0 else Decimal('0.00')
+            
+            # Gastos por categoría del mes
+            gastos_categoria_mes = list(Gasto.objects.filter(
+                fecha_gasto__month=mes_actual,
+                fecha_gasto__year=año_actual,
                 aprobado=True
-            ).aggregate(total=Sum('monto'))['total'] or 0
-            gastos_proyecto = Decimal(str(gastos_proyecto_raw))
+            ).values('categoria__nombre').annotate(
+                total=Sum('monto')
+            ).order_by('-total')[:5])
+            
+            # Proyectos más rentables (TODOS LOS TIEMPOS), agrupados en pocas consultas
+            proyectos_activos = dict(Proyecto.objects.filter(activo=True).values_list('id', 'nombre'))
+            proyectos_rentables = []
+            for proyecto_id, datos in motor.totales_por_proyecto().items():
+                # Mostrar todos los proyectos con actividad, no solo rentables
+                if datos['ingresos'] > 0 or datos['gastos'] > 0:
+                    proyectos_rentables.append({
+                        'nombre': proyectos_activos.get(proyecto_id, ''),
+                        'rentabilidad': datos['rentabilidad'],
+                        'ingresos': datos['ingresos'],
+                        'gastos': datos['gastos']
+                    })
+            
+            # Ordenar por rentabilidad
+            proyectos_rentables.sort(key=lambda x: x['rentabilidad'], reverse=True)
+            proyectos_rentables = proyectos_rentables[:5]  # Top 5
+            
+            # Convertir Decimals a float para JSON (y calcular margen)
+            proyectos_rentables_json = []
+            for p in proyectos_rentables:
+                ingresos = float(p['ingresos'])
+                gastos = float(p['gastos'])
+                rentabilidad = float(p['rentabilidad'])
+                margen = (rentabilidad / ingresos * 100) if ingresos > 0 else 0
+                
+                proyectos_rentables_json.append({
+                    'nombre': p['nombre'],
+                    'rentabilidad': rentabilidad,
+                    'ingresos': ingresos,
+                    'gastos': gastos,
+                    'margen': round(margen, 2)
+                })
+            
+            # Eventos del calendario (para la agenda)
+            eventos_agenda = list(EventoCalendario.objects.filter(
+                creado_por=request.user,
+                fecha_inicio__gte=timezone.now().date()
+            ).order_by('fecha_inicio')[:10])
             
-            rentabilidad_proyecto = ingresos_proyecto - gastos_proyecto
+            # Calendario con eventos básicos (para FullCalendar si se usa)
+            eventos_calendario = []
             
-            # Mostrar todos los proyectos, no solo rentables
-            if ingresos_proyecto > 0 or gastos_proyecto > 0:  # Proyectos con actividad
-                proyectos_rentables.append({
-                    'nombre': proyecto.nombre,
-                    'rentabilidad': rentabilidad_proyecto,
-                    'ingresos': ingresos_proyecto,
-                    'gastos': gastos_proyecto
+            # Eventos de facturas
+            facturas = Factura.objects.filter(fecha_vencimiento__isnull=False)[:5]
+            for factura in facturas:
+                eventos_calendario.append({
+                    'id': f'factura_{factura.id}',
+                    'title': f'Vencimiento: {factura.numero_factura}',
+                    'start': factura.fecha_vencimiento.isoformat(),
+                    'end': factura.fecha_vencimiento.isoformat(),
+                    'className': 'evento-factura',
+                    'backgroundColor': '#dc3545',
+                    'borderColor': '#dc3545',
+                    'extendedProps': {
+                        'tipo': 'vencimiento',
+                        'descripcion': f'Vencimiento de factura {factura.numero_factura}',
+                        'todo_el_dia': True
+                    }
                 })
-        
-        # Ordenar por rentabilidad
-        proyectos_rentables.sort(key=lambda x: x['rentabilidad'], reverse=True)
-        proyectos_rentables = proyectos_rentables[:5]  # Top 5
-        
-        # Convertir Decimals a float para JSON (y calcular margen)
-        proyectos_rentables_json = []
-        for p in proyectos_rentables:
-            ingresos = float(p['ingresos'])
-            gastos = float(p['gastos'])
-            rentabilidad = float(p['rentabilidad'])
-            margen = (rentabilidad / ingresos * 100) if ingresos > 0 else 0
-            
-            proyectos_rentables_json.append({
-                'nombre': p['nombre'],
-                'rentabilidad': rentabilidad,
-                'ingresos': ingresos,
-                'gastos': gastos,
-                'margen': round(margen, 2)
-            })
-        
-        # Eventos del calendario (para la agenda)
-        eventos_agenda = EventoCalendario.objects.filter(
-            creado_por=request.user,
-            fecha_inicio__gte=timezone.now().date()
-        ).order_by('fecha_inicio')[:10]
-        
-        # Calendario con eventos básicos (para FullCalendar si se usa)
-        eventos_calendario = []
-        
-        # Eventos de facturas
-        facturas = Factura.objects.filter(fecha_vencimiento__isnull=False)[:5]
-        for factura in facturas:
-            eventos_calendario.append({
-                'id': f'factura_{factura.id}',
-                'title': f'Vencimiento: {factura.numero_factura}',
-                'start': factura.fecha_vencimiento.isoformat(),
-                'end': factura.fecha_vencimiento.isoformat(),
-                'className': 'evento-factura',
-                'backgroundColor': '#dc3545',
-                'borderColor': '#dc3545',
-                'extendedProps': {
-                    'tipo': 'vencimiento',
-                    'descripcion': f'Vencimiento de factura {factura.numero_factura}',
-                    'todo_el_dia': True
-                }
-            })
-        
-        # Eventos de proyectos
-        proyectos = Proyecto.objects.filter(fecha_inicio__isnull=False)[:5]
-        for proyecto in proyectos:
-            eventos_calendario.append({
-                'id': f'proyecto_{proyecto.id}',
-                'title': f'Inicio: {proyecto.nombre}',
-                'start': proyecto.fecha_inicio.isoformat(),
-                'end': proyecto.fecha_inicio.isoformat(),
-                'className': 'evento-proyecto',
-                'backgroundColor': '#28a745',
-                'borderColor': '#28a745',
-                'extendedProps': {
-                    'tipo': 'proyecto',
-                    'descripcion': f'Inicio del proyecto {proyecto.nombre}',
-                    'todo_el_dia': True
-                }
-            })
-        
-        # Eventos del calendario personalizados
-        eventos_personalizados = EventoCalendario.objects.filter(creado_por=request.user)
-        for evento in eventos_personalizados:
-            eventos_calendario.append(evento.to_calendar_event())
-        
-        # Datos para gráfico de proyectos por estado
-        proyectos_por_estado = {
-            'Planificación': Proyecto.objects.filter(activo=True, estado='planificacion').count(),
-            'En Progreso': Proyecto.objects.filter(activo=True, estado='en_progreso').count(),
-            'En Pausa': Proyecto.objects.filter(activo=True, estado='en_pausa').count(),
-            'Completado': Proyecto.objects.filter(activo=True, estado='completado').count(),
-        }
-        
-        # Datos para gráfico de gastos por categoría (top 8) - TODOS LOS TIEMPOS
-        # Cambiado para mostrar todos los gastos, no solo del mes actual
-        gastos_por_categoria = Gasto.objects.filter(
-            aprobado=True
-        ).values('categoria__nombre').annotate(
-            total=Sum('monto')
-        ).order_by('-total')[:8]
+            
+            # Eventos de proyectos
+            proyectos = Proyecto.objects.filter(fecha_inicio__isnull=False)[:5]
+            for proyecto in proyectos:
+                eventos_calendario.append({
+                    'id': f'proyecto_{proyecto.id}',
+                    'title': f'Inicio: {proyecto.nombre}',
+                    'start': proyecto.fecha_inicio.isoformat(),
+                    'end': proyecto.fecha_inicio.isoformat(),
+                    'className': 'evento-proyecto',
+                    'backgroundColor': '#28a745',
+                    'borderColor': '#28a745',
+                    'extendedProps': {
+                        'tipo': 'proyecto',
+                        'descripcion': f'Inicio del proyecto {proyecto.nombre}',
+                        'todo_el_dia': True
+                    }
+                })
+            
+            # Eventos del calendario personalizados
+            eventos_personalizados = EventoCalendario.objects.filter(creado_por=request.user)
+            for evento in eventos_personalizados:
+                eventos_calendario.append(evento.to_calendar_event())
+            
+            # Datos para gráfico de proyectos por estado
+            proyectos_por_estado = {
+                'Planificación': resumen_proyectos['planificacion'],
+                'En Progreso': resumen_proyectos['en_progreso'],
+                'En Pausa': resumen_proyectos['en_pausa'],
+                'Completado': resumen_proyectos['completado'],
+            }
+            
+            # Datos para gráfico de gastos por categoría (top 8) - TODOS LOS TIEMPOS
+            # Cambiado para mostrar todos los gastos, no solo del mes actual
+            gastos_por_categoria = list(Gasto.objects.filter(
+                aprobado=True
+            ).values('categoria__nombre').annotate(
+                total=Sum('monto')
+            ).order_by('-total')[:8])
+            
+            # Datos adicionales para el dashboard
+            total_colaboradores = Colaborador.objects.filter(activo=True).count()
+            proyectos_completados = resumen_proyectos['completado']
         
         # Convertir a JSON para el template
-        import json
         eventos_calendario_json = json.dumps(eventos_calendario, default=str)
         
         # Datos de proyectos por estado
@@ -369,145 +368,7 @@ def dashboard(request):
         
         # Log eventos del calendario para debugging
         logger.debug(f"Eventos calendario: {len(eventos_calendario)} eventos generados")
-        
-        # ============================================================================
-        # DATOS REALES PARA GRÁFICOS - INGRESOS VS GASTOS
-        # ============================================================================
-        
-        # Obtener período seleccionado (por defecto 6 meses)
-        periodo = request.GET.get('periodo', '6')
-        
-        # Calcular datos reales para el gráfico según el período
-        hoy = timezone.now().date()
-        
-        if periodo == '1':
-            # Mes actual
-            mes_actual = hoy.month
-            año_actual = hoy.year
-            meses_grafico = [hoy.strftime('%b')]
-            
-            # Ingresos reales del mes: facturas pagadas + anticipos aplicados
-            facturas_pagadas_mes = Factura.objects.filter(
-                estado='pagada',
-                fecha_emision__month=mes_actual,
-                fecha_emision__year=año_actual
-            ).aggregate(total=Sum('monto_total'))['total'] or Decimal('0.00')
-            
-            anticipos_aplicados_mes = Anticipo.objects.filter(
-                aplicado_al_proyecto=True,
-                fecha_aplicacion__month=mes_actual,
-                fecha_aplicacion__year=año_actual
-            ).aggregate(total=Sum('monto_aplicado_proyecto'))['total'] or Decimal('0.00')
-            
-            ingresos_mes_real = facturas_pagadas_mes + anticipos_aplicados_mes
-            ingresos_mensuales = [float(ingresos_mes_real)]
-            
-            # Gastos reales del mes: todos los gastos aprobados
-            gastos_mes_real_raw = Gasto.objects.filter(
-                aprobado=True,
-                fecha_gasto__month=mes_actual,
-                fecha_gasto__year=año_actual
-            ).aggregate(total=Sum('monto'))['total'] or 0
-            gastos_mes_real = Decimal(str(gastos_mes_real_raw))
-            
-            gastos_mensuales = [float(gastos_mes_real)]
-            evolucion_proyectos = [total_proyectos]
-            
-        elif periodo == '3':
-            # 3 meses
-            meses_grafico = []
-            ingresos_mensuales = []
-            gastos_mensuales = []
-            evolucion_proyectos = []
-            for i in range(3):
-                fecha = hoy - timedelta(days=30*i)
-                meses_grafico.insert(0, fecha.strftime('%b'))
-                
-                mes = fecha.month
-                año = fecha.year
-                
-                # Ingresos reales del mes
-                facturas_pagadas_mes = Factura.objects.filter(
-                    estado='pagada',
-                    fecha_emision__month=mes,
-                    fecha_emision__year=año
-                ).aggregate(total=Sum('monto_total'))['total'] or Decimal('0.00')
-                
-                anticipos_aplicados_mes = Anticipo.objects.filter(
-                    aplicado_al_proyecto=True,
-                    fecha_aplicacion__month=mes,
-                    fecha_aplicacion__year=año
-                ).aggregate(total=Sum('monto_aplicado_proyecto'))['total'] or Decimal('0.00')
-                
-                ingresos_mes_real = facturas_pagadas_mes + anticipos_aplicados_mes
-                ingresos_mensuales.insert(0, float(ingresos_mes_real))
-                
-                # Gastos reales del mes
-                gastos_mes_real_raw = Gasto.objects.filter(
-                    aprobado=True,
-                    fecha_gasto__month=mes,
-                    fecha_gasto__year=año
-                ).aggregate(total=Sum('monto'))['total'] or 0
-                gastos_mes_real = Decimal(str(gastos_mes_real_raw))
-                
-                gastos_mensuales.insert(0, float(gastos_mes_real))
-                
-                # Proyectos activos en ese mes (aproximación)
-                proyectos_mes = Proyecto.objects.filter(
-                    activo=True,
-                    creado_en__lte=fecha
-                ).count()
-                evolucion_proyectos.insert(0, proyectos_mes)
-        else:
-            # 6 meses (por defecto)
-            meses_grafico = []
-            ingresos_mensuales = []
-            gastos_mensuales = []
-            evolucion_proyectos = []
-            for i in range(6):
-                fecha = hoy - timedelta(days=30*i)
-                meses_grafico.insert(0, fecha.strftime('%b'))
-                
-                mes = fecha.month
-                año = fecha.year
-                
-                # Ingresos reales del mes
-                facturas_pagadas_mes = Factura.objects.filter(
-                    estado='pagada',
-                    fecha_emision__month=mes,
-                    fecha_emision__year=año
-                ).aggregate(total=Sum('monto_total'))['total'] or Decimal('0.00')
-                
-                anticipos_aplicados_mes = Anticipo.objects.filter(
-                    aplicado_al_proyecto=True,
-                    fecha_aplicacion__month=mes,
-                    fecha_aplicacion__year=año
-                ).aggregate(total=Sum('monto_aplicado_proyecto'))['total'] or Decimal('0.00')
-                
-                ingresos_mes_real = facturas_pagadas_mes + anticipos_aplicados_mes
-                ingresos_mensuales.insert(0, float(ingresos_mes_real))
-                
-                # Gastos reales del mes
-                gastos_mes_real_raw = Gasto.objects.filter(
-                    aprobado=True,
-                    fecha_gasto__month=mes,
-                    fecha_gasto__year=año
-                ).aggregate(total=Sum('monto'))['total'] or 0
-                gastos_mes_real = Decimal(str(gastos_mes_real_raw))
-                
-                gastos_mensuales.insert(0, float(gastos_mes_real))
-                
-                # Proyectos activos en ese mes (aproximación)
-                proyectos_mes = Proyecto.objects.filter(
-                    activo=True,
-                    creado_en__lte=fecha
-                ).count()
-                evolucion_proyectos.insert(0, proyectos_mes)
-        
-        
-        # Datos adicionales para el dashboard
-        total_colaboradores = Colaborador.objects.filter(activo=True).count()
-        proyectos_completados = Proyecto.objects.filter(activo=True, estado='completado').count()
+        logger.debug(f"Dashboard generado con {motor.consultas} consultas SQL")
         
         # Contexto simplificado
         context = {
@@ -538,6 +399,7 @@ def dashboard(request):
             'margen_rentabilidad': margen_rentabilidad,
             'gastos_categoria_mes': gastos_categoria_mes,
             'proyectos_rentables': json.dumps(proyectos_rentables_json),
+            'consultas_dashboard': motor.consultas,
         }
         
         # Log información del contexto para debugging
@@ -622,7 +484,7 @@ def cliente_create(request):
             cliente = form.save()
             
             # Registrar actividad
-            LogActividad.objects.create(
+            registrar_actividad(
                 usuario=request.user,
                 accion='Crear',
                 modulo='Clientes',
@@ -649,7 +511,7 @@ def cliente_edit(request, cliente_id):
             cliente = form.save()
             
             # Registrar actividad
-            LogActividad.objects.create(
+            registrar_actividad(
                 usuario=request.user,
                 accion='Editar',
                 modulo='Clientes',
@@ -675,7 +537,7 @@ def cliente_delete(request, cliente_id):
         cliente.save()
         
         # Registrar actividad
-        LogActividad.objects.create(
+        registrar_actividad(
             usuario=request.user,
             accion='Eliminar',
             modulo='Clientes',
@@ -808,7 +670,7 @@ def proyecto_create(request):
             proyecto.save()
             
             # Registrar actividad
-            LogActividad.objects.create(
+            registrar_actividad(
                 usuario=request.user,
                 accion='Crear',
                 modulo='Proyectos',
@@ -849,7 +711,7 @@ def proyecto_edit(request, proyecto_id):
             proyecto = form.save()
             
             # Registrar actividad
-            LogActividad.objects.create(
+            registrar_actividad(
                 usuario=request.user,
                 accion='Editar',
                 modulo='Proyectos',
@@ -890,7 +752,7 @@ def proyecto_delete(request, proyecto_id):
         proyecto.save()
         
         # Registrar actividad
-        LogActividad.objects.create(
+        registrar_actividad(
             usuario=request.user,
             accion='Eliminar',
             modulo='Proyectos',
@@ -986,7 +848,7 @@ def colaborador_create(request):
             colaborador = form.save()
             
             # Registrar actividad
-            LogActividad.objects.create(
+            registrar_actividad(
                 usuario=request.user,
                 accion='Crear',
                 modulo='Colaboradores',
@@ -1013,7 +875,7 @@ def colaborador_edit(request, colaborador_id):
             colaborador = form.save()
             
             # Registrar actividad
-            LogActividad.objects.create(
+            registrar_actividad(
                 usuario=request.user,
                 accion='Editar',
                 modulo='Colaboradores',
@@ -1038,7 +900,7 @@ def colaborador_delete(request, colaborador_id):
         colaborador.delete()
         
         # Registrar actividad
-        LogActividad.objects.create(
+        registrar_actividad(
             usuario=request.user,
             accion='Eliminar',
             modulo='Colaboradores',
@@ -1053,12 +915,11 @@ def colaborador_delete(request, colaborador_id):
 
 
 # ===== CRUD FACTURAS =====
-@login_required
-def facturas_list(request):
-    """Lista de facturas - muestra todas las facturas sin paginación"""
-    
-    # Aplicar filtros si existen
-    filters = {}
+FACTURAS_POR_PAGINA = 50
+
+
+def _facturas_filtradas(request):
+    """Facturas con los filtros y la búsqueda del listado aplicados (sin ordenar)"""
     estado = request.GET.get('estado')
     cliente_id = request.GET.get('cliente')
     proyecto_id = request.GET.get('proyecto')
@@ -1066,33 +927,11 @@ def facturas_list(request):
     fecha_hasta = request.GET.get('fecha_hasta')
     buscar = request.GET.get('buscar', '').strip()
     
-    if estado:
-        filters['estado'] = estado
-    if cliente_id:
-        filters['cliente_id'] = cliente_id
-    if proyecto_id:
-        filters['proyecto_id'] = proyecto_id
-    
-    # Query base optimizada
-    facturas = Factura.objects.select_related(
-        'cliente', 'proyecto'
-    ).prefetch_related(
-        'pagos'
-    ).order_by('-fecha_emision')
+    facturas = Factura.objects.select_related('cliente', 'proyecto')
     
-    # Aplicar búsqueda por texto si existe
+    # Búsqueda de texto completo (número, cliente, proyecto, códigos, descripción)
     if buscar:
-        # Búsqueda inteligente: busca en múltiples campos relacionados
-        # La búsqueda es case-insensitive y busca en cualquier parte del texto
-        facturas = facturas.filter(
-            Q(numero_factura__icontains=buscar) |
-            Q(descripcion_servicios__icontains=buscar) |
-            Q(cliente__razon_social__icontains=buscar) |
-            Q(cliente__nombre_contacto__icontains=buscar) |
-            Q(proyecto__nombre__icontains=buscar) |
-            Q(proyecto__codigo__icontains=buscar) |
-            Q(observaciones__icontains=buscar)
-        ).distinct()
+        facturas = search.filtrar(facturas, 'factura', buscar)
     
     # Aplicar filtros de fecha si existen
     if fecha_desde:
@@ -1101,48 +940,67 @@ def facturas_list(request):
         facturas = facturas.filter(fecha_emision__lte=fecha_hasta)
     
     # Aplicar otros filtros
-    for field, value in filters.items():
-        if value:
-            facturas = facturas.filter(**{field: value})
+    if estado:
+        facturas = facturas.filter(estado=estado)
+    if cliente_id:
+        facturas = facturas.filter(cliente_id=cliente_id)
+    if proyecto_id:
+        facturas = facturas.filter(proyecto_id=proyecto_id)
     
-    # Obtener todas las facturas sin paginación
-    facturas_lista = list(facturas)
+    return facturas
+
+
+def _url_pagina_facturas(request, cursor):
+    """URL del endpoint JSON para la página que sigue a ``cursor`` con los mismos filtros"""
+    if not cursor:
+        return None
+    parametros = request.GET.copy()
+    parametros['cursor'] = cursor
+    return f"{reverse('facturas_list_pagina')}?{parametros.urlencode()}"
+
+
+@login_required
+def facturas_list(request):
+    """Lista de facturas - primera página; las siguientes se cargan con facturas_list_pagina"""
+    facturas = _facturas_filtradas(request)
+    facturas_pagina, siguiente = paginar_por_cursor(
+        facturas, request.GET.get('cursor'), FACTURAS_POR_PAGINA, campos=('-fecha_emision', '-id')
+    )
     
     # Obtener opciones de filtro
     clientes = Cliente.objects.filter(activo=True).order_by('razon_social')
     proyectos = Proyecto.objects.filter(activo=True).order_by('nombre')
     estados = Factura.ESTADO_CHOICES
     
-    # Organizar proyectos por cliente para el filtro dinámico
-    proyectos_por_cliente = {}
-    for cliente in clientes:
-        proyectos_por_cliente[cliente.id] = [
-            {'id': p.id, 'nombre': p.nombre} 
-            for p in proyectos.filter(cliente=cliente)
-        ]
-    
-    # Obtener estadísticas totales
-    total_facturas = Factura.objects.count()
-    total_facturado = Factura.objects.aggregate(total=Sum('monto_total'))['total'] or 0.00
-    
-    # Calcular total cobrado sumando solo las facturas pagadas
-    facturas_pagadas = Factura.objects.filter(estado='pagada')
-    total_cobrado = facturas_pagadas.aggregate(total=Sum('monto_total'))['total'] or 0.00
+    # Organizar proyectos por cliente para el filtro dinámico (una sola consulta)
+    proyectos_por_cliente = defaultdict(list)
+    for proyecto in proyectos.filter(cliente__activo=True).values('id', 'nombre', 'cliente_id'):
+        proyectos_por_cliente[proyecto['cliente_id']].append(
+            {'id': proyecto['id'], 'nombre': proyecto['nombre']}
+        )
     
-    facturas_emitidas = Factura.objects.filter(estado='emitida').count()
-    facturas_cobradas = Factura.objects.filter(estado='pagada').count()
+    # Estadísticas totales en una sola consulta
+    estadisticas = Factura.objects.aggregate(
+        total_facturas=Count('id'),
+        total_facturado=Sum('monto_total'),
+        total_cobrado=Sum('monto_total', filter=Q(estado='pagada')),
+        facturas_emitidas=Count('id', filter=Q(estado='emitida')),
+        facturas_pagadas=Count('id', filter=Q(estado='pagada')),
+    )
     
     context = {
-        'facturas': facturas_lista,
+        'facturas': facturas_pagina,
+        'total_filtradas': facturas.count(),
+        'siguiente_url': _url_pagina_facturas(request, siguiente),
         'clientes': clientes,
         'proyectos': proyectos,
         'estados': estados,
-        'proyectos_por_cliente': proyectos_por_cliente,
-        'total_facturas': total_facturas,
-        'total_facturado': total_facturado,
-        'total_cobrado': total_cobrado,
-        'facturas_emitidas': facturas_emitidas,
-        'facturas_pagadas': facturas_cobradas,
+        'proyectos_por_cliente': dict(proyectos_por_cliente),
+        'total_facturas': estadisticas['total_facturas'],
+        'total_facturado': estadisticas['total_facturado'] or 0.00,
+        'total_cobrado': estadisticas['total_cobrado'] or 0.00,
+        'facturas_emitidas': estadisticas['facturas_emitidas'],
+        'facturas_pagadas': estadisticas['facturas_pagadas'],
         'filtros_activos': {
             'estado': request.GET.get('estado'),
             'cliente': request.GET.get('cliente'),
@@ -1155,6 +1013,22 @@ def facturas_list(request):
     return render(request, 'core/facturas/list.html', context)
 
 
+@login_required
+def facturas_list_pagina(request):
+    """Siguiente página del listado de facturas (JSON con las filas ya renderizadas)"""
+    facturas_pagina, siguiente = paginar_por_cursor(
+        _facturas_filtradas(request), request.GET.get('cursor'), FACTURAS_POR_PAGINA,
+        campos=('-fecha_emision', '-id')
+    )
+    html = render_to_string('core/facturas/_filas.html', {'facturas': facturas_pagina}, request=request)
+    return JsonResponse({
+        'success': True,
+        'html': html,
+        'cantidad': len(facturas_pagina),
+        'siguiente_url': _url_pagina_facturas(request, siguiente),
+    })
+
+
 @login_required
 def factura_detail(request, factura_id):
     """Detalle de la factura"""
@@ -1206,7 +1080,7 @@ def factura_create(request):
             logger.info(f"Factura {factura.numero_factura} creada exitosamente por {request.user}")
             
             # Registrar actividad
-            LogActividad.objects.create(
+            registrar_actividad(
                 usuario=request.user,
                 accion='Crear',
                 modulo='Facturas',
@@ -1278,7 +1152,7 @@ def factura_edit(request, factura_id):
             logger.debug(f"Factura guardada. Comprobante: {factura.comprobante}")
             
             # Registrar actividad
-            LogActividad.objects.create(
+            registrar_actividad(
                 usuario=request.user,
                 accion='Editar',
                 modulo='Facturas',
@@ -1322,7 +1196,7 @@ def factura_delete(request, factura_id):
     
     if request.method == 'POST':
         # Registrar actividad antes de eliminar
-        LogActividad.objects.create(
+        registrar_actividad(
             usuario=request.user,
             accion='Eliminar',
             modulo='Facturas',
@@ -1366,7 +1240,7 @@ def factura_marcar_pagada(request, factura_id):
             factura.save()
             
             # Registrar actividad
-            LogActividad.objects.create(
+            registrar_actividad(
                 usuario=request.user,
                 accion='Marcar como Pagada',
                 modulo='Facturas',
@@ -1410,8 +1284,12 @@ def gastos_list(request):
         filtro_proyecto = request.GET.get('proyecto', '')
         filtro_fecha_desde = request.GET.get('fecha_desde', '')
         filtro_fecha_hasta = request.GET.get('fecha_hasta', '')
+        filtro_buscar = request.GET.get('buscar', '').strip()
         
         # Aplicar filtros
+        if filtro_buscar:
+            gastos = search.filtrar(gastos, 'gasto', filtro_buscar)
+        
         if filtro_estado == 'aprobados':
             gastos = gastos.filter(aprobado=True)
         elif filtro_estado == 'pendientes':
@@ -1492,6 +1370,7 @@ def gastos_list(request):
             'filtro_proyecto': filtro_proyecto,
             'filtro_fecha_desde': filtro_fecha_desde,
             'filtro_fecha_hasta': filtro_fecha_hasta,
+            'filtro_buscar': filtro_buscar,
             'total_gastos': total_gastos,
             'total_monto': total_monto,
             'egresos_aprobados': gastos_aprobados,  # Cambiado para consistencia
@@ -1507,14 +1386,54 @@ def gastos_list(request):
         return redirect('egresos_dashboard')
 
 
+def _reporte_gastos_pdf(gastos, lineas_encabezado, total_gastos, total_monto):
+    """Bytes del PDF del reporte de egresos (exportación y reporte contable)"""
+    story = [
+        Paragraph("Reporte de Egresos/Gastos", estilo('TituloReporte')),
+        Spacer(1, 12),
+    ]
+    for linea_texto in lineas_encabezado:
+        story.append(Paragraph(linea_texto, estilo('Normal')))
+    story.append(Paragraph(f"Fecha de generación: {datetime.now().strftime('%d/%m/%Y %H:%M')}", estilo('Normal')))
+    story.append(Spacer(1, 20))
+    
+    # Resumen
+    story.append(Paragraph(f"<b>Total de gastos:</b> {total_gastos}", estilo('Resumen')))
+    story.append(Paragraph(f"<b>Monto total:</b> ${total_monto:,.2f}", estilo('Resumen')))
+    story.append(Spacer(1, 20))
+    
+    if total_gastos > 0:
+        data = [['Fecha', 'Descripción', 'Proyecto', 'Categoría', 'Monto (USD)', 'Estado']]
+        for gasto in gastos:
+            estado_texto = 'Aprobado' if gasto.aprobado else 'Pendiente'
+            proyecto_nombre = gasto.proyecto.nombre if gasto.proyecto else 'Sin proyecto'
+            categoria_nombre = gasto.categoria.nombre if gasto.categoria else 'Sin categoría'
+            descripcion = gasto.descripcion[:50] + '...' if len(gasto.descripcion) > 50 else gasto.descripcion
+            
+            data.append([
+                gasto.fecha_gasto.strftime('%d/%m/%Y'),
+                descripcion,
+                proyecto_nombre[:30] + '...' if len(proyecto_nombre) > 30 else proyecto_nombre,
+                categoria_nombre[:20] + '...' if len(categoria_nombre) > 20 else categoria_nombre,
+                f"${gasto.monto:,.2f}",
+                estado_texto
+            ])
+        
+        table = Table(data, colWidths=[0.9*inch, 2.2*inch, 1.3*inch, 1.2*inch, 1*inch, 0.9*inch])
+        table.setStyle(tabla_listado(columnas_monto=(4,)))
+        story.append(table)
+        story.append(Spacer(1, 15))
+        story.append(Paragraph(f"<b>TOTAL: ${total_monto:,.2f}</b>", estilo('TotalDerecha')))
+    else:
+        story.append(Paragraph("No hay gastos que mostrar con los filtros aplicados.", estilo('Normal')))
+    
+    return construir_pdf(story)
+
+
 @login_required
 def gastos_exportar_pdf(request):
     """Exportar lista de gastos a PDF con filtros aplicados"""
     try:
-        from django.http import HttpResponse
-        from io import BytesIO
-        from datetime import datetime
-        
         # Obtener todos los gastos con información relacionada
         gastos = Gasto.objects.select_related(
             'proyecto', 'categoria', 'aprobado_por'
@@ -1526,8 +1445,12 @@ def gastos_exportar_pdf(request):
         filtro_proyecto = request.GET.get('proyecto', '')
         filtro_fecha_desde = request.GET.get('fecha_desde', '')
         filtro_fecha_hasta = request.GET.get('fecha_hasta', '')
+        filtro_buscar = request.GET.get('buscar', '').strip()
         
         # Aplicar filtros
+        if filtro_buscar:
+            gastos = search.filtrar(gastos, 'gasto', filtro_buscar)
+        
         if filtro_estado == 'aprobados':
             gastos = gastos.filter(aprobado=True)
         elif filtro_estado == 'pendientes':
@@ -1549,24 +1472,6 @@ def gastos_exportar_pdf(request):
         total_gastos = gastos.count()
         total_monto = gastos.aggregate(total=Sum('monto'))['total'] or Decimal('0.00')
         
-        # Crear PDF
-        buffer = BytesIO()
-        doc = SimpleDocTemplate(buffer, pagesize=A4)
-        styles = getSampleStyleSheet()
-        story = []
-        
-        # Título
-        title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=styles['Heading1'],
-            fontSize=18,
-            spaceAfter=20,
-            alignment=TA_CENTER,
-            textColor=colors.HexColor('#1e3a8a')
-        )
-        story.append(Paragraph("Reporte de Egresos/Gastos", title_style))
-        story.append(Spacer(1, 12))
-        
         # Información de filtros aplicados
         filtros_texto = []
         if filtro_estado != 'todos':
@@ -1593,99 +1498,18 @@ def gastos_exportar_pdf(request):
         if filtro_fecha_hasta:
             filtros_texto.append(f"Hasta: {filtro_fecha_hasta}")
         
-        if filtros_texto:
-            filtros_parrafo = "Filtros aplicados: " + " | ".join(filtros_texto)
-            story.append(Paragraph(filtros_parrafo, styles['Normal']))
-        else:
-            story.append(Paragraph("Todos los gastos", styles['Normal']))
-        
-        story.append(Paragraph(f"Fecha de generación: {datetime.now().strftime('%d/%m/%Y %H:%M')}", styles['Normal']))
-        story.append(Spacer(1, 20))
-        
-        # Resumen
-        summary_style = ParagraphStyle(
-            'SummaryStyle',
-            parent=styles['Normal'],
-            fontSize=11,
-            spaceAfter=15
-        )
-        story.append(Paragraph(f"<b>Total de gastos:</b> {total_gastos}", summary_style))
-        story.append(Paragraph(f"<b>Monto total:</b> ${total_monto:,.2f}", summary_style))
-        story.append(Spacer(1, 20))
+        if filtro_buscar:
+            filtros_texto.append(f"Búsqueda: {filtro_buscar}")
         
-        # Tabla de gastos
-        if total_gastos > 0:
-            headers = ['Fecha', 'Descripción', 'Proyecto', 'Categoría', 'Monto (USD)', 'Estado']
-            data = [headers]
-            
-            for gasto in gastos:
-                estado_texto = 'Aprobado' if gasto.aprobado else 'Pendiente'
-                proyecto_nombre = gasto.proyecto.nombre if gasto.proyecto else 'Sin proyecto'
-                categoria_nombre = gasto.categoria.nombre if gasto.categoria else 'Sin categoría'
-                descripcion = gasto.descripcion[:50] + '...' if len(gasto.descripcion) > 50 else gasto.descripcion
-                
-                data.append([
-                    gasto.fecha_gasto.strftime('%d/%m/%Y'),
-                    descripcion,
-                    proyecto_nombre[:30] + '...' if len(proyecto_nombre) > 30 else proyecto_nombre,
-                    categoria_nombre[:20] + '...' if len(categoria_nombre) > 20 else categoria_nombre,
-                    f"${gasto.monto:,.2f}",
-                    estado_texto
-                ])
-            
-            # Crear tabla
-            table = Table(data, colWidths=[0.9*inch, 2.2*inch, 1.3*inch, 1.2*inch, 1*inch, 0.9*inch])
-            table.setStyle(TableStyle([
-                # Encabezados
-                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#1e3a8a')),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-                ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 9),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 10),
-                ('TOPPADDING', (0, 0), (-1, 0), 10),
-                
-                # Fila de totales (si hay datos)
-                ('BACKGROUND', (0, 1), (-1, -1), colors.white),
-                ('FONTSIZE', (0, 1), (-1, -1), 8),
-                ('ALIGN', (4, 1), (4, -1), 'RIGHT'),  # Alinear montos a la derecha
-                ('ALIGN', (0, 1), (3, -1), 'LEFT'),
-                ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-                ('LEFTPADDING', (0, 1), (-1, -1), 6),
-                ('RIGHTPADDING', (0, 1), (-1, -1), 6),
-                ('TOPPADDING', (0, 1), (-1, -1), 6),
-                ('BOTTOMPADDING', (0, 1), (-1, -1), 6),
-                
-                # Colores alternos en filas
-                ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f8f9fa')]),
-                
-                # Bordes
-                ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#d1d5db')),
-                ('BOX', (0, 0), (-1, -1), 1.5, colors.HexColor('#1e3a8a')),
-            ]))
-            
-            story.append(table)
-            
-            # Agregar fila de totales al final
-            story.append(Spacer(1, 15))
-            total_style = ParagraphStyle(
-                'TotalStyle',
-                parent=styles['Normal'],
-                fontSize=11,
-                alignment=TA_RIGHT,
-                textColor=colors.HexColor('#1e3a8a'),
-                fontName='Helvetica-Bold'
-            )
-            story.append(Paragraph(f"<b>TOTAL: ${total_monto:,.2f}</b>", total_style))
+        if filtros_texto:
+            encabezado = ["Filtros aplicados: " + " | ".join(filtros_texto)]
         else:
-            story.append(Paragraph("No hay gastos que mostrar con los filtros aplicados.", styles['Normal']))
+            encabezado = ["Todos los gastos"]
         
-        # Construir PDF
-        doc.build(story)
-        buffer.seek(0)
+        pdf_bytes = _reporte_gastos_pdf(gastos, encabezado, total_gastos, total_monto)
         
         # Crear respuesta
-        response = HttpResponse(buffer.getvalue(), content_type='application/pdf')
+        response = HttpResponse(pdf_bytes, content_type='application/pdf')
         fecha_str = datetime.now().strftime('%Y%m%d_%H%M%S')
         filename = f"egresos_{fecha_str}.pdf"
         response['Content-Disposition'] = f'attachment; filename="{filename}"'
@@ -1729,13 +1553,10 @@ def gastos_reporte_contable(request):
 
 
 @login_required
+@en_segundo_plano('reporte_contable_zip')
 def gastos_reporte_contable_zip(request):
     """Generar ZIP con reporte de gastos, facturas y comprobantes por período"""
     try:
-        import zipfile
-        from django.conf import settings
-        from pathlib import Path
-        
         fecha_inicio = request.GET.get('fecha_inicio')
         fecha_fin = request.GET.get('fecha_fin')
         incluir_facturas = request.GET.get('incluir_facturas', 'no') == 'si'
@@ -1744,10 +1565,6 @@ def gastos_reporte_contable_zip(request):
             messages.error(request, 'Debes especificar las fechas del período')
             return redirect('egresos_reporte_contable')
         
-        # Crear buffer para el ZIP
-        zip_buffer = BytesIO()
-        zip_file = zipfile.ZipFile(zip_buffer, 'w', zipfile.ZIP_DEFLATED)
-        
         # 1. Obtener gastos del período
         gastos = Gasto.objects.select_related(
             'proyecto', 'categoria', 'aprobado_por'
@@ -1760,149 +1577,17 @@ def gastos_reporte_contable_zip(request):
         total_gastos = gastos.count()
         total_monto = gastos.aggregate(total=Sum('monto'))['total'] or Decimal('0.00')
         
-        # Generar PDF usando la misma lógica que gastos_exportar_pdf pero en memoria
-        pdf_buffer = BytesIO()
-        doc = SimpleDocTemplate(pdf_buffer, pagesize=A4)
-        styles = getSampleStyleSheet()
-        story = []
-        
-        # Título
-        title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=styles['Heading1'],
-            fontSize=18,
-            spaceAfter=20,
-            alignment=TA_CENTER,
-            textColor=colors.HexColor('#1e3a8a')
+        pdf_bytes = _reporte_gastos_pdf(
+            gastos, [f"Período: {fecha_inicio} a {fecha_fin}"], total_gastos, total_monto
         )
-        story.append(Paragraph("Reporte de Egresos/Gastos", title_style))
-        story.append(Spacer(1, 12))
-        
-        # Información del período
-        periodo_text = f"Período: {fecha_inicio} a {fecha_fin}"
-        story.append(Paragraph(periodo_text, styles['Normal']))
-        story.append(Paragraph(f"Fecha de generación: {datetime.now().strftime('%d/%m/%Y %H:%M')}", styles['Normal']))
-        story.append(Spacer(1, 20))
         
-        # Resumen
-        summary_style = ParagraphStyle(
-            'SummaryStyle',
-            parent=styles['Normal'],
-            fontSize=11,
-            spaceAfter=15
+        # 3 y 4. Comprobantes y facturas: se resuelven y revisan antes de enviar y
+        # se agregan al ZIP (con su manifiesto) mientras se envía
+        adjuntos = recolectar_adjuntos(gastos, fecha_inicio, fecha_fin, incluir_facturas)
+        response = StreamingHttpResponse(
+            generar_zip_contable(pdf_bytes, adjuntos),
+            content_type='application/zip'
         )
-        story.append(Paragraph(f"<b>Total de gastos:</b> {total_gastos}", summary_style))
-        story.append(Paragraph(f"<b>Monto total:</b> ${total_monto:,.2f}", summary_style))
-        story.append(Spacer(1, 20))
-        
-        # Tabla de gastos
-        if total_gastos > 0:
-            headers = ['Fecha', 'Descripción', 'Proyecto', 'Categoría', 'Monto (USD)', 'Estado']
-            data = [headers]
-            
-            for gasto in gastos:
-                estado_texto = 'Aprobado' if gasto.aprobado else 'Pendiente'
-                proyecto_nombre = gasto.proyecto.nombre if gasto.proyecto else 'Sin proyecto'
-                categoria_nombre = gasto.categoria.nombre if gasto.categoria else 'Sin categoría'
-                descripcion = gasto.descripcion[:50] + '...' if len(gasto.descripcion) > 50 else gasto.descripcion
-                
-                data.append([
-                    gasto.fecha_gasto.strftime('%d/%m/%Y'),
-                    descripcion,
-                    proyecto_nombre[:30] + '...' if len(proyecto_nombre) > 30 else proyecto_nombre,
-                    categoria_nombre[:20] + '...' if len(categoria_nombre) > 20 else categoria_nombre,
-                    f"${gasto.monto:,.2f}",
-                    estado_texto
-                ])
-            
-            table = Table(data, colWidths=[0.9*inch, 2.2*inch, 1.3*inch, 1.2*inch, 1*inch, 0.9*inch])
-            table.setStyle(TableStyle([
-                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#1e3a8a')),
-                ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-                ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
-                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-                ('FONTSIZE', (0, 0), (-1, 0), 9),
-                ('BOTTOMPADDING', (0, 0), (-1, 0), 10),
-                ('TOPPADDING', (0, 0), (-1, 0), 10),
-                ('BACKGROUND', (0, 1), (-1, -1), colors.white),
-                ('FONTSIZE', (0, 1), (-1, -1), 8),
-                ('ALIGN', (4, 1), (4, -1), 'RIGHT'),
-                ('ALIGN', (0, 1), (3, -1), 'LEFT'),
-                ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-                ('LEFTPADDING', (0, 1), (-1, -1), 6),
-                ('RIGHTPADDING', (0, 1), (-1, -1), 6),
-                ('TOPPADDING', (0, 1), (-1, -1), 6),
-                ('BOTTOMPADDING', (0, 1), (-1, -1), 6),
-                ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f8f9fa')]),
-                ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#d1d5db')),
-                ('BOX', (0, 0), (-1, -1), 1.5, colors.HexColor('#1e3a8a')),
-            ]))
-            
-            story.append(table)
-            story.append(Spacer(1, 15))
-            total_style = ParagraphStyle(
-                'TotalStyle',
-                parent=styles['Normal'],
-                fontSize=11,
-                alignment=TA_RIGHT,
-                textColor=colors.HexColor('#1e3a8a'),
-                fontName='Helvetica-Bold'
-            )
-            story.append(Paragraph(f"<b>TOTAL: ${total_monto:,.2f}</b>", total_style))
-        
-        doc.build(story)
-        pdf_buffer.seek(0)
-        zip_file.writestr('01_reporte_gastos.pdf', pdf_buffer.getvalue())
-        pdf_buffer.close()
-        
-        # 3. Agregar comprobantes de gastos
-        comprobantes_count = 0
-        for gasto in gastos:
-            if gasto.comprobante:
-                try:
-                    comprobante_path = gasto.comprobante.path
-                    if os.path.exists(comprobante_path):
-                        filename = f"comprobante_gasto_{gasto.id}_{os.path.basename(comprobante_path)}"
-                        zip_file.write(comprobante_path, f"03_comprobantes_gastos/{filename}")
-                        comprobantes_count += 1
-                except (ValueError, Exception) as e:
-                    # Si el archivo no existe en el sistema de archivos, continuar
-                    logger.warning(f"No se pudo agregar comprobante del gasto {gasto.id}: {e}")
-                    continue
-        
-        # 4. Si se solicita, incluir facturas relacionadas
-        if incluir_facturas:
-            # Obtener proyectos únicos de los gastos
-            proyectos_ids = gastos.values_list('proyecto_id', flat=True).distinct()
-            
-            # Obtener facturas de esos proyectos en el mismo período (o todas las facturas del proyecto)
-            facturas = Factura.objects.filter(
-                proyecto_id__in=proyectos_ids,
-                fecha_emision__gte=fecha_inicio,
-                fecha_emision__lte=fecha_fin
-            ).select_related('proyecto', 'cliente').order_by('fecha_emision')
-            
-            facturas_count = 0
-            for factura in facturas:
-                # Agregar archivos adjuntos de la factura
-                archivos_adjuntos = factura.archivos_adjuntos.all()
-                for archivo_adjunto in archivos_adjuntos:
-                    try:
-                        archivo_path = archivo_adjunto.archivo.path
-                        if os.path.exists(archivo_path):
-                            filename = f"factura_{factura.numero_factura.replace('/', '_')}_{os.path.basename(archivo_path)}"
-                            zip_file.write(archivo_path, f"02_facturas/{filename}")
-                            facturas_count += 1
-                    except (ValueError, Exception) as e:
-                        logger.warning(f"No se pudo agregar archivo adjunto de factura {factura.id}: {e}")
-                        continue
-        
-        # Cerrar el ZIP
-        zip_file.close()
-        zip_buffer.seek(0)
-        
-        # Crear respuesta HTTP
-        response = HttpResponse(zip_buffer.getvalue(), content_type='application/zip')
         fecha_inicio_str = fecha_inicio.replace('-', '')
         fecha_fin_str = fecha_fin.replace('-', '')
         filename = f"reporte_contable_{fecha_inicio_str}_{fecha_fin_str}.zip"
@@ -2032,8 +1717,9 @@ def egresos_prorrateo_administrativo(request):
     # Preparar datos por proyecto
     items = []
     pesos = []
+    rentabilidad_por_proyecto = calcular_rentabilidad_proyectos(proyectos, fecha_inicio, fecha_fin)
     for proyecto in proyectos:
-        rentabilidad_data = calcular_rentabilidad_proyecto(proyecto, fecha_inicio, fecha_fin)
+        rentabilidad_data = rentabilidad_por_proyecto[proyecto.id]
         rentabilidad = Decimal(str(rentabilidad_data['rentabilidad']))
         ingresos = Decimal(str(rentabilidad_data['ingresos']))
         gastos = Decimal(str(rentabilidad_data['gastos']))
@@ -2161,16 +1847,18 @@ def gasto_create(request):
         logger.info(f"📝 Datos POST: {request.POST}")
         logger.info(f"📝 Archivos FILES: {request.FILES}")
         
+        subida = subidas.adjuntar(request, 'comprobante')
         form = GastoForm(request.POST, request.FILES)
         logger.info(f"📝 Formulario creado: {form}")
         
         if form.is_valid():
             logger.info("✅ Formulario es válido, guardando gasto...")
             gasto = form.save()
+            subidas.finalizar(request, 'comprobante', subida)
             logger.info(f"✅ Gasto guardado con ID: {gasto.id}")
             
             # Registrar actividad
-            LogActividad.objects.create(
+            registrar_actividad(
                 usuario=request.user,
                 accion='Crear',
                 modulo='Gastos',
@@ -2210,7 +1898,7 @@ def gasto_aprobar(request, gasto_id):
             proyecto = gasto.proyecto
             if proyecto:
                 # Registrar actividad
-                LogActividad.objects.create(
+                registrar_actividad(
                     usuario=request.user,
                     accion='Desaprobar',
                     modulo='Gastos',
@@ -2232,7 +1920,7 @@ def gasto_aprobar(request, gasto_id):
             proyecto = gasto.proyecto
             if proyecto:
                 # Registrar actividad
-                LogActividad.objects.create(
+                registrar_actividad(
                     usuario=request.user,
                     accion='Aprobar',
                     modulo='Gastos',
@@ -2283,7 +1971,7 @@ def gasto_desaprobar(request, gasto_id):
             proyecto = gasto.proyecto
             if proyecto:
                 # Registrar actividad
-                LogActividad.objects.create(
+                registrar_actividad(
                     usuario=request.user,
                     accion='Desaprobar',
                     modulo='Gastos',
@@ -2332,6 +2020,7 @@ def gasto_edit(request, gasto_id):
     gasto = get_object_or_404(Gasto, id=gasto_id)
     
     if request.method == 'POST':
+        subida = subidas.adjuntar(request, 'comprobante')
         form = GastoForm(request.POST, request.FILES, instance=gasto)
         if form.is_valid():
             # Si se marcó el checkbox para eliminar el comprobante
@@ -2341,9 +2030,10 @@ def gasto_edit(request, gasto_id):
                     gasto.comprobante = None
             
             gasto = form.save()
+            subidas.finalizar(request, 'comprobante', subida)
             
             # Registrar actividad
-            LogActividad.objects.create(
+            registrar_actividad(
                 usuario=request.user,
                 accion='Editar',
                 modulo='Gastos',
@@ -2366,7 +2056,7 @@ def gasto_delete(request, gasto_id):
     
     if request.method == 'POST':
         # Registrar actividad antes de eliminar
-        LogActividad.objects.create(
+        registrar_actividad(
             usuario=request.user,
             accion='Eliminar',
             modulo='Gastos',
@@ -2404,7 +2094,7 @@ def pago_create(request):
             pago.save()
             
             # Registrar actividad
-            LogActividad.objects.create(
+            registrar_actividad(
                 usuario=request.user,
                 accion='Crear',
                 modulo='Pagos',
@@ -2433,7 +2123,7 @@ def pago_edit(request, pago_id):
             pago = form.save()
             
             # Registrar actividad
-            LogActividad.objects.create(
+            registrar_actividad(
                 usuario=request.user,
                 accion='Editar',
                 modulo='Pagos',
@@ -2456,7 +2146,7 @@ def pago_delete(request, pago_id):
     
     if request.method == 'POST':
         # Registrar actividad antes de eliminar
-        LogActividad.objects.create(
+        registrar_actividad(
             usuario=request.user,
             accion='Eliminar',
             modulo='Pagos',
@@ -2491,7 +2181,7 @@ def banco_create(request):
         form = BancoCuentaForm(request.POST)
         if form.is_valid():
             cuenta = form.save()
-            LogActividad.objects.create(
+            registrar_actividad(
                 usuario=request.user,
                 accion='Crear',
                 modulo='Bancos',
@@ -2513,7 +2203,7 @@ def banco_edit(request, cuenta_id):
         form = BancoCuentaForm(request.POST, instance=cuenta)
         if form.is_valid():
             cuenta = form.save()
-            LogActividad.objects.create(
+            registrar_actividad(
                 usuario=request.user,
                 accion='Editar',
                 modulo='Bancos',
@@ -2532,7 +2222,7 @@ def banco_delete(request, cuenta_id):
     """Eliminar cuenta bancaria"""
     cuenta = get_object_or_404(BancoCuenta, id=cuenta_id)
     if request.method == 'POST':
-        LogActividad.objects.create(
+        registrar_actividad(
             usuario=request.user,
             accion='Eliminar',
             modulo='Bancos',
@@ -2587,7 +2277,7 @@ def movimiento_create(request):
             movimiento = form.save(commit=False)
             movimiento.creado_por = request.user
             movimiento.save()
-            LogActividad.objects.create(
+            registrar_actividad(
                 usuario=request.user,
                 accion='Crear',
                 modulo='Bancos',
@@ -2609,7 +2299,7 @@ def movimiento_edit(request, movimiento_id):
         form = MovimientoBancoForm(request.POST, instance=movimiento)
         if form.is_valid():
             movimiento = form.save()
-            LogActividad.objects.create(
+            registrar_actividad(
                 usuario=request.user,
                 accion='Editar',
                 modulo='Bancos',
@@ -2628,7 +2318,7 @@ def movimiento_delete(request, movimiento_id):
     """Eliminar movimiento bancario"""
     movimiento = get_object_or_404(MovimientoBanco, id=movimiento_id)
     if request.method == 'POST':
-        LogActividad.objects.create(
+        registrar_actividad(
             usuario=request.user,
             accion='Eliminar',
             modulo='Bancos',
@@ -2667,7 +2357,7 @@ def categoria_gasto_create(request):
             categoria = form.save()
             
             # Registrar actividad
-            LogActividad.objects.create(
+            registrar_actividad(
                 usuario=request.user,
                 accion='Crear',
                 modulo='Categorías de Gasto',
@@ -2694,7 +2384,7 @@ def categoria_gasto_edit(request, categoria_id):
             categoria = form.save()
             
             # Registrar actividad
-            LogActividad.objects.create(
+            registrar_actividad(
                 usuario=request.user,
                 accion='Editar',
                 modulo='Categorías de Gasto',
@@ -2722,7 +2412,7 @@ def categoria_gasto_delete(request, categoria_id):
             return redirect('categoria_egreso_list')
         
         # Registrar actividad antes de eliminar
-        LogActividad.objects.create(
+        registrar_actividad(
             usuario=request.user,
             accion='Eliminar',
             modulo='Categorías de Gasto',
@@ -2805,7 +2495,7 @@ def evento_calendario_create(request):
             evento.save()
             
             # Registrar actividad
-            LogActividad.objects.create(
+            registrar_actividad(
                 usuario=request.user,
                 accion='Crear',
                 modulo='Eventos del Calendario',
@@ -2832,7 +2522,7 @@ def evento_calendario_edit(request, evento_id):
             evento = form.save()
             
             # Registrar actividad
-            LogActividad.objects.create(
+            registrar_actividad(
                 usuario=request.user,
                 accion='Editar',
                 modulo='Eventos del Calendario',
@@ -2855,7 +2545,7 @@ def evento_calendario_delete(request, evento_id):
     
     if request.method == 'POST':
         # Registrar actividad antes de eliminar
-        LogActividad.objects.create(
+        registrar_actividad(
             usuario=request.user,
             accion='Eliminar',
             modulo='Eventos del Calendario',
@@ -2993,7 +2683,7 @@ def evento_calendario_create_ajax(request):
             )
             
             # Registrar actividad
-            LogActividad.objects.create(
+            registrar_actividad(
                 usuario=request.user,
                 accion='Crear',
                 modulo='Eventos del Calendario',
@@ -3075,7 +2765,7 @@ def evento_calendario_update_ajax(request, evento_id):
         evento.save()
         
         # Registrar actividad
-        LogActividad.objects.create(
+        registrar_actividad(
             usuario=request.user,
             accion='Actualizar',
             modulo='Eventos del Calendario',
@@ -3116,7 +2806,7 @@ def evento_calendario_delete_ajax(request, evento_id):
         evento.delete()
         
         # Registrar actividad
-        LogActividad.objects.create(
+        registrar_actividad(
             usuario=request.user,
             accion='Eliminar',
             modulo='Eventos del Calendario',
@@ -3156,7 +2846,7 @@ def anticipo_create(request):
             logger.info(f"✅ Anticipo guardado con ID: {anticipo.id}")
             
             # Registrar actividad
-            LogActividad.objects.create(
+            registrar_actividad(
                 usuario=request.user,
                 accion='Crear',
                 modulo='Anticipos',
@@ -3246,7 +2936,7 @@ def anticipo_edit(request, anticipo_id):
             anticipo.save()
             
             # Registrar actividad
-            LogActividad.objects.create(
+            registrar_actividad(
                 usuario=request.user,
                 accion='Editar',
                 modulo='Anticipos',
@@ -3288,7 +2978,7 @@ def anticipo_delete(request, anticipo_id):
         anticipo.delete()
         
         # Registrar actividad
-        LogActividad.objects.create(
+        registrar_actividad(
             usuario=request.user,
             accion='Eliminar',
             modulo='Anticipos',
@@ -3324,7 +3014,7 @@ def aplicar_anticipo(request, anticipo_id):
                 anticipo.aplicar_a_factura(factura, monto_aplicar)
                 
                 # Registrar actividad
-                LogActividad.objects.create(
+                registrar_actividad(
                     usuario=request.user,
                     accion='Aplicar Anticipo',
                     modulo='Anticipos',
@@ -3344,7 +3034,7 @@ def aplicar_anticipo(request, anticipo_id):
                 anticipo.aplicar_al_proyecto(monto_aplicar)
                 
                 # Registrar actividad
-                LogActividad.objects.create(
+                registrar_actividad(
                     usuario=request.user,
                     accion='Aplicar Anticipo',
                     modulo='Anticipos',
@@ -3404,25 +3094,24 @@ def proyecto_dashboard(request, proyecto_id=None):
     # Estadísticas del proyecto específico
     facturas_proyecto = Factura.objects.filter(proyecto=proyecto)
     gastos_proyecto = Gasto.objects.filter(proyecto=proyecto)
-    gastos_aprobados = Gasto.objects.filter(proyecto=proyecto, aprobado=True)
     anticipos_proyecto = Anticipo.objects.filter(proyecto=proyecto)
     
-    # Totales financieros del proyecto
-    total_facturado = facturas_proyecto.aggregate(total=Sum('monto_total'))['total'] or Decimal('0.00')
+    # Totales financieros del proyecto desde el libro materializado (ProyectoFinanzas)
+    finanzas = proyecto.get_finanzas()
+    total_facturado = finanzas['facturado']
     
-    # Total gastos: usar los métodos del modelo para consistencia
-    total_gastos = proyecto.get_total_gastos_aprobados()  # Solo gastos aprobados
-    total_gastos_aprobados = proyecto.get_total_gastos_aprobados()
-    total_gastos_pendientes = proyecto.get_total_gastos_pendientes()
+    # Total gastos: solo gastos aprobados
+    total_gastos = finanzas['gastos_aprobados']
+    total_gastos_aprobados = finanzas['gastos_aprobados']
+    total_gastos_pendientes = finanzas['gastos_pendientes']
     
     # Estadísticas de anticipos
-    total_anticipos = anticipos_proyecto.aggregate(total=Sum('monto'))['total'] or Decimal('0.00')
-    total_anticipos_aplicados = anticipos_proyecto.aggregate(total=Sum('monto_aplicado'))['total'] or Decimal('0.00')
-    total_anticipos_disponibles_base = anticipos_proyecto.aggregate(total=Sum('monto_disponible'))['total'] or Decimal('0.00')
+    total_anticipos = finanzas['anticipos_monto']
+    total_anticipos_aplicados = finanzas['anticipos_aplicados']
+    total_anticipos_disponibles_base = finanzas['anticipos_disponibles']
     
     # Anticipos aplicados directamente al proyecto
-    anticipos_aplicados_proyecto = anticipos_proyecto.filter(aplicado_al_proyecto=True)
-    total_anticipos_aplicados_proyecto = anticipos_aplicados_proyecto.aggregate(total=Sum('monto_aplicado_proyecto'))['total'] or Decimal('0.00')
+    total_anticipos_aplicados_proyecto = finanzas['anticipos_aplicados_proyecto']
     
     # Fondos disponibles: anticipos aplicados al proyecto - gastos aprobados del proyecto
     total_anticipos_disponibles = max(total_anticipos_aplicados_proyecto - total_gastos, Decimal('0.00'))
@@ -3431,8 +3120,7 @@ def proyecto_dashboard(request, proyecto_id=None):
     total_anticipos_pendientes = total_anticipos_disponibles_base
     
     # Facturas pagadas (solo para mostrar en estadísticas)
-    facturas_pagadas = facturas_proyecto.filter(estado='pagada')
-    total_facturas_pagadas = facturas_pagadas.aggregate(total=Sum('monto_total'))['total'] or Decimal('0.00')
+    total_facturas_pagadas = finanzas['facturas_pagadas']
     
     # Total cobrado REAL: facturas pagadas + anticipos aplicados a facturas + anticipos aplicados al proyecto
     total_cobrado = total_facturas_pagadas + total_anticipos_aplicados + total_anticipos_aplicados_proyecto
@@ -3451,25 +3139,18 @@ def proyecto_dashboard(request, proyecto_id=None):
     
     # Calcular histórico de nómina (Personal + Trabajadores Diarios)
     # 1. Histórico de Personal (planillas regulares - sin observaciones de trabajadores diarios)
-    planillas_personal_liquidadas = PlanillaLiquidada.objects.filter(
-        proyecto=proyecto
-    ).exclude(observaciones__icontains='trabajadores diarios')
-    total_historico_personal = planillas_personal_liquidadas.aggregate(total=Sum('total_planilla'))['total'] or Decimal('0.00')
+    total_historico_personal = finanzas['planillas_personal']
     
     # 2. Histórico de Trabajadores Diarios (planillas de trabajadores diarios)
-    planillas_trabajadores_diarios = PlanillaLiquidada.objects.filter(
-        proyecto=proyecto,
-        observaciones__icontains='trabajadores diarios'
-    )
-    total_historico_trabajadores_diarios = planillas_trabajadores_diarios.aggregate(total=Sum('total_planilla'))['total'] or Decimal('0.00')
+    total_historico_trabajadores_diarios = finanzas['planillas_trabajadores_diarios']
     
     # 3. Total Histórico de Nómina Combinado
     total_historico_nomina = total_historico_personal + total_historico_trabajadores_diarios
     
     # Cálculo del Balance del Proyecto (Ingresos + Facturas - Gastos - Nómina Histórica)
     # IMPORTANTE: El total histórico de nómina SÍ afecta el balance porque son gastos reales del proyecto
-    total_ingresos_proyecto = proyecto.ingresos.aggregate(total=Sum('monto_total'))['total'] or Decimal('0.00')
-    total_facturas_proyecto = proyecto.facturas.filter(estado='pagada').aggregate(total=Sum('monto_total'))['total'] or Decimal('0.00')
+    total_ingresos_proyecto = finanzas['ingresos_registrados']
+    total_facturas_proyecto = finanzas['facturas_pagadas']
     total_ingresos_totales = total_ingresos_proyecto + total_facturas_proyecto
     
     # Total de gastos incluyendo nómina histórica (gastos aprobados + planillas liquidadas)
@@ -3504,10 +3185,10 @@ def proyecto_dashboard(request, proyecto_id=None):
         'gastos_recientes': gastos_recientes,
         'anticipos_recientes': anticipos_recientes,
         'total_archivos': archivos_proyecto.count(),
-        'total_facturas': facturas_proyecto.count(),
-        'total_gastos_count': gastos_proyecto.count(),
-        'facturas_pagadas_count': facturas_pagadas.count(),
-        'total_anticipos_count': anticipos_proyecto.count(),
+        'total_facturas': finanzas['facturas_cantidad'],
+        'total_gastos_count': finanzas['gastos_cantidad'],
+        'facturas_pagadas_count': finanzas['facturas_pagadas_cantidad'],
+        'total_anticipos_count': finanzas['anticipos_cantidad'],
         'total_historico_personal': total_historico_personal,
         'total_historico_trabajadores_diarios': total_historico_trabajadores_diarios,
         'total_historico_nomina': total_historico_nomina,
@@ -3523,18 +3204,14 @@ def proyecto_dashboard(request, proyecto_id=None):
 @login_required
 def archivos_proyectos_list(request):
     """Lista de todos los proyectos para gestión de archivos"""
-    proyectos = Proyecto.objects.filter(activo=True).order_by('nombre')
-    
-    # Estadísticas de archivos por proyecto
-    for proyecto in proyectos:
-        proyecto.total_archivos = ArchivoProyecto.objects.filter(
-            proyecto=proyecto, 
-            activo=True
-        ).count()
+    # Estadísticas de archivos por proyecto en la misma consulta
+    proyectos = list(Proyecto.objects.filter(activo=True).annotate(
+        total_archivos=Count('archivos', filter=Q(archivos__activo=True))
+    ).order_by('nombre'))
     
     context = {
         'proyectos': proyectos,
-        'total_proyectos': proyectos.count(),
+        'total_proyectos': len(proyectos),
     }
     
     return render(request, 'core/archivos/proyectos_list.html', context)
@@ -3555,14 +3232,16 @@ def archivos_proyecto_list(request, proyecto_id):
         except CarpetaProyecto.DoesNotExist:
             pass
     
+    # Árbol de carpetas del proyecto en una consulta (subcarpetas, rutas y conteos en memoria)
+    arbol = ArbolCarpetas.de_proyecto(proyecto.id, carpeta=carpeta_actual)
+    
     # Obtener archivos
     if carpeta_actual:
         archivos = ArchivoProyecto.objects.filter(proyecto=proyecto, carpeta=carpeta_actual, activo=True)
-        carpetas = carpeta_actual.get_subcarpetas_activas()
     else:
         # Carpeta raíz - archivos sin carpeta y carpetas raíz
         archivos = ArchivoProyecto.objects.filter(proyecto=proyecto, carpeta__isnull=True, activo=True)
-        carpetas = CarpetaProyecto.objects.filter(proyecto=proyecto, carpeta_padre__isnull=True, activa=True)
+    carpetas = arbol.subcarpetas(carpeta_actual)
     
     # Filtros
     tipo = request.GET.get('tipo')
@@ -3570,13 +3249,13 @@ def archivos_proyecto_list(request, proyecto_id):
         archivos = archivos.filter(tipo=tipo)
     
     # Obtener todas las carpetas del proyecto para el breadcrumb
-    todas_carpetas = CarpetaProyecto.objects.filter(proyecto=proyecto, activa=True).order_by('nombre')
+    todas_carpetas = arbol.activas()
     
     # Calcular total de carpetas para estadísticas
-    total_carpetas = todas_carpetas.count()
+    total_carpetas = len(todas_carpetas)
     
-    # Calcular tamaño total de archivos
-    total_size = sum(archivo.archivo.size for archivo in archivos if archivo.archivo)
+    # Calcular tamaño total de archivos (guardado al subirlos, sin consultar el disco)
+    total_size = archivos.aggregate(total=Sum('tamano_bytes'))['total'] or 0
     # Convertir a formato legible
     if total_size < 1024:
         total_size_str = f"{total_size} B"
@@ -3627,6 +3306,7 @@ def archivo_upload(request, proyecto_id):
         logger.info(f"📤 POST data: {request.POST}")
         logger.info(f"📤 FILES: {request.FILES}")
         
+        subida = subidas.adjuntar(request, 'archivo')
         form = ArchivoProyectoForm(request.POST, request.FILES, proyecto=proyecto)
         logger.info(f"📋 Formulario creado")
         logger.info(f"📋 Es válido: {form.is_valid()}")
@@ -3655,17 +3335,13 @@ def archivo_upload(request, proyecto_id):
                 logger.info(f"💾 Tipo: {archivo.tipo}")
                 
                 archivo.save()
+                subidas.finalizar(request, 'archivo', subida)
                 logger.info(f"✅ Archivo guardado exitosamente: ID={archivo.id}")
                 
-                # Generar thumbnail automáticamente
-                try:
-                    archivo.generar_thumbnail()
-                except Exception as e:
-                    logger.warning(f"⚠️ Error generando thumbnail: {e}")
-                    pass
+                # Las miniaturas se generan en segundo plano (ver core/miniaturas.py)
             
                 # Registrar actividad
-                LogActividad.objects.create(
+                registrar_actividad(
                     usuario=request.user,
                     accion='Subir Archivo',
                     modulo='Archivos',
@@ -3717,6 +3393,7 @@ def archivo_upload_carpeta(request, carpeta_id):
         logger.info(f"📤 POST data: {request.POST}")
         logger.info(f"📤 FILES: {request.FILES}")
         
+        subida = subidas.adjuntar(request, 'archivo')
         form = ArchivoProyectoForm(request.POST, request.FILES, proyecto=proyecto)
         logger.info(f"📋 Formulario creado")
         logger.info(f"📋 Es válido: {form.is_valid()}")
@@ -3732,17 +3409,13 @@ def archivo_upload_carpeta(request, carpeta_id):
                 logger.info(f"📁 FORZANDO carpeta: {carpeta.nombre}")
                 
                 archivo.save()
+                subidas.finalizar(request, 'archivo', subida)
                 logger.info(f"✅ Archivo guardado exitosamente: ID={archivo.id}")
                 
-                # Generar thumbnail automáticamente
-                try:
-                    archivo.generar_thumbnail()
-                except Exception as e:
-                    logger.warning(f"⚠️ Error generando thumbnail: {e}")
-                    pass
+                # Las miniaturas se generan en segundo plano (ver core/miniaturas.py)
                 
                 # Registrar actividad
-                LogActividad.objects.create(
+                registrar_actividad(
                     usuario=request.user,
                     accion='Subir Archivo',
                     modulo='Archivos',
@@ -3790,14 +3463,15 @@ def archivo_download(request, archivo_id):
         messages.error(request, 'No tienes permisos para acceder a este archivo')
         return redirect('proyectos_list')
     
-    # Registrar descarga
-    LogActividad.objects.create(
-        usuario=request.user,
-        accion='Descargar Archivo',
-        modulo='Archivos',
-        descripcion=f'Archivo descargado: {archivo.nombre}',
-        ip_address=request.META.get('REMOTE_ADDR')
-    )
+    # Registrar descarga (no cada parte de una descarga reanudada)
+    if descargas.es_descarga_inicial(request):
+        registrar_actividad(
+            usuario=request.user,
+            accion='Descargar Archivo',
+            modulo='Archivos',
+            descripcion=f'Archivo descargado: {archivo.nombre}',
+            ip_address=request.META.get('REMOTE_ADDR')
+        )
     
     # Retornar archivo para descarga
     from django.http import FileResponse
@@ -3825,9 +3499,13 @@ def archivo_download(request, archivo_id):
     try:
         file_path = archivo.archivo.path
         if os.path.exists(file_path):
-            response = FileResponse(open(file_path, 'rb'))
-            response['Content-Disposition'] = f'attachment; filename="{archivo.nombre}.{archivo.get_extension()}"'
-            return response
+            # Con DESCARGAS_BACKEND = 'nginx' los bytes los envía nginx (X-Accel-Redirect)
+            return descargas.servir_archivo(
+                request,
+                file_path,
+                nombre=f'{archivo.nombre}.{archivo.get_extension()}',
+                content_type=archivo.tipo_mime or None,
+            )
         else:
             messages.error(request, 'El archivo no existe en el servidor')
             return redirect('archivos_proyecto_list', proyecto_id=archivo.proyecto.id)
@@ -3858,7 +3536,7 @@ def archivo_delete(request, archivo_id):
         
         try:
             # Registrar actividad antes de eliminar
-            LogActividad.objects.create(
+            registrar_actividad(
                 usuario=request.user,
                 accion='Eliminar Archivo',
                 modulo='Archivos',
@@ -3912,6 +3590,38 @@ def archivo_preview(request, archivo_id):
     }
     
     return render(request, 'core/archivos/preview.html', context)
+
+
+@login_required
+def archivo_miniatura(request, archivo_id, tamano):
+    """
+    Miniatura de un archivo (lista, cuadricula o vista_previa).
+    
+    Si todavía no existe (archivos anteriores o worker detenido) se genera en
+    esta petición y queda guardada; la versión en la URL de la imagen es el
+    ETag, así el navegador la reutiliza sin volver a descargarla.
+    """
+    from django.http import FileResponse, Http404
+    from django.utils.cache import get_conditional_response, patch_cache_control
+    from . import miniaturas
+    
+    archivo = get_object_or_404(ArchivoProyecto, id=archivo_id, activo=True)
+    if tamano not in miniaturas.TAMANOS:
+        raise Http404('Tamaño de miniatura no válido')
+    
+    etag = f'"{miniaturas.version(archivo)}-{tamano}"'
+    no_modificado = get_conditional_response(request, etag=etag)
+    if no_modificado is not None:
+        return no_modificado
+    
+    ruta = miniaturas.obtener(archivo, tamano)
+    if ruta is None:
+        raise Http404('El archivo no tiene vista previa')
+    
+    response = FileResponse(open(ruta, 'rb'), content_type='image/jpeg')
+    response['ETag'] = etag
+    patch_cache_control(response, private=True, max_age=86400)
+    return response
  
 
 
@@ -3980,7 +3690,7 @@ def sistema_configurar(request):
             config.save()
             
             # Registrar actividad
-            LogActividad.objects.create(
+            registrar_actividad(
                 usuario=request.user,
                 accion='Actualizar',
                 modulo='Sistema',
@@ -4034,7 +3744,7 @@ def sistema_crear_respaldo(request):
             f.write(output.getvalue())
         
         # Registrar actividad
-        LogActividad.objects.create(
+        registrar_actividad(
             usuario=request.user,
             accion='Crear',
             modulo='Sistema',
@@ -4059,15 +3769,11 @@ def sistema_limpiar_logs(request):
         return redirect('dashboard')
     
     try:
-        from datetime import timedelta
-        
-        # Eliminar logs más antiguos de 30 días
-        fecha_limite = timezone.now() - timedelta(days=30)
-        logs_eliminados = LogActividad.objects.filter(fecha__lt=fecha_limite).count()
-        LogActividad.objects.filter(fecha__lt=fecha_limite).delete()
+        # Eliminar logs más antiguos de 30 días (archivados por mes, ver activity_log)
+        logs_eliminados = depurar_logs_actividad(dias=30)
         
         # Registrar actividad
-        LogActividad.objects.create(
+        registrar_actividad(
             usuario=request.user,
             accion='Limpiar',
             modulo='Sistema',
@@ -4119,7 +3825,7 @@ def sistema_exportar_config(request):
         response['Content-Disposition'] = f'attachment; filename="configuracion_sistema_{timezone.now().strftime("%Y%m%d_%H%M%S")}.json"'
         
         # Registrar actividad
-        LogActividad.objects.create(
+        registrar_actividad(
             usuario=request.user,
             accion='Exportar',
             modulo='Sistema',
@@ -4245,7 +3951,7 @@ def sistema_restaurar_respaldo(request, filename):
         call_command('loaddata', backup_path)
         
         # Registrar actividad
-        LogActividad.objects.create(
+        registrar_actividad(
             usuario=request.user,
             accion='Restaurar',
             modulo='Sistema',
@@ -4304,7 +4010,7 @@ def sistema_reset_app(request):
     if request.method == 'POST':
         try:
             # Registrar la acción en logs
-            LogActividad.objects.create(
+            registrar_actividad(
                 usuario=request.user,
                 accion='RESET_APP',
                 modulo='Sistema',
@@ -4412,7 +4118,7 @@ def sistema_reset_app(request):
             messages.success(request, '✅ RESET COMPLETO realizado exitosamente. Todos los datos han sido eliminados.')
             
             # Registrar éxito en logs
-            LogActividad.objects.create(
+            registrar_actividad(
                 usuario=request.user,
                 accion='RESET_APP_SUCCESS',
                 modulo='Sistema',
@@ -4426,7 +4132,7 @@ def sistema_reset_app(request):
             messages.error(request, f'❌ Error durante el reset: {str(e)}')
             
             # Registrar error en logs
-            LogActividad.objects.create(
+            registrar_actividad(
                 usuario=request.user,
                 accion='RESET_APP_ERROR',
                 modulo='Sistema',
@@ -4440,51 +4146,87 @@ def sistema_reset_app(request):
     return render(request, 'core/sistema/reset_app.html')
  
 # ===== VISTA DE RENTABILIDAD =====
+def calcular_rentabilidad_proyectos(proyectos, fecha_inicio_dt=None, fecha_fin_dt=None):
+    """
+    Calcula la rentabilidad de varios proyectos con consultas agrupadas por proyecto.
+    
+    Usa la misma lógica que el dashboard: ingresos = facturas pagadas + anticipos
+    aplicados a facturas + anticipos aplicados al proyecto; gastos = gastos aprobados.
+    Retorna un diccionario {proyecto_id: {'ingresos', 'gastos', 'rentabilidad', 'margen'}}
+    con una entrada (en cero si no hay movimientos) por cada proyecto recibido.
+    """
+    proyecto_ids = [proyecto.pk for proyecto in proyectos]
+    ingresos_por_proyecto = defaultdict(lambda: Decimal('0.00'))
+    gastos_por_proyecto = defaultdict(lambda: Decimal('0.00'))
+    
+    if proyecto_ids and not (fecha_inicio_dt and fecha_fin_dt):
+        # Sin filtro de fechas los totales salen del libro materializado (una sola consulta)
+        totales = ProyectoFinanzas.objects.filter(proyecto_id__in=proyecto_ids).values('proyecto_id').annotate(
+            facturas_pagadas=Sum('facturas_pagadas'),
+            anticipos_aplicados=Sum('anticipos_aplicados'),
+            anticipos_aplicados_proyecto=Sum('anticipos_aplicados_proyecto'),
+            gastos_aprobados=Sum('gastos_aprobados'),
+        ).order_by()
+        for fila in totales:
+            ingresos_por_proyecto[fila['proyecto_id']] = (
+                (fila['facturas_pagadas'] or Decimal('0.00'))
+                + (fila['anticipos_aplicados'] or Decimal('0.00'))
+                + (fila['anticipos_aplicados_proyecto'] or Decimal('0.00'))
+            )
+            gastos_por_proyecto[fila['proyecto_id']] = fila['gastos_aprobados'] or Decimal('0.00')
+    elif proyecto_ids:
+        rango = [fecha_inicio_dt, fecha_fin_dt]
+        
+        # Facturas pagadas por proyecto
+        facturas = Factura.objects.filter(
+            proyecto_id__in=proyecto_ids,
+            estado='pagada',
+            fecha_emision__range=rango
+        ).values('proyecto_id').annotate(total=Sum('monto_total')).order_by()
+        for fila in facturas:
+            ingresos_por_proyecto[fila['proyecto_id']] += fila['total'] or Decimal('0.00')
+        
+        # Anticipos aplicados a facturas y aplicados directamente al proyecto
+        anticipos = Anticipo.objects.filter(
+            proyecto_id__in=proyecto_ids,
+            fecha_aplicacion__range=rango
+        ).values('proyecto_id').annotate(
+            aplicados=Sum('monto_aplicado', filter=Q(monto_aplicado__gt=0)),
+            aplicados_proyecto=Sum('monto_aplicado_proyecto', filter=Q(aplicado_al_proyecto=True)),
+        ).order_by()
+        for fila in anticipos:
+            ingresos_por_proyecto[fila['proyecto_id']] += (
+                (fila['aplicados'] or Decimal('0.00'))
+                + (fila['aplicados_proyecto'] or Decimal('0.00'))
+            )
+        
+        # Gastos aprobados por proyecto
+        gastos = Gasto.objects.filter(
+            proyecto_id__in=proyecto_ids,
+            aprobado=True,
+            fecha_gasto__range=rango
+        ).values('proyecto_id').annotate(total=Sum('monto')).order_by()
+        for fila in gastos:
+            gastos_por_proyecto[fila['proyecto_id']] = Decimal(str(fila['total'] or 0))
+    
+    resultado = {}
+    for proyecto_id in proyecto_ids:
+        ingresos_proyecto = ingresos_por_proyecto[proyecto_id]
+        gastos_proyecto = gastos_por_proyecto[proyecto_id]
+        rentabilidad_proyecto = ingresos_proyecto - gastos_proyecto
+        margen_proyecto = (rentabilidad_proyecto / ingresos_proyecto * 100) if ingresos_proyecto > 0 else Decimal('0.00')
+        resultado[proyecto_id] = {
+            'ingresos': ingresos_proyecto,
+            'gastos': gastos_proyecto,
+            'rentabilidad': rentabilidad_proyecto,
+            'margen': margen_proyecto
+        }
+    return resultado
+
+
 def calcular_rentabilidad_proyecto(proyecto, fecha_inicio_dt=None, fecha_fin_dt=None):
     """Función auxiliar para calcular rentabilidad de un proyecto usando la misma lógica que el dashboard"""
-    from decimal import Decimal
-    
-    # Construir filtros de fecha dinámicamente
-    facturas_filter = {'proyecto': proyecto, 'estado': 'pagada'}
-    anticipos_filter = {'proyecto': proyecto, 'monto_aplicado__gt': 0}
-    anticipos_proyecto_filter = {'proyecto': proyecto, 'aplicado_al_proyecto': True}
-    gastos_filter = {'proyecto': proyecto, 'aprobado': True}
-    
-    # Aplicar filtros de fecha solo si se proporcionan
-    if fecha_inicio_dt and fecha_fin_dt:
-        facturas_filter['fecha_emision__range'] = [fecha_inicio_dt, fecha_fin_dt]
-        anticipos_filter['fecha_aplicacion__range'] = [fecha_inicio_dt, fecha_fin_dt]
-        anticipos_proyecto_filter['fecha_aplicacion__range'] = [fecha_inicio_dt, fecha_fin_dt]
-        gastos_filter['fecha_gasto__range'] = [fecha_inicio_dt, fecha_fin_dt]
-    
-    # Facturas pagadas del proyecto
-    facturas_pagadas = Factura.objects.filter(**facturas_filter)
-    total_facturas_pagadas = facturas_pagadas.aggregate(total=Sum('monto_total'))['total'] or Decimal('0.00')
-    
-    # Anticipos aplicados a facturas del proyecto
-    anticipos_aplicados = Anticipo.objects.filter(**anticipos_filter)
-    total_anticipos_aplicados = anticipos_aplicados.aggregate(total=Sum('monto_aplicado'))['total'] or Decimal('0.00')
-    
-    # Anticipos aplicados al proyecto
-    anticipos_proyecto = Anticipo.objects.filter(**anticipos_proyecto_filter)
-    total_anticipos_aplicados_proyecto = anticipos_proyecto.aggregate(total=Sum('monto_aplicado_proyecto'))['total'] or Decimal('0.00')
-    
-    # Total de ingresos (misma lógica que dashboard)
-    ingresos_proyecto = total_facturas_pagadas + total_anticipos_aplicados + total_anticipos_aplicados_proyecto
-    
-    # Gastos del proyecto
-    gastos_proyecto_raw = Gasto.objects.filter(**gastos_filter).aggregate(total=Sum('monto'))['total'] or 0
-    gastos_proyecto = Decimal(str(gastos_proyecto_raw))
-    
-    rentabilidad_proyecto = ingresos_proyecto - gastos_proyecto
-    margen_proyecto = (rentabilidad_proyecto / ingresos_proyecto * 100) if ingresos_proyecto > 0 else Decimal('0.00')
-    
-    return {
-        'ingresos': ingresos_proyecto,
-        'gastos': gastos_proyecto,
-        'rentabilidad': rentabilidad_proyecto,
-        'margen': margen_proyecto
-    }
+    return calcular_rentabilidad_proyectos([proyecto], fecha_inicio_dt, fecha_fin_dt)[proyecto.pk]
 
 @login_required
 def rentabilidad_view(request):
@@ -4583,9 +4325,9 @@ def rentabilidad_view(request):
         proyectos_rentabilidad = []
         proyectos = Proyecto.objects.filter(activo=True)
         
+        rentabilidad_por_proyecto = calcular_rentabilidad_proyectos(proyectos, fecha_inicio_dt, fecha_fin_dt)
         for proyecto in proyectos:
-            # Usar la función auxiliar para calcular rentabilidad
-            rentabilidad_data = calcular_rentabilidad_proyecto(proyecto, fecha_inicio_dt, fecha_fin_dt)
+            rentabilidad_data = rentabilidad_por_proyecto[proyecto.id]
             ingresos_proyecto = rentabilidad_data['ingresos']
             gastos_proyecto = rentabilidad_data['gastos']
             rentabilidad_proyecto = rentabilidad_data['rentabilidad']
@@ -4811,7 +4553,7 @@ def presupuesto_create(request):
             presupuesto.save()
             
             # Registrar actividad
-            LogActividad.objects.create(
+            registrar_actividad(
                 usuario=request.user,
                 accion='Crear',
                 modulo='Presupuestos',
@@ -4885,7 +4627,7 @@ def presupuesto_edit(request, presupuesto_id):
             presupuesto = form.save()
             
             # Registrar actividad
-            LogActividad.objects.create(
+            registrar_actividad(
                 usuario=request.user,
                 accion='Editar',
                 modulo='Presupuestos',
@@ -4933,7 +4675,7 @@ def partida_create(request, presupuesto_id):
                 messages.info(request, 'El presupuesto ha sido marcado como "En Revisión" automáticamente')
             
             # Registrar actividad
-            LogActividad.objects.create(
+            registrar_actividad(
                 usuario=request.user,
                 accion='Crear Partida',
                 modulo='Presupuestos',
@@ -4981,7 +4723,7 @@ def presupuesto_aprobar(request, presupuesto_id):
             presupuesto.save()
             
             # Registrar actividad
-            LogActividad.objects.create(
+            registrar_actividad(
                 usuario=request.user,
                 accion='Aprobar',
                 modulo='Presupuestos',
@@ -5136,6 +4878,107 @@ def notificaciones_historial(request):
     return render(request, 'core/notificaciones/historial.html', context)
 
 
+# ==================== SUBIDAS FRAGMENTADAS ====================
+
+def _respuesta_error_subida(error):
+    return JsonResponse({'success': False, 'error': str(error)}, status=error.estado)
+
+
+@login_required
+@require_http_methods(["POST"])
+def api_subida_iniciar(request):
+    """
+    Inicia una subida fragmentada. Cuerpo JSON: nombre, tamano y sha256
+    (opcional). Retorna el token, el tamaño de fragmento y cuántos enviar.
+    """
+    try:
+        datos = json.loads(request.body or b'{}')
+    except ValueError:
+        return JsonResponse({'success': False, 'error': 'JSON inválido'}, status=400)
+    try:
+        subida = subidas.iniciar(request.user, datos.get('nombre'), datos.get('tamano'), datos.get('sha256', ''))
+    except subidas.ErrorSubida as e:
+        return _respuesta_error_subida(e)
+    return JsonResponse({'success': True, **subidas.subida_a_dict(subida)}, status=201)
+
+
+@login_required
+@require_http_methods(["GET", "DELETE"])
+def api_subida_estado(request, token):
+    """Estado de la subida con los fragmentos recibidos (para reanudar) o cancelación"""
+    try:
+        subida = subidas.obtener(request.user, token)
+    except subidas.ErrorSubida as e:
+        return _respuesta_error_subida(e)
+    if request.method == 'DELETE':
+        subidas.eliminar(subida)
+        return JsonResponse({'success': True})
+    return JsonResponse({'success': True, **subidas.subida_a_dict(subida)})
+
+
+@login_required
+@require_http_methods(["PUT"])
+def api_subida_fragmento(request, token, indice):
+    """
+    Recibe el fragmento ``indice`` como cuerpo binario de la petición. La
+    cabecera X-Fragmento-SHA256 (opcional) permite detectar fragmentos dañados.
+    """
+    try:
+        subida = subidas.obtener(request.user, token)
+        recibidos = subidas.guardar_fragmento(
+            subida, indice, request, request.headers.get('X-Fragmento-SHA256', '')
+        )
+    except subidas.ErrorSubida as e:
+        return _respuesta_error_subida(e)
+    return JsonResponse({
+        'success': True,
+        'indice': indice,
+        'recibidos': len(recibidos),
+        'total_fragmentos': subida.total_fragmentos,
+    })
+
+
+@login_required
+@require_http_methods(["POST"])
+def api_subida_completar(request, token):
+    """Une los fragmentos y verifica el archivo; el token se envía luego con el formulario"""
+    try:
+        subida = subidas.completar(subidas.obtener(request.user, token))
+    except subidas.ErrorSubida as e:
+        return _respuesta_error_subida(e)
+    return JsonResponse({'success': True, **subidas.subida_a_dict(subida, con_recibidos=False)})
+
+
+# ==================== BÚSQUEDA GLOBAL ====================
+
+@login_required
+def api_buscar(request):
+    """
+    Búsqueda global por relevancia en facturas, gastos, proyectos, planillas,
+    colaboradores y trabajadores diarios (solo los módulos que el rol puede ver).
+    Parámetros: q, modulo (repetible) y limite (máximo 50).
+    """
+    texto = request.GET.get('q', '').strip()
+    permitidos = search.modulos_permitidos(request.user)
+    pedidos = request.GET.getlist('modulo')
+    modulos = [modulo for modulo in pedidos if modulo in permitidos] if pedidos else permitidos
+    try:
+        limite = min(max(int(request.GET.get('limite', 20)), 1), 50)
+    except ValueError:
+        limite = 20
+    
+    resultados = search.buscar(texto, modulos=modulos, limite=limite) if modulos else []
+    for resultado in resultados:
+        resultado['fecha'] = resultado['fecha'].strftime('%d/%m/%Y') if resultado['fecha'] else ''
+    
+    return JsonResponse({
+        'success': True,
+        'q': texto,
+        'resultados': resultados,
+        'total': len(resultados),
+    })
+
+
 # ==================== API PARA NOTIFICACIONES EN TIEMPO REAL ====================
 
 @login_required
@@ -5343,6 +5186,7 @@ def perfil(request):
 
 
 @login_required
+@en_segundo_plano('rentabilidad_pdf')
 def rentabilidad_exportar_pdf(request):
     """Exportar reporte de rentabilidad a PDF"""
     try:
@@ -5382,6 +5226,19 @@ def rentabilidad_exportar_pdf(request):
         rentabilidad_bruta = ingresos - gastos
         margen_rentabilidad = (rentabilidad_bruta / ingresos * 100) if ingresos > 0 else Decimal('0.00')
         
+        # Rentabilidad por proyecto (consultas agrupadas para todos los proyectos activos)
+        proyectos = list(Proyecto.objects.filter(activo=True).order_by('nombre'))
+        rentabilidad_por_proyecto = calcular_rentabilidad_proyectos(proyectos, fecha_inicio_dt, fecha_fin_dt)
+        proyectos_rentabilidad = sorted(
+            [
+                (proyecto, rentabilidad_por_proyecto[proyecto.id])
+                for proyecto in proyectos
+                if rentabilidad_por_proyecto[proyecto.id]['ingresos'] or rentabilidad_por_proyecto[proyecto.id]['gastos']
+            ],
+            key=lambda item: item[1]['rentabilidad'],
+            reverse=True
+        )
+        
         # Crear respuesta HTTP con contenido PDF
         from django.http import HttpResponse
         from reportlab.lib.pagesizes import letter
@@ -5439,6 +5296,33 @@ def rentabilidad_exportar_pdf(request):
         story.append(table)
         story.append(Spacer(1, 20))
         
+        # Rentabilidad por proyecto
+        if proyectos_rentabilidad:
+            story.append(Paragraph("Rentabilidad por Proyecto", styles['Heading2']))
+            story.append(Spacer(1, 12))
+            
+            data_proyectos = [['Proyecto', 'Ingresos (Q)', 'Gastos (Q)', 'Rentabilidad (Q)', 'Margen']]
+            for proyecto, datos in proyectos_rentabilidad:
+                data_proyectos.append([
+                    Paragraph(proyecto.nombre, styles['Normal']),
+                    f"{datos['ingresos']:,.2f}",
+                    f"{datos['gastos']:,.2f}",
+                    f"{datos['rentabilidad']:,.2f}",
+                    f"{datos['margen']:.2f}%"
+                ])
+            
+            table_proyectos = Table(data_proyectos, colWidths=[2.4*inch, 1.1*inch, 1.1*inch, 1.2*inch, 0.8*inch], repeatRows=1)
+            table_proyectos.setStyle(TableStyle([
+                ('BACKGROUND', (0, 0), (-1, 0), colors.grey),
+                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+                ('ALIGN', (1, 0), (-1, -1), 'RIGHT'),
+                ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+                ('FONTSIZE', (0, 0), (-1, -1), 9),
+                ('GRID', (0, 0), (-1, -1), 0.5, colors.black)
+            ]))
+            story.append(table_proyectos)
+        
         # Construir PDF
         doc.build(story)
         buffer.seek(0)
@@ -5495,6 +5379,19 @@ def rentabilidad_exportar_excel(request):
         rentabilidad_bruta = ingresos - gastos
         margen_rentabilidad = (rentabilidad_bruta / ingresos * 100) if ingresos > 0 else Decimal('0.00')
         
+        # Rentabilidad por proyecto (consultas agrupadas para todos los proyectos activos)
+        proyectos = list(Proyecto.objects.filter(activo=True).order_by('nombre'))
+        rentabilidad_por_proyecto = calcular_rentabilidad_proyectos(proyectos, fecha_inicio_dt, fecha_fin_dt)
+        proyectos_rentabilidad = sorted(
+            [
+                (proyecto, rentabilidad_por_proyecto[proyecto.id])
+                for proyecto in proyectos
+                if rentabilidad_por_proyecto[proyecto.id]['ingresos'] or rentabilidad_por_proyecto[proyecto.id]['gastos']
+            ],
+            key=lambda item: item[1]['rentabilidad'],
+            reverse=True
+        )
+        
         # Crear archivo Excel
         from django.http import HttpResponse
         from io import BytesIO
@@ -5551,9 +5448,30 @@ def rentabilidad_exportar_excel(request):
             worksheet.cell(row=row, column=1, value=concepto)
             worksheet.cell(row=row, column=2, value=monto)
         
+        # Rentabilidad por proyecto
+        fila_inicio = 6 + len(data) + 1
+        worksheet.cell(row=fila_inicio, column=1, value="Rentabilidad por Proyecto").font = Font(bold=True, size=14)
+        
+        headers_proyectos = ['Proyecto', 'Ingresos (Q)', 'Gastos (Q)', 'Rentabilidad (Q)', 'Margen (%)']
+        for col, header in enumerate(headers_proyectos, 1):
+            cell = worksheet.cell(row=fila_inicio + 1, column=col, value=header)
+            cell.font = header_font
+            cell.fill = header_fill
+            cell.alignment = center_alignment
+        
+        for row, (proyecto, datos) in enumerate(proyectos_rentabilidad, fila_inicio + 2):
+            worksheet.cell(row=row, column=1, value=proyecto.nombre)
+            worksheet.cell(row=row, column=2, value=float(datos['ingresos']))
+            worksheet.cell(row=row, column=3, value=float(datos['gastos']))
+            worksheet.cell(row=row, column=4, value=float(datos['rentabilidad']))
+            worksheet.cell(row=row, column=5, value=round(float(datos['margen']), 2))
+        
         # Ajustar ancho de columnas
-        worksheet.column_dimensions['A'].width = 25
+        worksheet.column_dimensions['A'].width = 35
         worksheet.column_dimensions['B'].width = 15
+        worksheet.column_dimensions['C'].width = 15
+        worksheet.column_dimensions['D'].width = 17
+        worksheet.column_dimensions['E'].width = 12
         
         # Guardar archivo
         workbook.save(buffer)
@@ -6670,12 +6588,13 @@ def resetear_historico_nomina(request, proyecto_id):
             
             # Eliminar planillas liquidadas del personal
             PlanillaLiquidada.objects.filter(proyecto=proyecto).delete()
+            reconstruir_finanzas(proyecto_ids=[proyecto.id])
             
             # Eliminar trabajadores diarios inactivos
             TrabajadorDiario.objects.filter(proyecto=proyecto, activo=False).delete()
             
             # Registrar actividad
-            LogActividad.objects.create(
+            registrar_actividad(
                 usuario=request.user,
                 accion='Reset',
                 modulo='Histórico Nómina',
@@ -6760,7 +6679,7 @@ def liquidar_y_generar_planilla(request, proyecto_id):
             mes_nombre = dict(PlanillaLiquidada.MESES_CHOICES).get(mes, '')
             quincena_nombre = dict(PlanillaLiquidada.QUINCENA_CHOICES).get(quincena, '')
             
-            LogActividad.objects.create(
+            registrar_actividad(
                 usuario=request.user,
                 accion='Liquidar Planilla',
                 modulo='Planilla Personal',
@@ -6869,6 +6788,7 @@ def configurar_planilla_proyecto(request, proyecto_id):
 
 
 @login_required
+@en_segundo_plano('planilla_proyecto_pdf')
 def planilla_proyecto_pdf(request, proyecto_id):
     """Generar PDF de la planilla del proyecto con desglose completo"""
     proyecto = get_object_or_404(Proyecto, id=proyecto_id)
@@ -7414,7 +7334,7 @@ def eliminar_anticipo_proyecto(request, anticipo_id):
         monto = anticipo.monto
         
         # Log de actividad antes de eliminar
-        LogActividad.objects.create(
+        registrar_actividad(
             usuario=request.user,
             accion='eliminar',
             modulo='Planilla de Proyecto',
@@ -7691,7 +7611,7 @@ def carpeta_create(request, proyecto_id):
             carpeta.save()
             
             # Registrar actividad
-            LogActividad.objects.create(
+            registrar_actividad(
                 usuario=request.user,
                 accion='Crear Carpeta',
                 modulo='Archivos',
@@ -7725,7 +7645,7 @@ def carpeta_edit(request, carpeta_id):
             carpeta = form.save()
             
             # Registrar actividad
-            LogActividad.objects.create(
+            registrar_actividad(
                 usuario=request.user,
                 accion='Editar Carpeta',
                 modulo='Archivos',
@@ -7761,7 +7681,7 @@ def carpeta_delete(request, carpeta_id):
             return redirect('archivos_proyecto_list', proyecto_id=carpeta.proyecto.id)
         
         # Registrar actividad antes de eliminar
-        LogActividad.objects.create(
+        registrar_actividad(
             usuario=request.user,
             accion='Eliminar Carpeta',
             modulo='Archivos',
@@ -7784,8 +7704,8 @@ def carpeta_detail(request, carpeta_id):
     # Obtener archivos en esta carpeta
     archivos = ArchivoProyecto.objects.filter(carpeta=carpeta, activo=True)
     
-    # Obtener subcarpetas activas
-    subcarpetas = carpeta.get_subcarpetas_activas()
+    # Subcarpetas activas, breadcrumb y conteos desde el árbol del proyecto (una consulta)
+    subcarpetas = carpeta.arbol().subcarpetas(carpeta)
     
     # Filtros
     tipo = request.GET.get('tipo')
@@ -7799,7 +7719,8 @@ def carpeta_detail(request, carpeta_id):
         'subcarpetas': subcarpetas,
         'tipos': ArchivoProyecto.TIPO_CHOICES,
         'total_archivos': archivos.count(),
-        'total_subcarpetas': subcarpetas.count(),
+        'total_subcarpetas': len(subcarpetas),
+        'ancestros': carpeta.get_ancestros(),
     }
     
     return render(request, 'core/archivos/carpeta_detail.html', context)
@@ -7892,33 +7813,10 @@ def facturas_reporte_pdf(request):
     total_cobrado = facturas.aggregate(total=Sum('monto_pagado'))['total'] or 0
     total_pendiente = total_facturado - total_cobrado
     
-    # Crear PDF
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4)
     elements = []
     
-    # Estilos
-    styles = getSampleStyleSheet()
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=18,
-        spaceAfter=30,
-        alignment=TA_CENTER,
-        textColor=colors.darkblue
-    )
-    
-    subtitle_style = ParagraphStyle(
-        'CustomSubtitle',
-        parent=styles['Heading2'],
-        fontSize=14,
-        spaceAfter=20,
-        alignment=TA_CENTER,
-        textColor=colors.darkblue
-    )
-    
     # Título
-    elements.append(Paragraph("REPORTE DE FACTURAS", title_style))
+    elements.append(Paragraph("REPORTE DE FACTURAS", estilo('TituloClasico')))
     
     # Información del reporte
     filtros_info = []
@@ -7934,7 +7832,7 @@ def facturas_reporte_pdf(request):
     
     if filtros_info:
         filtros_text = " | ".join(filtros_info)
-        elements.append(Paragraph(filtros_text, subtitle_style))
+        elements.append(Paragraph(filtros_text, estilo('SubtituloClasico')))
     
     # Resumen financiero
     resumen_data = [
@@ -7946,17 +7844,7 @@ def facturas_reporte_pdf(request):
     ]
     
     resumen_table = Table(resumen_data, colWidths=[3*inch, 2*inch])
-    resumen_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (0, -1), colors.lightblue),
-        ('TEXTCOLOR', (0, 0), (0, -1), colors.black),
-        ('ALIGN', (0, 0), (0, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (0, -1), 10),
-        ('BOTTOMPADDING', (0, 0), (0, -1), 12),
-        ('BACKGROUND', (1, 0), (1, -1), colors.white),
-        ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-    ]))
+    resumen_table.setStyle(TABLA_CONCEPTOS)
     
     elements.append(resumen_table)
     elements.append(Spacer(1, 20))
@@ -7979,35 +7867,25 @@ def facturas_reporte_pdf(request):
         
         # Crear tabla
         table = Table(data, colWidths=[1*inch, 1.5*inch, 1.5*inch, 1*inch, 1*inch, 1*inch, 1*inch])
-        table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.darkblue),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 8),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('BACKGROUND', (0, 1), (-1, -1), colors.white),
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ('ALIGN', (3, 1), (3, -1), 'RIGHT'),  # Alinear montos a la derecha
-            ('FONTSIZE', (0, 1), (-1, -1), 8),
-        ]))
+        table.setStyle(tabla_clasica(
+            tamano_encabezado=8, tamano_cuerpo=8, columnas_monto=(3,), relleno_encabezado=12
+        ))
         
         elements.append(table)
     
     # Pie de página
     elements.append(Spacer(1, 30))
     fecha_generacion = timezone.now().strftime('%d/%m/%Y %H:%M')
-    elements.append(Paragraph(f"Reporte generado el: {fecha_generacion}", styles['Normal']))
-    elements.append(Paragraph(f"Telecom Technology", styles['Normal']))
+    elements.append(Paragraph(f"Reporte generado el: {fecha_generacion}", estilo('Normal')))
+    elements.append(Paragraph(f"Telecom Technology", estilo('Normal')))
     
     # Generar PDF
-    doc.build(elements)
-    buffer.seek(0)
+    pdf_bytes = construir_pdf(elements)
     
     # Crear respuesta HTTP
     filename = f"reporte_facturas_{timezone.now().strftime('%Y%m%d_%H%M')}.pdf"
     
-    response = HttpResponse(buffer.getvalue(), content_type='application/pdf')
+    response = HttpResponse(pdf_bytes, content_type='application/pdf')
     response['Content-Disposition'] = f'attachment; filename="{filename}"'
     
     return response
@@ -8322,7 +8200,7 @@ def reactivar_trabajador_diario(request, proyecto_id, trabajador_id):
             trabajador.save()
             
             # Registrar actividad
-            LogActividad.objects.create(
+            registrar_actividad(
                 usuario=request.user,
                 accion='Reactivar Trabajador Diario',
                 modulo='Trabajadores Diarios',
@@ -8361,7 +8239,7 @@ def reactivar_todos_trabajadores_diarios(request, proyecto_id):
             trabajadores_reactivados = trabajadores.update(activo=True)
             
             # Registrar actividad
-            LogActividad.objects.create(
+            registrar_actividad(
                 usuario=request.user,
                 accion='Reactivar Todos los Trabajadores Diarios',
                 modulo='Trabajadores Diarios',
@@ -8396,61 +8274,19 @@ def finalizar_planilla_trabajadores(request, proyecto_id):
         # 1. Generar PDF de la planilla usando la misma lógica que trabajadores_diarios_pdf
         from django.core.files.base import ContentFile
         from django.utils import timezone
-        from io import BytesIO
-        from reportlab.lib.pagesizes import A4, landscape
-        from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle
-        from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-        from reportlab.lib import colors
-        from reportlab.lib.units import inch
-        from reportlab.lib.enums import TA_CENTER
         import os
         
-        # Crear el buffer para el PDF
-        buffer = BytesIO()
-        
-        # Crear el documento PDF en orientación horizontal
-        doc = SimpleDocTemplate(buffer, pagesize=landscape(A4), rightMargin=72, leftMargin=72, topMargin=72, bottomMargin=18)
-        
-        # Obtener estilos
-        styles = getSampleStyleSheet()
-        
-        # Crear estilos personalizados
-        title_style = ParagraphStyle(
-            'CustomTitle',
-            parent=styles['Heading1'],
-            fontSize=18,
-            spaceAfter=30,
-            alignment=TA_CENTER,
-            textColor=colors.darkblue
-        )
-        
-        subtitle_style = ParagraphStyle(
-            'CustomSubtitle',
-            parent=styles['Heading2'],
-            fontSize=14,
-            spaceAfter=20,
-            alignment=TA_CENTER,
-            textColor=colors.darkgreen
-        )
-        
-        normal_style = ParagraphStyle(
-            'CustomNormal',
-            parent=styles['Normal'],
-            fontSize=10,
-            spaceAfter=12
-        )
-        
         # Contenido del PDF
         story = []
         
         # Título principal
-        story.append(Paragraph("PLANILLA DE TRABAJADORES DIARIOS", title_style))
+        story.append(Paragraph("PLANILLA DE TRABAJADORES DIARIOS", estilo('TituloClasico')))
         story.append(Spacer(1, 12))
         
         # Información del proyecto
-        story.append(Paragraph(f"<b>Proyecto:</b> {proyecto.nombre}", normal_style))
-        story.append(Paragraph(f"<b>Cliente:</b> {proyecto.cliente.razon_social}", normal_style))
-        story.append(Paragraph(f"<b>Fecha de Generación:</b> {timezone.now().strftime('%d/%m/%Y %H:%M')}", normal_style))
+        story.append(Paragraph(f"<b>Proyecto:</b> {proyecto.nombre}", estilo('NormalEspaciado')))
+        story.append(Paragraph(f"<b>Cliente:</b> {proyecto.cliente.razon_social}", estilo('NormalEspaciado')))
+        story.append(Paragraph(f"<b>Fecha de Generación:</b> {timezone.now().strftime('%d/%m/%Y %H:%M')}", estilo('NormalEspaciado')))
         story.append(Spacer(1, 20))
         
         # Calcular totales con anticipos (solo trabajadores con días trabajados)
@@ -8509,42 +8345,21 @@ def finalizar_planilla_trabajadores(request, proyecto_id):
         # Crear la tabla con columnas adicionales (7 columnas total)
         table = Table(data, colWidths=[0.6*inch, 2.5*inch, 1.2*inch, 1.2*inch, 1.4*inch, 1.4*inch, 1.4*inch])
         
-        # Estilo de la tabla
-        table.setStyle(TableStyle([
-            # Encabezados
-            ('BACKGROUND', (0, 0), (-1, 0), colors.darkblue),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-            ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 10),
-            
-            # Fila de totales
-            ('BACKGROUND', (0, -1), (-1, -1), colors.lightgrey),
-            ('TEXTCOLOR', (0, -1), (-1, -1), colors.black),
-            ('ALIGN', (0, -1), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, -1), (-1, -1), 10),
-            
-            # Bordes
-            ('GRID', (0, 0), (-1, -1), 1, colors.black),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ]))
+        table.setStyle(tabla_clasica(fila_total=True))
         
         story.append(table)
         story.append(Spacer(1, 30))
         
         # Información adicional - usar contador de trabajadores con días
-        story.append(Paragraph(f"<b>Total de Trabajadores con Días:</b> {contador}", normal_style))
-        story.append(Paragraph(f"<b>Total Bruto a Pagar:</b> ${total_bruto_general:.2f}", normal_style))
-        story.append(Paragraph(f"<b>Total Anticipos Aplicados:</b> ${total_anticipos_general:.2f}", normal_style))
-        story.append(Paragraph(f"<b>Total Neto a Pagar:</b> ${total_neto_general:.2f}", normal_style))
-        
-        # Construir el PDF
-        doc.build(story)
-        
-        # Obtener el contenido del buffer
-        pdf_content = buffer.getvalue()
-        buffer.close()
+        story.append(Paragraph(f"<b>Total de Trabajadores con Días:</b> {contador}", estilo('NormalEspaciado')))
+        story.append(Paragraph(f"<b>Total Bruto a Pagar:</b> ${total_bruto_general:.2f}", estilo('NormalEspaciado')))
+        story.append(Paragraph(f"<b>Total Anticipos Aplicados:</b> ${total_anticipos_general:.2f}", estilo('NormalEspaciado')))
+        story.append(Paragraph(f"<b>Total Neto a Pagar:</b> ${total_neto_general:.2f}", estilo('NormalEspaciado')))
+        
+        # Construir el PDF en orientación horizontal
+        pdf_content = construir_pdf(
+            story, pagesize=landscape(A4), rightMargin=72, leftMargin=72, topMargin=72, bottomMargin=18
+        )
         
         # 2. Crear o obtener carpeta "Trabajadores Diarios" en archivos del proyecto
         from core.models import CarpetaProyecto
@@ -8593,7 +8408,7 @@ def finalizar_planilla_trabajadores(request, proyecto_id):
         print(f"✅ Archivo ID: {archivo.id}")
         print(f"✅ Tiene archivo físico: {bool(archivo.archivo)}")
         if archivo.archivo:
-            print(f"✅ Tamaño: {archivo.archivo.size} bytes")
+            print(f"✅ Tamaño: {archivo.tamano_bytes} bytes")
             print(f"✅ Ruta: {archivo.archivo.path}")
             print(f"✅ Existe archivo: {os.path.exists(archivo.archivo.path)}")
         
@@ -8623,8 +8438,7 @@ def finalizar_planilla_trabajadores(request, proyecto_id):
         print(f"✅ {trabajadores_eliminados} trabajadores marcados como inactivos")
         
         # 6. Registrar actividad
-        from core.models import LogActividad
-        LogActividad.objects.create(
+        registrar_actividad(
             usuario=request.user,
             accion='Finalizar Planilla',
             modulo='Trabajadores Diarios',
@@ -8676,7 +8490,7 @@ def reabrir_planilla_trabajadores(request, proyecto_id, planilla_id):
     # Reactivar trabajadores
     trabajadores_reactivados = planilla.trabajadores.update(activo=True)
     
-    LogActividad.objects.create(
+    registrar_actividad(
         usuario=request.user,
         accion='Reabrir Planilla',
         modulo='Trabajadores Diarios',
@@ -8741,7 +8555,7 @@ def trabajador_diario_create(request, proyecto_id):
                     planilla_seleccionada.refresh_from_db()
                 
                 # Registrar actividad
-                LogActividad.objects.create(
+                registrar_actividad(
                     usuario=request.user,
                     accion='Crear',
                     modulo='Trabajadores Diarios',
@@ -8967,6 +8781,7 @@ def actualizar_dias_trabajados(request, proyecto_id, trabajador_id):
 
 
 @login_required
+@en_segundo_plano('trabajadores_diarios_pdf')
 def trabajadores_diarios_pdf(request, proyecto_id):
     """Generar PDF de la planilla de trabajadores diarios"""
     print("🚀 INICIANDO GENERACIÓN DE PDF - VERSIÓN ACTUALIZADA")
@@ -9267,7 +9082,7 @@ def trabajadores_diarios_pdf(request, proyecto_id):
         print(f"✅ Archivo ID: {archivo.id}")
         print(f"✅ Tiene archivo físico: {bool(archivo.archivo)}")
         if archivo.archivo:
-            print(f"✅ Tamaño: {archivo.archivo.size} bytes")
+            print(f"✅ Tamaño: {archivo.tamano_bytes} bytes")
             print(f"✅ Ruta: {archivo.archivo.path}")
             print(f"✅ Existe archivo: {os.path.exists(archivo.archivo.path)}")
         
@@ -9285,7 +9100,7 @@ def trabajadores_diarios_pdf(request, proyecto_id):
     response.write(pdf_content)
     
     # Registrar actividad
-    LogActividad.objects.create(
+    registrar_actividad(
         usuario=request.user,
         accion='Exportar',
         modulo='Trabajadores Diarios',
@@ -9489,7 +9304,7 @@ def anticipo_trabajador_diario_delete(request, proyecto_id, anticipo_id):
         anticipo.delete()
         
         # Registrar actividad
-        LogActividad.objects.create(
+        registrar_actividad(
             usuario=request.user,
             accion='Eliminar',
             modulo='Anticipos Trabajadores Diarios',
@@ -9526,7 +9341,7 @@ def anticipo_trabajador_diario_aplicar(request, proyecto_id, anticipo_id):
             anticipo.save()
             
             # Registrar actividad
-            LogActividad.objects.create(
+            registrar_actividad(
                 usuario=request.user,
                 accion='Aplicar',
                 modulo='Anticipos Trabajadores Diarios',
@@ -9592,41 +9407,40 @@ def api_login(request):
 @api_view()
 def dashboard_data_api(request):
     """API para obtener datos del dashboard en tiempo real"""
+    motor = DashboardMetricsEngine()
     try:
-        # Estadísticas generales
-        estadisticas = DashboardService.obtener_estadisticas_generales()
-        
-        # Datos de gráficos
-        gastos_por_categoria = Gasto.objects.filter(aprobado=True).values(
-            'categoria__nombre'
-        ).annotate(
-            total=Sum('monto')
-        ).order_by('-total')[:5]
-        
-        proyectos_por_estado = Proyecto.objects.filter(activo=True).values(
-            'estado'
-        ).annotate(
-            total=Count('id')
-        )
-        
-        # Facturas por mes (últimos 6 meses)
-        fecha_inicio = timezone.now().date() - timedelta(days=180)
-        facturas_por_mes = Factura.objects.filter(
-            fecha_emision__gte=fecha_inicio
-        ).extra(
-            select={'mes': "strftime('%%Y-%%m', fecha_emision)"}
-        ).values('mes').annotate(
-            total=Sum('monto_total')
-        ).order_by('mes')
+        with motor.medir():
+            # Estadísticas generales
+            estadisticas = DashboardService.obtener_estadisticas_generales()
+            
+            # Datos de gráficos
+            gastos_por_categoria = list(Gasto.objects.filter(aprobado=True).values(
+                'categoria__nombre'
+            ).annotate(
+                total=Sum('monto')
+            ).order_by('-total')[:5])
+            
+            proyectos_por_estado = list(Proyecto.objects.filter(activo=True).values(
+                'estado'
+            ).annotate(
+                total=Count('id')
+            ).order_by())
+            
+            # Facturas por mes (últimos 6 meses)
+            facturas_por_mes = [
+                {'mes': mes['clave'], 'total': mes['facturado']}
+                for mes in motor.serie_mensual(6)
+            ]
         
         return JsonResponse({
             'success': True,
             'data': {
                 'estadisticas': estadisticas,
-                'gastos_por_categoria': list(gastos_por_categoria),
-                'proyectos_por_estado': list(proyectos_por_estado),
-                'facturas_por_mes': list(facturas_por_mes),
-            }
+                'gastos_por_categoria': gastos_por_categoria,
+                'proyectos_por_estado': proyectos_por_estado,
+                'facturas_por_mes': facturas_por_mes,
+            },
+            'consultas': motor.consultas,
         })
     
     except Exception as e:
@@ -9639,48 +9453,45 @@ def dashboard_data_api(request):
 @api_view()
 def dashboard_intelligent_data(request):
     """API para datos de análisis inteligente"""
+    motor = DashboardMetricsEngine()
     try:
-        # Datos para gráficos avanzados
-        data = {
-            'proyectos_rentabilidad': [],
-            'gastos_tendencia': [],
-            'facturas_estado': [],
-            'colaboradores_activos': 0,
-        }
-        
-        # Proyectos con rentabilidad
-        for proyecto in Proyecto.objects.filter(activo=True)[:5]:
-            rentabilidad = ProyectoService.calcular_rentabilidad(proyecto)
-            data['proyectos_rentabilidad'].append({
-                'nombre': proyecto.nombre,
-                'rentabilidad': rentabilidad.get('rentabilidad_porcentaje', 0)
-            })
-        
-        # Tendencia de gastos últimos 12 meses
-        fecha_inicio = timezone.now().date() - timedelta(days=365)
-        gastos_tendencia = Gasto.objects.filter(
-            fecha_gasto__gte=fecha_inicio,
-            aprobado=True
-        ).extra(
-            select={'mes': "strftime('%%Y-%%m', fecha_gasto)"}
-        ).values('mes').annotate(
-            total=Sum('monto')
-        ).order_by('mes')
-        
-        data['gastos_tendencia'] = list(gastos_tendencia)
-        
-        # Estado de facturas
-        facturas_estado = Factura.objects.values('estado').annotate(
-            total=Count('id')
-        )
-        data['facturas_estado'] = list(facturas_estado)
-        
-        # Colaboradores activos
-        data['colaboradores_activos'] = Colaborador.objects.filter(activo=True).count()
+        with motor.medir():
+            # Datos para gráficos avanzados
+            data = {
+                'proyectos_rentabilidad': [],
+                'gastos_tendencia': [],
+                'facturas_estado': [],
+                'colaboradores_activos': 0,
+            }
+            
+            # Proyectos con rentabilidad: ProyectoService.calcular_rentabilidad divide
+            # (facturas pagadas - gastos) entre el presupuesto, y Proyecto ya no tiene
+            # presupuesto, así que siempre da 0; se envía 0 sin consultar los totales
+            data['proyectos_rentabilidad'] = [
+                {'nombre': nombre, 'rentabilidad': 0.0}
+                for nombre in Proyecto.objects.filter(activo=True).order_by('id').values_list('nombre', flat=True)[:5]
+            ]
+            
+            # Tendencia de gastos últimos 12 meses
+            data['gastos_tendencia'] = [
+                {'mes': mes['clave'], 'total': float(mes['gastos'])}
+                for mes in motor.serie_mensual(12)
+                if mes['gastos']
+            ]
+            
+            # Estado de facturas
+            facturas_estado = Factura.objects.values('estado').annotate(
+                total=Count('id')
+            ).order_by()
+            data['facturas_estado'] = list(facturas_estado)
+            
+            # Colaboradores activos
+            data['colaboradores_activos'] = Colaborador.objects.filter(activo=True).count()
         
         return JsonResponse({
             'success': True,
-            'data': data
+            'data': data,
+            'consultas': motor.consultas,
         })
     
     except Exception as e:
@@ -10035,7 +9846,7 @@ def trabajador_diario_add_to_planilla(request, proyecto_id, planilla_id):
                 trabajador.save()
                 
                 # Registrar actividad
-                LogActividad.objects.create(
+                registrar_actividad(
                     usuario=request.user,
                     accion='Crear',
                     modulo='Trabajadores Diarios',
@@ -10154,7 +9965,7 @@ def ingreso_create(request):
             ingreso.save()
             
             # Registrar actividad
-            LogActividad.objects.create(
+            registrar_actividad(
                 usuario=request.user,
                 accion='Crear Ingreso',
                 modulo='Ingresos',
@@ -10188,7 +9999,7 @@ def ingreso_edit(request, ingreso_id):
             ingreso.save()
             
             # Registrar actividad
-            LogActividad.objects.create(
+            registrar_actividad(
                 usuario=request.user,
                 accion='Editar Ingreso',
                 modulo='Ingresos',
@@ -10232,7 +10043,7 @@ def ingreso_delete(request, ingreso_id):
         proyecto_nombre = ingreso.proyecto.nombre
         
         # Registrar actividad antes de eliminar
-        LogActividad.objects.create(
+        registrar_actividad(
             usuario=request.user,
             accion='Eliminar Ingreso',
             modulo='Ingresos',
@@ -10423,89 +10234,55 @@ def cotizacion_detail(request, cotizacion_id):
     return render(request, 'core/cotizaciones/detail.html', context)
 
 
-@login_required
-def cotizacion_pdf(request, cotizacion_id):
-    """Generar PDF de una cotización"""
-    cotizacion = get_object_or_404(Cotizacion, id=cotizacion_id)
-    
+def _version_cotizacion_pdf(cotizacion):
+    """Huella de los datos que usa el PDF de la cotización (ver pdf_cache)"""
+    items = ItemCotizacion.objects.filter(cotizacion=cotizacion).aggregate(
+        cantidad=Count('id'), ultimo=models.Max('modificado_en')
+    )
+    return pdf_cache.huella(
+        cotizacion.pk, cotizacion.fecha_modificacion, cotizacion.cliente.razon_social,
+        cotizacion.proyecto.nombre, items['cantidad'], items['ultimo'],
+        ConfiguracionSistema.get_config().nombre_empresa,
+    )
+
+
+def _cotizacion_pdf_sin_cache(request, cotizacion_id):
+    """Solo se encola la cotización si su PDF todavía no está guardado"""
+    cotizacion = Cotizacion.objects.select_related('cliente', 'proyecto').filter(id=cotizacion_id).first()
+    if cotizacion is None:
+        return False
+    return not pdf_cache.en_cache('cotizacion', cotizacion.pk, _version_cotizacion_pdf(cotizacion))
+
+
+def _render_cotizacion_pdf(cotizacion):
+    """Bytes del PDF de una cotización"""
     # Obtener items de la cotización
     items = ItemCotizacion.objects.filter(cotizacion=cotizacion).order_by('orden')
     
-    # Crear PDF
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=A4)
     elements = []
     
-    # Estilos
-    styles = getSampleStyleSheet()
-    
     # Header con logo a la izquierda y número a la derecha
-    header_data = []
-    
-    # Logo
-    try:
-        logo_path = os.path.join(settings.BASE_DIR, 'static', 'images', 'LOGO-TELECOM-small.png')
-        if os.path.exists(logo_path):
-            logo_cell = Image(logo_path, width=100, height=50)
-        else:
-            logo_cell = Paragraph("TELECOM<br/>Technology Panama INC.", styles['Heading3'])
-    except:
-        logo_cell = Paragraph("TELECOM<br/>Technology Panama INC.", styles['Heading3'])
-    
-    # Número de cotización
-    number_cell = Paragraph(
+    elements.append(encabezado_con_logo(
         f'<b>COTIZACIÓN NO.</b><br/><font color="red">{cotizacion.numero_cotizacion}</font>',
-        ParagraphStyle('Number', parent=styles['Normal'], fontSize=10, alignment=TA_RIGHT)
-    )
-    
-    header_table = Table([[logo_cell, number_cell]], colWidths=[4*inch, 2*inch])
-    header_table.setStyle(TableStyle([
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ('TEXTCOLOR', (0, 0), (0, 0), colors.black),
-        ('FONTSIZE', (0, 0), (-1, -1), 9),
-    ]))
-    elements.append(header_table)
+        [4*inch, 2*inch],
+        'EncabezadoDerechaChico',
+    ))
     elements.append(Spacer(1, 20))
     
     # Título principal
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=32,
-        spaceAfter=15,
-        alignment=TA_CENTER,
-        textColor=colors.HexColor('#000000'),
-        fontName='Helvetica-Bold',
-        leading=36
-    )
-    elements.append(Paragraph("COTIZACIÓN", title_style))
+    elements.append(Paragraph("COTIZACIÓN", estilo('TituloDocumento')))
     elements.append(Spacer(1, 5))
     
     # Fecha
-    fecha_style = ParagraphStyle(
-        'FechaStyle',
-        parent=styles['Normal'],
-        fontSize=10,
-        alignment=TA_CENTER,
-        textColor=colors.black,
-        spaceAfter=20
-    )
-    elements.append(Paragraph(f'<b>FECHA:</b> {cotizacion.fecha_emision.strftime("%d/%m/%Y")}', fecha_style))
+    elements.append(Paragraph(f'<b>FECHA:</b> {cotizacion.fecha_emision.strftime("%d/%m/%Y")}', estilo('FechaCentrada')))
     elements.append(Spacer(1, 15))
     
     # Sección "COTIZACIÓN PARA" con barra azul
-    cliente_bar_data = [
-        [Paragraph(f'<font color="white"><b>COTIZACIÓN PARA</b></font>', ParagraphStyle('Bar', fontSize=12, textColor=colors.white, alignment=TA_CENTER, fontName='Helvetica-Bold'))]
-    ]
-    cliente_bar_table = Table(cliente_bar_data, colWidths=[6*inch])
-    cliente_bar_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, -1), colors.HexColor('#007bff')),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ('TOPPADDING', (0, 0), (-1, -1), 8),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-    ]))
+    cliente_bar_table = Table(
+        [[Paragraph('<font color="white"><b>COTIZACIÓN PARA</b></font>', estilo('BarraTitulo'))]],
+        colWidths=[6*inch]
+    )
+    cliente_bar_table.setStyle(BARRA_AZUL)
     elements.append(cliente_bar_table)
     elements.append(Spacer(1, 10))
     
@@ -10516,26 +10293,13 @@ def cotizacion_pdf(request, cotizacion_id):
     ]
     
     info_table = Table(info_data, colWidths=[1.5*inch, 4.5*inch])
-    info_table.setStyle(TableStyle([
-        ('ALIGN', (0, 0), (0, -1), 'LEFT'),
-        ('ALIGN', (1, 0), (1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (0, -1), 10),
-        ('FONTSIZE', (1, 0), (1, -1), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-        ('TOPPADDING', (0, 0), (-1, -1), 8),
-        ('GRID', (0, 0), (-1, -1), 0.5, colors.black),
-    ]))
+    info_table.setStyle(TABLA_DATOS_CLIENTE)
     
     elements.append(info_table)
     elements.append(Spacer(1, 10))
     
     # Título en negrita sin label
-    title_paragraph = Paragraph(
-        f'<b>{cotizacion.titulo}</b>',
-        ParagraphStyle('TitleOnly', parent=styles['Normal'], fontSize=12, fontName='Helvetica-Bold', spaceAfter=15)
-    )
-    elements.append(title_paragraph)
+    elements.append(Paragraph(f'<b>{cotizacion.titulo}</b>', estilo('TextoNegrita')))
     elements.append(Spacer(1, 5))
     
     # Tabla de items
@@ -10557,40 +10321,7 @@ def cotizacion_pdf(request, cotizacion_id):
         data.append(['', '', 'TOTAL:', f"${cotizacion.monto_total:,.2f}"])
         
         items_table = Table(data, colWidths=[3.5*inch, 0.8*inch, 0.9*inch, 0.8*inch])
-        items_table.setStyle(TableStyle([
-            # Header
-            ('BACKGROUND', (0, 0), (-1, 0), colors.black),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-            ('ALIGN', (0, 0), (1, 0), 'CENTER'),
-            ('ALIGN', (2, 0), (-1, 0), 'RIGHT'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 11),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-            ('TOPPADDING', (0, 0), (-1, 0), 12),
-            # Body
-            ('BACKGROUND', (0, 1), (-1, -4), colors.white),
-            ('TEXTCOLOR', (0, 1), (-1, -4), colors.black),
-            ('FONTSIZE', (0, 1), (-1, -4), 10),
-            ('ALIGN', (0, 1), (0, -4), 'LEFT'),
-            ('ALIGN', (1, 1), (1, -4), 'CENTER'),
-            ('ALIGN', (2, 1), (-1, -4), 'RIGHT'),
-            ('GRID', (0, 0), (-1, -4), 0.5, colors.black),
-            ('ROWBACKGROUNDS', (0, 1), (-1, -4), [colors.white, colors.HexColor('#f8f9fa')]),
-            # Totales
-            ('BACKGROUND', (2, -3), (-1, -2), colors.white),
-            ('FONTNAME', (2, -3), (-1, -2), 'Helvetica-Bold'),
-            ('FONTSIZE', (2, -3), (-1, -2), 10),
-            ('ALIGN', (2, -3), (-1, -2), 'RIGHT'),
-            ('GRID', (2, -3), (-1, -2), 0.5, colors.black),
-            # TOTAL final
-            ('BACKGROUND', (2, -1), (-1, -1), colors.black),
-            ('TEXTCOLOR', (2, -1), (-1, -1), colors.white),
-            ('FONTNAME', (2, -1), (-1, -1), 'Helvetica-Bold'),
-            ('FONTSIZE', (2, -1), (-1, -1), 14),
-            ('ALIGN', (2, -1), (-1, -1), 'RIGHT'),
-            ('BOTTOMPADDING', (2, -1), (-1, -1), 10),
-            ('TOPPADDING', (2, -1), (-1, -1), 10),
-        ]))
+        items_table.setStyle(TABLA_ITEMS_COTIZACION)
         
         elements.append(items_table)
         elements.append(Spacer(1, 20))
@@ -10598,42 +10329,35 @@ def cotizacion_pdf(request, cotizacion_id):
     # Términos y condiciones
     if cotizacion.terminos_condiciones:
         elements.append(Spacer(1, 10))
-        elements.append(Paragraph("<b>TÉRMINOS Y CONDICIONES</b>", ParagraphStyle('TermsHeader', parent=styles['Normal'], fontSize=11, fontName='Helvetica-Bold', spaceAfter=5)))
-        elements.append(Paragraph(cotizacion.terminos_condiciones, ParagraphStyle('TermsBody', parent=styles['Normal'], fontSize=9, spaceAfter=15)))
+        elements.append(Paragraph("<b>TÉRMINOS Y CONDICIONES</b>", estilo('SeccionNegrita')))
+        elements.append(Paragraph(cotizacion.terminos_condiciones, estilo('TextoChico')))
     
     # Información de la empresa
     config = ConfiguracionSistema.get_config()
-    company_info = Paragraph(
+    elements.extend(pie_documento(
         f'<b>{config.nombre_empresa}</b><br/>'
         'Technology Panama INC.<br/>'
         'Correo: info@telecompanama.com<br/>'
         'Tel: +507 206-3456',
-        ParagraphStyle('CompanyInfo', parent=styles['Normal'], fontSize=8, alignment=TA_CENTER, textColor=colors.HexColor('#6c757d'))
-    )
-    elements.append(Spacer(1, 20))
-    elements.append(company_info)
+        'PieEmpresa',
+    ))
     
     # Pie de página
-    footer_style = ParagraphStyle(
-        'Footer',
-        parent=styles['Normal'],
-        fontSize=7,
-        alignment=TA_CENTER,
-        textColor=colors.HexColor('#9ca3af')
-    )
-    elements.append(Spacer(1, 5))
-    elements.append(Paragraph("Documento generado electrónicamente", footer_style))
-    
-    # Generar PDF
-    doc.build(elements)
-    buffer.seek(0)
+    elements.extend(pie_documento("Documento generado electrónicamente", 'PieDiminuto', espacio=5))
     
-    # Crear respuesta
-    response = HttpResponse(buffer, content_type='application/pdf')
-    filename = f"Cotizacion_{cotizacion.numero_cotizacion}.pdf"
-    response['Content-Disposition'] = f'attachment; filename="{filename}"'
-    
-    return response
+    return construir_pdf(elements)
+
+
+@login_required
+@en_segundo_plano('cotizacion_pdf', condicion=_cotizacion_pdf_sin_cache)
+def cotizacion_pdf(request, cotizacion_id):
+    """Generar PDF de una cotización (se guarda y reutiliza mientras no cambie)"""
+    cotizacion = get_object_or_404(Cotizacion.objects.select_related('cliente', 'proyecto'), id=cotizacion_id)
+    return pdf_cache.respuesta_pdf(
+        request, 'cotizacion', cotizacion.pk, _version_cotizacion_pdf(cotizacion),
+        lambda: _render_cotizacion_pdf(cotizacion),
+        f"Cotizacion_{cotizacion.numero_cotizacion}.pdf",
+    )
 
 
 @login_required
@@ -10881,26 +10605,26 @@ def caja_menuda_dashboard(request):
         tecnico = request.GET.get("tecnico", "").strip()
         fecha_desde = request.GET.get("fecha_desde", "").strip()
         fecha_hasta = request.GET.get("fecha_hasta", "").strip()
-        firebase_expenses, firebase_error = fetch_expenses_for_caja_menuda(sort, order)
-        firebase_expenses = _filter_firebase_expenses(
-            firebase_expenses, tecnico, fecha_desde, fecha_hasta
-        )
-        firebase_total_depositos = sum(
-            Decimal(str(exp.get("amount") or 0))
-            for exp in firebase_expenses
-            if exp.get("type") == "DEPOSIT"
+        espejo, firebase_error = asegurar_espejo_transacciones()
+        base, transacciones = _transacciones_caja_menuda(
+            sort, order, tecnico, fecha_desde, fecha_hasta
         )
-        firebase_total_gastos = sum(
-            Decimal(str(exp.get("amount") or 0))
-            for exp in firebase_expenses
-            if exp.get("type") == "EXPENSE"
+        totales = transacciones.aggregate(
+            total=Count('id'),
+            depositos=Sum('monto', filter=Q(tipo='DEPOSIT')),
+            gastos=Sum('monto', filter=Q(tipo='EXPENSE')),
         )
-        firebase_total_movimientos = len(firebase_expenses)
+        firebase_total_depositos = totales['depositos'] or Decimal('0.00')
+        firebase_total_gastos = totales['gastos'] or Decimal('0.00')
+        firebase_total_movimientos = totales['total']
         firebase_saldo = firebase_total_depositos - firebase_total_gastos
-        tecnicos_disponibles = _get_firebase_tecnicos(firebase_expenses)
-        firebase_balances, balances_error = _get_firebase_balances(firebase_expenses)
+        firebase_page = Paginator(transacciones, 50).get_page(request.GET.get('page'))
+        firebase_expenses = [transaccion.como_gasto() for transaccion in firebase_page]
+        usuarios = _usuarios_caja_menuda(base)
+        tecnicos_disponibles = _get_firebase_tecnicos(usuarios)
+        firebase_balances, balances_error = _get_firebase_balances(usuarios)
         firebase_balances_by_name = _map_firebase_balances_by_name(
-            firebase_expenses, firebase_balances
+            usuarios, firebase_balances
         )
 
         context = {
@@ -10910,6 +10634,10 @@ def caja_menuda_dashboard(request):
             'saldo_caja': firebase_saldo if firebase_total_movimientos else saldo_caja,
             'movimientos_recientes': movimientos_recientes,
             'firebase_expenses': firebase_expenses,
+            'firebase_page': firebase_page,
+            'firebase_querystring': _querystring_sin_pagina(request),
+            'firebase_total': firebase_total_movimientos,
+            'firebase_espejo': espejo,
             'firebase_error': firebase_error,
             'firebase_sort': sort,
             'firebase_order': order,
@@ -10938,19 +10666,26 @@ def caja_menuda_list(request):
     tecnico = request.GET.get("tecnico", "").strip()
     fecha_desde = request.GET.get("fecha_desde", "").strip()
     fecha_hasta = request.GET.get("fecha_hasta", "").strip()
-    firebase_expenses, firebase_error = fetch_expenses_for_caja_menuda(sort, order)
-    tecnicos_disponibles = _get_firebase_tecnicos(firebase_expenses)
-    firebase_balances, balances_error = _get_firebase_balances(firebase_expenses)
-    firebase_balances_by_name = _map_firebase_balances_by_name(
-        firebase_expenses, firebase_balances
+    espejo, firebase_error = asegurar_espejo_transacciones()
+    base, transacciones = _transacciones_caja_menuda(
+        sort, order, tecnico, fecha_desde, fecha_hasta
     )
-    firebase_expenses = _filter_firebase_expenses(
-        firebase_expenses, tecnico, fecha_desde, fecha_hasta
+    firebase_page = Paginator(transacciones, 50).get_page(request.GET.get('page'))
+    firebase_expenses = [transaccion.como_gasto() for transaccion in firebase_page]
+    usuarios = _usuarios_caja_menuda(base)
+    tecnicos_disponibles = _get_firebase_tecnicos(usuarios)
+    firebase_balances, balances_error = _get_firebase_balances(usuarios)
+    firebase_balances_by_name = _map_firebase_balances_by_name(
+        usuarios, firebase_balances
     )
     
     context = {
         'movimientos': movimientos,
         'firebase_expenses': firebase_expenses,
+        'firebase_page': firebase_page,
+        'firebase_querystring': _querystring_sin_pagina(request),
+        'firebase_total': firebase_page.paginator.count,
+        'firebase_espejo': espejo,
         'firebase_error': firebase_error,
         'firebase_sort': sort,
         'firebase_order': order,
@@ -10979,6 +10714,22 @@ def caja_menuda_firebase_detail(request, transaction_id):
     return render(request, 'core/caja-menuda/firebase_detail.html', {'expense': expense})
 
 
+@login_required
+@require_http_methods(["POST"])
+def caja_menuda_firebase_resync(request):
+    """Resincroniza el espejo local de transacciones de Firebase"""
+    completa = request.POST.get("completa") == "1"
+    result = sync_transacciones_espejo(completa=completa)
+    if result.ok:
+        messages.success(request, f"✅ {result.message}")
+    else:
+        messages.error(request, f"❌ Error al sincronizar con Firebase: {result.message}")
+    siguiente = request.POST.get("next", "")
+    if siguiente.startswith("/") and not siguiente.startswith("//"):
+        return redirect(siguiente)
+    return redirect("caja_menuda_list")
+
+
 @login_required
 def caja_menuda_firebase_deposit(request):
     """Registrar depósito a técnico (Firebase)"""
@@ -11063,24 +10814,22 @@ def caja_menuda_cuadre(request):
             if start_dt is None or end_dt is None:
                 messages.error(request, "Ingresa un rango de fechas válido (dd/mm/aaaa).")
             else:
-                transactions, tx_error = fetch_firebase_transactions_for_user(
-                    selected_user_id,
-                    start_ms=start_dt,
-                    end_ms=end_dt,
-                )
+                # El cuadre se registra en Firebase: se sincroniza el espejo antes de sumar
+                _, tx_error = asegurar_espejo_transacciones(max_age=0)
                 if tx_error:
                     messages.error(request, tx_error)
                 else:
-                    ingresos = sum(
-                        Decimal(str(t.get("amount") or 0))
-                        for t in transactions
-                        if t.get("type") == "DEPOSIT"
-                    )
-                    egresos = sum(
-                        Decimal(str(t.get("amount") or 0))
-                        for t in transactions
-                        if t.get("type") == "EXPENSE"
+                    totales = TransaccionFirebase.objects.filter(
+                        usuario_firebase_id=selected_user_id,
+                        tipo__in=CAJA_MENUDA_TIPOS,
+                        timestamp_ms__gte=start_dt,
+                        timestamp_ms__lte=end_dt,
+                    ).aggregate(
+                        ingresos=Sum('monto', filter=Q(tipo='DEPOSIT')),
+                        egresos=Sum('monto', filter=Q(tipo='EXPENSE')),
                     )
+                    ingresos = totales['ingresos'] or Decimal('0.00')
+                    egresos = totales['egresos'] or Decimal('0.00')
                     balance = ingresos - egresos
                     status = "superhabit" if balance > 0 else "deficit" if balance < 0 else "cero"
                     leader = team_map[selected_user_id]
@@ -11133,14 +10882,13 @@ def caja_menuda_firebase_export(request):
     fecha_desde = request.GET.get("fecha_desde", "").strip()
     fecha_hasta = request.GET.get("fecha_hasta", "").strip()
 
-    firebase_expenses, firebase_error = fetch_expenses_for_caja_menuda(sort, order)
+    _, firebase_error = asegurar_espejo_transacciones()
     if firebase_error:
-        messages.error(request, firebase_error)
-        return redirect('caja_menuda_list')
-    firebase_expenses = _filter_firebase_expenses(
-        firebase_expenses, tecnico, fecha_desde, fecha_hasta
+        messages.warning(request, f"Exportando datos locales sin sincronizar: {firebase_error}")
+    _, transacciones = _transacciones_caja_menuda(
+        sort, order, tecnico, fecha_desde, fecha_hasta
     )
-    firebase_balances, _ = _get_firebase_balances(firebase_expenses)
+    firebase_expenses = (transaccion.como_gasto() for transaccion in transacciones.iterator(chunk_size=500))
 
     response = HttpResponse(content_type='text/csv')
     timestamp = timezone.now().strftime("%Y%m%d_%H%M")
@@ -11190,13 +10938,13 @@ def caja_menuda_firebase_export_pdf(request):
     fecha_desde = request.GET.get("fecha_desde", "").strip()
     fecha_hasta = request.GET.get("fecha_hasta", "").strip()
 
-    firebase_expenses, firebase_error = fetch_expenses_for_caja_menuda(sort, order)
+    _, firebase_error = asegurar_espejo_transacciones()
     if firebase_error:
-        messages.error(request, firebase_error)
-        return redirect('caja_menuda_list')
-    firebase_expenses = _filter_firebase_expenses(
-        firebase_expenses, tecnico, fecha_desde, fecha_hasta
+        messages.warning(request, f"Exportando datos locales sin sincronizar: {firebase_error}")
+    _, transacciones = _transacciones_caja_menuda(
+        sort, order, tecnico, fecha_desde, fecha_hasta
     )
+    firebase_expenses = [transaccion.como_gasto() for transaccion in transacciones.iterator(chunk_size=500)]
 
     total_depositos = sum(
         float(exp.get("amount") or 0)
@@ -11417,31 +11165,54 @@ def caja_menuda_firebase_export_pdf(request):
     return response
 
 
-def _filter_firebase_expenses(expenses, tecnico, fecha_desde, fecha_hasta):
-    if not expenses:
-        return []
-    filtered = expenses
+def _transacciones_caja_menuda(sort, order, tecnico, fecha_desde, fecha_hasta):
+    """
+    Transacciones de técnicos del espejo local, filtradas y ordenadas en SQL.
+
+    Retorna ``(base, filtradas)``: ``base`` sin los filtros de técnico y fechas
+    (para la lista de técnicos y balances) y ``filtradas`` lista para paginar.
+    """
+    base = TransaccionFirebase.objects.filter(tipo__in=CAJA_MENUDA_TIPOS).exclude(origen="web")
+    transacciones = base
     if tecnico:
-        tecnico_lower = tecnico.lower()
-        filtered = [
-            exp for exp in filtered
-            if tecnico_lower in (exp.get("userName") or "").lower()
-        ]
+        transacciones = transacciones.filter(usuario_nombre__icontains=tecnico)
     if fecha_desde:
         dt_start = _parse_firebase_fecha(fecha_desde)
         if dt_start:
-            filtered = [
-                exp for exp in filtered
-                if exp.get("timestamp_dt") and exp["timestamp_dt"].date() >= dt_start
-            ]
+            inicio = timezone.make_aware(datetime.combine(dt_start, time.min))
+            transacciones = transacciones.filter(timestamp_ms__gte=int(inicio.timestamp() * 1000))
     if fecha_hasta:
         dt_end = _parse_firebase_fecha(fecha_hasta)
         if dt_end:
-            filtered = [
-                exp for exp in filtered
-                if exp.get("timestamp_dt") and exp["timestamp_dt"].date() <= dt_end
-            ]
-    return filtered
+            fin = timezone.make_aware(datetime.combine(dt_end, time.max))
+            transacciones = transacciones.filter(timestamp_ms__lte=int(fin.timestamp() * 1000))
+
+    orden = {
+        "userName": Lower("usuario_nombre"),
+        "amount": F("monto"),
+    }.get(sort, F("timestamp_ms"))
+    if str(order).lower() == "asc":
+        transacciones = transacciones.order_by(orden.asc(), "id")
+    else:
+        transacciones = transacciones.order_by(orden.desc(), "-id")
+    return base, transacciones
+
+
+def _querystring_sin_pagina(request):
+    """Parámetros GET actuales sin ``page``, para los enlaces de paginación"""
+    params = request.GET.copy()
+    params.pop('page', None)
+    return params.urlencode()
+
+
+def _usuarios_caja_menuda(transacciones):
+    """Técnicos distintos (``userId``/``userName``) de un queryset de TransaccionFirebase"""
+    return [
+        {"userId": fila["usuario_firebase_id"], "userName": fila["usuario_nombre"]}
+        for fila in transacciones.exclude(usuario_nombre="").order_by().values(
+            "usuario_firebase_id", "usuario_nombre"
+        ).distinct()
+    ]
 
 
 def _wrap_text_pdf(text, max_len):
@@ -11807,7 +11578,7 @@ def servicio_torrero_create(request):
                 # (no se asignan en la creación del servicio)
                 
                 # Log de actividad
-                LogActividad.objects.create(
+                registrar_actividad(
                     usuario=request.user,
                     accion='crear',
                     modulo='Servicios Torreros',
@@ -11895,7 +11666,7 @@ def servicio_torrero_edit(request, pk):
                 servicio.save()
                 
                 # Log de actividad
-                LogActividad.objects.create(
+                registrar_actividad(
                     usuario=request.user,
                     accion='editar',
                     modelo='ServicioTorrero',
@@ -11935,7 +11706,7 @@ def servicio_torrero_delete(request, pk):
             servicio.save()
             
             # Log de actividad
-            LogActividad.objects.create(
+            registrar_actividad(
                 usuario=request.user,
                 accion='eliminar',
                 modulo='Servicios Torreros',
@@ -11987,7 +11758,7 @@ def registro_dias_create(request, servicio_id):
                     )
                 
                 # Log de actividad
-                LogActividad.objects.create(
+                registrar_actividad(
                     usuario=request.user,
                     accion='crear',
                     modulo='Servicios Torreros',
@@ -12070,7 +11841,7 @@ def registro_dias_quick(request, servicio_id):
             
             # Log de actividad
             torreros_nombres = ', '.join([t.nombre for t in torreros_seleccionados])
-            LogActividad.objects.create(
+            registrar_actividad(
                 usuario=request.user,
                 accion='crear',
                 modulo='Servicios Torreros',
@@ -12124,7 +11895,7 @@ def registro_dias_aprobar(request, pk):
             
             # Log de actividad
             accion = 'aprobó' if registro.aprobado else 'desaprobó'
-            LogActividad.objects.create(
+            registrar_actividad(
                 usuario=request.user,
                 accion='aprobar' if registro.aprobado else 'desaprobar',
                 modulo='Servicios Torreros',
@@ -12184,7 +11955,7 @@ def registro_dias_delete(request, pk):
             servicio.refresh_from_db()
             
             # Log de actividad
-            LogActividad.objects.create(
+            registrar_actividad(
                 usuario=request.user,
                 accion='eliminar',
                 modulo='Servicios Torreros',
@@ -12234,7 +12005,7 @@ def servicio_torrero_toggle_pago(request, servicio_id):
             servicio.save()
             
             # Log de actividad
-            LogActividad.objects.create(
+            registrar_actividad(
                 usuario=request.user,
                 accion='editar',
                 modulo='Servicios Torreros',
@@ -12275,7 +12046,7 @@ def pago_servicio_create(request, servicio_id):
                 pago.save()
                 
                 # Log de actividad
-                LogActividad.objects.create(
+                registrar_actividad(
                     usuario=request.user,
                     accion='crear',
                     modelo='PagoServicioTorrero',
@@ -12338,7 +12109,7 @@ def torrero_create(request):
                 torrero.creado_por = request.user
                 torrero.save()
                 
-                LogActividad.objects.create(
+                registrar_actividad(
                     usuario=request.user,
                     accion='crear',
                     modulo='Torreros',
@@ -12375,7 +12146,7 @@ def torrero_edit(request, pk):
             try:
                 torrero = form.save()
                 
-                LogActividad.objects.create(
+                registrar_actividad(
                     usuario=request.user,
                     accion='editar',
                     modulo='Torreros',
@@ -12412,7 +12183,7 @@ def torrero_delete(request, pk):
             torrero.activo = False
             torrero.save()
             
-            LogActividad.objects.create(
+            registrar_actividad(
                 usuario=request.user,
                 accion='eliminar',
                 modulo='Torreros',
@@ -12465,7 +12236,7 @@ def torrero_registro_rapido(request):
             )
             
             # Log de actividad
-            LogActividad.objects.create(
+            registrar_actividad(
                 usuario=request.user,
                 accion='crear',
                 modulo='Torreros',
@@ -12492,16 +12263,9 @@ def torrero_registro_rapido(request):
 
 
 @login_required
+@en_segundo_plano('servicio_torrero_pdf')
 def servicio_torrero_pdf(request, pk):
     """Generar PDF de respaldo del servicio de torrero"""
-    from reportlab.lib import colors
-    from reportlab.lib.pagesizes import letter
-    from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-    from reportlab.lib.units import inch
-    from reportlab.lib.enums import TA_CENTER, TA_RIGHT, TA_LEFT
-    from io import BytesIO
-    
     servicio = get_object_or_404(ServicioTorrero, pk=pk)
     registros = RegistroDiasTrabajados.objects.filter(servicio=servicio).order_by('fecha_registro')
     pagos = PagoServicioTorrero.objects.filter(servicio=servicio).order_by('fecha_pago')
@@ -12509,52 +12273,10 @@ def servicio_torrero_pdf(request, pk):
     asignaciones = AsignacionTorrero.objects.filter(servicio=servicio, activo=True).select_related('torrero')
     torreros = [asignacion.torrero for asignacion in asignaciones]
     
-    # Crear el PDF en memoria
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(buffer, pagesize=letter, topMargin=0.5*inch, bottomMargin=0.5*inch)
     elements = []
-    styles = getSampleStyleSheet()
-    
-    # Estilos personalizados mejorados
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=26,
-        textColor=colors.HexColor('#1e293b'),
-        spaceAfter=8,
-        alignment=TA_CENTER,
-        fontName='Helvetica-Bold',
-        leading=32
-    )
-    
-    subtitle_style = ParagraphStyle(
-        'CustomSubtitle',
-        parent=styles['Normal'],
-        fontSize=11,
-        textColor=colors.HexColor('#64748b'),
-        spaceAfter=25,
-        alignment=TA_CENTER
-    )
-    
-    heading_style = ParagraphStyle(
-        'CustomHeading',
-        parent=styles['Heading2'],
-        fontSize=16,
-        textColor=colors.HexColor('#0f172a'),
-        spaceAfter=12,
-        spaceBefore=20,
-        fontName='Helvetica-Bold',
-        borderWidth=0,
-        borderPadding=0,
-        backColor=colors.HexColor('#f1f5f9'),
-        leftIndent=10,
-        rightIndent=10,
-        topPadding=8,
-        bottomPadding=8
-    )
+    heading_style = estilo('SeccionResaltada')
     
     # Encabezado profesional con diseño moderno
-    from django.utils import timezone
     fecha_actual = timezone.localtime(timezone.now())
     
     # Título principal
@@ -12565,57 +12287,38 @@ def servicio_torrero_pdf(request, pk):
         <font size="26" name="Helvetica-Bold" color="#6366f1">TORREROS</font>
     </para>
     """
-    elements.append(Paragraph(header_text, styles['Normal']))
+    elements.append(Paragraph(header_text, estilo('Normal')))
     
     # Subtítulo
-    elements.append(Paragraph(f"<para align='center'><font size='11' color='#64748b'>TELECOM PANAMA - Generado el {fecha_actual.strftime('%d/%m/%Y a las %I:%M %p')}</font></para>", styles['Normal']))
+    elements.append(Paragraph(f"<para align='center'><font size='11' color='#64748b'>TELECOM PANAMA - Generado el {fecha_actual.strftime('%d/%m/%Y a las %I:%M %p')}</font></para>", estilo('Normal')))
     
     # Línea decorativa
     elements.append(Spacer(1, 0.2*inch))
-    divider_data = [['']]
-    divider_table = Table(divider_data, colWidths=[7*inch])
-    divider_table.setStyle(TableStyle([
-        ('LINEBELOW', (0, 0), (0, 0), 2, colors.HexColor('#6366f1')),
-    ]))
+    divider_table = Table([['']], colWidths=[7*inch])
+    divider_table.setStyle(linea())
     elements.append(divider_table)
     elements.append(Spacer(1, 0.25*inch))
     
     # Información del Servicio - Diseño mejorado
-    info_heading = Paragraph("INFORMACIÓN DEL SERVICIO", heading_style)
-    elements.append(info_heading)
+    elements.append(Paragraph("INFORMACIÓN DEL SERVICIO", heading_style))
     
     info_data = [
         ['Cliente:', servicio.cliente.razon_social],
         ['Proyecto:', servicio.proyecto.nombre if servicio.proyecto else 'No asignado'],
         ['Descripción:', servicio.descripcion or 'Sin descripción'],
-        ['Estado del Servicio:', Paragraph(f"{'PAGADO' if servicio.esta_pagado else 'PENDIENTE'}", ParagraphStyle('EstadoStyle', parent=styles['Normal'], textColor=colors.HexColor('#10b981') if servicio.esta_pagado else colors.HexColor('#f59e0b'), fontName='Helvetica-Bold'))],
+        ['Estado del Servicio:', Paragraph(f"{'PAGADO' if servicio.esta_pagado else 'PENDIENTE'}", estilo('ValorVerde' if servicio.esta_pagado else 'ValorAmbar'))],
         ['Días Solicitados:', f"{servicio.dias_solicitados} día(s)"],
         ['Días Trabajados:', f"{servicio.dias_trabajados} día(s)"],
         ['Días Restantes:', f"{servicio.dias_restantes} día(s)"],
         ['Progreso:', f"{servicio.porcentaje_completado}%"],
         ['Tarifa Diaria:', f"${servicio.tarifa_por_dia:,.2f}"],
-        ['Monto Total:', Paragraph(f"${servicio.monto_total:,.2f}", ParagraphStyle('MontoStyle', parent=styles['Normal'], textColor=colors.HexColor('#1e40af'), fontName='Helvetica-Bold'))],
-        ['Total Pagado:', Paragraph(f"${servicio.monto_pagado:,.2f}", ParagraphStyle('MontoStyle', parent=styles['Normal'], textColor=colors.HexColor('#10b981'), fontName='Helvetica-Bold'))],
-        ['Saldo Pendiente:', Paragraph(f"${servicio.saldo_pendiente:,.2f}", ParagraphStyle('MontoStyle', parent=styles['Normal'], textColor=colors.HexColor('#dc2626'), fontName='Helvetica-Bold'))],
+        ['Monto Total:', Paragraph(f"${servicio.monto_total:,.2f}", estilo('ValorAzul'))],
+        ['Total Pagado:', Paragraph(f"${servicio.monto_pagado:,.2f}", estilo('ValorVerde'))],
+        ['Saldo Pendiente:', Paragraph(f"${servicio.saldo_pendiente:,.2f}", estilo('ValorRojo'))],
     ]
     
     info_table = Table(info_data, colWidths=[2.2*inch, 4.3*inch])
-    info_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#f8fafc')),
-        ('TEXTCOLOR', (0, 0), (-1, -1), colors.HexColor('#1e293b')),
-        ('ALIGN', (0, 0), (0, -1), 'RIGHT'),
-        ('ALIGN', (1, 0), (1, -1), 'LEFT'),
-        ('FONTNAME', (0, 0), (0, -1), 'Helvetica'),
-        ('FONTNAME', (1, 0), (1, -1), 'Helvetica'),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#e2e8f0')),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ('TOPPADDING', (0, 0), (-1, -1), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 10),
-        ('LEFTPADDING', (0, 0), (-1, -1), 12),
-        ('RIGHTPADDING', (0, 0), (-1, -1), 12),
-        ('BOX', (0, 0), (-1, -1), 1.5, colors.HexColor('#6366f1')),
-    ]))
+    info_table.setStyle(TABLA_FICHA_INDIGO)
     elements.append(info_table)
     elements.append(Spacer(1, 0.4*inch))
     
@@ -12625,9 +12328,8 @@ def servicio_torrero_pdf(request, pk):
     if registros.exists():
         elements.append(Paragraph("REGISTRO DETALLADO DE DÍAS TRABAJADOS", heading_style))
         
-        # Obtener todas las asignaciones activas para el servicio
-        asignaciones_activas = AsignacionTorrero.objects.filter(servicio=servicio, activo=True).select_related('torrero')
-        lista_torreros_asignados = [a.torrero.nombre for a in asignaciones_activas]
+        # Torreros asignados al servicio
+        lista_torreros_asignados = [torrero.nombre for torrero in torreros]
         
         # Nueva tabla mejorada: Fecha, Torreros que Trabajaron, Días, Estado
         registros_data = [['FECHA TRABAJADA', 'TORREROS', 'DÍAS', 'ESTADO']]
@@ -12651,34 +12353,7 @@ def servicio_torrero_pdf(request, pk):
         
         # Tabla más ancha y profesional
         registros_table = Table(registros_data, colWidths=[1.5*inch, 3.5*inch, 0.8*inch, 1.2*inch])
-        registros_table.setStyle(TableStyle([
-            # Header
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#6366f1')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 11),
-            ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
-            ('VALIGN', (0, 0), (-1, 0), 'MIDDLE'),
-            ('TOPPADDING', (0, 0), (-1, 0), 10),
-            ('BOTTOMPADDING', (0, 0), (-1, 0), 10),
-            # Body
-            ('ALIGN', (0, 1), (0, -1), 'CENTER'),  # Fecha centrada
-            ('ALIGN', (1, 1), (1, -1), 'LEFT'),    # Torreros izquierda
-            ('ALIGN', (2, 1), (2, -1), 'CENTER'),  # Días centrada
-            ('ALIGN', (3, 1), (3, -1), 'CENTER'),  # Estado centrada
-            ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-            ('FONTSIZE', (0, 1), (-1, -1), 10),
-            ('VALIGN', (0, 1), (-1, -1), 'MIDDLE'),
-            ('TOPPADDING', (0, 1), (-1, -1), 8),
-            ('BOTTOMPADDING', (0, 1), (-1, -1), 8),
-            ('LEFTPADDING', (0, 1), (-1, -1), 8),
-            ('RIGHTPADDING', (0, 1), (-1, -1), 8),
-            # Grid
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#e5e7eb')),
-            ('BOX', (0, 0), (-1, -1), 1.5, colors.HexColor('#6366f1')),
-            # Row backgrounds alternados
-            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f8fafc')]),
-        ]))
+        registros_table.setStyle(TABLA_DETALLE_INDIGO)
         elements.append(registros_table)
         elements.append(Spacer(1, 0.3*inch))
         
@@ -12688,23 +12363,11 @@ def servicio_torrero_pdf(request, pk):
             ['Total Días Solicitados:', f"{servicio.dias_solicitados} día(s)"],
             ['Total Días Trabajados:', f"{servicio.dias_trabajados} día(s)"],
             ['Días Restantes:', f"{servicio.dias_restantes} día(s)"],
-            ['Progreso:', Paragraph(f"{servicio.porcentaje_completado}%", ParagraphStyle('ProgressStyle', parent=styles['Normal'], textColor=colors.HexColor('#10b981'), fontName='Helvetica-Bold'))],
+            ['Progreso:', Paragraph(f"{servicio.porcentaje_completado}%", estilo('ValorVerde'))],
         ]
         
         resumen_dias_table = Table(resumen_dias_data, colWidths=[3*inch, 3.5*inch])
-        resumen_dias_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (0, -1), colors.HexColor('#f3f4f6')),
-            ('TEXTCOLOR', (0, 0), (-1, -1), colors.HexColor('#1f2937')),
-            ('ALIGN', (0, 0), (0, -1), 'RIGHT'),
-            ('ALIGN', (1, 0), (1, -1), 'LEFT'),
-            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, -1), 10),
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#e5e7eb')),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ('TOPPADDING', (0, 0), (-1, -1), 10),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 10),
-            ('BOX', (0, 0), (-1, -1), 1.5, colors.HexColor('#6366f1')),
-        ]))
+        resumen_dias_table.setStyle(TABLA_RESUMEN_INDIGO)
         elements.append(resumen_dias_table)
         elements.append(Spacer(1, 0.3*inch))
     
@@ -12723,20 +12386,7 @@ def servicio_torrero_pdf(request, pk):
             ])
         
         pagos_table = Table(pagos_data, colWidths=[1.2*inch, 1.2*inch, 1.5*inch, 1.5*inch, 1.5*inch])
-        pagos_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#f59e0b')),
-            ('TEXTCOLOR', (0, 0), (-1, 0), colors.white),
-            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 10),
-            ('FONTNAME', (0, 1), (-1, -1), 'Helvetica'),
-            ('FONTSIZE', (0, 1), (-1, -1), 9),
-            ('GRID', (0, 0), (-1, -1), 0.5, colors.HexColor('#e5e7eb')),
-            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-            ('TOPPADDING', (0, 0), (-1, -1), 6),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 6),
-            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f9fafb')]),
-        ]))
+        pagos_table.setStyle(TABLA_PAGOS)
         elements.append(pagos_table)
         elements.append(Spacer(1, 0.3*inch))
     
@@ -12745,37 +12395,22 @@ def servicio_torrero_pdf(request, pk):
     
     # Línea decorativa superior
     footer_divider = Table([['']], colWidths=[7*inch])
-    footer_divider.setStyle(TableStyle([
-        ('LINEABOVE', (0, 0), (0, 0), 1, colors.HexColor('#e2e8f0')),
-    ]))
+    footer_divider.setStyle(linea('LINEABOVE', 1, '#e2e8f0'))
     elements.append(footer_divider)
-    elements.append(Spacer(1, 0.2*inch))
-    
-    footer_style = ParagraphStyle(
-        'Footer',
-        parent=styles['Normal'],
-        fontSize=9,
-        textColor=colors.HexColor('#64748b'),
-        alignment=TA_CENTER,
-        leading=12
-    )
     
     footer_text = f"""TELECOM PANAMA - Technology Panama INC.<br/>
 Documento generado automáticamente por: {request.user.get_full_name() or request.user.username}<br/>
 Fecha de generación: {fecha_actual.strftime('%d/%m/%Y a las %I:%M:%S %p')}"""
-    elements.append(Paragraph(footer_text, footer_style))
-    
-    # Construir PDF
-    doc.build(elements)
+    elements.extend(pie_documento(footer_text, 'PieGris', espacio=0.2*inch))
     
     # Preparar respuesta
-    buffer.seek(0)
-    response = HttpResponse(buffer.getvalue(), content_type='application/pdf')
+    pdf_bytes = construir_pdf(elements, pagesize=letter, topMargin=0.5*inch, bottomMargin=0.5*inch)
+    response = HttpResponse(pdf_bytes, content_type='application/pdf')
     filename = f"Servicio_Torrero_{servicio.cliente.razon_social.replace(' ', '_')}_{servicio.id}.pdf"
     response['Content-Disposition'] = f'inline; filename="{filename}"'
     
     # Log de actividad
-    LogActividad.objects.create(
+    registrar_actividad(
         usuario=request.user,
         accion='generar_pdf',
         modulo='Servicios Torreros',
@@ -12806,7 +12441,7 @@ def subproyecto_create(request, proyecto_id):
                 subproyecto.save()
                 
                 # Log de actividad
-                LogActividad.objects.create(
+                registrar_actividad(
                     usuario=request.user,
                     accion='crear',
                     modulo='Subproyectos',
@@ -12846,7 +12481,7 @@ def subproyecto_edit(request, pk):
                 subproyecto = form.save()
                 
                 # Log de actividad
-                LogActividad.objects.create(
+                registrar_actividad(
                     usuario=request.user,
                     accion='editar',
                     modulo='Subproyectos',
@@ -12885,7 +12520,7 @@ def subproyecto_delete(request, pk):
             subproyecto.save()
             
             # Log de actividad
-            LogActividad.objects.create(
+            registrar_actividad(
                 usuario=request.user,
                 accion='eliminar',
                 modulo='Subproyectos',
@@ -12960,7 +12595,7 @@ def subproyectos_dashboard(request, proyecto_id):
 @login_required
 def planillas_liquidadas_historial(request):
     """Vista completa para consultar todas las planillas liquidadas pasadas"""
-    from django.db.models import Q, Sum
+    from django.db.models import Sum
     from django.core.paginator import Paginator
     
     # Obtener parámetros de búsqueda
@@ -12968,7 +12603,7 @@ def planillas_liquidadas_historial(request):
     año = request.GET.get('año')
     mes = request.GET.get('mes')
     tipo_planilla = request.GET.get('tipo_planilla', 'todas')  # 'todas', 'personal', 'trabajadores_diarios'
-    search = request.GET.get('search', '')
+    texto_busqueda = request.GET.get('search', '').strip()
     
     # Query inicial
     planillas = PlanillaLiquidada.objects.select_related(
@@ -12994,11 +12629,8 @@ def planillas_liquidadas_historial(request):
     if mes:
         planillas = planillas.filter(mes=mes)
     
-    if search:
-        planillas = planillas.filter(
-            Q(proyecto__nombre__icontains=search) |
-            Q(observaciones__icontains=search)
-        )
+    if texto_busqueda:
+        planillas = search.filtrar(planillas, 'planilla_liquidada', texto_busqueda)
     
     # Paginación
     paginator = Paginator(planillas, 25)  # 25 por página
@@ -13060,7 +12692,7 @@ def planillas_liquidadas_historial(request):
         'año_selected': año,
         'mes_selected': mes,
         'tipo_planilla_selected': tipo_planilla,
-        'search': search,
+        'search': texto_busqueda,
         'meses_choices': PlanillaLiquidada.MESES_CHOICES,
         # Estadísticas generales por tipo
         'total_planillas_todas': total_planillas_todas,
@@ -13220,9 +12852,8 @@ def consultar_pagos_persona(request):
         # Buscar en colaboradores
         if tipo_persona in ['todos', 'colaboradores']:
             from core.models import AnticipoProyecto
-            colaboradores_query = Colaborador.objects.filter(
-                nombre__icontains=nombre_persona,
-                activo=True
+            colaboradores_query = search.filtrar(
+                Colaborador.objects.filter(activo=True), 'colaborador', nombre_persona, solo_claves=True
             ).prefetch_related('proyectos', 'anticipos_proyecto')
             
             # Si hay proyecto_id, filtrar colaboradores que pertenezcan a ese proyecto
@@ -13288,8 +12919,8 @@ def consultar_pagos_persona(request):
         
         # Buscar en trabajadores diarios
         if tipo_persona in ['todos', 'trabajadores_diarios']:
-            trabajadores_query = TrabajadorDiario.objects.filter(
-                nombre__icontains=nombre_persona
+            trabajadores_query = search.filtrar(
+                TrabajadorDiario.objects.all(), 'trabajador_diario', nombre_persona, solo_claves=True
             ).select_related('proyecto', 'planilla')
             
             if proyecto_id:
@@ -13370,7 +13001,7 @@ def planilla_liquidada_delete(request, planilla_id):
         planilla.delete()
         
         # Registrar actividad
-        LogActividad.objects.create(
+        registrar_actividad(
             usuario=request.user,
             accion='Eliminar Planilla Liquidada',
             modulo='Planillas Liquidadas',
@@ -13401,105 +13032,38 @@ def planilla_liquidada_delete(request, planilla_id):
     })
 
 
-@login_required
-def planilla_liquidada_pdf(request, planilla_id):
-    """Generar PDF de una planilla liquidada específica"""
-    planilla = get_object_or_404(PlanillaLiquidada, id=planilla_id)
+def _render_planilla_liquidada_pdf(planilla):
+    """Bytes del PDF de una planilla liquidada"""
     proyecto = planilla.proyecto
     
-    # Crear el PDF en orientación horizontal
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(
-        buffer, 
-        pagesize=landscape(A4),
-        leftMargin=0.5*inch,
-        rightMargin=0.5*inch,
-        topMargin=0.5*inch,
-        bottomMargin=0.5*inch
-    )
     elements = []
     
-    # Estilos personalizados
-    styles = getSampleStyleSheet()
-    
-    # Estilo para el encabezado principal
-    header_style = ParagraphStyle(
-        'HeaderStyle',
-        parent=styles['Heading1'],
-        fontSize=24,
-        spaceAfter=10,
-        alignment=TA_CENTER,
-        textColor=colors.HexColor('#1e3a8a'),
-        fontName='Helvetica-Bold',
-        leading=28
-    )
-    
-    # Estilo para subtítulo
-    subtitle_style = ParagraphStyle(
-        'SubtitleStyle',
-        parent=styles['Normal'],
-        fontSize=14,
-        spaceAfter=20,
-        alignment=TA_CENTER,
-        textColor=colors.HexColor('#3b82f6'),
-        fontName='Helvetica-Bold'
-    )
-    
-    # Estilo para secciones
-    section_style = ParagraphStyle(
-        'SectionStyle',
-        parent=styles['Normal'],
-        fontSize=12,
-        spaceAfter=10,
-        textColor=colors.HexColor('#1e3a8a'),
-        fontName='Helvetica-Bold'
-    )
-    
-    # Logo y encabezado
-    try:
-        logo_path = os.path.join(settings.BASE_DIR, 'static', 'images', 'LOGO-TELECOM-small.png')
-        if os.path.exists(logo_path):
-            logo = Image(logo_path, width=120, height=60)
-        else:
-            logo = Paragraph("<b>TELECOM</b><br/>Technology Panama INC.", styles['Normal'])
-    except:
-        logo = Paragraph("<b>TELECOM</b><br/>Technology Panama INC.", styles['Normal'])
-    
-    # Fecha de generación
-    fecha_generacion = timezone.localtime(timezone.now()).strftime('%d/%m/%Y %H:%M')
+    # Fecha de liquidación (no la de generación: el PDF se guarda y se reutiliza)
+    fecha_liquidacion = timezone.localtime(planilla.fecha_liquidacion).strftime('%d/%m/%Y %H:%M')
     
     # Header con logo y fecha
-    header_data = [[
-        logo,
-        Paragraph(
-            f'<b>PLANILLA DE PERSONAL QUINCENAL LIQUIDADA</b><br/>'
-            f'<font size="10">Generado: {fecha_generacion}</font>',
-            ParagraphStyle('HeaderRight', parent=styles['Normal'], fontSize=12, alignment=TA_RIGHT)
-        )
-    ]]
-    header_table = Table(header_data, colWidths=[3*inch, 7*inch])
-    header_table.setStyle(TableStyle([
-        ('ALIGN', (0, 0), (0, 0), 'LEFT'),
-        ('ALIGN', (1, 0), (1, 0), 'RIGHT'),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-    ]))
-    elements.append(header_table)
+    elements.append(encabezado_con_logo(
+        f'<b>PLANILLA DE PERSONAL QUINCENAL LIQUIDADA</b><br/>'
+        f'<font size="10">Liquidada: {fecha_liquidacion}</font>',
+        [3*inch, 7*inch],
+        logo=(120, 60),
+    ))
     elements.append(Spacer(1, 20))
     
     # Título del proyecto
-    elements.append(Paragraph(f"<b>PROYECTO: {proyecto.nombre.upper()}</b>", header_style))
+    elements.append(Paragraph(f"<b>PROYECTO: {proyecto.nombre.upper()}</b>", estilo('TituloProyecto')))
     
     # Cliente
     if proyecto.cliente:
         elements.append(Paragraph(
             f'<b>Cliente:</b> {proyecto.cliente.razon_social}', 
-            subtitle_style
+            estilo('SubtituloDestacado')
         ))
     
     # RUC de la empresa
     elements.append(Paragraph(
-        f'<b>RUC:</b> 155668382-2-2018', 
-        subtitle_style
+        f'<b>RUC:</b> {RUC_EMPRESA}', 
+        estilo('SubtituloDestacado')
     ))
     
     elements.append(Spacer(1, 15))
@@ -13515,15 +13079,7 @@ def planilla_liquidada_pdf(request, planilla_id):
     ]
     
     periodo_table = Table(periodo_data, colWidths=[2.5*inch, 7.5*inch])
-    periodo_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#e0e7ff')),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ('LEFTPADDING', (0, 0), (-1, -1), 10),
-        ('TOPPADDING', (0, 0), (-1, -1), 5),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 5),
-        ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#d1d5db')),
-    ]))
+    periodo_table.setStyle(TABLA_PERIODO)
     elements.append(periodo_table)
     elements.append(Spacer(1, 20))
     
@@ -13537,50 +13093,43 @@ def planilla_liquidada_pdf(request, planilla_id):
     ]
     
     resumen_table = Table(resumen_data, colWidths=[5*inch, 5*inch])
-    resumen_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#1e3a8a')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 12),
-        ('FONTSIZE', (0, 1), (-1, -1), 10),
-        ('FONTNAME', (0, 3), (1, 3), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 3), (1, 3), 14),
-        ('BACKGROUND', (0, 3), (-1, 3), colors.HexColor('#dbeafe')),
-        ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#1e3a8a')),
-        ('TOPPADDING', (0, 0), (-1, -1), 8),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 8),
-    ]))
+    resumen_table.setStyle(tabla_resumen(
+        tamano_encabezado=12, fila_destacada=3, tamano_destacado=14, relleno=8
+    ))
     elements.append(resumen_table)
     elements.append(Spacer(1, 20))
     
     # Observaciones si existen
     if planilla.observaciones:
-        elements.append(Paragraph('<b>OBSERVACIONES</b>', section_style))
-        elements.append(Paragraph(planilla.observaciones, styles['Normal']))
+        elements.append(Paragraph('<b>OBSERVACIONES</b>', estilo('Seccion')))
+        elements.append(Paragraph(planilla.observaciones, estilo('Normal')))
         elements.append(Spacer(1, 20))
     
     # Footer
-    footer_text = f"<i>TELECOM PANAMA - Planilla Liquidada</i>"
-    elements.append(Spacer(1, 20))
-    elements.append(Paragraph(footer_text, ParagraphStyle(
-        'FooterStyle',
-        parent=styles['Normal'],
-        fontSize=8,
-        alignment=TA_CENTER,
-        textColor=colors.HexColor('#6b7280'),
-    )))
-    
-    # Construir PDF
-    doc.build(elements)
+    elements.extend(pie_documento("<i>TELECOM PANAMA - Planilla Liquidada</i>"))
     
-    # Preparar respuesta
-    buffer.seek(0)
-    response = HttpResponse(buffer.read(), content_type='application/pdf')
-    response['Content-Disposition'] = f'attachment; filename="planilla_liquidada_{planilla.proyecto.nombre}_{planilla.get_mes_display()}_{planilla.año}_Q{planilla.quincena}.pdf"'
-    
-    return response
+    return construir_pdf(elements, pagesize=landscape(A4), **MARGEN_ESTRECHO)
+
+
+@login_required
+def planilla_liquidada_pdf(request, planilla_id):
+    """Generar PDF de una planilla liquidada específica (se guarda y reutiliza mientras no cambie)"""
+    planilla = get_object_or_404(
+        PlanillaLiquidada.objects.select_related('proyecto__cliente', 'liquidada_por'), id=planilla_id
+    )
+    proyecto = planilla.proyecto
+    version = pdf_cache.huella(
+        planilla.pk, planilla.mes, planilla.año, planilla.quincena, planilla.fecha_liquidacion,
+        planilla.total_salarios, planilla.total_anticipos, planilla.total_planilla,
+        planilla.cantidad_personal, planilla.observaciones, proyecto.nombre,
+        proyecto.cliente.razon_social if proyecto.cliente else '',
+        planilla.liquidada_por.get_full_name() or planilla.liquidada_por.username,
+    )
+    return pdf_cache.respuesta_pdf(
+        request, 'planilla_liquidada', planilla.pk, version,
+        lambda: _render_planilla_liquidada_pdf(planilla),
+        f"planilla_liquidada_{proyecto.nombre}_{planilla.get_mes_display()}_{planilla.año}_Q{planilla.quincena}.pdf",
+    )
 
 
 @login_required
@@ -13653,88 +13202,27 @@ def planilla_colaborador_pdf(request, proyecto_id, colaborador_id):
     total_anticipos_decimal = Decimal(str(total_anticipos_colaborador))
     salario_quincenal_neto = salario_quincenal + bonos_quincenal - retenciones_quincenal - total_anticipos_decimal
     
-    # Crear el PDF
-    buffer = BytesIO()
-    doc = SimpleDocTemplate(
-        buffer, 
-        pagesize=A4,
-        leftMargin=0.5*inch,
-        rightMargin=0.5*inch,
-        topMargin=0.5*inch,
-        bottomMargin=0.5*inch
-    )
     elements = []
     
-    # Estilos
-    styles = getSampleStyleSheet()
-    
-    header_style = ParagraphStyle(
-        'HeaderStyle',
-        parent=styles['Heading1'],
-        fontSize=20,
-        spaceAfter=10,
-        alignment=TA_CENTER,
-        textColor=colors.HexColor('#1e3a8a'),
-        fontName='Helvetica-Bold',
-        leading=24
-    )
-    
-    subtitle_style = ParagraphStyle(
-        'SubtitleStyle',
-        parent=styles['Normal'],
-        fontSize=12,
-        spaceAfter=15,
-        textColor=colors.HexColor('#374151'),
-        fontName='Helvetica'
-    )
-    
-    section_style = ParagraphStyle(
-        'SectionStyle',
-        parent=styles['Normal'],
-        fontSize=11,
-        spaceAfter=8,
-        textColor=colors.HexColor('#1e3a8a'),
-        fontName='Helvetica-Bold'
-    )
-    
-    # Logo y encabezado
-    try:
-        logo_path = os.path.join(settings.BASE_DIR, 'static', 'images', 'LOGO-TELECOM-small.png')
-        if os.path.exists(logo_path):
-            logo = Image(logo_path, width=100, height=50)
-        else:
-            logo = Paragraph("<b>TELECOM</b><br/>Technology Panama INC.", styles['Normal'])
-    except:
-        logo = Paragraph("<b>TELECOM</b><br/>Technology Panama INC.", styles['Normal'])
-    
     fecha_generacion = timezone.localtime(timezone.now()).strftime('%d/%m/%Y %H:%M')
     
-    header_data = [[
-        logo,
-        Paragraph(
-            f'<b>PLANILLA INDIVIDUAL QUINCENAL</b><br/>'
-            f'<font size="9">Generado: {fecha_generacion}</font>',
-            ParagraphStyle('HeaderRight', parent=styles['Normal'], fontSize=10, alignment=TA_RIGHT)
-        )
-    ]]
-    header_table = Table(header_data, colWidths=[2.5*inch, 5.5*inch])
-    header_table.setStyle(TableStyle([
-        ('ALIGN', (0, 0), (0, 0), 'LEFT'),
-        ('ALIGN', (1, 0), (1, 0), 'RIGHT'),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-    ]))
-    elements.append(header_table)
+    elements.append(encabezado_con_logo(
+        f'<b>PLANILLA INDIVIDUAL QUINCENAL</b><br/>'
+        f'<font size="9">Generado: {fecha_generacion}</font>',
+        [2.5*inch, 5.5*inch],
+        'EncabezadoDerechaChico',
+    ))
     elements.append(Spacer(1, 15))
     
     # Información del proyecto y RUC
-    elements.append(Paragraph(f"<b>PROYECTO: {proyecto.nombre.upper()}</b>", header_style))
+    elements.append(Paragraph(f"<b>PROYECTO: {proyecto.nombre.upper()}</b>", estilo('TituloProyectoChico')))
     if proyecto.cliente:
-        elements.append(Paragraph(f'<b>Cliente:</b> {proyecto.cliente.razon_social}', subtitle_style))
-    elements.append(Paragraph(f'<b>RUC:</b> 155668382-2-2018', subtitle_style))
+        elements.append(Paragraph(f'<b>Cliente:</b> {proyecto.cliente.razon_social}', estilo('SubtituloGris')))
+    elements.append(Paragraph(f'<b>RUC:</b> {RUC_EMPRESA}', estilo('SubtituloGris')))
     elements.append(Spacer(1, 15))
     
     # Información del colaborador
-    elements.append(Paragraph('<b>INFORMACIÓN DEL COLABORADOR</b>', section_style))
+    elements.append(Paragraph('<b>INFORMACIÓN DEL COLABORADOR</b>', estilo('SeccionChica')))
     
     colaborador_data = [
         ['Nombre:', colaborador.nombre],
@@ -13745,19 +13233,12 @@ def planilla_colaborador_pdf(request, proyecto_id, colaborador_id):
     ]
     
     colaborador_table = Table(colaborador_data, colWidths=[2*inch, 6*inch])
-    colaborador_table.setStyle(TableStyle([
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-        ('LEFTPADDING', (0, 0), (-1, -1), 5),
-        ('TOPPADDING', (0, 0), (-1, -1), 3),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 3),
-        ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#e5e7eb')),
-    ]))
+    colaborador_table.setStyle(TABLA_FICHA)
     elements.append(colaborador_table)
     elements.append(Spacer(1, 15))
     
     # Desglose de salarios - Mensual
-    elements.append(Paragraph('<b>DESGLOSE MENSUAL</b>', section_style))
+    elements.append(Paragraph('<b>DESGLOSE MENSUAL</b>', estilo('SeccionChica')))
     
     mensual_data = [
         ['CONCEPTO', 'MONTO'],
@@ -13788,22 +13269,12 @@ def planilla_colaborador_pdf(request, proyecto_id, colaborador_id):
         mensual_data.append(['Total Retenciones', '$0.00'])
     
     mensual_table = Table(mensual_data, colWidths=[4*inch, 4*inch])
-    mensual_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#1e3a8a')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 11),
-        ('FONTSIZE', (0, 1), (-1, -1), 10),
-        ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
-        ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#1e3a8a')),
-        ('TOPPADDING', (0, 0), (-1, -1), 5),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 5),
-    ]))
+    mensual_table.setStyle(tabla_resumen())
     elements.append(mensual_table)
     elements.append(Spacer(1, 15))
     
     # Desglose quincenal
-    elements.append(Paragraph('<b>DESGLOSE QUINCENAL</b>', section_style))
+    elements.append(Paragraph('<b>DESGLOSE QUINCENAL</b>', estilo('SeccionChica')))
     
     quincenal_data = [
         ['CONCEPTO', 'MONTO'],
@@ -13822,26 +13293,13 @@ def planilla_colaborador_pdf(request, proyecto_id, colaborador_id):
     quincenal_data.append(['TOTAL A PAGAR QUINCENAL', f"${salario_quincenal_neto:,.2f}"])
     
     quincenal_table = Table(quincenal_data, colWidths=[4*inch, 4*inch])
-    quincenal_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#1e3a8a')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 11),
-        ('FONTSIZE', (0, 1), (-1, -1), 10),
-        ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, -1), (-1, -1), 12),
-        ('BACKGROUND', (0, -1), (-1, -1), colors.HexColor('#dbeafe')),
-        ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
-        ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#1e3a8a')),
-        ('TOPPADDING', (0, 0), (-1, -1), 5),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 5),
-    ]))
+    quincenal_table.setStyle(tabla_resumen(fila_destacada=-1))
     elements.append(quincenal_table)
     elements.append(Spacer(1, 15))
     
     # Anticipos detallados
     if anticipos.exists():
-        elements.append(Paragraph('<b>HISTORIAL DE ANTICIPOS</b>', section_style))
+        elements.append(Paragraph('<b>HISTORIAL DE ANTICIPOS</b>', estilo('SeccionChica')))
         
         anticipos_headers = [['Fecha', 'Concepto', 'Monto', 'Estado']]
         anticipos_rows = []
@@ -13856,16 +13314,7 @@ def planilla_colaborador_pdf(request, proyecto_id, colaborador_id):
         
         anticipos_table_data = anticipos_headers + anticipos_rows
         anticipos_table = Table(anticipos_table_data, colWidths=[1.5*inch, 3*inch, 1.5*inch, 2*inch])
-        anticipos_table.setStyle(TableStyle([
-            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#f3f4f6')),
-            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-            ('FONTSIZE', (0, 0), (-1, 0), 9),
-            ('FONTSIZE', (0, 1), (-1, -1), 8),
-            ('ALIGN', (2, 0), (2, -1), 'RIGHT'),
-            ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#e5e7eb')),
-            ('TOPPADDING', (0, 0), (-1, -1), 3),
-            ('BOTTOMPADDING', (0, 0), (-1, -1), 3),
-        ]))
+        anticipos_table.setStyle(TABLA_DETALLE_GRIS)
         elements.append(anticipos_table)
         elements.append(Spacer(1, 10))
         
@@ -13876,32 +13325,18 @@ def planilla_colaborador_pdf(request, proyecto_id, colaborador_id):
             ['Total Anticipos', f"${total_anticipos_colaborador:,.2f}"],
         ]
         resumen_anticipos_table = Table(resumen_anticipos, colWidths=[4*inch, 4*inch])
-        resumen_anticipos_table.setStyle(TableStyle([
-            ('FONTSIZE', (0, 0), (-1, -1), 10),
-            ('FONTNAME', (0, 0), (0, -1), 'Helvetica-Bold'),
-            ('ALIGN', (1, 0), (1, -1), 'RIGHT'),
-            ('GRID', (0, 0), (-1, -1), 1, colors.HexColor('#e5e7eb')),
-        ]))
+        resumen_anticipos_table.setStyle(TABLA_FICHA_MONTOS)
         elements.append(resumen_anticipos_table)
         elements.append(Spacer(1, 15))
     
     # Footer
-    footer_text = f"<i>TELECOM PANAMA - Planilla Individual - {timezone.localtime(timezone.now()).strftime('%d/%m/%Y %H:%M')}</i>"
-    elements.append(Spacer(1, 20))
-    elements.append(Paragraph(footer_text, ParagraphStyle(
-        'FooterStyle',
-        parent=styles['Normal'],
-        fontSize=8,
-        alignment=TA_CENTER,
-        textColor=colors.HexColor('#6b7280'),
-    )))
-    
-    # Construir PDF
-    doc.build(elements)
+    elements.extend(pie_documento(
+        f"<i>TELECOM PANAMA - Planilla Individual - {timezone.localtime(timezone.now()).strftime('%d/%m/%Y %H:%M')}</i>"
+    ))
     
     # Preparar respuesta
-    buffer.seek(0)
-    response = HttpResponse(buffer.read(), content_type='application/pdf')
+    pdf_bytes = construir_pdf(elements, **MARGEN_ESTRECHO)
+    response = HttpResponse(pdf_bytes, content_type='application/pdf')
     filename = f"planilla_{colaborador.nombre.replace(' ', '_')}_{proyecto.nombre.replace(' ', '_')}.pdf"
     response['Content-Disposition'] = f'attachment; filename="{filename}"'
     
@@ -14236,7 +13671,7 @@ def bitacora_planificacion(request):
                     planificacion.trabajadores_diarios.set(TrabajadorDiario.objects.filter(id__in=trabajadores_diarios_ids))
                 
                 # Registrar actividad
-                LogActividad.objects.create(
+                registrar_actividad(
                     usuario=request.user,
                     accion='Crear',
                     modulo='Bitácora',
@@ -14761,7 +14196,7 @@ def bitacora_avance_create(request, planificacion_id):
                     planificacion.save()
                 
                 # Registrar actividad
-                LogActividad.objects.create(
+                registrar_actividad(
                     usuario=request.user,
                     accion='Crear',
                     modulo='Bitácora',
@@ -14814,28 +14249,37 @@ FIREBASE_REPORT_COLLECTIONS = {
         "collection": "instalacionesRoutersTigo",
         "description": "Reportes de instalación y configuración de routers Nokia.",
         "icon": "fas fa-network-wired",
+        "summary_fields": ("nombreSitio", "tipoEquipo", "fecha"),
+        "date_field": "fecha",
     },
     "enlaces_ericsson": {
         "label": "Enlaces Ericsson",
         "collection": "reportesEnlacesEricssonTigo",
         "description": "Reportes de enlaces y antenas Ericsson.",
         "icon": "fas fa-link",
+        "summary_fields": ("DatosGenerales.SitioA", "DatosGenerales.SitioB"),
+        "date_field": None,
     },
     "ran_setar": {
         "label": "Instalaciones Nokia RAN",
         "collection": "InstalacionesRanSetar",
         "description": "Instalaciones y evidencias de sitios Nokia RAN.",
         "icon": "fas fa-broadcast-tower",
+        "summary_fields": ("nombre", "region", "fecha"),
+        "date_field": "fecha",
     },
     "metro_celdas": {
         "label": "Instalaciones Metro Celdas",
         "collection": "InstalacionesNokiaMetroCeldas",
         "description": "Instalaciones Nokia Metro Celdas.",
         "icon": "fas fa-satellite-dish",
+        "summary_fields": ("nombre", "region", "fecha"),
+        "date_field": "fecha",
     },
 }
 
 DEFAULT_REPORT_TYPE = "routers_nokia"
+REPORTES_POR_PAGINA = 50
 
 
 def _get_report_config(tipo):
@@ -14844,6 +14288,33 @@ def _get_report_config(tipo):
     return FIREBASE_REPORT_COLLECTIONS.get(DEFAULT_REPORT_TYPE)
 
 
+def _report_query(config, fecha_desde="", fecha_hasta=""):
+    """
+    Filtros ``where`` y campo de orden de Firestore para un tipo de reporte.
+
+    Los borradores no se filtran aquí sino al leer cada página
+    (``include_drafts`` de fetch_firestore_collection_page): los reportes
+    antiguos no tienen ``isDraft`` y un ``where isDraft == False`` los ocultaría.
+    El rango de fechas se compara como texto ISO (AAAA-MM-DD) sobre
+    ``date_field``, por lo que solo aplica a los tipos que lo declaran; con
+    rango, Firestore exige ordenar primero por ese campo. Al filtrar y ordenar
+    por un solo campo basta el índice simple que Firestore crea por defecto.
+    """
+    filters = []
+    order_field = None
+    date_field = config.get("date_field")
+    if date_field:
+        desde = _parse_firebase_fecha(fecha_desde) if fecha_desde else None
+        hasta = _parse_firebase_fecha(fecha_hasta) if fecha_hasta else None
+        if desde:
+            filters.append((date_field, ">=", desde.isoformat()))
+        if hasta:
+            filters.append((date_field, "<=", hasta.isoformat()))
+        if desde or hasta:
+            order_field = date_field
+    return filters, order_field
+
+
 def _build_report_summary(tipo, data):
     if tipo == "routers_nokia":
         titulo = data.get("nombreSitio") or "Reporte sin nombre"
@@ -14897,20 +14368,30 @@ def reportes_exportacion(request):
     if tipo not in FIREBASE_REPORT_COLLECTIONS:
         tipo = DEFAULT_REPORT_TYPE
     include_drafts = request.GET.get("borradores") == "1"
+    fecha_desde = request.GET.get("fecha_desde", "").strip()
+    fecha_hasta = request.GET.get("fecha_hasta", "").strip()
+    cursor = request.GET.get("cursor", "")
     limit = request.GET.get("limit")
     try:
-        limit = int(limit) if limit else 200
+        limit = min(int(limit), 200) if limit else REPORTES_POR_PAGINA
     except ValueError:
-        limit = 200
+        limit = REPORTES_POR_PAGINA
 
     config = _get_report_config(tipo)
     reportes = []
+    next_cursor = ""
     firebase_error = ""
 
     if config:
-        reportes, firebase_error = fetch_firestore_collection_docs(
+        filters, order_field = _report_query(config, fecha_desde, fecha_hasta)
+        reportes, next_cursor, firebase_error = fetch_firestore_collection_page(
             config["collection"],
-            limit=limit,
+            page_size=limit,
+            cursor=cursor,
+            filters=filters,
+            order_field=order_field,
+            descending=bool(order_field),
+            fields=config.get("summary_fields"),
             include_drafts=include_drafts,
         )
 
@@ -14923,10 +14404,11 @@ def reportes_exportacion(request):
                 "titulo": titulo,
                 "detalle": detalle,
                 "fecha": fecha,
-                "raw": doc.get("data", {}),
             }
         )
 
+    params = request.GET.copy()
+    params.pop("cursor", None)
     context = {
         "tipo": tipo,
         "config": config,
@@ -14934,14 +14416,130 @@ def reportes_exportacion(request):
         "total_items": len(items),
         "firebase_error": firebase_error,
         "include_drafts": include_drafts,
+        "fecha_desde": fecha_desde,
+        "fecha_hasta": fecha_hasta,
         "limit": limit,
+        "cursor": cursor,
+        "next_cursor": next_cursor,
+        "querystring": params.urlencode(),
         "report_types": FIREBASE_REPORT_COLLECTIONS,
+        "pdf_en_segundo_plano": segundo_plano_activo(),
     }
 
     return render(request, "core/reportes/exportacion.html", context)
 
 
+def _report_pdf_basename(tipo, doc_id, data):
+    titulo, _, _ = _build_report_summary(tipo, data)
+    safe_title = re.sub(r"[^A-Za-z0-9_-]+", "_", titulo).strip("_") or tipo
+    return f"reporte_{safe_title}_{doc_id[:8]}"
+
+
+def _reportes_exportar_pdf_lote(request, tipo, config, include_drafts):
+    """
+    PDFs de varios reportes en un ZIP que se envía a medida que se generan.
+
+    Toma los ids marcados (``doc_ids``) o, si no hay, todos los que cumplen los
+    filtros del listado, hasta ``REPORTES_LOTE_MAX``. El avance se consulta en
+    ``reportes_exportacion_progreso`` con el ``token`` enviado por el navegador.
+    """
+    maximo = getattr(settings, "REPORTES_LOTE_MAX", 300)
+    doc_ids = [doc_id for doc_id in request.GET.getlist("doc_ids") if doc_id][:maximo]
+    if doc_ids:
+        documentos, firebase_error = fetch_firestore_documents(config["collection"], doc_ids)
+        if firebase_error:
+            return HttpResponse(firebase_error, status=400)
+        total = len(documentos)
+    else:
+        filters, order_field = _report_query(
+            config,
+            request.GET.get("fecha_desde", "").strip(),
+            request.GET.get("fecha_hasta", "").strip(),
+        )
+        documentos = itertools.islice(
+            iter_firestore_collection_docs(
+                config["collection"],
+                filters=filters,
+                order_field=order_field,
+                batch_size=100,
+                include_drafts=include_drafts,
+            ),
+            maximo,
+        )
+        total = None
+
+    timestamp = timezone.now().strftime("%Y%m%d_%H%M")
+    response = StreamingHttpResponse(
+        exportar_lote_zip(
+            tipo,
+            documentos,
+            lambda doc: f"{_report_pdf_basename(tipo, doc['id'], doc.get('data', {}))}.pdf",
+            total=total,
+            token=request.GET.get("token", ""),
+        ),
+        content_type="application/zip",
+    )
+    response["Content-Disposition"] = f'attachment; filename="reportes_{tipo}_{timestamp}.zip"'
+    return response
+
+
+@login_required
+def reportes_exportacion_progreso(request, token):
+    """Avance de una exportación en lote (JSON)"""
+    progreso = obtener_progreso(token)
+    if progreso is None:
+        return JsonResponse({"estado": "desconocido"}, status=404)
+    return JsonResponse(progreso)
+
+
+def _trabajo_del_usuario(request, trabajo_id):
+    """Trabajo en segundo plano visible para el usuario (propio o cualquiera si es superusuario)"""
+    trabajos = TrabajoSegundoPlano.objects.all()
+    if not request.user.is_superuser:
+        trabajos = trabajos.filter(usuario=request.user)
+    return get_object_or_404(trabajos, pk=trabajo_id)
+
+
+@login_required
+def trabajo_detalle(request, trabajo_id):
+    """Página de espera de un trabajo en segundo plano con su avance y descarga"""
+    trabajo = _trabajo_del_usuario(request, trabajo_id)
+    context = {
+        "trabajo": trabajo,
+        "estado": trabajo_a_dict(trabajo),
+        "recientes": TrabajoSegundoPlano.objects.filter(usuario=request.user).exclude(
+            pk=trabajo.pk
+        ).exclude(parametros__has_key='funcion')[:10],
+    }
+    return render(request, "core/trabajos/detalle.html", context)
+
+
+@login_required
+def trabajo_estado(request, trabajo_id):
+    """Estado y avance de un trabajo en segundo plano (JSON)"""
+    return JsonResponse(trabajo_a_dict(_trabajo_del_usuario(request, trabajo_id)))
+
+
+@login_required
+def trabajo_descargar(request, trabajo_id):
+    """Descarga el archivo generado por un trabajo mientras no haya expirado"""
+    trabajo = _trabajo_del_usuario(request, trabajo_id)
+    if not trabajo.disponible:
+        messages.error(request, "El archivo no está disponible o ya expiró.")
+        return redirect("trabajo_detalle", trabajo_id=trabajo.pk)
+    return descargas.servir_archivo(
+        request,
+        trabajo.archivo.path,
+        nombre=trabajo.nombre_archivo or os.path.basename(trabajo.archivo.name),
+        content_type=trabajo.content_type or None,
+    )
+
+
 @login_required
+@en_segundo_plano(
+    'reporte_firebase_pdf',
+    condicion=lambda request, tipo: request.GET.get("formato", "json").lower() == "pdf",
+)
 def reportes_exportacion_exportar(request, tipo):
     if tipo not in FIREBASE_REPORT_COLLECTIONS:
         return HttpResponse("Tipo de reporte no soportado", status=404)
@@ -14954,16 +14552,32 @@ def reportes_exportacion_exportar(request, tipo):
     doc_id = request.GET.get("doc_id")
     include_drafts = request.GET.get("borradores") == "1"
 
+    if formato == "pdf" and not doc_id:
+        return _reportes_exportar_pdf_lote(request, tipo, config, include_drafts)
+
     if doc_id:
         doc, firebase_error = fetch_firestore_document(config["collection"], doc_id)
         if doc is None:
             return HttpResponse(firebase_error or "Documento no encontrado", status=404)
         documentos = [doc]
     else:
-        documentos, firebase_error = fetch_firestore_collection_docs(
-            config["collection"],
-            include_drafts=include_drafts,
+        filters, order_field = _report_query(
+            config,
+            request.GET.get("fecha_desde", "").strip(),
+            request.GET.get("fecha_hasta", "").strip(),
         )
+        try:
+            documentos = list(
+                iter_firestore_collection_docs(
+                    config["collection"],
+                    filters=filters,
+                    order_field=order_field,
+                    include_drafts=include_drafts,
+                )
+            )
+            firebase_error = ""
+        except RuntimeError as exc:
+            firebase_error = str(exc)
 
     if firebase_error:
         return HttpResponse(firebase_error, status=400)
@@ -14971,20 +14585,12 @@ def reportes_exportacion_exportar(request, tipo):
     timestamp = timezone.now().strftime("%Y%m%d_%H%M")
 
     if formato == "pdf":
-        if not doc_id:
-            return HttpResponse(
-                "Selecciona un reporte especifico para exportar en PDF.",
-                status=400,
-            )
-
         data = documentos[0].get("data", {})
         pdf_bytes, error = generar_pdf_reporte(tipo, doc_id, data)
         if error:
             return HttpResponse(error, status=500)
 
-        titulo, _, _ = _build_report_summary(tipo, data)
-        safe_title = re.sub(r"[^A-Za-z0-9_-]+", "_", titulo).strip("_") or tipo
-        filename = f"reporte_{safe_title}_{doc_id[:8]}_{timestamp}.pdf"
+        filename = f"{_report_pdf_basename(tipo, doc_id, data)}_{timestamp}.pdf"
         response = HttpResponse(pdf_bytes, content_type="application/pdf")
         response["Content-Disposition"] = f'attachment; filename="{filename}"'
         return response
@@ -12,6 +12,8 @@ logger = logging.getLogger(__name__)
 from .models import (
     Rol, PerfilUsuario, Modulo, Permiso, RolPermiso, LogActividad
 )
+from .activity_log import registrar_actividad
+from .cache_utils import invalidate_tags_on_commit, tag_rol
 import json
 
 # ==================== GESTIÓN DE ROLES MEJORADA ====================
@@ -83,7 +85,7 @@ def rol_crear_mejorado(request):
                     RolPermiso.objects.create(rol=rol, permiso=permiso)
                 
                 # Log de actividad
-                LogActividad.objects.create(
+                registrar_actividad(
                     usuario=request.user,
                     accion='Crear Rol',
                     modulo='Usuarios',
@@ -134,7 +136,9 @@ def rol_editar_mejorado(request, rol_id):
                 permisos_ids = request.POST.getlist('permisos')
                 
                 # Desactivar todos los permisos actuales
+                # (update() no emite señales: se invalida la caché de permisos del rol)
                 RolPermiso.objects.filter(rol=rol).update(activo=False)
+                invalidate_tags_on_commit(tag_rol(rol.id))
                 
                 # Activar los permisos seleccionados
                 for permiso_id in permisos_ids:
@@ -149,7 +153,7 @@ def rol_editar_mejorado(request, rol_id):
                         rol_permiso.save()
                 
                 # Log de actividad
-                LogActividad.objects.create(
+                registrar_actividad(
                     usuario=request.user,
                     accion='Editar Rol',
                     modulo='Usuarios',
@@ -210,7 +214,7 @@ def rol_eliminar_mejorado(request, rol_id):
                 rol.delete()
                 
                 # Log de actividad
-                LogActividad.objects.create(
+                registrar_actividad(
                     usuario=request.user,
                     accion='Eliminar Rol',
                     modulo='Usuarios',
@@ -341,7 +345,7 @@ def usuario_crear_mejorado(request):
                     perfil.save()
                 
                 # Log de actividad
-                LogActividad.objects.create(
+                registrar_actividad(
                     usuario=request.user,
                     accion='Crear Usuario',
                     modulo='Usuarios',
@@ -407,7 +411,7 @@ def usuario_editar_mejorado(request, usuario_id):
                     usuario.save()
                 
                 # Log de actividad
-                LogActividad.objects.create(
+                registrar_actividad(
                     usuario=request.user,
                     accion='Editar Usuario',
                     modulo='Usuarios',
@@ -526,7 +530,9 @@ def permisos_actualizar_masivo(request):
             
             with transaction.atomic():
                 # Desactivar todos los permisos actuales
+                # (update() no emite señales: se invalida la caché de permisos del rol)
                 RolPermiso.objects.filter(rol=rol).update(activo=False)
+                invalidate_tags_on_commit(tag_rol(rol.id))
                 
                 # Activar los permisos seleccionados
                 for permiso_id in permisos_ids:
@@ -541,7 +547,7 @@ def permisos_actualizar_masivo(request):
                         rol_permiso.save()
                 
                 # Log de actividad
-                LogActividad.objects.create(
+                registrar_actividad(
                     usuario=request.user,
                     accion='Actualizar Permisos',
                     modulo='Usuarios',
@@ -720,7 +726,7 @@ def permisos_actualizar_modulos(request):
                         RolPermiso.objects.create(rol=rol, permiso=permiso, activo=True)
                 
                 # Log de actividad
-                LogActividad.objects.create(
+                registrar_actividad(
                     usuario=request.user,
                     accion='Actualizar Módulos',
                     modulo='Usuarios',
@@ -0,0 +1,118 @@
+"""
+Generación de archivos ZIP en flujo del Telecom Technology
+Escribe el ZIP por partes para enviarlo con StreamingHttpResponse sin tener
+el archivo completo en memoria.
+"""
+
+import os
+import time
+import zipfile
+
+# Formatos que ya vienen comprimidos: deflate no reduce su tamaño y solo gasta CPU
+EXTENSIONES_COMPRIMIDAS = {
+    '.jpg', '.jpeg', '.png', '.gif', '.webp', '.heic', '.pdf',
+    '.zip', '.gz', '.rar', '.7z', '.docx', '.xlsx', '.pptx', '.mp4', '.mov',
+}
+
+
+def compresion_para(nombre):
+    """ZIP_STORED para archivos ya comprimidos y ZIP_DEFLATED para el resto"""
+    if os.path.splitext(nombre)[1].lower() in EXTENSIONES_COMPRIMIDAS:
+        return zipfile.ZIP_STORED
+    return zipfile.ZIP_DEFLATED
+
+
+class _SalidaEnFlujo:
+    """Destino no posicionable para ZipFile: acumula lo escrito hasta que se retira"""
+
+    def __init__(self):
+        self._partes = []
+        self._posicion = 0
+
+    def write(self, datos):
+        if datos:
+            self._partes.append(bytes(datos))
+            self._posicion += len(datos)
+        return len(datos)
+
+    def tell(self):
+        return self._posicion
+
+    def flush(self):
+        pass
+
+    def retirar(self):
+        datos = b''.join(self._partes)
+        self._partes = []
+        return datos
+
+
+class ZipEnFlujo:
+    """
+    ZIP que se construye entrada por entrada y entrega los bytes a medida que se escriben.
+
+    Como el destino no es posicionable, ``zipfile`` escribe cada entrada con
+    descriptor de datos, por lo que solo se retiene en memoria la entrada en
+    curso (o el bloque en curso si se agrega desde un archivo).
+
+    Uso::
+
+        zip_stream = ZipEnFlujo()
+        for nombre, contenido in archivos:
+            yield from zip_stream.agregar(nombre, contenido)
+        yield from zip_stream.cerrar()
+    """
+
+    TAMANO_BLOQUE = 64 * 1024
+
+    def __init__(self, compresion=zipfile.ZIP_DEFLATED):
+        self._salida = _SalidaEnFlujo()
+        self._zip = zipfile.ZipFile(self._salida, mode='w', compression=compresion, allowZip64=True)
+        self.nombres = set()
+
+    def nombre_unico(self, nombre):
+        """Agrega un sufijo numérico si el nombre ya existe en el ZIP"""
+        if nombre not in self.nombres:
+            self.nombres.add(nombre)
+            return nombre
+        base, punto, extension = nombre.rpartition('.')
+        if not punto:
+            base, extension = nombre, ''
+        indice = 2
+        while True:
+            candidato = f"{base}_{indice}.{extension}" if extension else f"{base}_{indice}"
+            if candidato not in self.nombres:
+                self.nombres.add(candidato)
+                return candidato
+            indice += 1
+
+    def agregar(self, nombre, contenido, compresion=None):
+        """Agrega una entrada desde bytes o texto y entrega los bytes generados"""
+        if isinstance(contenido, str):
+            contenido = contenido.encode('utf-8')
+        self._zip.writestr(self._info(nombre, compresion), contenido)
+        yield self._salida.retirar()
+
+    def agregar_archivo(self, nombre, archivo, compresion=None):
+        """Agrega una entrada leyendo un archivo abierto por bloques (memoria constante)"""
+        with self._zip.open(self._info(nombre, compresion), mode='w', force_zip64=True) as destino:
+            while True:
+                bloque = archivo.read(self.TAMANO_BLOQUE)
+                if not bloque:
+                    break
+                destino.write(bloque)
+                datos = self._salida.retirar()
+                if datos:
+                    yield datos
+        yield self._salida.retirar()
+
+    def cerrar(self):
+        """Escribe el directorio central y entrega los últimos bytes"""
+        self._zip.close()
+        yield self._salida.retirar()
+
+    def _info(self, nombre, compresion):
+        info = zipfile.ZipInfo(nombre, date_time=time.localtime()[:6])
+        info.compress_type = self._zip.compression if compresion is None else compresion
+        info.external_attr = 0o644 << 16
+        return info
@@ -5,11 +5,23 @@ from firebase_config import init_firestore
 from reportlab.lib.units import cm
 from reportlab.lib.utils import ImageReader
 import os
-from PIL import Image as PilImage
+import sys
 from PIL import ImageOps
-import requests
 from io import BytesIO
 
+# Utilidades compartidas por los generadores (reportes/imagenes_reporte.py)
+_REPORTES_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if _REPORTES_DIR not in sys.path:
+    sys.path.insert(0, _REPORTES_DIR)
+
+from imagenes_reporte import (
+    descargar_imagen,
+    dibujar_plantilla,
+    plantilla_comprimida,
+    precargar_imagenes,
+    recolectar_urls,
+)
+
 
 
 def _get_templates_base_dir():
@@ -46,52 +58,20 @@ def buscar_plantilla(nombre_archivo):
 
 def comprimir_plantilla(ruta_original):
     """
-    Comprime una plantilla local y retorna la ruta del archivo comprimido.
+    Retorna la ruta de la versión comprimida de una plantilla local.
+    
+    La compresión se hace una sola vez por versión del archivo y se guarda en
+    la caché de plantillas compartida (ver imagenes_reporte.plantilla_comprimida).
     
     Args:
         ruta_original: Ruta del archivo de plantilla original
     
     Returns:
-        Ruta del archivo comprimido temporal, o None si falla
+        Ruta del archivo comprimido, o None si la plantilla no existe
     """
     if not ruta_original or not os.path.exists(ruta_original):
         return None
-    
-    try:
-        # Crear nombre para archivo comprimido temporal
-        nombre_base = os.path.basename(ruta_original)
-        nombre_comprimido = f"temp_compressed_{nombre_base}"
-        
-        # Abrir imagen con PIL
-        img = PilImage.open(ruta_original)
-        
-        # Convertir a RGB si es necesario (para JPEG)
-        if img.mode in ('RGBA', 'LA', 'P'):
-            # Crear fondo blanco para imágenes con transparencia
-            fondo = PilImage.new('RGB', img.size, (255, 255, 255))
-            if img.mode == 'P':
-                img = img.convert('RGBA')
-            fondo.paste(img, mask=img.split()[-1] if img.mode in ('RGBA', 'LA') else None)
-            img = fondo
-        elif img.mode != 'RGB':
-            img = img.convert('RGB')
-        
-        # Calcular dimensiones máximas (1024px manteniendo proporción)
-        max_dimension = 1024
-        if img.width > max_dimension or img.height > max_dimension:
-            ratio = min(max_dimension / img.width, max_dimension / img.height)
-            new_width = int(img.width * ratio)
-            new_height = int(img.height * ratio)
-            img = img.resize((new_width, new_height), PilImage.Resampling.LANCZOS)
-        
-        # Guardar con compresión JPEG (calidad 50 - balance entre calidad y tamaño)
-        img.save(nombre_comprimido, 'JPEG', quality=50, optimize=True)
-        
-        return nombre_comprimido
-    
-    except Exception as e:
-        print(f"⚠️ Error al comprimir plantilla {ruta_original}: {e}")
-        return None
+    return plantilla_comprimida(ruta_original)
 
 
 def insertar_plantilla_comprimida(canvas_obj, ruta_imagen, ancho, alto):
@@ -107,133 +87,39 @@ def insertar_plantilla_comprimida(canvas_obj, ruta_imagen, ancho, alto):
     if not ruta_imagen:
         return
     
-    ruta_comprimida = comprimir_plantilla(ruta_imagen)
-    if ruta_comprimida:
-        try:
-            canvas_obj.drawImage(ImageReader(ruta_comprimida), 0, 0, width=ancho, height=alto)
-        finally:
-            # Limpiar archivo temporal comprimido
-            if os.path.exists(ruta_comprimida):
-                try:
-                    os.remove(ruta_comprimida)
-                except:
-                    pass
-    else:
-        # Si falla la compresión, usar original
-        canvas_obj.drawImage(ImageReader(ruta_imagen), 0, 0, width=ancho, height=alto)
+    dibujar_plantilla(canvas_obj, ruta_imagen, ancho, alto)
 
 
 def insertar_imagen_remota(canvas_obj, url, x, y, width=None, height=None, nombre_temp="temp_img.jpg"):
     """
-    Descarga e inserta una imagen remota en el PDF.
+    Inserta una imagen remota en el PDF.
+    
+    Usa la imagen precargada en ``canvas_obj.imagenes_precargadas`` (ver
+    generar_pdf_ericsson); si no está, la descarga en memoria en ese momento.
     
     Args:
         canvas_obj: Objeto canvas de ReportLab
         url: URL de la imagen a descargar
         x, y: Posición en el PDF
         width, height: Dimensiones de la imagen
-        nombre_temp: Nombre temporal del archivo
+        nombre_temp: Sin uso; se conserva por compatibilidad con las llamadas existentes
     """
     if not url or not url.startswith("http"):
         return
     
+    precargadas = getattr(canvas_obj, "imagenes_precargadas", {})
+    imagen = precargadas.get(url)
+    if imagen is None:
+        contenido = descargar_imagen(url)
+        if not contenido:
+            return
+        imagen = ImageReader(BytesIO(contenido))
+        precargadas[url] = imagen
+    
     try:
-        # Agregar timeout para evitar que se cuelgue (10 segundos de conexión, 30 segundos total)
-        response = requests.get(url, timeout=(10, 30), stream=True)
-        
-        if response.ok:
-            # Verificar que sea una imagen válida
-            content_type = response.headers.get('content-type', '')
-            if not content_type.startswith('image/'):
-                print(f"⚠️ URL no es una imagen: {url} (Content-Type: {content_type})")
-                return
-            
-            # Descargar contenido en chunks para manejar archivos grandes
-            with open(nombre_temp, "wb") as f:
-                for chunk in response.iter_content(chunk_size=8192):
-                    if chunk:
-                        f.write(chunk)
-            
-            # Verificar que el archivo se descargó correctamente
-            if os.path.exists(nombre_temp) and os.path.getsize(nombre_temp) > 0:
-                # Comprimir y optimizar la imagen antes de insertarla
-                nombre_comprimido = nombre_temp.replace(".jpg", "_compressed.jpg")
-                try:
-                    # Abrir imagen con PIL
-                    img = PilImage.open(nombre_temp)
-                    
-                    # Convertir a RGB si es necesario (para JPEG)
-                    if img.mode in ('RGBA', 'LA', 'P'):
-                        # Crear fondo blanco para imágenes con transparencia
-                        fondo = PilImage.new('RGB', img.size, (255, 255, 255))
-                        if img.mode == 'P':
-                            img = img.convert('RGBA')
-                        fondo.paste(img, mask=img.split()[-1] if img.mode in ('RGBA', 'LA') else None)
-                        img = fondo
-                    elif img.mode != 'RGB':
-                        img = img.convert('RGB')
-                    
-                    # Calcular dimensiones máximas (1024px manteniendo proporción)
-                    max_dimension = 1024
-                    if img.width > max_dimension or img.height > max_dimension:
-                        ratio = min(max_dimension / img.width, max_dimension / img.height)
-                        new_width = int(img.width * ratio)
-                        new_height = int(img.height * ratio)
-                        img = img.resize((new_width, new_height), PilImage.Resampling.LANCZOS)
-                    
-                    # Guardar con compresión JPEG (calidad 50 - balance entre calidad y tamaño)
-                    img.save(nombre_comprimido, 'JPEG', quality=50, optimize=True)
-                    
-                    # Eliminar imagen original
-                    os.remove(nombre_temp)
-                    
-                    # Usar la imagen comprimida
-                    canvas_obj.drawImage(ImageReader(nombre_comprimido), x, y, width=width, height=height)
-                    os.remove(nombre_comprimido)
-                    
-                except Exception as e:
-                    # Si falla la compresión, intentar con la imagen original
-                    print(f"⚠️ Error al comprimir imagen, usando original: {url} - {e}")
-                    try:
-                        canvas_obj.drawImage(ImageReader(nombre_temp), x, y, width=width, height=height)
-                    except:
-                        pass
-                    finally:
-                        if os.path.exists(nombre_temp):
-                            os.remove(nombre_temp)
-                        if os.path.exists(nombre_comprimido):
-                            try:
-                                os.remove(nombre_comprimido)
-                            except:
-                                pass
-            else:
-                print(f"⚠️ Imagen descargada está vacía: {url}")
-        else:
-            print(f"⚠️ Error HTTP {response.status_code} al descargar: {url}")
-    
-    except requests.exceptions.Timeout:
-        print(f"⏱️ Timeout al descargar imagen (demasiado lenta): {url}")
-    except requests.exceptions.ConnectionError:
-        print(f"🔌 Error de conexión al descargar: {url}")
-    except requests.exceptions.RequestException as e:
-        print(f"❌ Error al descargar imagen: {url} - {e}")
-    except KeyboardInterrupt:
-        print(f"⚠️ Descarga interrumpida por el usuario: {url}")
-        # Limpiar archivo temporal si existe
-        if os.path.exists(nombre_temp):
-            try:
-                os.remove(nombre_temp)
-            except:
-                pass
-        raise  # Re-lanzar para que el usuario sepa que fue interrumpido
+        canvas_obj.drawImage(imagen, x, y, width=width, height=height)
     except Exception as e:
         print(f"❌ Error inesperado al insertar imagen remota: {url} - {type(e).__name__}: {e}")
-        # Limpiar archivo temporal si existe
-        if os.path.exists(nombre_temp):
-            try:
-                os.remove(nombre_temp)
-            except:
-                pass
 
 
 def obtener_antenas(sitio_torre, cantidad_antenas):
@@ -378,6 +264,9 @@ def generar_pdf_ericsson(document_id, salida_pdf, data=None):
     c = canvas.Canvas(salida_pdf, pagesize=letter)
     ancho, alto = letter
 
+    # Descargar todas las fotos del documento en paralelo antes de dibujar
+    c.imagenes_precargadas = precargar_imagenes(recolectar_urls(datos))
+
     # Página 1
     ruta_imagen = buscar_plantilla("r1.jpg")
     if ruta_imagen:
@@ -1087,10 +976,6 @@ def generar_pdf_ericsson(document_id, salida_pdf, data=None):
     
     #PAGINA 25 
 
-    doc_ref = db.collection("reportesEnlacesEricssonTigo").document(document_id)
-
-    doc = doc_ref.get()
-    data = doc.to_dict()
     
     ruta_imagen = buscar_plantilla("r25.jpg")
     if ruta_imagen:
@@ -1392,10 +1277,6 @@ def generar_pdf_ericsson(document_id, salida_pdf, data=None):
     
     #########REPORTRIA IMAGENES SITIO B !#######
     #PAGINA 30  
-    doc_ref = db.collection("reportesEnlacesEricssonTigo").document(document_id)
-
-    doc = doc_ref.get()
-    data = doc.to_dict()
    
     ruta_imagen = buscar_plantilla("r30.jpg")
     if ruta_imagen:
@@ -1486,10 +1367,6 @@ def generar_pdf_ericsson(document_id, salida_pdf, data=None):
 
     c.showPage()
     #PAGINA 31
-    doc_ref = db.collection("reportesEnlacesEricssonTigo").document(document_id)
-
-    doc = doc_ref.get()
-    data = doc.to_dict()
    
     ruta_imagen = buscar_plantilla("r31.jpg")
     if ruta_imagen:
@@ -1555,10 +1432,6 @@ def generar_pdf_ericsson(document_id, salida_pdf, data=None):
 
     c.showPage()
     #PAGINA 32
-    doc_ref = db.collection("reportesEnlacesEricssonTigo").document(document_id)
-
-    doc = doc_ref.get()
-    data = doc.to_dict()
    
     ruta_imagen = buscar_plantilla("r32.jpg")
     if os.path.exists(ruta_imagen):
@@ -1603,10 +1476,6 @@ def generar_pdf_ericsson(document_id, salida_pdf, data=None):
 
     c.showPage()
     #PAGINA 33
-    doc_ref = db.collection("reportesEnlacesEricssonTigo").document(document_id)
-
-    doc = doc_ref.get()
-    data = doc.to_dict()
    
     ruta_imagen = buscar_plantilla("r33.jpg")
     if os.path.exists(ruta_imagen):
@@ -1,134 +1,39 @@
 from reportlab.lib.pagesizes import letter
 from reportlab.pdfgen import canvas
 from PIL import Image as PilImage
-from PIL import ImageOps
-import requests
 from io import BytesIO
 import os
+import sys
 from firebase_config import init_firestore
 import uuid 
 from datetime import datetime
 from reportlab.lib.utils import ImageReader
 
+# Utilidades compartidas por los generadores (reportes/imagenes_reporte.py)
+_REPORTES_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if _REPORTES_DIR not in sys.path:
+    sys.path.insert(0, _REPORTES_DIR)
+
+from imagenes_reporte import descargar_imagen as _descargar_imagen_comprimida, dibujar_plantilla
+
 def descargar_imagen(url, max_size=(800, 800), quality=60, max_retries=3):
     """
     Descarga una imagen desde una URL y la procesa.
-    Maneja imágenes truncadas o corruptas con reintentos.
+    Maneja imágenes truncadas o corruptas con reintentos y reutiliza la caché
+    de imágenes compartida por los generadores (no descarga fotos ya procesadas).
     """
-    if not url:
+    contenido = _descargar_imagen_comprimida(
+        url,
+        max_dimension=max(max_size),
+        calidad=quality,
+        corregir_rotacion=True,
+        reintentos=max_retries,
+    )
+    if not contenido:
         return None
-    
-    for intento in range(max_retries):
-        try:
-            # Descargar con timeout y verificar status
-            # Usar stream=False para asegurar descarga completa
-            response = requests.get(url, timeout=30, stream=False)
-            response.raise_for_status()  # Lanza excepción si hay error HTTP
-            
-            # Verificar que el Content-Length coincide con lo descargado
-            content = response.content
-            expected_length = response.headers.get('Content-Length')
-            
-            if expected_length:
-                expected_length = int(expected_length)
-                if len(content) < expected_length:
-                    # Descarga incompleta
-                    if intento < max_retries - 1:
-                        continue  # Reintentar
-                    print(f"⚠️  Advertencia: Imagen descargada incompleta ({len(content)}/{expected_length} bytes)")
-            
-            # Verificar que hay contenido
-            if not content or len(content) < 100:  # Mínimo razonable para una imagen
-                raise ValueError("Imagen demasiado pequeña o vacía")
-            
-            # Intentar abrir la imagen
-            img = None
-            try:
-                # Configurar PIL para ser más permisivo con imágenes truncadas
-                # Esto permite procesar imágenes que están ligeramente truncadas pero aún utilizables
-                from PIL import ImageFile
-                ImageFile.LOAD_TRUNCATED_IMAGES = True  # Permite cargar imágenes truncadas
-                
-                img = PilImage.open(BytesIO(content))
-                # Intentar cargar completamente
-                try:
-                    img.load()
-                except Exception as load_error:
-                    # Si el error es de truncamiento, la imagen puede ser aún utilizable
-                    if "truncated" in str(load_error).lower():
-                        # Intentar reabrir y procesar de todas formas
-                        # Muchas imágenes truncadas aún pueden ser procesadas
-                        img = PilImage.open(BytesIO(content))
-                        # Continuar con el procesamiento aunque esté truncada
-                        # No mostrar error si la imagen se puede abrir
-                    else:
-                        # Otro error al cargar, reintentar
-                        if intento < max_retries - 1:
-                            continue
-                        raise load_error
-            except Exception as img_error:
-                # Error al abrir la imagen
-                if "truncated" in str(img_error).lower():
-                    # Intentar abrir de todas formas con LOAD_TRUNCATED_IMAGES
-                    try:
-                        from PIL import ImageFile
-                        ImageFile.LOAD_TRUNCATED_IMAGES = True
-                        img = PilImage.open(BytesIO(content))
-                    except:
-                        if intento < max_retries - 1:
-                            continue
-                        # Si es el último intento y aún falla, omitir esta imagen
-                        return None
-                else:
-                    if intento < max_retries - 1:
-                        continue
-                    raise img_error
-            
-            if img is None:
-                if intento < max_retries - 1:
-                    continue
-                return None
-            
-            # Corregir rotación EXIF
-            try:
-                img = ImageOps.exif_transpose(img)
-            except:
-                pass  # Si falla, continuar sin corrección EXIF
-
-            # Convertir a RGB por si tiene canal alfa (PNG)
-            img = img.convert("RGB")
-
-            # Redimensionar proporcionalmente
-            try:
-                # Intentar con Resampling (PIL 10.0+)
-                img.thumbnail(max_size, PilImage.Resampling.LANCZOS)
-            except AttributeError:
-                # Fallback para versiones anteriores
-                img.thumbnail(max_size, PilImage.LANCZOS)
-
-            # Recomprimir a JPEG con calidad reducida
-            buffer = BytesIO()
-            img.save(buffer, format="JPEG", quality=quality, optimize=True)
-            buffer.seek(0)
-
-            # Devolver objeto PIL listo para ImageReader
-            return PilImage.open(buffer)
-            
-        except requests.exceptions.RequestException as e:
-            if intento < max_retries - 1:
-                continue
-            print(f"Error al descargar imagen {url[:50]}...: {e}")
-            return None
-        except Exception as e:
-            if intento < max_retries - 1:
-                continue
-            # Solo mostrar error si es el último intento
-            error_msg = str(e)
-            if "truncated" not in error_msg.lower():
-                print(f"Error al procesar imagen {url[:50]}...: {e}")
-            return None
-    
-    return None
+
+    # Devolver objeto PIL listo para ImageReader
+    return PilImage.open(BytesIO(contenido))
 
 def insertar_imagen(canvas_obj, img, x, y, width=None, height=None):
     if img:
@@ -166,7 +71,7 @@ def generar_pdf_nokia_metrocell(document_id, salida_pdf='reporte_nokia_metrocell
             
         plantilla_path = os.path.join(templates_dir, f"Nokia{pagina}.jpg")
         if os.path.exists(plantilla_path):
-            c.drawImage(plantilla_path, 0, 0, width=ancho, height=alto)
+            dibujar_plantilla(c, plantilla_path, ancho, alto, max_dimension=1700, calidad=75)
         else:
             print(f"Plantilla {plantilla_path} no encontrada.")
 
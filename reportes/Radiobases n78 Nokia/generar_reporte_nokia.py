@@ -1,38 +1,35 @@
 from reportlab.lib.pagesizes import letter
 from reportlab.pdfgen import canvas
 from PIL import Image as PilImage
-from PIL import ImageOps
-import requests
 from io import BytesIO
 import os
+import sys
 from firebase_config import init_firestore
 import uuid 
 from datetime import datetime
 from reportlab.lib.utils import ImageReader
 
+# Utilidades compartidas por los generadores (reportes/imagenes_reporte.py)
+_REPORTES_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if _REPORTES_DIR not in sys.path:
+    sys.path.insert(0, _REPORTES_DIR)
+
+from imagenes_reporte import descargar_imagen as _descargar_imagen_comprimida, dibujar_plantilla
+
 def descargar_imagen(url, max_size=(800, 800), quality=60):
-    try:
-        response = requests.get(url)
-        img = PilImage.open(BytesIO(response.content))
-        img = ImageOps.exif_transpose(img)  # Corrige rotación
-
-        # Convertir a RGB por si tiene canal alfa (PNG)
-        img = img.convert("RGB")
-
-        # Redimensionar proporcionalmente
-        img.thumbnail(max_size)
-
-        # Recomprimir a JPEG con calidad reducida
-        buffer = BytesIO()
-        img.save(buffer, format="JPEG", quality=quality)
-        buffer.seek(0)
-
-        # Devolver objeto PIL listo para ImageReader
-        return PilImage.open(buffer)
-    except Exception as e:
-        print(f"Error al descargar imagen {url}: {e}")
+    # Toma la imagen de la caché compartida o la descarga, corrige rotación y recomprime
+    contenido = _descargar_imagen_comprimida(
+        url,
+        max_dimension=max(max_size),
+        calidad=quality,
+        corregir_rotacion=True,
+    )
+    if not contenido:
         return None
 
+    # Devolver objeto PIL listo para ImageReader
+    return PilImage.open(BytesIO(contenido))
+
 def insertar_imagen(canvas_obj, img, x, y, width=None, height=None):
     if img:
         img_reader = ImageReader(img)
@@ -65,7 +62,7 @@ def generar_pdf_nokia(document_id, salida_pdf='reporte_nokia.pdf', data=None):
     for pagina in range(1, 17):
         plantilla_path = os.path.join(templates_dir, f"Nokia{pagina}.jpg")
         if os.path.exists(plantilla_path):
-            c.drawImage(plantilla_path, 0, 0, width=ancho, height=alto)
+            dibujar_plantilla(c, plantilla_path, ancho, alto, max_dimension=1700, calidad=75)
         else:
             print(f"Plantilla {plantilla_path} no encontrada.")
 
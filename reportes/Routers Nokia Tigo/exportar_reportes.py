@@ -5,92 +5,83 @@ from reportlab.lib.units import cm
 from reportlab.lib.utils import ImageReader
 from firebase_config import init_firestore
 import os
+import sys
 import textwrap
-import requests
-import uuid
-import time
+from io import BytesIO
+
+# Utilidades compartidas por los generadores (reportes/imagenes_reporte.py)
+_REPORTES_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if _REPORTES_DIR not in sys.path:
+    sys.path.insert(0, _REPORTES_DIR)
+
+from imagenes_reporte import descargar_imagen, dibujar_plantilla
 
 # Debug: guardar copias de imágenes descargadas para verificación visual
 DEBUG_SAVE_IMAGES = True
 
-def insertar_imagen_remota(canvas_obj, url, x, y, width, height, nombre_campo="imagen", debug_dir=None):
+# Por defecto se incrustan las fotos originales. Con True se reducen a
+# IMAGEN_MAX_DIMENSION px y calidad IMAGEN_CALIDAD: el PDF pesa mucho menos,
+# pero las fotos pierden resolución (ver generar_pdf_routers_tigo)
+REDUCIR_IMAGENES = False
+IMAGEN_MAX_DIMENSION = 1024
+IMAGEN_CALIDAD = 75
+
+def insertar_imagen_remota(canvas_obj, url, x, y, width, height, nombre_campo="imagen", debug_dir=None,
+                           reducir=False):
     """
     Descarga una imagen remota y la inserta en el canvas del PDF.
-    Usa nombres únicos y fuerza la recarga para evitar caché.
+    La imagen se toma de la caché compartida si ya se descargó antes y se dibuja
+    desde memoria (ReportLab identifica cada imagen por su contenido). Con
+    ``reducir`` se redimensiona y recomprime antes de incrustarla.
     """
     if not url or not url.startswith("http"):
         return
     
-    # Generar nombre único con timestamp y campo
-    nombre_temp = f"temp_{nombre_campo}_{uuid.uuid4().hex}_{int(time.time()*1000)}.jpg"
-    
     try:
-        # Descargar imagen con headers para evitar caché
-        headers = {
-            'Cache-Control': 'no-cache, no-store, must-revalidate',
-            'Pragma': 'no-cache',
-            'Expires': '0'
-        }
-        response = requests.get(url, timeout=15, headers=headers)
-        
-        if response.ok:
-            # Guardar temporalmente
-            with open(nombre_temp, "wb") as f:
-                f.write(response.content)
-            
-            # Forzar flush del sistema de archivos
-            os.sync() if hasattr(os, 'sync') else None
-            
-            # Esperar un poco para asegurar que el archivo esté listo
-            time.sleep(0.05)
-            
-            # Guardar copia de depuración si aplica
-            try:
-                if DEBUG_SAVE_IMAGES and debug_dir:
-                    os.makedirs(debug_dir, exist_ok=True)
-                    copia_path = os.path.join(debug_dir, f"{nombre_campo}.jpg")
-                    # Evitar sobrescribir: agregar sufijo incremental
-                    idx = 1
-                    base, ext = os.path.splitext(copia_path)
-                    while os.path.exists(copia_path):
-                        copia_path = f"{base}_{idx}{ext}"
-                        idx += 1
-                    with open(copia_path, "wb") as fc:
-                        fc.write(response.content)
-            except Exception as dbg_err:
-                print(f"   ⚠️  Debug save fallo para {nombre_campo}: {dbg_err}")
-
-            # Crear ImageReader directamente desde el archivo
-            # No reutilizar objetos ImageReader para evitar caché
-            img = ImageReader(nombre_temp)
-            canvas_obj.drawImage(img, x, y, width=width, height=height, mask='auto')
-            
-            # Limpiar inmediatamente después de insertar
-            try:
-                img = None  # Liberar referencia
-                if os.path.exists(nombre_temp):
-                    os.remove(nombre_temp)
-            except Exception as cleanup_error:
-                print(f"   ⚠️  Error al limpiar {nombre_temp}: {cleanup_error}")
+        if reducir:
+            contenido = descargar_imagen(url, max_dimension=IMAGEN_MAX_DIMENSION, calidad=IMAGEN_CALIDAD)
         else:
-            print(f"   ⚠️  HTTP {response.status_code} para {nombre_campo}")
-            
+            contenido = descargar_imagen(url, comprimir=False)
+        if not contenido:
+            print(f"   ⚠️  No se pudo obtener la imagen de {nombre_campo}")
+            return
+        
+        # Guardar copia de depuración si aplica
+        try:
+            if DEBUG_SAVE_IMAGES and debug_dir:
+                os.makedirs(debug_dir, exist_ok=True)
+                copia_path = os.path.join(debug_dir, f"{nombre_campo}.jpg")
+                # Evitar sobrescribir: agregar sufijo incremental
+                idx = 1
+                base, ext = os.path.splitext(copia_path)
+                while os.path.exists(copia_path):
+                    copia_path = f"{base}_{idx}{ext}"
+                    idx += 1
+                with open(copia_path, "wb") as fc:
+                    fc.write(contenido)
+        except Exception as dbg_err:
+            print(f"   ⚠️  Debug save fallo para {nombre_campo}: {dbg_err}")
+
+        canvas_obj.drawImage(ImageReader(BytesIO(contenido)), x, y, width=width, height=height, mask='auto')
     except Exception as e:
         print(f"   ❌ Error en {nombre_campo}: {e}")
-        # Limpiar archivo temporal en caso de error
-        if os.path.exists(nombre_temp):
-            try:
-                os.remove(nombre_temp)
-            except:
-                pass
 
 def _get_templates_base_dir():
     base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
     return os.path.join(base_dir, "reportes_templates", "routers_nokia")
 
 
-def generar_pdf_routers_tigo(doc_id, salida_pdf, data=None, templates_dir=None, debug_save_images=None):
+def generar_pdf_routers_tigo(doc_id, salida_pdf, data=None, templates_dir=None, debug_save_images=None,
+                             reducir_imagenes=None):
+    """
+    Genera el PDF del reporte de instalación de router.
+
+    ``reducir_imagenes`` (por defecto REDUCIR_IMAGENES) reduce las fotos a
+    IMAGEN_MAX_DIMENSION px y calidad IMAGEN_CALIDAD en lugar de incrustar las
+    originales.
+    """
     global DEBUG_SAVE_IMAGES
+    reducir = REDUCIR_IMAGENES if reducir_imagenes is None else reducir_imagenes
     if data is None:
         db = init_firestore()
         doc_ref = db.collection("instalacionesRoutersTigo").document(doc_id)
@@ -123,7 +114,7 @@ def generar_pdf_routers_tigo(doc_id, salida_pdf, data=None, templates_dir=None,
     # Página 1 - router1
     fondo = os.path.join(templates_dir, "router1.jpg")
     if os.path.exists(fondo):
-        c.drawImage(ImageReader(fondo), 0, 0, width=width, height=height)
+        dibujar_plantilla(c, fondo, width, height, max_dimension=1700, calidad=75)
     else:
         print(" Imagen router1.jpg no encontrada")
 
@@ -185,14 +176,14 @@ def generar_pdf_routers_tigo(doc_id, salida_pdf, data=None, templates_dir=None,
         if url and url.startswith("http"):
             suf = url.split("/")[-1][:24]
             print(f"   ⬇️  {nombre_campo} -> {suf}... ", end="", flush=True)
-            insertar_imagen_remota(c, url, x * cm, y * cm, 4.5 * cm, 4.5 * cm, nombre_campo, debug_dir)
+            insertar_imagen_remota(c, url, x * cm, y * cm, 4.5 * cm, 4.5 * cm, nombre_campo, debug_dir, reducir)
             print("✓")
     c.showPage()
 
     # Página 2 - router2
     ruta_imagen = os.path.join(templates_dir, "router2.jpg")
     if os.path.exists(ruta_imagen):
-        c.drawImage(ImageReader(ruta_imagen), 0, 0, width=width, height=height)
+        dibujar_plantilla(c, ruta_imagen, width, height, max_dimension=1700, calidad=75)
 
     # Orden solicitado para página 2 (8 imágenes):
     # 7: etiquetaEnergia, 8: breaker, 9: etiquetaDCDU
@@ -214,14 +205,14 @@ def generar_pdf_routers_tigo(doc_id, salida_pdf, data=None, templates_dir=None,
         if url and url.startswith("http"):
             suf = url.split("/")[-1][:24]
             print(f"   ⬇️  {nombre_campo} -> {suf}... ", end="", flush=True)
-            insertar_imagen_remota(c, url, x * cm, y * cm, 4.5 * cm, 4.5 * cm, nombre_campo, debug_dir)
+            insertar_imagen_remota(c, url, x * cm, y * cm, 4.5 * cm, 4.5 * cm, nombre_campo, debug_dir, reducir)
             print("✓")
     c.showPage()
 
     # Página 3 - router3
     fondo_r3 = os.path.join(templates_dir, "router3.jpg")
     if os.path.exists(fondo_r3):
-        c.drawImage(ImageReader(fondo_r3), 0, 0, width=width, height=height)
+        dibujar_plantilla(c, fondo_r3, width, height, max_dimension=1700, calidad=75)
 
     c.setFont("Helvetica", 8)
     fuenteB = datos.get("condicionesElectricas", {}).get("fuenteB", {})
@@ -249,7 +240,7 @@ def generar_pdf_routers_tigo(doc_id, salida_pdf, data=None, templates_dir=None,
     # Página 4 - router4
     fondo_r4 = os.path.join(templates_dir, "router4.jpg")
     if os.path.exists(fondo_r4):
-        c.drawImage(ImageReader(fondo_r4), 0, 0, width=width, height=height)
+        dibujar_plantilla(c, fondo_r4, width, height, max_dimension=1700, calidad=75)
 
     c.setFont("Helvetica", 7)
     inventario = datos.get("inventario", [])
@@ -271,7 +262,7 @@ def generar_pdf_routers_tigo(doc_id, salida_pdf, data=None, templates_dir=None,
     # Página 5 - router5
     fondo_r5 = os.path.join(templates_dir, "router5.jpg")
     if os.path.exists(fondo_r5):
-        c.drawImage(ImageReader(fondo_r5), 0, 0, width=width, height=height)
+        dibujar_plantilla(c, fondo_r5, width, height, max_dimension=1700, calidad=75)
 
     c.setFont("Helvetica", 7)
     fibra = datos.get("posicionFO", [])
@@ -0,0 +1,490 @@
+"""
+Descarga y preparación de imágenes remotas para los generadores de reportes PDF.
+
+Los generadores dibujan decenas de fotos de Firebase Storage. En lugar de
+descargar cada una al momento de dibujarla, ``precargar_imagenes`` recolecta
+todas las URLs del documento, las descarga en paralelo (con un pool acotado y
+una sesión HTTP que reutiliza conexiones) y las deja comprimidas en memoria
+como ``ImageReader`` listos para ``drawImage``.
+
+Las imágenes ya comprimidas se guardan en una caché en disco compartida por los
+cuatro generadores (``CacheImagenes``), de modo que reexportar un reporte o
+exportar varios que comparten fotos no vuelve a descargar nada.
+"""
+
+import hashlib
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+import requests
+from requests.adapters import HTTPAdapter
+from PIL import Image as PilImage
+from PIL import ImageFile, ImageOps
+from reportlab.lib.utils import ImageReader
+
+# Las fotos subidas desde la app a veces llegan truncadas pero siguen siendo utilizables
+ImageFile.LOAD_TRUNCATED_IMAGES = True
+
+
+MAX_DESCARGAS_SIMULTANEAS = 8
+TIMEOUT_DESCARGA = (10, 30)  # (conexión, lectura) en segundos
+MAX_DIMENSION = 1024
+CALIDAD_JPEG = 50
+
+_BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+CACHE_DIR_POR_DEFECTO = os.environ.get(
+    "REPORTES_CACHE_IMAGENES_DIR",
+    os.path.join(_BASE_DIR, "cache_data", "imagenes_reportes"),
+)
+CACHE_MAX_MB_POR_DEFECTO = int(os.environ.get("REPORTES_CACHE_IMAGENES_MB", "512"))
+# Pasado este tiempo una imagen en caché se revalida con If-None-Match (ETag):
+# si no cambió, el servidor responde 304 y no se vuelve a descargar
+CACHE_REVALIDAR_HORAS_POR_DEFECTO = float(os.environ.get("REPORTES_CACHE_IMAGENES_REVALIDAR_HORAS", "24"))
+PLANTILLAS_DIR_POR_DEFECTO = os.environ.get(
+    "REPORTES_CACHE_PLANTILLAS_DIR",
+    os.path.join(_BASE_DIR, "cache_data", "plantillas_reportes"),
+)
+
+_sesion = None
+_sesion_lock = threading.Lock()
+_plantillas_dir = PLANTILLAS_DIR_POR_DEFECTO
+_plantillas = {}
+_plantillas_lock = threading.Lock()
+
+
+class CacheImagenes:
+    """
+    Caché en disco de imágenes ya redimensionadas y comprimidas (o de las
+    originales, si se piden sin comprimir).
+
+    Los bytes se guardan por su SHA-256 en ``objetos/`` (la misma foto bajo dos
+    URLs ocupa un solo archivo) y ``indice/`` asocia cada combinación URL +
+    tamaño + calidad con ese hash, el ETag de la descarga y la fecha en que se
+    verificó por última vez. Cada lectura actualiza la fecha del objeto; al
+    superar ``max_bytes`` se eliminan los menos usados. Las escrituras van a un
+    archivo temporal y se renombran, por lo que varios procesos pueden
+    compartir el directorio.
+    """
+
+    def __init__(self, directorio=None, max_mb=None, revalidar_horas=None):
+        self.directorio = directorio or CACHE_DIR_POR_DEFECTO
+        self.max_bytes = (max_mb if max_mb is not None else CACHE_MAX_MB_POR_DEFECTO) * 1024 * 1024
+        self.revalidar_segundos = (
+            revalidar_horas if revalidar_horas is not None else CACHE_REVALIDAR_HORAS_POR_DEFECTO
+        ) * 3600
+        self._escrituras = 0
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def clave(url, max_dimension, calidad, corregir_rotacion=False):
+        texto = f"{url}|{max_dimension}|{calidad}|{int(bool(corregir_rotacion))}"
+        return hashlib.sha256(texto.encode("utf-8")).hexdigest()
+
+    def _ruta_indice(self, clave):
+        return os.path.join(self.directorio, "indice", clave[:2], f"{clave}.json")
+
+    def _ruta_objeto(self, sha):
+        return os.path.join(self.directorio, "objetos", sha[:2], f"{sha}.jpg")
+
+    @staticmethod
+    def _escribir_atomico(ruta, contenido):
+        os.makedirs(os.path.dirname(ruta), exist_ok=True)
+        temporal = f"{ruta}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temporal, "wb") as archivo:
+            archivo.write(contenido)
+        os.replace(temporal, ruta)
+
+    def entrada(self, clave):
+        """Entrada del índice (sha, etag, verificado) de la clave, o None"""
+        try:
+            with open(self._ruta_indice(clave), encoding="utf-8") as archivo:
+                entrada = json.load(archivo)
+        except (OSError, ValueError):
+            return None
+        return entrada if isinstance(entrada, dict) and entrada.get("sha") else None
+
+    def obtener(self, clave, entrada=None):
+        """Bytes guardados para la clave, o None"""
+        entrada = entrada or self.entrada(clave)
+        if entrada is None:
+            return None
+        try:
+            ruta = self._ruta_objeto(entrada["sha"])
+            with open(ruta, "rb") as archivo:
+                contenido = archivo.read()
+            os.utime(ruta, None)
+            return contenido
+        except OSError:
+            return None
+
+    def por_revalidar(self, entrada):
+        """True si la entrada tiene ETag y pasó el plazo desde su última verificación"""
+        return bool(entrada.get("etag")) and \
+            time.time() - entrada.get("verificado", 0) > self.revalidar_segundos
+
+    def marcar_verificada(self, clave, entrada):
+        """Registra que el servidor confirmó (304) que la imagen no cambió"""
+        try:
+            self._escribir_atomico(
+                self._ruta_indice(clave),
+                json.dumps(dict(entrada, verificado=time.time())).encode("utf-8"),
+            )
+        except OSError as e:
+            print(f"⚠️ No se pudo actualizar la caché de imágenes: {e}")
+
+    def guardar(self, clave, contenido, etag=""):
+        """Guarda los bytes de una clave; los errores de disco solo se reportan"""
+        sha = hashlib.sha256(contenido).hexdigest()
+        try:
+            ruta = self._ruta_objeto(sha)
+            if os.path.exists(ruta):
+                os.utime(ruta, None)
+            else:
+                self._escribir_atomico(ruta, contenido)
+            self._escribir_atomico(
+                self._ruta_indice(clave),
+                json.dumps({"sha": sha, "etag": etag, "verificado": time.time()}).encode("utf-8"),
+            )
+        except OSError as e:
+            print(f"⚠️ No se pudo guardar la imagen en caché: {e}")
+            return
+        with self._lock:
+            self._escrituras += 1
+            depurar = self._escrituras % 50 == 0
+        if depurar:
+            self.depurar()
+
+    def depurar(self):
+        """Elimina los objetos menos usados hasta quedar bajo ``max_bytes``; retorna cuántos borró"""
+        objetos = []
+        total = 0
+        for raiz, _, archivos in os.walk(os.path.join(self.directorio, "objetos")):
+            for nombre in archivos:
+                ruta = os.path.join(raiz, nombre)
+                try:
+                    info = os.stat(ruta)
+                except OSError:
+                    continue
+                objetos.append((info.st_mtime, info.st_size, ruta))
+                total += info.st_size
+        if total <= self.max_bytes:
+            return 0
+
+        eliminados = 0
+        for _, tamano, ruta in sorted(objetos):
+            if total <= self.max_bytes * 0.9:
+                break
+            try:
+                os.remove(ruta)
+            except OSError:
+                continue
+            total -= tamano
+            eliminados += 1
+        # Las entradas del índice que apuntan a objetos borrados se tratan como
+        # ausentes en obtener() y se sobrescriben en la siguiente descarga
+        return eliminados
+
+
+_cache = None
+
+
+def obtener_cache():
+    """Caché de imágenes del proceso (ver configurar_cache)"""
+    global _cache
+    if _cache is None:
+        _cache = CacheImagenes()
+    return _cache
+
+
+def configurar_cache(directorio=None, max_mb=None, revalidar_horas=None):
+    """Reemplaza la caché del proceso, p. ej. con la ubicación definida en settings de Django"""
+    global _cache
+    _cache = CacheImagenes(directorio, max_mb, revalidar_horas)
+    return _cache
+
+
+def obtener_sesion():
+    """Sesión HTTP compartida con un pool de conexiones del tamaño del pool de descargas"""
+    global _sesion
+    if _sesion is None:
+        with _sesion_lock:
+            if _sesion is None:
+                sesion = requests.Session()
+                adaptador = HTTPAdapter(
+                    pool_connections=MAX_DESCARGAS_SIMULTANEAS,
+                    pool_maxsize=MAX_DESCARGAS_SIMULTANEAS,
+                    max_retries=1,
+                )
+                sesion.mount("https://", adaptador)
+                sesion.mount("http://", adaptador)
+                _sesion = sesion
+    return _sesion
+
+
+def comprimir_imagen(contenido, max_dimension=MAX_DIMENSION, calidad=CALIDAD_JPEG,
+                     corregir_rotacion=False):
+    """
+    Convierte una imagen (bytes) a JPEG RGB redimensionado, sin archivos temporales.
+
+    Args:
+        contenido: Bytes de la imagen original
+        max_dimension: Lado máximo en píxeles (se mantiene la proporción)
+        calidad: Calidad JPEG de salida
+        corregir_rotacion: Aplicar la orientación EXIF de la cámara
+
+    Returns:
+        Bytes del JPEG comprimido
+    """
+    img = PilImage.open(BytesIO(contenido))
+    if corregir_rotacion:
+        try:
+            img = ImageOps.exif_transpose(img)
+        except Exception:
+            pass  # Si falla, continuar sin corrección EXIF
+
+    # Convertir a RGB si es necesario (para JPEG)
+    if img.mode in ('RGBA', 'LA', 'P'):
+        # Crear fondo blanco para imágenes con transparencia
+        fondo = PilImage.new('RGB', img.size, (255, 255, 255))
+        if img.mode == 'P':
+            img = img.convert('RGBA')
+        fondo.paste(img, mask=img.split()[-1] if img.mode in ('RGBA', 'LA') else None)
+        img = fondo
+    elif img.mode != 'RGB':
+        img = img.convert('RGB')
+
+    if img.width > max_dimension or img.height > max_dimension:
+        img.thumbnail((max_dimension, max_dimension), PilImage.Resampling.LANCZOS)
+
+    salida = BytesIO()
+    img.save(salida, 'JPEG', quality=calidad, optimize=True)
+    return salida.getvalue()
+
+
+def descargar_imagen(url, max_dimension=MAX_DIMENSION, calidad=CALIDAD_JPEG,
+                     corregir_rotacion=False, reintentos=1, usar_cache=True, comprimir=True):
+    """
+    Retorna una imagen remota comprimida en memoria, desde la caché si ya existe.
+
+    Una imagen en caché con ETag se revalida con If-None-Match cuando pasa el
+    plazo de ``CacheImagenes.revalidar_segundos``: un 304 la da por vigente
+    sin descargarla y, si el servidor no responde, se usa la copia en caché.
+
+    Args:
+        url: URL de la imagen
+        max_dimension, calidad, corregir_rotacion: Parámetros de compresión (ver comprimir_imagen)
+        reintentos: Intentos ante errores de red o descargas incompletas
+        usar_cache: Consultar y alimentar la caché en disco
+        comprimir: False para obtener los bytes originales, sin redimensionar ni recomprimir
+
+    Returns:
+        Bytes de la imagen (JPEG si se comprimió), o None si la descarga o la conversión fallan
+    """
+    if not url or not url.startswith("http"):
+        return None
+
+    cache = obtener_cache() if usar_cache else None
+    if comprimir:
+        clave = CacheImagenes.clave(url, max_dimension, calidad, corregir_rotacion)
+    else:
+        clave = CacheImagenes.clave(url, "original", "original")
+    entrada = cache.entrada(clave) if cache is not None else None
+    en_cache = cache.obtener(clave, entrada) if entrada else None
+    if en_cache and not cache.por_revalidar(entrada):
+        return en_cache
+    headers = {"If-None-Match": entrada["etag"]} if en_cache else {}
+
+    for intento in range(max(1, reintentos)):
+        ultimo = intento == max(1, reintentos) - 1
+        try:
+            response = obtener_sesion().get(url, timeout=TIMEOUT_DESCARGA, headers=headers)
+            if response.status_code == 304 and en_cache:
+                cache.marcar_verificada(clave, entrada)
+                return en_cache
+            if not response.ok:
+                print(f"⚠️ Error HTTP {response.status_code} al descargar: {url}")
+                # Ante un error del servidor se conserva la copia en caché
+                return en_cache if response.status_code >= 500 else None
+            content_type = response.headers.get('content-type', '')
+            if not content_type.startswith('image/'):
+                print(f"⚠️ URL no es una imagen: {url} (Content-Type: {content_type})")
+                return None
+            original = response.content
+            esperado = response.headers.get('Content-Length')
+            incompleta = not original or (esperado and esperado.isdigit() and len(original) < int(esperado))
+            if incompleta:
+                if not ultimo:
+                    continue
+                print(f"⚠️ Imagen descargada vacía o incompleta: {url}")
+                # Una copia en caché completa es mejor que la descarga cortada
+                if not original or en_cache:
+                    return en_cache
+            if not comprimir:
+                contenido = original
+            else:
+                try:
+                    contenido = comprimir_imagen(original, max_dimension, calidad, corregir_rotacion)
+                except Exception as e:
+                    if not ultimo:
+                        continue
+                    # Si falla la compresión se usa el contenido original (sin guardarlo en caché)
+                    print(f"⚠️ Error al comprimir imagen, usando original: {url} - {e}")
+                    return original
+            # Una descarga incompleta se usa en este reporte pero no se guarda: con
+            # el ETag del archivo completo, las revalidaciones la darían por vigente
+            if cache is not None and not incompleta:
+                cache.guardar(clave, contenido, response.headers.get('ETag', ''))
+            return contenido
+        except requests.exceptions.Timeout:
+            if ultimo:
+                print(f"⏱️ Timeout al descargar imagen (demasiado lenta): {url}")
+        except requests.exceptions.ConnectionError:
+            if ultimo:
+                print(f"🔌 Error de conexión al descargar: {url}")
+        except requests.exceptions.RequestException as e:
+            if ultimo:
+                print(f"❌ Error al descargar imagen: {url} - {e}")
+        except Exception as e:
+            if ultimo:
+                print(f"❌ Error inesperado al descargar imagen: {url} - {type(e).__name__}: {e}")
+    return en_cache
+
+
+def recolectar_urls(datos):
+    """
+    Recorre el documento (diccionarios y listas anidados) y retorna sus URLs http(s).
+
+    Args:
+        datos: Documento de Firestore
+
+    Returns:
+        Lista de URLs sin repetir, en orden de aparición
+    """
+    urls = []
+    vistas = set()
+    pendientes = [datos]
+    while pendientes:
+        valor = pendientes.pop(0)
+        if isinstance(valor, dict):
+            pendientes.extend(valor.values())
+        elif isinstance(valor, (list, tuple)):
+            pendientes.extend(valor)
+        elif isinstance(valor, str):
+            url = valor.strip()
+            if url.startswith("http") and url not in vistas:
+                vistas.add(url)
+                urls.append(url)
+    return urls
+
+
+def precargar_imagenes(urls, max_workers=MAX_DESCARGAS_SIMULTANEAS,
+                       max_dimension=MAX_DIMENSION, calidad=CALIDAD_JPEG,
+                       corregir_rotacion=False):
+    """
+    Descarga en paralelo las URLs y retorna ``{url: ImageReader}``.
+
+    Las URLs que fallan no aparecen en el resultado, de modo que el dibujo
+    simplemente las omite como antes. El tiempo total queda acotado por la
+    imagen más lenta de cada tanda y no por la suma de todas; las que ya están
+    en la caché en disco no generan tráfico de red.
+    """
+    urls = [url for url in dict.fromkeys(urls) if url and url.startswith("http")]
+    if not urls:
+        return {}
+
+    def tarea(url):
+        return url, descargar_imagen(url, max_dimension, calidad, corregir_rotacion)
+
+    imagenes = {}
+    with ThreadPoolExecutor(max_workers=min(max_workers, len(urls))) as pool:
+        for url, contenido in pool.map(tarea, urls):
+            if contenido:
+                imagenes[url] = ImageReader(BytesIO(contenido))
+    print(f"🖼️ {len(imagenes)}/{len(urls)} imágenes precargadas")
+    return imagenes
+
+
+def configurar_plantillas(directorio=None):
+    """Cambia el directorio donde se guardan las plantillas comprimidas"""
+    global _plantillas_dir
+    _plantillas_dir = directorio or PLANTILLAS_DIR_POR_DEFECTO
+    with _plantillas_lock:
+        _plantillas.clear()
+
+
+def plantilla_comprimida(ruta, max_dimension=MAX_DIMENSION, calidad=CALIDAD_JPEG):
+    """
+    Ruta de la versión comprimida de una plantilla de fondo, generándola la primera vez.
+
+    El archivo comprimido se identifica por la ruta, la fecha de modificación y
+    el tamaño del original más los parámetros de compresión, así que reemplazar
+    una plantilla invalida solo su versión. Si la compresión falla se retorna la
+    ruta original.
+
+    Args:
+        ruta: Ruta de la plantilla original (JPEG o PNG)
+        max_dimension, calidad: Parámetros de compresión (ver comprimir_imagen)
+
+    Returns:
+        Ruta del JPEG comprimido
+    """
+    try:
+        info = os.stat(ruta)
+    except OSError:
+        return ruta
+    ruta_absoluta = os.path.abspath(ruta)
+    clave = (ruta_absoluta, info.st_mtime_ns, info.st_size, max_dimension, calidad)
+    destino = _plantillas.get(clave)
+    if destino and os.path.exists(destino):
+        return destino
+
+    with _plantillas_lock:
+        prefijo = hashlib.sha256(ruta_absoluta.encode("utf-8")).hexdigest()[:16]
+        version = hashlib.sha256(repr(clave).encode("utf-8")).hexdigest()[:16]
+        destino = os.path.join(_plantillas_dir, f"{prefijo}-{version}.jpg")
+        if not os.path.exists(destino):
+            try:
+                with open(ruta, "rb") as archivo:
+                    contenido = comprimir_imagen(archivo.read(), max_dimension, calidad)
+                CacheImagenes._escribir_atomico(destino, contenido)
+            except Exception as e:
+                print(f"⚠️ Error al comprimir plantilla {ruta}: {e}")
+                return ruta
+            # Eliminar versiones anteriores de la misma plantilla
+            for nombre in os.listdir(_plantillas_dir):
+                if nombre.startswith(f"{prefijo}-") and not nombre.startswith(f"{prefijo}-{version}"):
+                    try:
+                        os.remove(os.path.join(_plantillas_dir, nombre))
+                    except OSError:
+                        pass
+        _plantillas[clave] = destino
+    return destino
+
+
+def dibujar_plantilla(canvas_obj, ruta, ancho, alto, max_dimension=MAX_DIMENSION, calidad=CALIDAD_JPEG):
+    """
+    Dibuja una plantilla de fondo a página completa.
+
+    Se dibuja por ruta de archivo: ReportLab registra cada archivo como un solo
+    XObject por PDF (lo reutiliza si el fondo se repite) e incrusta el JPEG tal
+    cual, sin decodificarlo ni recomprimirlo en cada exportación.
+    """
+    canvas_obj.drawImage(
+        plantilla_comprimida(ruta, max_dimension, calidad), 0, 0, width=ancho, height=alto
+    )
+
+
+def precalentar_plantillas(directorio, max_dimension=MAX_DIMENSION, calidad=CALIDAD_JPEG):
+    """Comprime de antemano todas las plantillas JPEG de un directorio; retorna cuántas procesó"""
+    procesadas = 0
+    if not os.path.isdir(directorio):
+        return procesadas
+    for nombre in sorted(os.listdir(directorio)):
+        if nombre.lower().endswith((".jpg", ".jpeg")):
+            plantilla_comprimida(os.path.join(directorio, nombre), max_dimension, calidad)
+            procesadas += 1
+    return procesadas
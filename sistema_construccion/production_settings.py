@@ -137,27 +137,9 @@ LOGGING = {
 # CONFIGURACIÓN DE CACHE PARA PRODUCCIÓN
 # ============================================================================
 
-# Cache con fallback a memoria local (en producción usar Redis)
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-        'LOCATION': 'sistema_construccion_production_cache',
-        'TIMEOUT': 3600,  # 1 hora
-        'OPTIONS': {
-            'MAX_ENTRIES': 10000,
-            'CULL_FREQUENCY': 3,
-        }
-    },
-    'session': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-        'LOCATION': 'session_production_cache',
-        'TIMEOUT': 86400,  # 24 horas
-        'OPTIONS': {
-            'MAX_ENTRIES': 2000,
-            'CULL_FREQUENCY': 3,
-        }
-    }
-}
+# Se hereda CACHES de settings.py: Redis si REDIS_URL está definida, caché en
+# archivos compartida por los workers en caso contrario. No usar LocMemCache aquí:
+# cada worker de gunicorn tendría su propia copia y la invalidación no llegaría a los demás.
 
 # ============================================================================
 # CONFIGURACIÓN DE EMAIL PARA PRODUCCIÓN
@@ -212,37 +212,92 @@ FIREBASE_BITACORA_ASIGNACIONES_COLLECTION = os.environ.get(
 FIREBASE_BITACORA_AVANCES_DIARIOS_COLLECTION = os.environ.get(
     'FIREBASE_BITACORA_AVANCES_DIARIOS_COLLECTION', 'bitacora_avances_diarios'
 )
-
-# Configuración de caché con fallback
-# Configuración de cache simplificada (sin Redis)
-CACHES = {
-    'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-        'LOCATION': 'sistema_construccion_cache',
-        'TIMEOUT': 3600,  # 1 hora por defecto
-        'OPTIONS': {
-            'MAX_ENTRIES': 5000,
-            'CULL_FREQUENCY': 3,
-        }
-    },
-    'session': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-        'LOCATION': 'session_cache',
-        'TIMEOUT': 86400,  # 24 horas para sesiones
-        'OPTIONS': {
-            'MAX_ENTRIES': 1000,
-            'CULL_FREQUENCY': 3,
+# Espejo local de la colección transactions (TransaccionFirebase): segundos antes de
+# volver a sincronizar y ventana (ms) que se relee para cubrir registros subidos tarde
+FIREBASE_MIRROR_MAX_AGE = int(os.environ.get('FIREBASE_MIRROR_MAX_AGE', '60'))
+FIREBASE_MIRROR_OVERLAP_MS = int(os.environ.get('FIREBASE_MIRROR_OVERLAP_MS', str(7 * 24 * 3600 * 1000)))
+# Segundos que una sincronización obligatoria (max_age=0) espera a la de otro worker
+FIREBASE_MIRROR_LOCK_WAIT = int(os.environ.get('FIREBASE_MIRROR_LOCK_WAIT', '30'))
+
+# Configuración de caché compartida entre los workers de gunicorn
+# Con REDIS_URL se usa Redis; sin ella, una caché en archivos bajo CACHE_DIR que
+# comparten todos los procesos del mismo servidor (desarrollo o un solo droplet).
+# La invalidación se hace por versiones de etiquetas (ver core/cache_utils.py).
+REDIS_URL = os.environ.get('REDIS_URL', '')
+CACHE_DIR = os.environ.get('CACHE_DIR', str(BASE_DIR / 'cache_data'))
+
+# Caché en disco de las fotos ya comprimidas que usan los generadores de reportes PDF
+# (reportes/imagenes_reporte.py); se eliminan las menos usadas al superar el tamaño
+REPORTES_CACHE_IMAGENES_DIR = os.environ.get(
+    'REPORTES_CACHE_IMAGENES_DIR', os.path.join(CACHE_DIR, 'imagenes_reportes')
+)
+REPORTES_CACHE_IMAGENES_MB = int(os.environ.get('REPORTES_CACHE_IMAGENES_MB', '512'))
+# Horas tras las que una foto en caché se revalida con su ETag (If-None-Match)
+REPORTES_CACHE_IMAGENES_REVALIDAR_HORAS = float(os.environ.get('REPORTES_CACHE_IMAGENES_REVALIDAR_HORAS', '24'))
+# Routers Nokia incrusta las fotos originales; con True las reduce a 1024 px y calidad 75
+# (PDF mucho más liviano, pero con fotos de menor resolución)
+REPORTES_ROUTERS_REDUCIR_IMAGENES = os.environ.get(
+    'REPORTES_ROUTERS_REDUCIR_IMAGENES', 'False'
+).lower() in ('true', '1', 'yes')
+# Plantillas de fondo de los reportes ya comprimidas (una versión por archivo y fecha de modificación)
+REPORTES_CACHE_PLANTILLAS_DIR = os.environ.get(
+    'REPORTES_CACHE_PLANTILLAS_DIR', os.path.join(CACHE_DIR, 'plantillas_reportes')
+)
+# Exportación de PDFs de reportes en lote (ZIP): procesos de renderizado y máximo de reportes
+REPORTES_LOTE_PROCESOS = int(os.environ.get('REPORTES_LOTE_PROCESOS', '2'))
+REPORTES_LOTE_MAX = int(os.environ.get('REPORTES_LOTE_MAX', '300'))
+
+# Cola de trabajos en segundo plano (core/trabajos.py). Las vistas pesadas se encolan y las
+# ejecuta `manage.py procesar_trabajos`; sin worker se puede desactivar para generar en la petición
+TRABAJOS_SEGUNDO_PLANO = os.environ.get('TRABAJOS_SEGUNDO_PLANO', 'True').lower() in ('true', '1', 'yes')
+TRABAJOS_RETENCION_HORAS = int(os.environ.get('TRABAJOS_RETENCION_HORAS', '24'))
+TRABAJOS_HISTORIAL_DIAS = int(os.environ.get('TRABAJOS_HISTORIAL_DIAS', '30'))
+# El worker renueva el latido de cada trabajo en ejecución; sin latido reciente se reencola
+TRABAJOS_LATIDO = int(os.environ.get('TRABAJOS_LATIDO', '30'))
+TRABAJOS_LATIDO_LIMITE = int(os.environ.get('TRABAJOS_LATIDO_LIMITE', '120'))
+TRABAJOS_TIMEOUT = int(os.environ.get('TRABAJOS_TIMEOUT', '1800'))  # trabajos sin latido
+TRABAJOS_MAX_INTENTOS = int(os.environ.get('TRABAJOS_MAX_INTENTOS', '2'))
+# Cada cuántas horas el worker concilia el libro ProyectoFinanzas (cambios hechos con update())
+FINANZAS_CONCILIACION_HORAS = int(os.environ.get('FINANZAS_CONCILIACION_HORAS', '24'))
+
+# Subidas fragmentadas y reanudables (core/subidas.py). Los fragmentos se guardan en SUBIDAS_DIR
+# (mismo disco que MEDIA_ROOT para mover el archivo final sin copiarlo) y las subidas sin
+# actividad se eliminan en el mantenimiento de `procesar_trabajos`
+SUBIDAS_DIR = os.environ.get('SUBIDAS_DIR', str(BASE_DIR / 'subidas_temporales'))
+SUBIDAS_TAMANO_FRAGMENTO = int(os.environ.get('SUBIDAS_TAMANO_FRAGMENTO', str(2 * 1024 * 1024)))
+SUBIDAS_TAMANO_MAXIMO = int(os.environ.get('SUBIDAS_TAMANO_MAXIMO', str(200 * 1024 * 1024)))
+SUBIDAS_EXPIRACION_HORAS = int(os.environ.get('SUBIDAS_EXPIRACION_HORAS', '24'))
+
+# Descargas protegidas (core/descargas.py): 'django' envía el archivo desde el worker (desarrollo);
+# 'nginx' responde X-Accel-Redirect hacia la ubicación internal DESCARGAS_NGINX_PREFIJO -> MEDIA_ROOT
+DESCARGAS_BACKEND = os.environ.get('DESCARGAS_BACKEND', 'django')
+DESCARGAS_NGINX_PREFIJO = os.environ.get('DESCARGAS_NGINX_PREFIJO', '/protegido/')
+
+
+def _cache_compartida(nombre, timeout, max_entries):
+    """Configuración de un alias de caché compartido por todos los workers"""
+    if REDIS_URL:
+        return {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': REDIS_URL,
+            'KEY_PREFIX': f'sistema_construccion_{nombre}',
+            'TIMEOUT': timeout,
         }
-    },
-    'long_term': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-        'LOCATION': 'long_term_cache',
-        'TIMEOUT': 86400 * 7,  # 7 días para datos que cambian poco
+    return {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.path.join(CACHE_DIR, nombre),
+        'TIMEOUT': timeout,
         'OPTIONS': {
-            'MAX_ENTRIES': 2000,
+            'MAX_ENTRIES': max_entries,
             'CULL_FREQUENCY': 3,
         }
     }
+
+
+CACHES = {
+    'default': _cache_compartida('default', 3600, 5000),  # 1 hora por defecto
+    'session': _cache_compartida('session', 86400, 1000),  # 24 horas para sesiones
+    'long_term': _cache_compartida('long_term', 86400 * 7, 2000),  # 7 días para datos que cambian poco
 }
 
 # Usar sesiones de base de datos
@@ -301,3 +356,11 @@ LOGGING = {
 # Crear directorio de logs si no existe
 LOGS_DIR = BASE_DIR / 'logs'
 LOGS_DIR.mkdir(exist_ok=True)
+
+# Log de actividad (LogActividad) en lote: ver core/activity_log.py
+ACTIVITY_LOG_BUFFERED = os.environ.get('ACTIVITY_LOG_BUFFERED', 'True').lower() in ('true', '1', 'yes')
+ACTIVITY_LOG_BATCH_SIZE = int(os.environ.get('ACTIVITY_LOG_BATCH_SIZE', 50))
+ACTIVITY_LOG_FLUSH_INTERVAL = int(os.environ.get('ACTIVITY_LOG_FLUSH_INTERVAL', 5))  # segundos
+ACTIVITY_LOG_SPOOL_DIR = LOGS_DIR / 'actividad'
+ACTIVITY_LOG_ARCHIVE_DIR = LOGS_DIR / 'actividad_archivo'
+ACTIVITY_LOG_RETENTION_DAYS = int(os.environ.get('ACTIVITY_LOG_RETENTION_DAYS', 365))
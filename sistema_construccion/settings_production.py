@@ -113,6 +113,9 @@ X_FRAME_OPTIONS = 'DENY'
 STATIC_ROOT = BASE_DIR / 'staticfiles'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# nginx envía los archivos de las descargas protegidas (ver nginx/sistema_construccion.conf)
+DESCARGAS_BACKEND = os.environ.get('DESCARGAS_BACKEND', 'nginx')
+
 # Configuración de email para producción
 EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 EMAIL_HOST = os.environ.get('EMAIL_HOST', 'smtp.gmail.com')
@@ -80,6 +80,11 @@ self.addEventListener('fetch', (event) => {
     const { request } = event;
     const url = new URL(request.url);
     
+    // Subidas fragmentadas: el estado debe venir siempre del servidor para reanudar
+    if (url.pathname.startsWith('/api/subidas/')) {
+        return;
+    }
+    
     // Estrategia de cache para diferentes tipos de recursos
     if (request.method === 'GET') {
         // Archivos estáticos - Cache First
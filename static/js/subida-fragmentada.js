@@ -0,0 +1,192 @@
+// Subidas fragmentadas y reanudables (API /api/subidas/, ver core/subidas.py)
+//
+// El archivo se envía en fragmentos con varias peticiones en paralelo. Si la
+// conexión se cae, cada fragmento se reintenta y, al recargar la página, la
+// subida retoma desde los fragmentos que el servidor ya tiene.
+class SubidaFragmentada {
+    constructor(archivo, opciones = {}) {
+        this.archivo = archivo;
+        this.paralelos = opciones.paralelos || 3;
+        this.reintentos = opciones.reintentos || 6;
+        this.alProgresar = opciones.alProgresar || (() => {});
+        this.csrfToken = opciones.csrfToken || SubidaFragmentada.obtenerCsrf();
+        this.base = opciones.base || '/api/subidas/';
+        this.enviados = 0;
+    }
+
+    static obtenerCsrf() {
+        const campo = document.querySelector('input[name="csrfmiddlewaretoken"]');
+        if (campo) return campo.value;
+        const cookie = document.cookie.split('; ').find(c => c.startsWith('csrftoken='));
+        return cookie ? decodeURIComponent(cookie.split('=')[1]) : '';
+    }
+
+    get claveLocal() {
+        const a = this.archivo;
+        return `subida:${a.name}:${a.size}:${a.lastModified}`;
+    }
+
+    async peticion(url, opciones = {}) {
+        const respuesta = await fetch(url, {
+            credentials: 'same-origin',
+            ...opciones,
+            headers: { 'X-CSRFToken': this.csrfToken, ...(opciones.headers || {}) },
+        });
+        let datos = {};
+        try {
+            datos = await respuesta.json();
+        } catch (e) {
+            // Respuesta sin JSON (proxy, error del servidor)
+        }
+        if (!respuesta.ok) {
+            const error = new Error(datos.error || `Error ${respuesta.status}`);
+            error.estado = respuesta.status;
+            throw error;
+        }
+        return datos;
+    }
+
+    // Retoma la subida guardada para este archivo o inicia una nueva
+    async preparar() {
+        const token = localStorage.getItem(this.claveLocal);
+        if (token) {
+            try {
+                const estado = await this.peticion(`${this.base}${token}/`);
+                if (estado.tamano === this.archivo.size) {
+                    console.log(`🔄 Reanudando subida: ${estado.recibidos.length}/${estado.total_fragmentos} fragmentos`);
+                    return estado;
+                }
+            } catch (e) {
+                // La subida expiró o ya se usó: se inicia otra
+            }
+            localStorage.removeItem(this.claveLocal);
+        }
+        const estado = await this.peticion(this.base, {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ nombre: this.archivo.name, tamano: this.archivo.size }),
+        });
+        localStorage.setItem(this.claveLocal, estado.token);
+        return estado;
+    }
+
+    async sha256(datos) {
+        if (!window.crypto || !crypto.subtle) return '';  // Solo en HTTPS o localhost
+        const hash = await crypto.subtle.digest('SHA-256', datos);
+        return Array.from(new Uint8Array(hash)).map(b => b.toString(16).padStart(2, '0')).join('');
+    }
+
+    esperar(ms) {
+        return new Promise(resolver => setTimeout(resolver, ms));
+    }
+
+    async esperarConexion() {
+        if (navigator.onLine) return;
+        await new Promise(resolver => window.addEventListener('online', resolver, { once: true }));
+    }
+
+    async enviarFragmento(estado, indice) {
+        const inicio = indice * estado.tamano_fragmento;
+        const datos = await this.archivo.slice(inicio, inicio + estado.tamano_fragmento).arrayBuffer();
+        const hash = await this.sha256(datos);
+        for (let intento = 0; ; intento++) {
+            await this.esperarConexion();
+            try {
+                await this.peticion(`${this.base}${estado.token}/fragmentos/${indice}/`, {
+                    method: 'PUT',
+                    headers: { 'Content-Type': 'application/octet-stream', 'X-Fragmento-SHA256': hash },
+                    body: datos,
+                });
+                return datos.byteLength;
+            } catch (error) {
+                // 4xx (salvo fragmento dañado) no se arregla reintentando
+                const definitivo = error.estado && error.estado < 500 && error.estado !== 422 && error.estado !== 429;
+                if (definitivo || intento + 1 >= this.reintentos) throw error;
+                await this.esperar(Math.min(1000 * 2 ** intento, 30000));
+            }
+        }
+    }
+
+    // Sube el archivo y retorna el token de la subida completada
+    async subir() {
+        const estado = await this.preparar();
+        if (estado.estado === 'completada') {
+            localStorage.removeItem(this.claveLocal);
+            return estado.token;
+        }
+        const recibidos = new Set(estado.recibidos);
+        const pendientes = [];
+        for (let i = 0; i < estado.total_fragmentos; i++) {
+            if (recibidos.has(i)) {
+                this.enviados += Math.min(estado.tamano_fragmento, this.archivo.size - i * estado.tamano_fragmento);
+            } else {
+                pendientes.push(i);
+            }
+        }
+        this.alProgresar(Math.round(this.enviados * 100 / this.archivo.size));
+
+        const trabajador = async () => {
+            while (pendientes.length) {
+                const indice = pendientes.shift();
+                this.enviados += await this.enviarFragmento(estado, indice);
+                this.alProgresar(Math.round(this.enviados * 100 / this.archivo.size));
+            }
+        };
+        await Promise.all(Array.from({ length: Math.min(this.paralelos, pendientes.length) }, trabajador));
+
+        const completa = await this.peticion(`${this.base}${estado.token}/completar/`, { method: 'POST' });
+        localStorage.removeItem(this.claveLocal);
+        return completa.token;
+    }
+
+    // Hace que un formulario existente envíe su archivo por fragmentos: al
+    // enviarlo se sube el archivo, se deshabilita el input y el formulario
+    // viaja solo con el campo oculto subida_<campo> que contiene el token.
+    static conectarFormulario(formulario, input, opciones = {}) {
+        if (!formulario || !input || !window.fetch || !window.Blob || !Blob.prototype.slice) return;
+        const campo = opciones.campo || input.name;
+        let oculto = formulario.querySelector(`input[name="subida_${campo}"]`);
+        if (!oculto) {
+            oculto = document.createElement('input');
+            oculto.type = 'hidden';
+            oculto.name = `subida_${campo}`;
+            formulario.appendChild(oculto);
+        }
+
+        formulario.addEventListener('submit', async (evento) => {
+            const archivo = input.files && input.files[0];
+            if (evento.defaultPrevented || !archivo || oculto.value) return;
+            evento.preventDefault();
+
+            const boton = formulario.querySelector('[type="submit"]');
+            const textoBoton = boton ? boton.innerHTML : '';
+            if (boton) boton.disabled = true;
+            const subida = new SubidaFragmentada(archivo, {
+                ...opciones,
+                alProgresar: (porcentaje) => {
+                    if (boton) boton.innerHTML = `<i class="fas fa-spinner fa-spin"></i> Subiendo ${porcentaje}%`;
+                    if (opciones.alProgresar) opciones.alProgresar(porcentaje);
+                },
+            });
+            try {
+                oculto.value = await subida.subir();
+                input.disabled = true;  // El archivo ya está en el servidor
+                formulario.submit();
+            } catch (error) {
+                console.error('❌ Error en la subida fragmentada:', error);
+                if (boton) {
+                    boton.disabled = false;
+                    boton.innerHTML = textoBoton;
+                }
+                const mensaje = `No se pudo subir el archivo: ${error.message}. Vuelva a intentarlo; la subida continuará donde quedó.`;
+                if (window.showToast) {
+                    window.showToast('error', 'Subida interrumpida', mensaje);
+                } else {
+                    alert(mensaje);
+                }
+            }
+        });
+    }
+}
+
+window.SubidaFragmentada = SubidaFragmentada;